@@ -0,0 +1,42 @@
+"""unique index on security_devices (user_id, fingerprint)
+
+Revision ID: 5f3c2a91d7e4
+Revises: b9d4869aea72
+Create Date: 2026-10-19 10:12:41.204518
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5f3c2a91d7e4"
+down_revision: str | Sequence[str] | None = "b9d4869aea72"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # collapse duplicates created by the old select-then-insert flow (keep the newest row)
+    op.execute(
+        """
+        DELETE FROM security_devices a
+        USING security_devices b
+        WHERE a.user_id = b.user_id
+          AND a.fingerprint = b.fingerprint
+          AND a.id < b.id;
+        """
+    )
+    op.create_index(
+        "uq_security_devices_user_fingerprint",
+        "security_devices",
+        ["user_id", "fingerprint"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_security_devices_user_fingerprint", table_name="security_devices")
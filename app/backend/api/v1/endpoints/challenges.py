@@ -6,7 +6,7 @@
 # - *GET  /api/v1/rankings* – retrieve sorted scoreboard (rank, team name, finalScore, optional tie-breakers)
 
 import os
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 import fastapi
 import httpx
@@ -20,12 +20,33 @@ from app.backend.config.settings import get_settings
 from app.backend.db.models import ChallengeTable
 from app.backend.schema.challenges import ChallengeInResponse, FlagSubmission
 from app.backend.schema.teams import TeamWithScoresInResponse
+from app.backend.utils.challenge_profiles import MODE_SHARED, challenge_profiles
 from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.instance_activity import instance_activity
 from app.backend.utils.instance_limiter import InstanceLimiter
 from app.backend.utils.instance_token_store import InstanceTokenStore
 from app.backend.utils.k8s_manager import K8sChallengeManager, K8sTeamChallengeManager
 from app.backend.utils.limiter import limiter
-from app.backend.utils.team_instance_store import TeamInstanceStore
+from app.backend.utils.shared_instances import (
+    FLAG_HEADER,
+    INJECTED_HEADERS,
+    TEAM_HEADER,
+    is_shared,
+    shared_flag,
+    shared_name,
+)
+from app.backend.utils.spawn_queue import spawn_queue
+from app.backend.utils.team_instance_store import (
+    ADMIT_EXISTS,
+    ADMIT_FULL,
+    STATUS_HIBERNATED,
+    STATUS_RESTARTING,
+    STATUS_RUNNING,
+    STATUS_STARTING,
+    STATUS_TERMINATING,
+    STATUS_WAKING,
+    TeamInstanceStore,
+)
 
 settings = get_settings()
 
@@ -56,6 +77,15 @@ def parse_iso_utc(s: str) -> datetime:
     return dt
 
 
+def _queued_instance(queued: dict) -> dict:
+    return {
+        "running": False,
+        "status": "queued",
+        "queue_position": queued.get("position"),
+        "eta_seconds": queued.get("eta_seconds"),
+    }
+
+
 ## we decided to go with team-scoped instances only
 @router.post("/{challenge_id}/spawn", status_code=status.HTTP_201_CREATED)
 @limiter.limit("2/minute")
@@ -72,7 +102,12 @@ async def spawn_challenge(
 
     k8s_manager = K8sChallengeManager()
     connection_info = await k8s_manager.spawn_instance(
-        user_id=current_user.id, challenge_id=ch.id, image=image_name, port=target_port, ttl_seconds=3600
+        user_id=current_user.id,
+        challenge_id=ch.id,
+        image=image_name,
+        port=target_port,
+        ttl_seconds=3600,
+        profile=challenge_profiles.for_challenge(ch),
     )
 
     if not connection_info:
@@ -80,7 +115,9 @@ async def spawn_challenge(
 
     # schedule server-side termination as fallback
     try:
-        k8s_manager.schedule_termination(current_user.id, ch.id, ttl_seconds=settings.CHALLENGE_K8S_POD_TTL_SECONDS)
+        await k8s_manager.schedule_termination(
+            current_user.id, ch.id, ttl_seconds=settings.CHALLENGE_K8S_POD_TTL_SECONDS
+        )
     except Exception as e:
         logger.error(f"Failed to schedule termination for {connection_info}: {e}")
 
@@ -92,7 +129,7 @@ async def spawn_challenge(
 async def terminate_challenge(request: Request, challenge_id: int, current_user: CurrentUserDep):
     # k8sManager is a singleton - it does not get reinitialized here
     k8s_manager = K8sChallengeManager()
-    k8s_manager.terminate_instance(current_user.id, challenge_id)
+    await k8s_manager.terminate_instance(current_user.id, challenge_id)
     return {"message": "Instance terminated"}
 
 
@@ -174,7 +211,8 @@ async def issue_web_token(
 
     store = TeamInstanceStore()
     inst = await store.get(team.id, challenge_id)
-    if not inst or inst.get("status") != "running" or not inst.get("connection"):
+    # a hibernated instance is woken by the first request through the token
+    if not inst or inst.get("status") not in (STATUS_RUNNING, STATUS_HIBERNATED) or not inst.get("connection"):
         raise HTTPException(status_code=400, detail="Instance not running.")
 
     token_store = InstanceTokenStore()
@@ -220,13 +258,31 @@ async def proxy_by_token(
 
     team_id = int(mapping["team_id"])
     challenge_id = int(mapping["challenge_id"])
+    instance_activity.touch(team_id, challenge_id)  # in memory, flushed in batches
 
     ch = await challenge_repo.read_challenge_by_id(challenge_id)
     if not ch:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
     k8s = K8sTeamChallengeManager()
-    service_name = k8s.get_pod_name(team_id, challenge_id)
+    inst = await TeamInstanceStore().get(team_id, challenge_id)
+    current = inst.get("status") if inst else None
+    # hibernated (scaled to zero): recreate the pod and hold this request until it is Ready
+    if current in (STATUS_HIBERNATED, STATUS_WAKING):
+        try:
+            if await k8s.wake_instance(team_id, ch):
+                current = STATUS_RUNNING
+        except Exception as e:
+            logger.warning(f"Wake of t{team_id}-c{challenge_id} failed: {e}")
+    # pod being (re)started: ask to come back instead of proxying into a 502
+    if current in (STATUS_STARTING, STATUS_RESTARTING, STATUS_HIBERNATED, STATUS_WAKING):
+        raise HTTPException(
+            status_code=503, detail="Challenge is starting. Try again in a few seconds.", headers={"Retry-After": "2"}
+        )
+
+    # shared challenge: one Service for every team, the team's flag travels with each request
+    shared = bool(inst) and inst.get("mode") == MODE_SHARED
+    service_name = shared_name(challenge_id) if shared else k8s.get_pod_name(team_id, challenge_id)
     namespace = k8s.namespace
     target_port = getattr(ch, "internal_port", 80)
 
@@ -234,7 +290,11 @@ async def proxy_by_token(
     query_params = dict(request.query_params)
 
     async with httpx.AsyncClient(follow_redirects=False) as client:
-        req_headers = {k: v for k, v in request.headers.items() if k.lower() not in ["host", "content-length"]}
+        dropped = {"host", "content-length", *INJECTED_HEADERS}  # never taken from the player
+        req_headers = {k: v for k, v in request.headers.items() if k.lower() not in dropped}
+        if shared:
+            req_headers[FLAG_HEADER] = shared_flag(challenge_id, team_id)
+            req_headers[TEAM_HEADER] = str(team_id)
 
         rp_req = client.build_request(
             request.method,
@@ -337,6 +397,14 @@ async def get_rankings(team_repo: TeamsRepositoryDep):
     return [x["team"] for x in enriched]
 
 
+@router.get("/capacity", status_code=status.HTTP_200_OK)
+async def get_instance_capacity(current_user: CurrentUserDep):
+    """
+    Active instances and the CPU / memory they reserve against the capacity budget.
+    """
+    return await InstanceLimiter().utilisation()
+
+
 @router.get("/{challenge_id}", response_model=ChallengeInResponse, status_code=status.HTTP_200_OK)
 async def get_challenge_by_id(challenge_id: int, challenge_repo: ChallengesRepositoryDep):
     ch = await challenge_repo.read_challenge_by_id(challenge_id)
@@ -436,6 +504,8 @@ async def get_instance_status(
     store = TeamInstanceStore()
     inst = await store.get(team.id, challenge_id)
     if not inst:
+        if queued := await spawn_queue.status(team.id, challenge_id):
+            return _queued_instance(queued)
         raise HTTPException(status_code=404, detail="No active instance.")
 
     # Basic derived fields for UI
@@ -475,6 +545,12 @@ async def spawn_challenge_team_scoped(
     - Requires team
     - If an instance is already running for this team+challenge -> 409 with instance info
     - Stores instance metadata in Redis for accurate UI TTL/timer
+    - Answers with status "starting"; the pod watch marks it running once the pod is Ready
+      and pushes `instance_ready` to the team's SSE streams
+    - At capacity (or while other teams wait) the spawn is queued -> 202 with status "queued",
+      its position and ETA; the queue starts it in turn and pushes `spawn_queue` events
+    - A shared challenge (runtime mode "shared") is never queued: the team only gets its flag
+      and is running right away on the challenge's deployment
     """
     team = await team_repo.get_team_for_user(current_user.id)
     if not team:
@@ -485,25 +561,37 @@ async def spawn_challenge_team_scoped(
         raise HTTPException(status_code=404, detail="Challenge not found or not deployable.")
 
     ttl_seconds = int(getattr(settings, "CHALLENGE_K8S_POD_TTL_SECONDS", 3600))
+    profile = challenge_profiles.for_challenge(ch)
+    cpu_millicores, memory_bytes = profile.weight
+    shared = is_shared(ch, profile)
 
     store = TeamInstanceStore()
 
     # =====================================================
-    # ATOMIC CLAIM (ONLY THE FIRST CALLER WINS)
+    # ATOMIC ADMISSION (TEAM CLAIM + GLOBAL CAP + CAPACITY BUDGET, ONE ROUND TRIP)
+    # teams already waiting go first: no admission while the queue is not empty
     # =====================================================
-    claimed, payload = await store.claim_or_get(
-        team.id,
-        challenge_id,
-        ttl_seconds=ttl_seconds,
-    )
+    if not shared and await spawn_queue.pending():
+        payload = await store.get(team.id, challenge_id)
+        outcome = ADMIT_EXISTS if payload else ADMIT_FULL
+    else:
+        outcome, payload = await store.admit(
+            team.id,
+            challenge_id,
+            ttl_seconds=ttl_seconds,
+            limit=int(getattr(settings, "MAX_ACTIVE_INSTANCES", 50)),
+            cpu_millicores=cpu_millicores,
+            memory_bytes=memory_bytes,
+            shared=shared,
+        )
 
-    if not claimed:
+    if outcome == ADMIT_EXISTS:
         return JSONResponse(
             status_code=409,
             content={
                 "message": "Instance already launched for your team.",
                 "instance": {
-                    "running": True,
+                    "running": payload.get("status") == STATUS_RUNNING,
                     "connection": payload.get("connection"),
                     "started_at": payload.get("started_at"),
                     "expires_at": payload.get("expires_at"),
@@ -516,79 +604,41 @@ async def spawn_challenge_team_scoped(
             },
         )
 
-    # =====================================================
-    # LIMITER OF ACTIVE INSTANCES
-    # =====================================================
-    limiter = InstanceLimiter()
-
-    try:
-        ok = await limiter.try_acquire(
-            team_id=team.id,
-            challenge_id=challenge_id,
-            ttl_seconds=ttl_seconds,
-            limit=int(getattr(settings, "MAX_ACTIVE_INSTANCES", 50)),
-        )
-        if not ok:
-            # we back up claim
-            await store.delete(team.id, challenge_id)
-            raise HTTPException(
-                status_code=429,
-                detail="Too many active instances right now. Try again later.",
-            )
-
+    if outcome == ADMIT_FULL:
         # =================================================
-        # SPAWN K8S (TEAM-SCOPED)
+        # WAIT IN THE FAIR QUEUE INSTEAD OF A 429 RETRY LOOP
         # =================================================
-        k8s = K8sTeamChallengeManager()
-        proto = ch.protocol.value if getattr(ch, "protocol", None) else "http"
-        result = await k8s.spawn_instance(
-            team_id=team.id,
-            challenge_id=challenge_id,
-            image=ch.image_name,
-            port=ch.internal_port,
-            ttl_seconds=ttl_seconds,
-            protocol=proto,
+        queued = await spawn_queue.enqueue(team.id, challenge_id)
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "No free capacity right now: your instance is queued and starts automatically.",
+                "instance": _queued_instance(queued),
+            },
         )
 
-        if not result:
-            raise RuntimeError("K8s spawn failed")
-
-        # =================================================
-        # FILL IN THE PLACEHOLDER
-        # =================================================
-        payload = await store.set(
-            team.id,
-            challenge_id,
-            ttl_seconds=ttl_seconds,
-            connection=result.get("connection_internal"),
-            protocol=result.get("protocol"),
-            tcp_host=result.get("tcp_host"),
-            tcp_port=result.get("tcp_port"),
-            passphrase=result.get("passphrase"),
-        )
-        if not payload:
-            raise RuntimeError("Redis placeholder missing after claim (unexpected)")
-
-        return {
-            "message": "Instance started.",
-            "instance": {
-                "running": True,
-                "status": payload.get("status", "running"),
-                "protocol": payload.get("protocol"),
-                "connection": payload.get("connection"),
-                "tcp_host": payload.get("tcp_host"),
-                "tcp_port": payload.get("tcp_port"),
-                "passphrase": payload.get("passphrase"),
-                "started_at": payload.get("started_at"),
-                "expires_at": payload.get("expires_at"),
-            },
-        }
+    # =====================================================
+    # SPAWN K8S (TEAM-SCOPED); STILL STARTING UNTIL THE POD IS READY
+    # =====================================================
+    k8s = K8sTeamChallengeManager()
+    payload = await k8s.launch_instance(
+        team.id, ch, ttl_seconds=ttl_seconds, profile=profile, challenge_repo=challenge_repo
+    )
 
-    except Exception:
-        # Spawn failed - cleanup
-        await store.delete(team.id, challenge_id)
-        await limiter.release(team_id=team.id, challenge_id=challenge_id)
-        raise
+    return {
+        "message": "Instance started.",
+        "instance": {
+            "running": payload.get("status") == STATUS_RUNNING,
+            "status": payload.get("status"),
+            "protocol": payload.get("protocol"),
+            "connection": payload.get("connection"),
+            "tcp_host": payload.get("tcp_host"),
+            "tcp_port": payload.get("tcp_port"),
+            "passphrase": payload.get("passphrase"),
+            "started_at": payload.get("started_at"),
+            "expires_at": payload.get("expires_at"),
+        },
+    }
 
 
 @router.post("/{challenge_id}/extend", status_code=status.HTTP_200_OK)
@@ -616,7 +666,9 @@ async def extend_instance_team_scoped(
         raise HTTPException(status_code=404, detail="No active instance to extend.")
 
     # Must be running
-    if inst.get("status") != "running":
+    if inst.get("status") == STATUS_HIBERNATED:
+        raise HTTPException(status_code=409, detail="Instance is hibernated. Open it to wake it up, then extend.")
+    if inst.get("status") != STATUS_RUNNING:
         raise HTTPException(status_code=400, detail="Instance is not running.")
 
     # Remaining time check
@@ -642,9 +694,21 @@ async def extend_instance_team_scoped(
 
     proto = ch.protocol.value if getattr(ch, "protocol", None) else "http"
 
+    # ---- RESTART FLOW ----
+    # 0) running -> restarting (CAS): only one extend wins, terminate can still take over
+    #    (started_at restarts too: the fresh pod's startup time is measured from here)
+    claimed, _ = await store.transition(
+        team.id,
+        challenge_id,
+        from_status=(STATUS_RUNNING,),
+        to_status=STATUS_RESTARTING,
+        started_at=datetime.now(timezone.utc).isoformat(),
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Instance is already being restarted or terminated.")
+
     k8s = K8sTeamChallengeManager()
 
-    # ---- RESTART FLOW ----
     # 1) terminate current (best-effort)
     try:
         await k8s.terminate_instance(team.id, challenge_id)
@@ -653,20 +717,30 @@ async def extend_instance_team_scoped(
         logger.warning("terminate_instance() failed during extend; continuing best-effort.")
 
     # 2) spawn fresh with new ttl
-    result = await k8s.spawn_instance(
-        team_id=team.id,
-        challenge_id=challenge_id,
-        image=ch.image_name,
-        port=ch.internal_port,
-        ttl_seconds=new_ttl,
-        protocol=proto,
-    )
+    try:
+        result = await k8s.spawn_instance(
+            team_id=team.id,
+            challenge_id=challenge_id,
+            image=ch.image_name,
+            port=ch.internal_port,
+            ttl_seconds=new_ttl,
+            protocol=proto,
+            warm_pool=ch.warm_pool_size > 0,
+            profile=challenge_profiles.for_challenge(ch),
+        )
+    except Exception as e:
+        logger.error(f"spawn_instance() failed during extend: {e}")
+        result = None
     if not result:
-        # IMPORTANT: instance is now down; reflect that in redis to avoid stale UI
-        await store.delete(team.id, challenge_id)
+        # IMPORTANT: instance is now down; free record, slot, reservation and expiry (no stale UI)
+        await store.abandon(team.id, challenge_id)
         raise HTTPException(status_code=500, detail="Failed to restart instance during extend.")
 
-    # 3) Update redis metadata (connection/protocol/tcp stuff + new expires)
+    await challenge_repo.save_team_instance_flag(team.id, challenge_id, result["flag"], ttl_seconds=new_ttl)
+
+    # 3) Update redis metadata (connection/protocol/tcp stuff + new expires), restarting -> starting
+    #    (the pod watch marks it running once the fresh pod is Ready; a shared one runs already)
+    shared = result.get("mode") == MODE_SHARED
     updated = await store.set(
         team.id,
         challenge_id,
@@ -676,37 +750,30 @@ async def extend_instance_team_scoped(
         tcp_host=result.get("tcp_host"),
         tcp_port=result.get("tcp_port"),
         passphrase=result.get("passphrase"),
+        pod_uid=result.get("pod_uid"),
+        from_status=(STATUS_RESTARTING,),
+        to_status=STATUS_RUNNING if shared else STATUS_STARTING,
     )
     if not updated:
-        # If placeholder missing, fallback: recreate state (safe)
-        now2 = datetime.now(timezone.utc)
-        exp2 = now2 + timedelta(seconds=new_ttl)
-        payload = {
-            "team_id": team.id,
-            "challenge_id": challenge_id,
-            "connection": result.get("connection_internal"),
-            "started_at": now2.isoformat(),
-            "expires_at": exp2.isoformat(),
-            "status": "running",
-            "protocol": result.get("protocol"),
-            "tcp_host": result.get("tcp_host"),
-            "tcp_port": result.get("tcp_port"),
-            "passphrase": result.get("passphrase"),
-        }
-        await store.force_set(team.id, challenge_id, payload, ttl_seconds=new_ttl)
-        updated = payload
-
-    # 4) Extend limiter slot too (so capacity accounting matches)
+        # terminated while we were restarting -> the fresh pod must not outlive it
+        try:
+            await k8s.terminate_instance(team.id, challenge_id)
+        except Exception:
+            logger.warning("terminate_instance() failed after extend lost to terminate.")
+        raise HTTPException(status_code=409, detail="Instance was terminated during extend.")
+    updated = await k8s.readiness.notify_spawned(team.id, challenge_id) or updated
+
+    # 4) Extend limiter slot too (so capacity accounting matches; shared instances have none)
     limiter = InstanceLimiter()
-    ok2 = await limiter.extend(team_id=team.id, challenge_id=challenge_id, ttl_seconds=new_ttl)
+    ok2 = shared or await limiter.extend(team_id=team.id, challenge_id=challenge_id, ttl_seconds=new_ttl)
     if not ok2:
         logger.warning("InstanceLimiter.extend() failed or slot missing during extend().")
 
     return {
         "message": "Instance restarted and extended to 60 minutes.",
         "instance": {
-            "running": True,
-            "status": updated.get("status", "running"),
+            "running": updated.get("status") == STATUS_RUNNING,
+            "status": updated.get("status"),
             "protocol": updated.get("protocol"),
             "connection": updated.get("connection"),
             "tcp_host": updated.get("tcp_host"),
@@ -725,22 +792,31 @@ async def terminate_instance_team_scoped(
     challenge_id: int,
     current_user: CurrentUserDep,
     team_repo: TeamsRepositoryDep,
+    challenge_repo: ChallengesRepositoryDep,
 ):
     """
-    Terminates the team-scoped instance and clears Redis metadata/flag.
+    Terminates the team-scoped instance and clears Redis metadata/flag (and its DB copy).
     """
     team = await team_repo.get_team_for_user(current_user.id)
     if not team:
         raise HTTPException(status_code=400, detail="You must be in a team.")
 
+    # a spawn still waiting in the queue is simply dropped
+    if await spawn_queue.cancel(team.id, challenge_id):
+        return {"message": "Queued instance cancelled."}
+
+    # any -> terminating first, so a concurrent extend cannot bring the record back to running
+    store = TeamInstanceStore()
+    await store.transition(team.id, challenge_id, to_status=STATUS_TERMINATING)
+
     k8s = K8sTeamChallengeManager()
     await k8s.terminate_instance(team.id, challenge_id)
 
-    store = TeamInstanceStore()
     await store.delete(team.id, challenge_id)
 
     flags = TeamFlagStore()
     await flags.delete_flag(team.id, challenge_id)
+    await challenge_repo.delete_team_instance_flag(team.id, challenge_id)
 
     # FREE UP LIMITER SLOT
     limiter = InstanceLimiter()
@@ -748,6 +824,7 @@ async def terminate_instance_team_scoped(
         await limiter.release(team_id=team.id, challenge_id=challenge_id)
     except Exception:
         logger.warning("InstanceLimiter.release() failed")
+    spawn_queue.wake()
 
     return {"message": "Instance terminated."}
 
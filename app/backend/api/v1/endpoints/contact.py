@@ -31,7 +31,7 @@ async def contact(
         email_sent = False
 
         if saved:
-            email_sent = send_contact_email(
+            email_sent = await send_contact_email(
                 name=data.name,
                 email=data.email,
                 message=data.message,
@@ -13,6 +13,7 @@ from app.backend.db.models import UserTable
 from app.backend.repository.ctf_state import CTFStateRepository
 from app.backend.schema.ctf import CTFStartRequest
 from app.backend.utils.ctf_redis import ctf_redis_bus
+from app.backend.utils.ctf_state_cache import ctf_state_cache
 from app.backend.utils.limiter import rate_limit
 from app.backend.utils.limiter_keys import admin_key
 
@@ -65,6 +66,7 @@ async def get_ctf_status(
             session.add(state)
             await session.commit()
             await session.refresh(state)
+            ctf_state_cache.update(state)
             await ctf_redis_bus.publish("ctf_changed", {"action": "ended"})
 
             return {
@@ -132,6 +134,7 @@ async def start_ctf(
         session.add(state)
         await session.commit()
         await session.refresh(state)
+        ctf_state_cache.update(state)
         await ctf_redis_bus.publish("ctf_changed", {"action": "start"})
 
         return {"message": "CTF resumed", "ends_at": state.ends_at, "remaining_seconds": paused_left}
@@ -152,6 +155,7 @@ async def start_ctf(
     session.add(state)
     await session.commit()
     await session.refresh(state)
+    ctf_state_cache.update(state)
     await ctf_redis_bus.publish("ctf_changed", {"action": "start"})
 
     return {"message": "CTF started", "ends_at": state.ends_at, "remaining_seconds": duration}
@@ -187,6 +191,7 @@ async def stop_ctf(
     session.add(state)
     await session.commit()
     await session.refresh(state)
+    ctf_state_cache.update(state)
     await ctf_redis_bus.publish("ctf_changed", {"action": "stop"})
 
     return {"message": "CTF paused", "remaining_seconds": remaining}
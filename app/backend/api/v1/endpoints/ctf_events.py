@@ -7,10 +7,15 @@ from collections.abc import AsyncGenerator
 
 import fastapi
 from fastapi import Request
+from loguru import logger
 from starlette.responses import StreamingResponse
 
-from app.backend.config.redis import redis_client
+from app.backend.api.v1.deps import get_current_user
+from app.backend.config.redis import REDIS_DOWN_ERRORS, redis_client
 from app.backend.config.settings import get_settings
+from app.backend.db.session import AsyncSessionLocal
+from app.backend.repository.teams import TeamsCRUDRepository
+from app.backend.utils.metrics import metrics
 from app.backend.utils.sse_bus import sse_bus
 
 settings = get_settings()
@@ -37,26 +42,59 @@ def _sse_conn_key(ip: str) -> str:
     return f"sse:ctf:ip:{ip}"
 
 
+async def _acquire_sse_slot(key: str) -> bool:
+    """
+    Counts the connection against the per-IP cap (429 when over it).
+    Degraded mode: if Redis is unavailable the stream is served without a cap
+    and False is returned (nothing to release later).
+    """
+    try:
+        current = await redis_client.incr(key)
+        if current == 1:
+            await redis_client.expire(key, SSE_CONN_TTL_SECONDS)
+    except REDIS_DOWN_ERRORS as e:
+        metrics.inc("degraded.sse_uncapped")
+        logger.warning(f"SSE connection cap skipped, Redis unavailable: {e}")
+        return False
+
+    if current > MAX_SSE_CONNECTIONS_PER_IP:
+        await redis_client.decr(key)
+        raise fastapi.HTTPException(status_code=429, detail="Too many SSE connections")
+    return True
+
+
+async def _stream_team_id(request: Request) -> int | None:
+    """
+    Team of the logged-in user (access_token cookie), None for anonymous streams.
+    Resolved once with a short-lived session: the stream itself holds no DB connection.
+    """
+    if not request.cookies.get("access_token"):
+        return None
+    async with AsyncSessionLocal() as session:
+        try:
+            user = await get_current_user(request, session)
+        except fastapi.HTTPException:
+            return None
+        team = await TeamsCRUDRepository(session).get_team_for_user(user.id)
+        return team.id if team else None
+
+
 @router.get("/ctf-events")
 async def ctf_events(request: Request):
     """
     SSE stream.
     Expects messages from sse_bus as JSON string: {"event":"ctf_changed","data":{...}}
     Sends SSE event name == payload.event, and data == payload.data
+    Logged-in team members also receive their team's events (e.g. instance_ready).
     """
 
     ip = request.client.host if request.client else "unknown"
     key = _sse_conn_key(ip)
 
-    current = await redis_client.incr(key)
-    if current == 1:
-        await redis_client.expire(key, SSE_CONN_TTL_SECONDS)
-
-    if current > MAX_SSE_CONNECTIONS_PER_IP:
-        await redis_client.decr(key)
-        raise fastapi.HTTPException(status_code=429, detail="Too many SSE connections")
+    team_id = await _stream_team_id(request)
+    counted = await _acquire_sse_slot(key)
 
-    q = await sse_bus.subscribe()
+    q = await sse_bus.subscribe(team_id)
 
     async def gen() -> AsyncGenerator[bytes, None]:
         # Initial hello (optional)
@@ -85,13 +123,15 @@ async def ctf_events(request: Request):
 
                 except asyncio.TimeoutError:
                     # keep-alive ping to prevent proxies closing connection
-                    with contextlib.suppress(Exception):
-                        await redis_client.expire(key, SSE_CONN_TTL_SECONDS)
+                    if counted:
+                        with contextlib.suppress(Exception):
+                            await redis_client.expire(key, SSE_CONN_TTL_SECONDS)
                     yield _sse_frame("ping", {"t": 1})
         finally:
             await sse_bus.unsubscribe(q)
-            with contextlib.suppress(Exception):
-                await redis_client.decr(key)
+            if counted:
+                with contextlib.suppress(Exception):
+                    await redis_client.decr(key)
 
     headers = {
         "Cache-Control": "no-cache",
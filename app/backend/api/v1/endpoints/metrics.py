@@ -0,0 +1,19 @@
+# app/backend/api/v1/endpoints/metrics.py
+## Operational metrics (admin only)
+# - *GET /api/v1/metrics* – per-worker counters, gauges, timings and live collectors
+
+import fastapi
+from fastapi import Depends, Request, status
+
+from app.backend.api.v1.deps import CurrentAdminDep, RequireAdminMFA
+from app.backend.utils.limiter import limiter
+from app.backend.utils.limiter_keys import admin_key
+from app.backend.utils.metrics import metrics
+
+router = fastapi.APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_model=dict, status_code=status.HTTP_200_OK, dependencies=[Depends(RequireAdminMFA)])
+@limiter.limit("30/minute", key_func=admin_key)
+async def get_metrics(request: Request, current_admin: CurrentAdminDep):
+    return await metrics.snapshot()
@@ -9,7 +9,6 @@ Prefix: /api/v1/users
 - *DELETE /api/v1/users/:id* – delete a user (admin only)
 """
 
-import asyncio
 import contextlib
 from datetime import datetime, timedelta, timezone
 from hashlib import sha256
@@ -75,7 +74,7 @@ from app.backend.utils.admin_mfa import (
 from app.backend.utils.cookies import clear_auth_cookies
 from app.backend.utils.device_fingerprint import build_device_fingerprint
 from app.backend.utils.email_validation import (
-    has_mx_record,
+    has_mx_record_async,
     is_trusted_email,
 )
 from app.backend.utils.exceptions import DBEntityDoesNotExist
@@ -208,7 +207,7 @@ async def create_user(
         )
 
     # MX (protection against fakes)
-    if not has_mx_record(domain):
+    if not await has_mx_record_async(domain):
         raise HTTPException(
             status_code=400,
             detail="Invalid email domain",
@@ -221,7 +220,6 @@ async def create_user(
         logger.error(f"User registration failed for email={user.email}")
         raise HTTPException(status.HTTP_409_CONFLICT, "User already exists.")
     verification_token = create_email_verification_token(email)
-    await asyncio.sleep(1)  # slight delay to avoid not sending email
     background_tasks.add_task(send_verification_email, email=email, token=verification_token)
     return _construct_user_in_response(db_user)
 
@@ -4,6 +4,7 @@ from app.backend.api.v1.endpoints import ctf_events
 from app.backend.api.v1.endpoints.challenges import router as challenges_router
 from app.backend.api.v1.endpoints.contact import router as contact_router
 from app.backend.api.v1.endpoints.ctf import router as ctf_router
+from app.backend.api.v1.endpoints.metrics import router as metrics_router
 from app.backend.api.v1.endpoints.mfa import router as mfa_router
 from app.backend.api.v1.endpoints.teams import router as teams_router
 from app.backend.api.v1.endpoints.users import router as users_router
@@ -19,3 +20,4 @@ api_router.include_router(challenges_router, prefix="/challenges")
 api_router.include_router(mfa_router, prefix="/mfa")
 api_router.include_router(ctf_router)
 api_router.include_router(ctf_events.router)
+api_router.include_router(metrics_router)
@@ -1,10 +1,220 @@
-import redis.asyncio as redis
+import redis
+import redis.asyncio as aioredis
+from loguru import logger
 
 from app.backend.config.settings import get_settings
+from app.backend.utils.circuit_breaker import OPEN, CircuitBreaker
+from app.backend.utils.metrics import metrics
 
 settings = get_settings()
 
-redis_client = redis.from_url(
+PUBSUB = "pubsub"
+
+
+class RedisUnavailable(redis.exceptions.ConnectionError):
+    """
+    Raised without touching the network while the Redis circuit is open.
+    Subclasses ConnectionError, so existing Redis error handling applies unchanged.
+    """
+
+
+# errors that mean "Redis is down" (as opposed to e.g. a bad command)
+REDIS_DOWN_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+
+class _GuardedPipeline(aioredis.client.Pipeline):
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.breaker.allow():
+            await self.reset()
+            raise RedisUnavailable("Redis circuit open")
+        try:
+            res = await super().execute(raise_on_error)
+        except REDIS_DOWN_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except redis.RedisError:
+            self.breaker.record_success()  # server answered
+            raise
+        self.breaker.record_success()
+        return res
+
+
+class _GuardedRedis(aioredis.Redis):
+    """
+    Async client whose commands and pipelines go through the registry's circuit breaker.
+    """
+
+    breaker: CircuitBreaker
+
+    async def execute_command(self, *args, **options):
+        if not self.breaker.allow():
+            raise RedisUnavailable("Redis circuit open")
+        try:
+            res = await super().execute_command(*args, **options)
+        except REDIS_DOWN_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except redis.RedisError:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return res
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _GuardedPipeline:
+        pipe = _GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class _GuardedSyncRedis(redis.Redis):
+    breaker: CircuitBreaker
+
+    def execute_command(self, *args, **options):
+        if not self.breaker.allow():
+            raise RedisUnavailable("Redis circuit open")
+        try:
+            res = super().execute_command(*args, **options)
+        except REDIS_DOWN_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except redis.RedisError:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return res
+
+
+class RedisRegistry:
+    """
+    Process-wide Redis clients shared by every store, bus and limiter.
+    - one bounded, blocking connection pool per named client ("default" for request
+      traffic, "pubsub" for long-lived subscriptions) instead of a pool per store instance
+    - idle connections are health-checked (PING) before reuse
+    - started at app startup (connectivity check) and closed at shutdown
+    - pool usage is exported through the metrics registry
+    - request-path clients share one circuit breaker: after a few consecutive connection
+      failures they fail fast with RedisUnavailable until a probe succeeds again
+      (the pubsub client is not guarded, the SSE listener has its own reconnect backoff)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        max_connections: int,
+        pool_timeout: float,
+        socket_timeout: float,
+        health_check_interval: int,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.url = url
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.socket_timeout = socket_timeout
+        self.health_check_interval = health_check_interval
+        self.breaker = breaker or CircuitBreaker("redis")
+
+        self._clients: dict[str, aioredis.Redis] = {}
+        self._sync_client: redis.Redis | None = None
+
+    def _pool_kwargs(self, *, blocking_reads: bool = False) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "timeout": self.pool_timeout,
+            # pub/sub connections sit in a blocking read until the next message arrives
+            "socket_timeout": None if blocking_reads else self.socket_timeout,
+            "socket_connect_timeout": self.socket_timeout,
+            "health_check_interval": self.health_check_interval,
+            "decode_responses": True,
+        }
+
+    def client(self, name: str = "default") -> aioredis.Redis:
+        """
+        Shared async client. Connections are opened lazily, so this is safe at import time.
+        The "pubsub" client has no read timeout (subscriptions idle between messages).
+        """
+        r = self._clients.get(name)
+        if r is None:
+            kwargs = self._pool_kwargs(blocking_reads=name == PUBSUB)
+            pool = aioredis.BlockingConnectionPool.from_url(self.url, **kwargs)
+            if name == PUBSUB:
+                r = aioredis.Redis(connection_pool=pool)
+            else:
+                r = _GuardedRedis(connection_pool=pool)
+                r.breaker = self.breaker
+            self._clients[name] = r
+        return r
+
+    def sync_client(self) -> redis.Redis:
+        """
+        Shared sync client for code paths that cannot await (slowapi limit checks).
+        """
+        if self._sync_client is None:
+            pool = redis.BlockingConnectionPool.from_url(self.url, **self._pool_kwargs())
+            self._sync_client = _GuardedSyncRedis(connection_pool=pool)
+            self._sync_client.breaker = self.breaker
+        return self._sync_client
+
+    @property
+    def available(self) -> bool:
+        """
+        False while the circuit is open (callers can skip Redis work entirely).
+        """
+        return self.breaker.state != OPEN
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self.client().ping())
+        except redis.RedisError:
+            return False
+
+    async def startup(self) -> None:
+        if await self.ping():
+            logger.info(f"Redis pool ready (max_connections={self.max_connections})")
+        else:
+            # stores reconnect lazily; do not block the app from starting
+            logger.warning("Redis not reachable at startup")
+
+    async def shutdown(self) -> None:
+        for name, r in list(self._clients.items()):
+            try:
+                await r.aclose(close_connection_pool=True)
+            except Exception as e:
+                logger.warning(f"Closing redis client {name} failed: {e}")
+        self._clients.clear()
+
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client.connection_pool.disconnect()
+            self._sync_client = None
+
+    def stats(self) -> dict:
+        out = {"breaker": self.breaker.stats()}
+        for name, r in self._clients.items():
+            pool = r.connection_pool
+            out[name] = {
+                "max": pool.max_connections,
+                "in_use": len(getattr(pool, "_in_use_connections", ())),
+                "idle": len(getattr(pool, "_available_connections", ())),
+            }
+        return out
+
+
+redis_registry = RedisRegistry(
     settings.REDIS_URL,
-    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    pool_timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+    breaker=CircuitBreaker(
+        "redis",
+        failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.REDIS_BREAKER_RESET_SECONDS,
+    ),
 )
+metrics.register_collector("redis_pools", redis_registry.stats)
+
+# default shared client (kept as a module attribute for existing imports)
+redis_client = redis_registry.client()
@@ -64,14 +64,30 @@ class BackendBaseSettings(BaseSettings):
         raise ValueError("Sync DB URL is not configured")
 
     RATE_LIMIT_PER_MINUTE: int = decouple.config("RATE_LIMIT_PER_MINUTE", cast=int)
+    # limits >= this many requests per window are served from a local token lease
+    RATE_LIMIT_LOCAL_LEASE_MIN_LIMIT: int = 100
+    RATE_LIMIT_LOCAL_LEASE_FRACTION: float = 0.05  # lease size as a share of the limit
 
     # -----------------------------
     # REDIS
     # -----------------------------
 
     REDIS_URL: str = decouple.config("REDIS_URL", default="redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS: int = decouple.config("REDIS_MAX_CONNECTIONS", cast=int, default=64)  # per pool, per worker
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0  # wait for a free pooled connection before failing
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30  # PING idle connections before reuse
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 3  # consecutive connection failures -> fail fast
+    REDIS_BREAKER_RESET_SECONDS: float = 5.0  # open circuit: wait before probing Redis again
+    # RESP3 client-side cache (CLIENT TRACKING) for hot read-mostly keys (tokens, instance records, flags)
+    REDIS_CLIENT_CACHE_ENABLED: bool = decouple.config("REDIS_CLIENT_CACHE_ENABLED", cast=bool, default=False)
+    REDIS_CLIENT_CACHE_MAX_ENTRIES: int = 10_000  # per worker, LRU
+    REDIS_CLIENT_CACHE_TTL_SECONDS: float = 60.0  # upper bound even without an invalidation message
     ADMIN_MFA_TTL_SECONDS: int = 60
 
+    # per-worker CTF state copy (refreshed by ctf_changed pub/sub, polled as a fallback)
+    CTF_STATE_CACHE_TTL_SECONDS: float = 5.0
+
     # -----------------------------
     # SERVER SETTINGS (UVICORN)
     # -----------------------------
@@ -84,6 +100,49 @@ class BackendBaseSettings(BaseSettings):
 
     ACCESS_TOKEN_EXPIRE_MINUTES: int = decouple.config("ACCESS_TOKEN_EXPIRE_MINUTES", cast=int)
 
+    # -----------------------------
+    # CTF GATE (paths reachable while the CTF is closed)
+    # -----------------------------
+    CTF_GATE_ALLOWLIST_EXACT: tuple[str, ...] = (
+        "/",
+        "/contact",
+        "/privacy-policy",
+        "/terms-of-service",
+        "/acceptable-use-policy",
+        "/dual-license",
+        "/legal-notice",
+        "/api/v1/users/logout",
+        "/api/v1/users/logout/force",
+        "/api/v1/users/auth/refresh",
+        "/rankings",
+        "/read-more",
+        "/api/v1/ctf-events",
+        "/api/v1/ctf-status",
+        "/api/v1/mfa/verify",
+        "/api/v1/mfa/admin/verify",
+        "/api/v1/users/admin/login",
+        "/api/v1/users/me",
+        "/api/v1/contact",
+        "/api/v1/challenges/rankings",
+        "/api/v1/teams",
+    )
+    CTF_GATE_ALLOWLIST_PREFIXES: tuple[str, ...] = (
+        "/assets",
+        "/favicon",
+        "/robots.txt",
+        "/api/v1/ctf-status",
+        "/team/",
+        "/profile/",
+        "/api/v1/users/profile/",
+        "/api/v1/teams/by-name/",
+    )
+    # deployment-specific additions, comma-separated; a trailing "*" marks a prefix (e.g. "/status,/docs/*")
+    CTF_GATE_ALLOWLIST_EXTRA: str = decouple.config("CTF_GATE_ALLOWLIST_EXTRA", default="")
+
+    @property
+    def CTF_GATE_ALLOWLIST_EXTRA_LIST(self) -> list[str]:
+        return [p.strip() for p in self.CTF_GATE_ALLOWLIST_EXTRA.split(",") if p.strip()]
+
     # -----------------------------
     # CORS — dynamic by ENV
     # -----------------------------
@@ -112,9 +171,21 @@ class BackendBaseSettings(BaseSettings):
 
     SMTP_MAX_RETRIES: int = 3
     SMTP_RETRY_DELAY_SECONDS: int = 2
+    SMTP_IDLE_RECONNECT_SECONDS: int = 240  # re-open the pooled connection before servers drop it
+
+    # Transactional email outbox (Redis stream drained by the mail dispatcher)
+    MAIL_OUTBOX_MAXLEN: int = 100_000
+    MAIL_OUTBOX_BATCH_SIZE: int = 50
+    MAIL_OUTBOX_CLAIM_IDLE_SECONDS: int = 60
     UNVERIFIED_TTL_DAYS: int = 7
     SPAM_WINDOW_MINUTES: int = 5
 
+    # MX validation (registration)
+    MX_LOOKUP_TIMEOUT_SECONDS: float = decouple.config("MX_LOOKUP_TIMEOUT_SECONDS", cast=float, default=2.0)
+    MX_CACHE_MIN_TTL_SECONDS: int = 60
+    MX_CACHE_MAX_TTL_SECONDS: int = 6 * 3600
+    MX_CACHE_NEGATIVE_TTL_SECONDS: int = 300
+
     # -----------------------------
     # JWT & SECURITY
     # -----------------------------
@@ -123,6 +194,12 @@ class BackendBaseSettings(BaseSettings):
     JWT_HASHING_PEPPER: str | None = decouple.config("JWT_HASHING_PEPPER", default=None)
     ADMIN_MFA_TTL: int = 60  # seconds
 
+    # known-device tracking: last_seen is written at most once per interval per device
+    SECURITY_DEVICE_TOUCH_INTERVAL_MINUTES: int = decouple.config(
+        "SECURITY_DEVICE_TOUCH_INTERVAL_MINUTES", cast=int, default=15
+    )
+    SECURITY_DEVICE_CACHE_SIZE: int = 10_000
+
     # -----------------------------
     # SSE SETTINGS
     # -----------------------------
@@ -181,7 +258,69 @@ class BackendBaseSettings(BaseSettings):
 
     K8S_CHALLENGE_NAMESPACE: str = decouple.config("K8S_CHALLENGE_NAMESPACE", default="ctf-challenges")
     CHALLENGE_K8S_POD_TTL_SECONDS: int = decouple.config("CHALLENGE_K8S_POD_TTL_SECONDS", cast=int, default=3600)
+    # per-challenge runtime profiles (`runtime:` of challenges/**/challenge.yml) and the
+    # resources of challenges without one
+    CHALLENGES_DIR: Path = Path(decouple.config("CHALLENGES_DIR", default=str(ROOT_DIR.parent.parent / "challenges")))
+    CHALLENGE_DEFAULT_CPU_REQUEST: str = "200m"
+    CHALLENGE_DEFAULT_MEMORY_REQUEST: str = "256Mi"
+    CHALLENGE_DEFAULT_CPU_LIMIT: str = "500m"
+    CHALLENGE_DEFAULT_MEMORY_LIMIT: str = "512Mi"
+    # Kubernetes API calls run on a bounded thread pool (the client is synchronous)
+    K8S_API_MAX_WORKERS: int = decouple.config("K8S_API_MAX_WORKERS", cast=int, default=16)
+    K8S_API_TIMEOUT_SECONDS: float = 10.0  # per API call
+    # name conflicts (409) on spawn: attempts in total, first backoff (doubled, jittered) and how
+    # long a replaced dead object may take to be gone
+    K8S_SPAWN_MAX_ATTEMPTS: int = 3
+    K8S_SPAWN_BACKOFF_SECONDS: float = 0.25
+    K8S_DELETE_WAIT_SECONDS: float = 15.0
+    # a live pod is adopted only if its activeDeadlineSeconds leaves at least the new TTL minus
+    # this much; the instance then ends with the pod
+    K8S_ADOPT_DEADLINE_SLACK_SECONDS: float = 60.0
+    # warm pool (challenges with warm_pool_size > 0): refill period and lifetime of an unclaimed pod
+    K8S_WARM_POOL_REFILL_SECONDS: float = 15.0
+    K8S_WARM_POOL_MAX_AGE_SECONDS: int = 6 * 3600
+    # pod / service watch cache: length of one watch stream before the list is re-read
+    K8S_WATCH_SECONDS: int = 300
+    # reconciliation of K8s objects vs. Redis instance state: period, and the age below
+    # which a mismatch may still be an in-flight spawn / terminate
+    K8S_RECONCILE_SECONDS: float = 30.0
+    K8S_RECONCILE_GRACE_SECONDS: int = 120
+    # durable instance expiry (Redis delayed-job ZSET): poll period, instances per batch and
+    # the delay before a failed termination is tried again
+    INSTANCE_EXPIRY_POLL_SECONDS: float = 5.0
+    INSTANCE_EXPIRY_BATCH_SIZE: int = 50
+    INSTANCE_EXPIRY_RETRY_SECONDS: int = 60
     MAX_ACTIVE_INSTANCES: int = decouple.config("MAX_ACTIVE_INSTANCES", cast=int, default=50)
+    # capacity budget of admission, weighted by each challenge's resource requests (K8s
+    # quantities, "" = no budget on that resource); with CAPACITY_FROM_NODES it is the allocatable
+    # of the (selected) nodes times CAPACITY_NODE_FRACTION, refreshed every CAPACITY_REFRESH_SECONDS
+    CAPACITY_CPU: str = decouple.config("CAPACITY_CPU", default="")
+    CAPACITY_MEMORY: str = decouple.config("CAPACITY_MEMORY", default="")
+    CAPACITY_FROM_NODES: bool = decouple.config("CAPACITY_FROM_NODES", cast=bool, default=False)
+    CAPACITY_NODE_SELECTOR: str = decouple.config("CAPACITY_NODE_SELECTOR", default="")
+    CAPACITY_NODE_FRACTION: float = 0.8
+    CAPACITY_REFRESH_SECONDS: float = 60.0
+    # fair spawn queue (spawns refused at capacity wait for a slot): dispatcher poll period and
+    # the most spawns handed out per pass
+    SPAWN_QUEUE_POLL_SECONDS: float = 2.0
+    SPAWN_QUEUE_BATCH_SIZE: int = 20
+    # idle instances (HTTP requests seen by the token proxy, flushed every ACTIVITY_FLUSH_SECONDS):
+    # when usage (instances / CPU / memory, the highest) reaches IDLE_RECLAIM_USAGE or spawns are
+    # queued, instances idle for IDLE_TIMEOUT_SECONDS are reclaimed LRU-first, at most
+    # IDLE_RECLAIM_BATCH per pass. IDLE_RECLAIM_MODE: "terminate", "notify" (ask the team) or "off"
+    ACTIVITY_FLUSH_SECONDS: float = 10.0
+    IDLE_TIMEOUT_SECONDS: int = 15 * 60
+    IDLE_RECLAIM_USAGE: float = 0.9
+    IDLE_RECLAIM_BATCH: int = 5
+    IDLE_RECLAIM_SECONDS: float = 60.0
+    IDLE_RECLAIM_MODE: str = decouple.config("IDLE_RECLAIM_MODE", default="notify")
+    # scale to zero: HTTP instances idle for HIBERNATE_IDLE_SECONDS (0 = never) lose their pod but
+    # keep record / flag / token / slot; the first proxied request recreates the pod and is held
+    # up to HIBERNATE_WAKE_TIMEOUT_SECONDS for it to become Ready
+    HIBERNATE_IDLE_SECONDS: int = decouple.config("HIBERNATE_IDLE_SECONDS", default=0, cast=int)
+    HIBERNATE_WAKE_TIMEOUT_SECONDS: float = 30.0
+    # key of the per-team flags of shared challenges (runtime mode "shared"); JWT_SECRET_KEY when empty
+    SHARED_FLAG_SECRET: str = decouple.config("SHARED_FLAG_SECRET", default="")
 
     def load_k8s_config(self):
         import os
@@ -135,6 +135,11 @@ class SecurityDevice(Base):
     user_agent = Column(Text, nullable=True)
     ip_prefix = Column(String(32), nullable=True)
 
+    __table_args__ = (
+        # one row per (user, device) - required by the upsert in security_events.is_new_device
+        Index("uq_security_devices_user_fingerprint", "user_id", "fingerprint", unique=True),
+    )
+
 
 class DifficultyEnum(enum.Enum):
     EASY = "easy"
@@ -178,6 +183,8 @@ class ChallengeTable(Base):
 
     image_name: Mapped[str] = mapped_column(String(128))
     internal_port: Mapped[int] = mapped_column(Integer, default=80)
+    # pre-started instances kept ready for this challenge (0 = always cold spawn)
+    warm_pool_size: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     # optional stored flag (if provided, used for validation)
     flag: Mapped[str | None] = mapped_column(String(128), nullable=True, default=None)
@@ -340,3 +347,18 @@ class TeamCompletedChallengeTable(Base):
     )
 
     __mapper_args__: ClassVar[dict] = {"eager_defaults": True}
+
+
+class TeamInstanceFlagTable(Base):
+    """
+    Durable copy of the per-team instance flag (primary copy lives in Redis).
+    Used to validate submissions while Redis is unavailable.
+    """
+
+    __tablename__ = "team_instance_flags"
+
+    team_id: Mapped[int] = mapped_column(ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    challenge_id: Mapped[int] = mapped_column(ForeignKey("challenges.id", ondelete="CASCADE"), primary_key=True)
+
+    flag: Mapped[str] = mapped_column(String(128), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
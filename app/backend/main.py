@@ -3,25 +3,52 @@ import os
 import fastapi
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from app.backend.api.v1.router import api_router
+from app.backend.config.redis import redis_registry
 from app.backend.config.settings import BackendBaseSettings, get_settings
-from app.backend.middleware.ctf_gate import CTFGateMiddleware
+from app.backend.middleware.ctf_gate import CTFGateMiddleware, PathAllowlist
 from app.backend.middleware.origin_check import OriginCheckMiddleware
-from app.backend.utils.ctf_redis import ctf_redis_bus
-from app.backend.utils.k8s_manager import K8sChallengeManager
+from app.backend.middleware.rate_limit import RateLimitMiddleware
+from app.backend.utils.email_validation import start_mx_cache_warmup, stop_mx_cache_warmup
+from app.backend.utils.k8s_manager import (
+    K8sChallengeManager,
+    start_idle_reclaim,
+    start_instance_controller,
+    start_instance_expiry,
+    start_spawn_queue,
+    start_warm_pool,
+    stop_idle_reclaim,
+    stop_instance_controller,
+    stop_instance_expiry,
+    stop_spawn_queue,
+    stop_warm_pool,
+)
 from app.backend.utils.limiter import limiter
 from app.backend.utils.logging_config import setup_logging
+from app.backend.utils.mailer import start_mail_dispatcher, stop_mail_dispatcher
+from app.backend.utils.redis_client_cache import start_redis_client_cache, stop_redis_client_cache
 from app.backend.utils.redis_sse_listener import (
     start_redis_sse_listener,
     stop_redis_sse_listener,
 )
 
 
+async def _redis_unavailable_handler(request: fastapi.Request, exc: Exception) -> JSONResponse:
+    # degraded mode: features without a local fallback answer 503 instead of 500
+    return JSONResponse(
+        status_code=503,
+        content={"code": "REDIS_UNAVAILABLE", "message": "Temporarily unavailable, please retry shortly."},
+        headers={"Retry-After": str(int(settings.REDIS_BREAKER_RESET_SECONDS))},
+    )
+
+
 def _create_fastapi_backend(app_settings: BackendBaseSettings) -> fastapi.FastAPI:
     """
     Create and configure the FastAPI backend application:
@@ -32,6 +59,19 @@ def _create_fastapi_backend(app_settings: BackendBaseSettings) -> fastapi.FastAP
     K8sChallengeManager()  # noqa: we want to force k8s singleton manager initialization here
     backend_app = fastapi.FastAPI(**app_settings.backend_app_attributes)
 
+    # -----------------------------------------
+    # Redis connection pools (shared by all stores, buses and limiters)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", redis_registry.startup)
+    backend_app.add_exception_handler(RedisConnectionError, _redis_unavailable_handler)
+    backend_app.add_exception_handler(RedisTimeoutError, _redis_unavailable_handler)
+
+    # -----------------------------------------
+    # Redis client-side cache (opt-in, CLIENT TRACKING invalidation)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_redis_client_cache)
+    backend_app.add_event_handler("shutdown", stop_redis_client_cache)
+
     # -----------------------------------------
     # Redis - SSE bridge (MULTI-WORKER SAFE)
     # -----------------------------------------
@@ -45,46 +85,55 @@ def _create_fastapi_backend(app_settings: BackendBaseSettings) -> fastapi.FastAP
         stop_redis_sse_listener,
     )
 
-    backend_app.add_event_handler("shutdown", ctf_redis_bus.close)
+    # -----------------------------------------
+    # MX cache pre-warm (trusted email domains)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_mx_cache_warmup)
+    backend_app.add_event_handler("shutdown", stop_mx_cache_warmup)
+
+    # -----------------------------------------
+    # Transactional email outbox dispatcher
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_mail_dispatcher)
+    backend_app.add_event_handler("shutdown", stop_mail_dispatcher)
+
+    # -----------------------------------------
+    # Warm pool of pre-started challenge pods (refill loop)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_warm_pool)
+    backend_app.add_event_handler("shutdown", stop_warm_pool)
+
+    # -----------------------------------------
+    # Pod / service watch caches: readiness (starting -> running) + drift reconciliation
+    # (+ node capacity budget with CAPACITY_FROM_NODES)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_instance_controller)
+    backend_app.add_event_handler("shutdown", stop_instance_controller)
+
+    # -----------------------------------------
+    # Durable instance expiry (Redis delayed-job ZSET, polled by one leader)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_instance_expiry)
+    backend_app.add_event_handler("shutdown", stop_instance_expiry)
+
+    # -----------------------------------------
+    # Fair spawn queue (spawns at capacity wait for a slot, round-robin across teams)
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_spawn_queue)
+    backend_app.add_event_handler("shutdown", stop_spawn_queue)
+
+    # -----------------------------------------
+    # Idle instances: batched last-activity of proxied requests + LRU reclaim near capacity
+    # -----------------------------------------
+    backend_app.add_event_handler("startup", start_idle_reclaim)
+    backend_app.add_event_handler("shutdown", stop_idle_reclaim)
 
     # -----------------------------------------
     # CTF Gate (global lock when CTF ended)
     # -----------------------------------------
     backend_app.add_middleware(
         CTFGateMiddleware,
-        allowlist_exact={
-            "/",
-            "/contact",
-            "/privacy-policy",
-            "/terms-of-service",
-            "/acceptable-use-policy",
-            "/dual-license",
-            "/legal-notice",
-            "/api/v1/users/logout",
-            "/api/v1/users/logout/force",
-            "/api/v1/users/auth/refresh",
-            "/rankings",
-            "/read-more",
-            "/api/v1/ctf-events",
-            "/api/v1/ctf-status",
-            "/api/v1/mfa/verify",
-            "/api/v1/mfa/admin/verify",
-            "/api/v1/users/admin/login",
-            "/api/v1/users/me",
-            "/api/v1/contact",
-            "/api/v1/challenges/rankings",
-            "/api/v1/teams",
-        },
-        allowlist_prefixes=(
-            "/assets",
-            "/favicon",
-            "/robots.txt",
-            "/api/v1/ctf-status",
-            "/team/",
-            "/profile/",
-            "/api/v1/users/profile/",
-            "/api/v1/teams/by-name/",
-        ),
+        allowlist=PathAllowlist.from_settings(app_settings),
     )
 
     # -----------------------------------------
@@ -92,7 +141,7 @@ def _create_fastapi_backend(app_settings: BackendBaseSettings) -> fastapi.FastAP
     # -----------------------------------------
     backend_app.state.limiter = limiter
     backend_app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-    backend_app.add_middleware(SlowAPIMiddleware)
+    backend_app.add_middleware(RateLimitMiddleware)  # pure ASGI: streams are not buffered
 
     # -----------------------------------------
     # CORS — dynamic by environment
@@ -130,6 +179,9 @@ def _create_fastapi_backend(app_settings: BackendBaseSettings) -> fastapi.FastAP
 
     backend_app.include_router(api_router)
 
+    # registered last: shutdown handlers run in order and the ones above still use Redis
+    backend_app.add_event_handler("shutdown", redis_registry.shutdown)
+
     return backend_app
 
 
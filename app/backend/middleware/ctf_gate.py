@@ -1,54 +1,103 @@
 from __future__ import annotations
 
+import re
 from collections.abc import Iterable
 from datetime import datetime, timezone
 
 import jwt
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.backend.config.settings import get_settings
+from app.backend.config.settings import BackendBaseSettings, get_settings
 from app.backend.db.models import RoleEnum, UserTable
 from app.backend.db.session import AsyncSessionLocal
-from app.backend.repository.ctf_state import CTFStateRepository
+from app.backend.utils.ctf_state_cache import ctf_state_cache
 
 settings = get_settings()
 
+ADMIN_LOGIN_PATH = "/api/v1/users/admin/login"
+
+
+class PathAllowlist:
+    """
+    Allowlist compiled once: exact paths go into a frozenset (one hash lookup), prefixes
+    into a single anchored regex built from a character trie, so a miss costs one match()
+    that walks the path at most once, independent of how many prefixes are configured.
+    """
+
+    __slots__ = ("exact", "prefix_pattern", "prefixes")
+
+    def __init__(self, exact: Iterable[str] = (), prefixes: Iterable[str] = ()) -> None:
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(dict.fromkeys(prefixes))
+
+        trie: dict = {}
+        for pfx in self.prefixes:
+            node = trie
+            for ch in pfx:
+                node = node.setdefault(ch, {})
+            node[""] = {}  # end of a prefix
+
+        self.prefix_pattern = re.compile(self._node_regex(trie)) if trie else None
+
+    @classmethod
+    def _node_regex(cls, node: dict) -> str:
+        if "" in node:
+            return ""  # a shorter prefix already allows everything below this node
+
+        alternatives = [re.escape(ch) + cls._node_regex(child) for ch, child in node.items()]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    @classmethod
+    def from_settings(cls, s: BackendBaseSettings) -> PathAllowlist:
+        exact = [*s.CTF_GATE_ALLOWLIST_EXACT, ADMIN_LOGIN_PATH]
+        prefixes = list(s.CTF_GATE_ALLOWLIST_PREFIXES)
+        for entry in s.CTF_GATE_ALLOWLIST_EXTRA_LIST:
+            if entry.endswith("*"):
+                prefixes.append(entry[:-1])
+            else:
+                exact.append(entry)
+        return cls(exact, prefixes)
+
+    def matches(self, path: str) -> bool:
+        if path in self.exact:
+            return True
+        return self.prefix_pattern is not None and self.prefix_pattern.match(path) is not None
+
+
+class CTFGateMiddleware:
+    """
+    Global lock when the CTF is closed (pure ASGI, streaming responses pass through untouched).
+    """
 
-class CTFGateMiddleware(BaseHTTPMiddleware):
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         *,
+        allowlist: PathAllowlist | None = None,
         allowlist_exact: set[str] | None = None,
         allowlist_prefixes: Iterable[str] = (),
     ):
-        super().__init__(app)
-        self.allowlist_exact = allowlist_exact or set()
-        self.allowlist_prefixes = tuple(allowlist_prefixes)
+        self.app = app
+        if allowlist is None:
+            allowlist = PathAllowlist([*(allowlist_exact or ()), ADMIN_LOGIN_PATH], allowlist_prefixes)
+        self.allowlist = allowlist
 
-    def _is_allowlisted(self, request: Request) -> bool:
+    def _is_allowlisted(self, path: str) -> bool:
         """
         Decide if the request is allowed even when the CTF is closed.
         """
-        path = request.url.path
-
-        if path in self.allowlist_exact:
-            return True
-
-        for pfx in self.allowlist_prefixes:
-            if path.startswith(pfx):
-                return True
+        return self.allowlist.matches(path)
 
-        return path == "/api/v1/users/admin/login"
-
-    async def _is_admin_session(self, request: Request) -> bool:
+    async def _is_admin_session(self, conn: HTTPConnection) -> bool:
         """
         True only if request has a valid access_token cookie AND that user is admin.
         (Used to allow admin endpoints even when CTF is closed.)
         """
-        token = request.cookies.get("access_token")
+        token = conn.cookies.get("access_token")
         if not token:
             return False
 
@@ -67,32 +116,35 @@ class CTFGateMiddleware(BaseHTTPMiddleware):
 
         return bool(user and user.role == RoleEnum.ADMIN)
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        # 1) Always allow explicit allowlist
-        if self._is_allowlisted(request):
-            return await call_next(request)
-
-        # 2) Read CTF state
-        async with AsyncSessionLocal() as session:
-            repo = CTFStateRepository(session)
-            state = await repo.get_state()
-
-        now = datetime.now(timezone.utc)
-        is_open = state.active and (state.ends_at is None or state.ends_at >= now)
-
-        # 3) If CTF is closed -> allow ADMIN session to access everything (except what you explicitly want to block)
-        if not is_open:
-            if await self._is_admin_session(request):
-                return await call_next(request)
-
-            return JSONResponse(
-                status_code=403,
-                content={
-                    "code": "CTF_ENDED",
-                    "message": "CTF has ended. Only admin endpoints are available.",
-                    "ends_at": state.ends_at.isoformat() if state.ends_at else None,
-                },
-            )
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # 4) CTF open -> normal
-        return await call_next(request)
+        # 1) Always allow explicit allowlist
+        if self._is_allowlisted(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        # 2) Read CTF state (per-worker in-memory copy, no DB round trip)
+        state = await ctf_state_cache.get()
+
+        # 3) CTF open -> normal
+        if state.is_open(datetime.now(timezone.utc)):
+            await self.app(scope, receive, send)
+            return
+
+        # 4) If CTF is closed -> allow ADMIN session to access everything
+        if await self._is_admin_session(HTTPConnection(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse(
+            status_code=403,
+            content={
+                "code": "CTF_ENDED",
+                "message": "CTF has ended. Only admin endpoints are available.",
+                "ends_at": state.ends_at.isoformat() if state.ends_at else None,
+            },
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,50 @@
+# app/backend/middleware/rate_limit.py
+from __future__ import annotations
+
+from slowapi import Limiter
+from slowapi.middleware import _find_route_handler, _should_exempt, async_check_limits
+from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RateLimitMiddleware:
+    """
+    SlowAPI's default / application limits as pure ASGI middleware (routes decorated with a
+    limit are checked by their decorator), with the same checks as slowapi's
+    SlowAPIASGIMiddleware. That one re-sends `http.response.start` before every body message,
+    which breaks any response streamed in more than one chunk (StreamingResponse, SSE); here
+    the X-RateLimit headers are added to the start message, everything else passes untouched.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        app: Starlette = scope["app"]
+        limiter: Limiter = app.state.limiter
+        handler = _find_route_handler(app.routes, scope) if limiter.enabled else None
+        if not limiter.enabled or _should_exempt(limiter, handler):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive=receive, send=send)
+        error_response, inject_headers = await async_check_limits(limiter, request, handler, app)
+        if error_response is not None:
+            await error_response(scope, receive, send)
+            return
+        if not inject_headers:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                limiter._inject_asgi_headers(MutableHeaders(scope=message), request.state.view_rate_limit)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,14 +1,17 @@
 import hmac
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from loguru import logger
-from sqlalchemy import func, select
+from sqlalchemy import delete, func, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.backend.db.models import ChallengeTable, UserCompletedChallengeTable
+from app.backend.config.redis import REDIS_DOWN_ERRORS
+from app.backend.db.models import ChallengeTable, TeamInstanceFlagTable, UserCompletedChallengeTable
 from app.backend.repository.base import BaseCRUDRepository
 from app.backend.utils.flag_store import RedisFlagStore, TeamFlagStore
+from app.backend.utils.metrics import metrics
 
 
 class ChallengesCRUDRepository(BaseCRUDRepository):
@@ -20,6 +23,11 @@ class ChallengesCRUDRepository(BaseCRUDRepository):
         query = await self.async_session.execute(stmt)
         return list(query.scalars().all())
 
+    async def list_warm_pool_challenges(self) -> list[ChallengeTable]:
+        stmt = select(ChallengeTable).where(ChallengeTable.warm_pool_size > 0, ChallengeTable.is_download.is_(False))
+        query = await self.async_session.execute(stmt)
+        return list(query.scalars().all())
+
     async def read_challenge_by_id(self, challenge_id: int) -> ChallengeTable | None:
         stmt = select(ChallengeTable).where(ChallengeTable.id == challenge_id)
         query = await self.async_session.execute(stmt)
@@ -99,11 +107,16 @@ class ChallengesCRUDRepository(BaseCRUDRepository):
     async def validate_flag_team(self, challenge: ChallengeTable, submitted_flag: str, team_id: int) -> bool:
         """
         Validate a submitted flag for a team-scoped instance.
-        - First check per-team Redis flag.
+        - First check per-team Redis flag (DB copy while Redis is unavailable).
         - Fallback to static flag stored in DB (if any).
         """
         store = TeamFlagStore()
-        expected = await store.get_flag(team_id, challenge.id)
+        try:
+            expected = await store.get_flag(team_id, challenge.id)
+        except REDIS_DOWN_ERRORS as e:
+            metrics.inc("degraded.flag_db_fallback")
+            logger.warning(f"Validating team flag from DB, Redis unavailable: {e}")
+            expected = await self.read_team_instance_flag(team_id, challenge.id)
         if expected:
             return hmac.compare_digest(expected, submitted_flag)
 
@@ -113,6 +126,35 @@ class ChallengesCRUDRepository(BaseCRUDRepository):
 
         return False
 
+    async def save_team_instance_flag(self, team_id: int, challenge_id: int, flag: str, *, ttl_seconds: int) -> None:
+        """
+        Durable copy of the instance flag written at spawn (see TeamInstanceFlagTable).
+        """
+        row = TeamInstanceFlagTable(
+            team_id=team_id,
+            challenge_id=challenge_id,
+            flag=flag,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+        )
+        await self.async_session.merge(row)
+        await self.async_session.commit()
+
+    async def read_team_instance_flag(self, team_id: int, challenge_id: int) -> str | None:
+        stmt = select(TeamInstanceFlagTable.flag).where(
+            (TeamInstanceFlagTable.team_id == team_id)
+            & (TeamInstanceFlagTable.challenge_id == challenge_id)
+            & (TeamInstanceFlagTable.expires_at > datetime.now(timezone.utc))
+        )
+        res = await self.async_session.execute(stmt)
+        return res.scalar()
+
+    async def delete_team_instance_flag(self, team_id: int, challenge_id: int) -> None:
+        stmt = delete(TeamInstanceFlagTable).where(
+            (TeamInstanceFlagTable.team_id == team_id) & (TeamInstanceFlagTable.challenge_id == challenge_id)
+        )
+        await self.async_session.execute(stmt)
+        await self.async_session.commit()
+
     async def get_user_solved_ids(self, user_id: int) -> list[int]:
         stmt = select(UserCompletedChallengeTable.challenge_id).where(UserCompletedChallengeTable.user_id == user_id)
         res = await self.async_session.execute(stmt)
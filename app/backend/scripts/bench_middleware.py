@@ -0,0 +1,231 @@
+"""
+Middleware micro-benchmark: previous BaseHTTPMiddleware stack vs the pure ASGI stack of the
+real application.
+
+    python -m app.backend.scripts.bench_middleware [--requests 3000] [--concurrency 50]
+
+Both stacks are the application built by `app.backend.main` (same routes, CORS, proxy
+headers and SlowAPI limiter with the default limits); the legacy one swaps the CTF gate,
+the origin check and SlowAPI's middleware for their BaseHTTPMiddleware versions. Each is
+served by uvicorn on a loopback port, so streamed responses really stream.
+No DB is needed: the CTF state cache is pre-filled with an open CTF and the limiter's
+counters are answered in-process (its evaluation path runs, the Redis round trip does not);
+the SSE per-IP cap is lifted and runs degraded when REDIS_URL is unreachable.
+Routes:
+- /api/v1/bench-trivial  small JSON response (added to the app for the benchmark)
+- /api/v1/bench-stream   StreamingResponse of 50 chunks, read to the end (idem)
+- /api/v1/ctf-events     the real SSE endpoint; timed until its hello frame, then closed
+Reports requests/second and p50/p99 latency per (stack, route), then the cost of one
+CTF gate allowlist lookup (previous set + startswith loop vs the compiled PathAllowlist)
+over the allowlist configured in settings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import timeit
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+import fastapi
+import httpx
+import uvicorn
+from slowapi.middleware import SlowAPIMiddleware
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.types import ASGIApp
+
+from app.backend.api.v1.endpoints import ctf_events
+from app.backend.config.settings import get_settings
+from app.backend.main import _create_fastapi_backend
+from app.backend.middleware.ctf_gate import ADMIN_LOGIN_PATH, CTFGateMiddleware, PathAllowlist
+from app.backend.middleware.origin_check import OriginCheckMiddleware
+from app.backend.middleware.rate_limit import RateLimitMiddleware
+from app.backend.utils.ctf_state_cache import CTFStateSnapshot, ctf_state_cache
+from app.backend.utils.limiter import limiter
+
+settings = get_settings()
+
+ORIGIN = settings.ALLOWED_ORIGINS_LIST[0] if settings.ALLOWED_ORIGINS_LIST else "http://localhost:5173"
+ALLOWLIST = PathAllowlist.from_settings(settings)
+
+ROUTES = {
+    "trivial": "/api/v1/bench-trivial",
+    "stream": "/api/v1/bench-stream",
+    "ctf-events": "/api/v1/ctf-events",
+}
+
+
+def _in_process_hit(keys: list[str], args: list[int]) -> list[int]:
+    # BatchedLimiter script reply: everything granted, far from any limit
+    return [args[0], 0, 1_000_000, 60, 60]
+
+
+# -----------------------------
+# PREVIOUS IMPLEMENTATION (BaseHTTPMiddleware)
+# -----------------------------
+def _legacy_is_allowlisted(path: str, exact: frozenset[str] = ALLOWLIST.exact, prefixes=ALLOWLIST.prefixes) -> bool:
+    if path in exact:
+        return True
+    for pfx in prefixes:
+        if path.startswith(pfx):
+            return True
+    return path == ADMIN_LOGIN_PATH
+
+
+class _LegacyCTFGate(BaseHTTPMiddleware):
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(app)
+        self.gate = CTFGateMiddleware(app, **kwargs)
+
+    async def dispatch(self, request, call_next):
+        if _legacy_is_allowlisted(request.url.path):
+            return await call_next(request)
+
+        state = await ctf_state_cache.get()
+        if not state.is_open(datetime.now(timezone.utc)):
+            if await self.gate._is_admin_session(request):
+                return await call_next(request)
+            return JSONResponse(status_code=403, content={"code": "CTF_ENDED"})
+
+        return await call_next(request)
+
+
+class _LegacyOriginCheck(BaseHTTPMiddleware):
+    def __init__(self, app: ASGIApp, *args, **kwargs):
+        super().__init__(app)
+        self.check = OriginCheckMiddleware(app, *args, **kwargs)
+
+    async def dispatch(self, request, call_next):
+        if request.method in {"POST", "PUT", "PATCH", "DELETE"} and not self.check._origin_ok(request.headers):
+            return JSONResponse(status_code=403, content={"code": "CSRF_BLOCKED"})
+        return await call_next(request)
+
+
+_LEGACY = {
+    CTFGateMiddleware: _LegacyCTFGate,
+    OriginCheckMiddleware: _LegacyOriginCheck,
+    RateLimitMiddleware: SlowAPIMiddleware,
+}
+
+
+async def bench_trivial():
+    return {"ok": True}
+
+
+async def bench_stream():
+    async def gen():
+        for i in range(50):
+            yield f"chunk {i}\n".encode()
+
+    return StreamingResponse(gen(), media_type="text/plain")
+
+
+def build_asgi_stack() -> fastapi.FastAPI:
+    app = _create_fastapi_backend(settings)
+    app.add_api_route(ROUTES["trivial"], bench_trivial)
+    app.add_api_route(ROUTES["stream"], bench_stream)
+    return app
+
+
+def build_legacy_stack() -> fastapi.FastAPI:
+    app = build_asgi_stack()
+    app.user_middleware = [Middleware(_LEGACY.get(m.cls, m.cls), *m.args, **m.kwargs) for m in app.user_middleware]
+    return app
+
+
+# -----------------------------
+# DRIVER
+# -----------------------------
+async def _serve(app: ASGIApp) -> tuple[uvicorn.Server, asyncio.Task, str]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def run_case(base_url: str, path: str, *, requests: int, concurrency: int, first_frame: bool = False) -> dict:
+    latencies: list[float] = []
+    per_worker = max(1, requests // concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+
+        async def worker():
+            for _ in range(per_worker):
+                t0 = time.perf_counter()
+                async with client.stream("GET", path, headers={"origin": ORIGIN}) as res:
+                    if res.status_code != 200:
+                        raise RuntimeError(f"{path} -> {res.status_code}")
+                    async for _chunk in res.aiter_bytes():
+                        if first_frame:
+                            break  # SSE: the hello frame, the stream never ends
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _print_row(stack: str, route: str, res: dict) -> None:
+    print(f"{stack:<10} {route:<12} {res['rps']:>10.0f} {res['p50_ms']:>9.2f} {res['p99_ms']:>9.2f}")
+
+
+MATCHER_PATHS = {
+    "exact hit": "/api/v1/ctf-status",
+    "prefix hit": "/api/v1/teams/by-name/some-team",
+    "miss": "/api/v1/challenges/42/instance",
+}
+
+
+def bench_matcher(number: int = 200_000) -> None:
+    print(f"\nallowlist: {len(ALLOWLIST.exact)} exact, {len(ALLOWLIST.prefixes)} prefixes")
+    print(f"{'path':<12} {'legacy ns':>10} {'compiled ns':>12}")
+    for name, path in MATCHER_PATHS.items():
+        assert _legacy_is_allowlisted(path) == ALLOWLIST.matches(path)
+        legacy = timeit.timeit(lambda p=path: _legacy_is_allowlisted(p), number=number) / number
+        compiled = timeit.timeit(lambda p=path: ALLOWLIST.matches(p), number=number) / number
+        print(f"{name:<12} {legacy * 1e9:>10.0f} {compiled * 1e9:>12.0f}")
+
+
+async def main(requests: int, concurrency: int, stacks: dict[str, Callable[[], ASGIApp]]) -> None:
+    ctf_state_cache.ttl = float("inf")
+    ctf_state_cache.set(CTFStateSnapshot(active=True, ends_at=None, paused_remaining_seconds=None))
+    limiter._hit_script = _in_process_hit
+    limiter.lease_min_limit = float("inf")  # every request takes the (in-process) evaluation path
+    ctf_events.MAX_SSE_CONNECTIONS_PER_IP = 1_000_000  # every client is 127.0.0.1
+
+    print(f"{'stack':<10} {'route':<12} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for stack, build in stacks.items():
+        server, task, base_url = await _serve(build())
+        try:
+            for route, path in ROUTES.items():
+                case = {"concurrency": concurrency, "first_frame": route == "ctf-events"}
+                await run_case(base_url, path, requests=min(200, requests), **case)  # warm-up
+                _print_row(stack, route, await run_case(base_url, path, requests=requests, **case))
+        finally:
+            server.should_exit = True
+            await task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency, {"legacy": build_legacy_stack, "asgi": build_asgi_stack}))
+    bench_matcher()
@@ -1,11 +1,17 @@
 # app/backend/security/security_events.py
-from datetime import datetime, timezone
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 
-from sqlalchemy import select
+from sqlalchemy import literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.backend.config.settings import get_settings
 from app.backend.db.models import SecurityDevice
 
+settings = get_settings()
+
 
 class SecurityEventType(str, Enum):
     LOGIN_NEW_DEVICE = "login_new_device"
@@ -46,7 +52,66 @@ async def emit_security_event(
     )
 
 
-async def is_new_device(session, user_id: int, fingerprint: str) -> bool:
+class _KnownDeviceCache:
+    """
+    Per-worker LRU of (user_id, fingerprint) -> monotonic time of the last DB write.
+    A hit inside the touch interval means the device is known and last_seen is fresh enough,
+    so the login path skips the database entirely.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[int, str], float] = OrderedDict()
+
+    def is_fresh(self, key: tuple[int, str], interval_seconds: float) -> bool:
+        touched_at = self._entries.get(key)
+        if touched_at is None:
+            return False
+        if time.monotonic() - touched_at >= interval_seconds:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def mark(self, key: tuple[int, str]) -> None:
+        self._entries[key] = time.monotonic()
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+known_devices = _KnownDeviceCache(settings.SECURITY_DEVICE_CACHE_SIZE)
+
+
+def _device_upsert_stmt(user_id: int, fingerprint: str, now: datetime, interval: timedelta):
+    """
+    INSERT the device, or bump last_seen if it is older than `interval`.
+    RETURNING (xmax = 0) is true only for freshly inserted rows; a conflict whose WHERE
+    rejects the update returns no row at all (known device, last_seen still fresh).
+    """
+    stmt = pg_insert(SecurityDevice).values(
+        user_id=user_id,
+        fingerprint=fingerprint,
+        first_seen=now,
+        last_seen=now,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[SecurityDevice.user_id, SecurityDevice.fingerprint],
+        set_={"last_seen": stmt.excluded.last_seen},
+        where=SecurityDevice.last_seen < now - interval,
+    ).returning(literal_column("(xmax = 0)").label("inserted"))
+
+
+async def _upsert_device(session, user_id: int, fingerprint: str, now: datetime, interval: timedelta) -> bool:
+    row = (await session.execute(_device_upsert_stmt(user_id, fingerprint, now, interval))).first()
+    await session.commit()
+    return bool(row is not None and row.inserted)
+
+
+async def _select_or_insert_device(session, user_id: int, fingerprint: str, now: datetime) -> bool:
+    # non-Postgres fallback (SQLite in tests)
     stmt = select(SecurityDevice).where(
         SecurityDevice.user_id == user_id,
         SecurityDevice.fingerprint == fingerprint,
@@ -54,8 +119,6 @@ async def is_new_device(session, user_id: int, fingerprint: str) -> bool:
     result = await session.execute(stmt)
     device = result.scalar_one_or_none()
 
-    now = datetime.now(timezone.utc)
-
     if device:
         device.last_seen = now
         await session.commit()
@@ -71,3 +134,21 @@ async def is_new_device(session, user_id: int, fingerprint: str) -> bool:
     )
     await session.commit()
     return True
+
+
+async def is_new_device(session, user_id: int, fingerprint: str) -> bool:
+    key = (user_id, fingerprint)
+    interval = timedelta(minutes=settings.SECURITY_DEVICE_TOUCH_INTERVAL_MINUTES)
+
+    if known_devices.is_fresh(key, interval.total_seconds()):
+        return False
+
+    now = datetime.now(timezone.utc)
+
+    if session.get_bind().dialect.name == "postgresql":
+        is_new = await _upsert_device(session, user_id, fingerprint, now, interval)
+    else:
+        is_new = await _select_or_insert_device(session, user_id, fingerprint, now)
+
+    known_devices.mark(key)
+    return is_new
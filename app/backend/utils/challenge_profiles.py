@@ -0,0 +1,306 @@
+# app/backend/utils/challenge_profiles.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import yaml
+from kubernetes import client
+from kubernetes.utils import parse_quantity
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+
+settings = get_settings()
+
+# set by the managers / warm pool for every instance: a profile cannot override them
+RESERVED_ENV = frozenset({"CTF_FLAG", "CTF_PASSPHRASE", "CTF_FLAG_FILE", "CTF_PASSPHRASE_FILE"})
+
+# "team": one pod + Service per team instance; "shared": one Deployment + Service per challenge
+# for every team, the team's flag derived from its id and passed per request (shared_instances)
+MODE_TEAM = "team"
+MODE_SHARED = "shared"
+
+# used only to turn the V1 models into plain request bodies once per template
+_serializer = client.ApiClient()
+
+
+@dataclass(frozen=True, slots=True)
+class ProbeProfile:
+    type: str = "tcp"  # "tcp" | "http"
+    path: str = "/"
+    port: int | None = None  # default: the challenge port
+    initial_delay_seconds: int = 0
+    period_seconds: int = 2
+    failure_threshold: int = 3
+
+
+@dataclass(frozen=True, slots=True)
+class ChallengeProfile:
+    """
+    Runtime profile of one challenge (`runtime:` section of its challenge.yml); hashable, so
+    it is part of the manifest template cache key.
+    """
+
+    cpu_request: str = settings.CHALLENGE_DEFAULT_CPU_REQUEST
+    memory_request: str = settings.CHALLENGE_DEFAULT_MEMORY_REQUEST
+    cpu_limit: str = settings.CHALLENGE_DEFAULT_CPU_LIMIT
+    memory_limit: str = settings.CHALLENGE_DEFAULT_MEMORY_LIMIT
+    port: int | None = None  # default: the challenge's internal_port
+    probe: ProbeProfile | None = None  # readiness probe (none: Ready once the container runs)
+    env: tuple[tuple[str, str], ...] = ()
+    mode: str = MODE_TEAM
+    replicas: int = 1  # shared mode only
+
+    @property
+    def shared(self) -> bool:
+        return self.mode == MODE_SHARED
+
+    def resources(self) -> client.V1ResourceRequirements:
+        return client.V1ResourceRequirements(
+            requests={"cpu": self.cpu_request, "memory": self.memory_request},
+            limits={"cpu": self.cpu_limit, "memory": self.memory_limit},
+        )
+
+    @property
+    def weight(self) -> tuple[int, int]:
+        """
+        (CPU millicores, memory bytes) requested: what one instance reserves in the capacity budget.
+        """
+        return millicores(self.cpu_request), memory_bytes(self.memory_request)
+
+
+def millicores(quantity: Any) -> int:
+    return int(parse_quantity(quantity) * 1000)
+
+
+def memory_bytes(quantity: Any) -> int:
+    return int(parse_quantity(quantity))
+
+
+DEFAULT_PROFILE = ChallengeProfile()
+
+
+def _quantity(value: Any, field: str) -> str:
+    try:
+        parse_quantity(value)
+    except (ValueError, TypeError) as err:
+        raise ValueError(f"invalid quantity for {field}: {value!r}") from err
+    return str(value)
+
+
+def parse_profile(runtime: dict | None) -> ChallengeProfile:
+    """
+    Builds a profile from a `runtime:` mapping; missing keys keep the defaults.
+        runtime:
+          port: 8000
+          resources: {requests: {cpu: 100m, memory: 128Mi}, limits: {cpu: "1", memory: 1Gi}}
+          probe: {type: http, path: /health, period_seconds: 2}
+          env: {BOT_TIMEOUT: "10"}
+          mode: shared   # stateless challenge: one deployment for every team
+          replicas: 2
+    Raises ValueError on malformed values.
+    """
+    if not runtime:
+        return DEFAULT_PROFILE
+    if not isinstance(runtime, dict):
+        raise ValueError("runtime must be a mapping")
+
+    resources = runtime.get("resources") or {}
+    requests = resources.get("requests") or {}
+    limits = resources.get("limits") or {}
+    fields: dict[str, Any] = {}
+    for name, section, key in (
+        ("cpu_request", requests, "cpu"),
+        ("memory_request", requests, "memory"),
+        ("cpu_limit", limits, "cpu"),
+        ("memory_limit", limits, "memory"),
+    ):
+        if key in section:
+            fields[name] = _quantity(section[key], name)
+
+    if "port" in runtime:
+        fields["port"] = int(runtime["port"])
+
+    if "mode" in runtime:
+        if runtime["mode"] not in (MODE_TEAM, MODE_SHARED):
+            raise ValueError(f"unknown mode {runtime['mode']!r}")
+        fields["mode"] = runtime["mode"]
+    if "replicas" in runtime:
+        if int(runtime["replicas"]) < 1:
+            raise ValueError("replicas must be at least 1")
+        fields["replicas"] = int(runtime["replicas"])
+
+    if probe := runtime.get("probe"):
+        if probe.get("type", "tcp") not in ("tcp", "http"):
+            raise ValueError(f"unknown probe type {probe.get('type')!r}")
+        fields["probe"] = ProbeProfile(**{k: (str(v) if k in ("type", "path") else int(v)) for k, v in probe.items()})
+
+    env = runtime.get("env") or {}
+    if reserved := RESERVED_ENV.intersection(env):
+        raise ValueError(f"reserved env vars: {sorted(reserved)}")
+    fields["env"] = tuple(sorted((str(k), str(v)) for k, v in env.items()))
+
+    return ChallengeProfile(**fields)
+
+
+class ManifestTemplate:
+    """
+    Pod / Service bodies of one challenge, compiled once from its image, port and profile.
+    `pod()` / `service()` only fill in the per-instance fields (name, labels, selector, env,
+    deadline) by shallow-copying the compiled parts; nothing else is rebuilt per spawn.
+    """
+
+    def __init__(self, image: str, port: int, profile: ChallengeProfile) -> None:
+        self.key = (image, port, profile)
+        self.profile = profile
+        self.port = profile.port or port
+
+        probe = None
+        if p := profile.probe:
+            target = p.port or self.port
+            probe = client.V1Probe(
+                http_get=client.V1HTTPGetAction(path=p.path, port=target) if p.type == "http" else None,
+                tcp_socket=client.V1TCPSocketAction(port=target) if p.type == "tcp" else None,
+                initial_delay_seconds=p.initial_delay_seconds,
+                period_seconds=p.period_seconds,
+                failure_threshold=p.failure_threshold,
+            )
+        container = client.V1Container(
+            name="challenge",
+            image=image,
+            ports=[client.V1ContainerPort(container_port=self.port)],
+            env=[client.V1EnvVar(name=k, value=v) for k, v in profile.env],
+            resources=profile.resources(),
+            readiness_probe=probe,
+        )
+        self._container: dict = _serializer.sanitize_for_serialization(container)
+        self._container.setdefault("env", [])
+        self._service_ports = [{"port": self.port, "targetPort": self.port}]
+
+    @property
+    def has_probe(self) -> bool:
+        return "readinessProbe" in self._container
+
+    def pod(
+        self,
+        *,
+        name: str,
+        labels: dict[str, str],
+        env: dict[str, str],
+        active_deadline_seconds: int,
+        annotations: dict[str, str] | None = None,
+        volume_mounts: list[dict] | None = None,
+        volumes: list[dict] | None = None,
+        readiness_probe: dict | None = None,
+    ) -> dict:
+        """
+        Pod body; `readiness_probe` is only used when the profile has none.
+        """
+        container = {
+            **self._container,
+            "env": [*self._container["env"], *({"name": k, "value": v} for k, v in env.items())],
+        }
+        if volume_mounts:
+            container["volumeMounts"] = volume_mounts
+        if readiness_probe and not self.has_probe:
+            container["readinessProbe"] = readiness_probe
+
+        metadata: dict[str, Any] = {"name": name, "labels": labels}
+        if annotations:
+            metadata["annotations"] = annotations
+        spec: dict[str, Any] = {
+            "containers": [container],
+            "restartPolicy": "Never",
+            "activeDeadlineSeconds": active_deadline_seconds,
+        }
+        if volumes:
+            spec["volumes"] = volumes
+        return {"apiVersion": "v1", "kind": "Pod", "metadata": metadata, "spec": spec}
+
+    def deployment(self, *, name: str, labels: dict[str, str], replicas: int) -> dict:
+        """
+        Deployment body of a shared challenge: the compiled container without any flag (it
+        comes per request), restarted by the ReplicaSet instead of a per-instance deadline.
+        """
+        return {
+            "apiVersion": "apps/v1",
+            "kind": "Deployment",
+            "metadata": {"name": name, "labels": labels},
+            "spec": {
+                "replicas": replicas,
+                "selector": {"matchLabels": labels},
+                "template": {"metadata": {"labels": labels}, "spec": {"containers": [dict(self._container)]}},
+            },
+        }
+
+    def service(self, *, name: str, selector: dict[str, str], service_type: str = "ClusterIP") -> dict:
+        return {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {"name": name, "labels": {"app": "ctf-challenge"}},
+            "spec": {"selector": selector, "ports": self._service_ports, "type": service_type},
+        }
+
+
+class ChallengeProfiles:
+    """
+    Runtime profiles of every `challenges/**/challenge.yml`, keyed by the challenge directory
+    relative to `root` (ChallengeTable.path, or its name when no path is set, as for flags
+    on disk). Files are read once (`reload()` re-reads them); a file that does not parse, or
+    a challenge without a file, gets the default profile.
+    Compiled manifest templates are cached per challenge id and rebuilt when its image, port
+    or profile changes.
+    """
+
+    def __init__(self, root: Path = settings.CHALLENGES_DIR) -> None:
+        self.root = Path(root)
+        self._profiles: dict[str, ChallengeProfile] | None = None
+        self._templates: dict[int, ManifestTemplate] = {}
+        self._invalid: list[str] = []
+
+    def _load(self) -> dict[str, ChallengeProfile]:
+        profiles: dict[str, ChallengeProfile] = {}
+        self._invalid = []
+        for file in sorted(self.root.rglob("challenge.yml")) if self.root.is_dir() else ():
+            key = file.parent.relative_to(self.root).as_posix()
+            try:
+                meta = yaml.safe_load(file.read_text(encoding="utf-8")) or {}
+                profiles[key] = parse_profile(meta.get("runtime") if isinstance(meta, dict) else None)
+            except (OSError, yaml.YAMLError, ValueError, TypeError) as e:
+                self._invalid.append(key)
+                logger.warning(f"Ignoring runtime profile of {file}: {e}")
+        logger.info(f"Loaded {len(profiles)} challenge profiles from {self.root}")
+        return profiles
+
+    def reload(self) -> None:
+        self._profiles = self._load()
+        self._templates.clear()
+
+    def get(self, path: str | None = None, name: str | None = None) -> ChallengeProfile:
+        if self._profiles is None:
+            self._profiles = self._load()
+        key = (path or name or "").strip("/")
+        return self._profiles.get(key, DEFAULT_PROFILE)
+
+    def for_challenge(self, challenge: Any) -> ChallengeProfile:
+        return self.get(getattr(challenge, "path", None), getattr(challenge, "name", None))
+
+    def template(
+        self, challenge_id: int, image: str, port: int, profile: ChallengeProfile = DEFAULT_PROFILE
+    ) -> ManifestTemplate:
+        tpl = self._templates.get(challenge_id)
+        if tpl is None or tpl.key != (image, port, profile):
+            tpl = self._templates[challenge_id] = ManifestTemplate(image, port, profile)
+        return tpl
+
+    def stats(self) -> dict:
+        return {
+            "profiles": len(self._profiles or {}),
+            "invalid": list(self._invalid),
+            "templates": len(self._templates),
+        }
+
+
+challenge_profiles = ChallengeProfiles()
@@ -0,0 +1,87 @@
+# app/backend/utils/circuit_breaker.py
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+
+from loguru import logger
+
+from app.backend.utils.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for a shared dependency.
+    - closed: calls go through; `failure_threshold` consecutive failures -> open
+    - open: calls are rejected immediately (no socket, no timeout) for `reset_timeout` seconds
+    - half_open: a single probe call is let through; success -> closed, failure -> open again
+    Per worker, not thread-safe across event loops (one breaker per process is enough).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 3,
+        reset_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        if self._state == CLOSED:
+            return True
+
+        if self._state == OPEN:
+            if self._clock() - self._opened_at < self.reset_timeout:
+                metrics.inc(f"circuit.{self.name}.rejected")
+                return False
+            self._state = HALF_OPEN
+            self._probing = False
+
+        # half open: exactly one probe in flight
+        if self._probing:
+            metrics.inc(f"circuit.{self.name}.rejected")
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            logger.info(f"Circuit {self.name} closed (dependency recovered)")
+            metrics.set_gauge(f"circuit.{self.name}.open", 0)
+        self._state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self._failures} failure(s)")
+                metrics.inc(f"circuit.{self.name}.opened")
+                metrics.set_gauge(f"circuit.{self.name}.open", 1)
+            self._state = OPEN
+            self._opened_at = self._clock()
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
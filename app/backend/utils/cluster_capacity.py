@@ -0,0 +1,103 @@
+# app/backend/utils/cluster_capacity.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.backend.config.redis import redis_client
+from app.backend.config.settings import get_settings
+from app.backend.utils.challenge_profiles import memory_bytes, millicores
+from app.backend.utils.instance_limiter import BUDGET_KEY
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+
+class NodeCapacityWatcher:
+    """
+    Keeps the admission budget (`BUDGET_KEY`) in line with the cluster:
+    - every `interval`, sums the allocatable CPU / memory of the schedulable nodes matching
+      `selector` and stores `fraction` of it (headroom for system pods and warm pools)
+    - the key expires after three missed refreshes, so admission falls back to the
+      configured CAPACITY_CPU / CAPACITY_MEMORY instead of trusting a stale budget
+    Every replica may run it: they all write the same value.
+    """
+
+    def __init__(
+        self,
+        core_v1: AsyncCoreV1,
+        r: redis.Redis | None = None,
+        *,
+        selector: str = settings.CAPACITY_NODE_SELECTOR,
+        fraction: float = settings.CAPACITY_NODE_FRACTION,
+        interval: float = settings.CAPACITY_REFRESH_SECONDS,
+    ) -> None:
+        self.core_v1 = core_v1
+        self._r = r or redis_client
+        self.selector = selector
+        self.fraction = fraction
+        self.interval = interval
+
+        self._budget: dict[str, int] = {}
+        self._nodes = 0
+        self._refreshed_at: float | None = None
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    async def refresh(self) -> dict[str, int]:
+        nodes = await self.core_v1.call("list_node", label_selector=self.selector or None)
+        cpu = memory = count = 0
+        for node in nodes.items:
+            if node.spec and node.spec.unschedulable:
+                continue
+            allocatable = (node.status and node.status.allocatable) or {}
+            cpu += millicores(allocatable.get("cpu", 0))
+            memory += memory_bytes(allocatable.get("memory", 0))
+            count += 1
+
+        budget = {"cpu": int(cpu * self.fraction), "memory": int(memory * self.fraction)}
+        pipe = self._r.pipeline(transaction=True)
+        pipe.hset(BUDGET_KEY, mapping=budget)
+        pipe.expire(BUDGET_KEY, max(1, int(self.interval * 3)))
+        await pipe.execute()
+
+        self._budget, self._nodes, self._refreshed_at = budget, count, time.time()
+        metrics.set_gauge("capacity.budget_cpu_millicores", budget["cpu"])
+        metrics.set_gauge("capacity.budget_memory_bytes", budget["memory"])
+        return budget
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.inc("capacity.refresh_errors")
+                logger.warning(f"Node capacity refresh failed: {e}")
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"nodes": self._nodes, "budget": dict(self._budget), "refreshed_at": self._refreshed_at}
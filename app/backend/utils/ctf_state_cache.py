@@ -0,0 +1,106 @@
+# app/backend/utils/ctf_state_cache.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.backend.config.settings import get_settings
+from app.backend.db.models import CTFStateTable
+from app.backend.db.session import AsyncSessionLocal
+from app.backend.repository.ctf_state import CTFStateRepository
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+
+@dataclass(frozen=True, slots=True)
+class CTFStateSnapshot:
+    active: bool
+    ends_at: datetime | None
+    paused_remaining_seconds: int | None
+
+    @classmethod
+    def from_row(cls, row: CTFStateTable) -> CTFStateSnapshot:
+        return cls(
+            active=bool(row.active),
+            ends_at=row.ends_at,
+            paused_remaining_seconds=row.paused_remaining_seconds,
+        )
+
+    def is_open(self, now: datetime | None = None) -> bool:
+        if not self.active:
+            return False
+        if self.ends_at is None:
+            return True
+        return self.ends_at >= (now or datetime.now(timezone.utc))
+
+
+async def _load_from_db() -> CTFStateSnapshot:
+    async with AsyncSessionLocal() as session:
+        row = await CTFStateRepository(session).get_state()
+        return CTFStateSnapshot.from_row(row)
+
+
+class CTFStateCache:
+    """
+    Per-worker in-memory copy of the single ctf_state row.
+    - updated in place by the ctf endpoints of this worker (write-through)
+    - invalidated by `ctf_changed` events from other workers (Redis pub/sub)
+    - re-read at most every `ttl` seconds as a fallback if an event is missed
+    - a reload that overlapped a write-through or an invalidation is not stored (`_epoch`),
+      so an older row never replaces the state an admin just changed
+    The open/closed check itself (ends_at vs now) is evaluated per request, so expiry needs no event.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float = settings.CTF_STATE_CACHE_TTL_SECONDS,
+        loader: Callable[[], Awaitable[CTFStateSnapshot]] = _load_from_db,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self._loader = loader
+        self._clock = clock
+        self._snapshot: CTFStateSnapshot | None = None
+        self._loaded_at = 0.0
+        self._epoch = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and self._clock() - self._loaded_at < self.ttl
+
+    async def get(self) -> CTFStateSnapshot:
+        if self._fresh():
+            metrics.inc("ctf_state_cache.hit")
+            return self._snapshot
+
+        async with self._lock:
+            # single-flight: concurrent requests wait for one reload
+            if not self._fresh():
+                metrics.inc("ctf_state_cache.reload")
+                epoch = self._epoch
+                snapshot = await self._loader()
+                if epoch != self._epoch:
+                    return self._snapshot or snapshot
+                self.set(snapshot)
+            return self._snapshot
+
+    def set(self, snapshot: CTFStateSnapshot) -> None:
+        self._epoch += 1
+        self._snapshot = snapshot
+        self._loaded_at = self._clock()
+
+    def update(self, row: CTFStateTable) -> None:
+        self.set(CTFStateSnapshot.from_row(row))
+
+    def invalidate(self) -> None:
+        self._epoch += 1
+        self._snapshot = None
+        self._loaded_at = 0.0
+
+
+ctf_state_cache = CTFStateCache()
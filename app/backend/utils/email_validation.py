@@ -1,4 +1,16 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import Callable, Iterable
+
+import dns.asyncresolver
+import dns.exception
 import dns.resolver
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+
+settings = get_settings()
 
 TRUSTED_EMAIL_DOMAINS = {
     # Google
@@ -125,9 +137,133 @@ def is_trusted_email(email: str) -> bool:
     return domain in TRUSTED_EMAIL_DOMAINS
 
 
-def has_mx_record(domain: str) -> bool:
-    try:
-        dns.resolver.resolve(domain, "MX")
+class MXLookupCache:
+    """
+    Async MX validation with a TTL-respecting positive/negative cache.
+
+    - positive answers are cached for the record TTL (clamped to [min_ttl, max_ttl])
+    - NXDOMAIN / no MX answers are cached for negative_ttl
+    - timeouts and SERVFAIL are NOT cached (transient), the lookup simply fails
+    - concurrent lookups for the same domain share one in-flight query
+    """
+
+    def __init__(
+        self,
+        *,
+        resolver=None,
+        timeout: float = settings.MX_LOOKUP_TIMEOUT_SECONDS,
+        min_ttl: int = settings.MX_CACHE_MIN_TTL_SECONDS,
+        max_ttl: int = settings.MX_CACHE_MAX_TTL_SECONDS,
+        negative_ttl: int = settings.MX_CACHE_NEGATIVE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._resolver = resolver or dns.asyncresolver.Resolver()
+        self.timeout = timeout
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: dict[str, tuple[bool, float]] = {}
+        self._inflight: dict[str, asyncio.Future[bool]] = {}
+
+    def _cached(self, domain: str) -> bool | None:
+        entry = self._entries.get(domain)
+        if entry is None:
+            return None
+        ok, expires_at = entry
+        if self._clock() >= expires_at:
+            self._entries.pop(domain, None)
+            return None
+        return ok
+
+    def _store(self, domain: str, ok: bool, ttl: int) -> None:
+        self._entries[domain] = (ok, self._clock() + ttl)
+
+    async def _lookup(self, domain: str) -> bool:
+        try:
+            answer = await asyncio.wait_for(
+                self._resolver.resolve(domain, "MX", lifetime=self.timeout),
+                timeout=self.timeout,
+            )
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            self._store(domain, False, self.negative_ttl)
+            return False
+        except (asyncio.TimeoutError, dns.exception.Timeout):
+            logger.warning(f"MX lookup timed out for {domain}")
+            return False
+        except Exception as e:
+            logger.warning(f"MX lookup failed for {domain}: {e}")
+            return False
+
+        ttl = getattr(getattr(answer, "rrset", None), "ttl", None) or self.min_ttl
+        self._store(domain, True, max(self.min_ttl, min(int(ttl), self.max_ttl)))
         return True
-    except Exception:
-        return False
+
+    async def has_mx(self, domain: str) -> bool:
+        domain = domain.strip().lower().rstrip(".")
+        cached = self._cached(domain)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(domain)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        fut: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._inflight[domain] = fut
+        try:
+            ok = await self._lookup(domain)
+            fut.set_result(ok)
+            return ok
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(domain, None)
+
+    async def warm(self, domains: Iterable[str], *, concurrency: int = 16) -> int:
+        """
+        Resolve all domains with bounded concurrency. Returns number of domains with MX.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(d: str) -> bool:
+            async with sem:
+                return await self.has_mx(d)
+
+        results = await asyncio.gather(*(_one(d) for d in domains))
+        return sum(1 for ok in results if ok)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+mx_cache = MXLookupCache()
+
+
+async def has_mx_record_async(domain: str) -> bool:
+    return await mx_cache.has_mx(domain)
+
+
+# ---- startup pre-warm (runs in background, never blocks startup) ----
+_warmup_task: asyncio.Task | None = None
+
+
+async def start_mx_cache_warmup() -> None:
+    global _warmup_task
+
+    async def _run() -> None:
+        ok = await mx_cache.warm(sorted(TRUSTED_EMAIL_DOMAINS))
+        logger.info(f"MX cache warmed: {ok}/{len(TRUSTED_EMAIL_DOMAINS)} trusted domains resolved")
+
+    if _warmup_task is None or _warmup_task.done():
+        _warmup_task = asyncio.create_task(_run())
+
+
+async def stop_mx_cache_warmup() -> None:
+    global _warmup_task
+    if _warmup_task and not _warmup_task.done():
+        _warmup_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _warmup_task
+    _warmup_task = None
@@ -1,8 +1,7 @@
 import redis.asyncio as redis
 
-from app.backend.config.settings import get_settings
-
-settings = get_settings()
+from app.backend.config.redis import redis_client
+from app.backend.utils.redis_client_cache import RedisClientCache, redis_cache
 
 
 class RedisFlagStore:
@@ -11,8 +10,8 @@ class RedisFlagStore:
     Key format: ctf:flag:{user_id}:{challenge_id}
     """
 
-    def __init__(self) -> None:
-        self._r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(self, r: redis.Redis | None = None) -> None:
+        self._r = r or redis_client
 
     def _key(self, user_id: int, challenge_id: int) -> str:
         return f"ctf:flag:{user_id}:{challenge_id}"
@@ -33,17 +32,23 @@ class TeamFlagStore:
     Key format: ctf:flag:team:{team_id}:{challenge_id}
     """
 
-    def __init__(self) -> None:
-        self._r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(self, r: redis.Redis | None = None, cache: RedisClientCache | None = None) -> None:
+        self._r = r or redis_client
+        self._cache = cache or redis_cache
 
     def _key(self, team_id: int, challenge_id: int) -> str:
         return f"ctf:flag:team:{team_id}:{challenge_id}"
 
     async def set_flag(self, team_id: int, challenge_id: int, flag: str, ttl_seconds: int) -> None:
-        await self._r.set(self._key(team_id, challenge_id), flag, ex=ttl_seconds)
+        key = self._key(team_id, challenge_id)
+        await self._r.set(key, flag, ex=ttl_seconds)
+        self._cache.invalidate(key)
 
     async def get_flag(self, team_id: int, challenge_id: int) -> str | None:
-        return await self._r.get(self._key(team_id, challenge_id))
+        key = self._key(team_id, challenge_id)
+        return await self._cache.get(key, lambda: self._r.get(key))
 
     async def delete_flag(self, team_id: int, challenge_id: int) -> None:
-        await self._r.delete(self._key(team_id, challenge_id))
+        key = self._key(team_id, challenge_id)
+        await self._r.delete(key)
+        self._cache.invalidate(key)
@@ -0,0 +1,320 @@
+# app/backend/utils/instance_activity.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.backend.config.redis import REDIS_DOWN_ERRORS, redis_client
+from app.backend.config.settings import get_settings
+from app.backend.utils.ctf_redis import ctf_redis_bus
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.instance_reconciler import InstanceKey, slot_instance
+from app.backend.utils.leader_lock import LeaderLock
+from app.backend.utils.metrics import metrics
+from app.backend.utils.redis_bus import RedisBus
+from app.backend.utils.spawn_queue import SpawnQueue, spawn_queue
+from app.backend.utils.team_instance_store import STATUS_HIBERNATED, STATUS_RUNNING, TeamInstanceStore
+
+settings = get_settings()
+
+# member "<team_id>:<challenge_id>", score = epoch of the instance's last proxied request
+ACTIVITY_ZSET_KEY = "ctf:instances:activity"
+IDLE_LOCK_KEY = "ctf:idle:lock"
+
+MODE_TERMINATE = "terminate"
+MODE_NOTIFY = "notify"
+MODE_OFF = "off"
+
+# (team_id, challenge_id) -> True if the instance was reclaimed / hibernated (it may have changed meanwhile)
+ReclaimHandler = Callable[[int, int], Awaitable[bool]]
+
+
+def _member(team_id: int, challenge_id: int) -> str:
+    return f"{team_id}:{challenge_id}"
+
+
+class ActivityTracker:
+    """
+    Last HTTP activity of every team instance, recorded without I/O on the request path:
+    `touch` only updates an in-memory dict, and every `interval` the buffered timestamps
+    are written in one ZADD GT (a late flush of another worker never moves an instance
+    back in time). Unflushed touches of a worker that dies are lost: at most `interval`.
+    """
+
+    def __init__(self, r: redis.Redis | None = None, *, interval: float = settings.ACTIVITY_FLUSH_SECONDS) -> None:
+        self._r = r or redis_client
+        self.interval = interval
+        self._pending: dict[InstanceKey, float] = {}
+        self._flushed = 0
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    def touch(self, team_id: int, challenge_id: int) -> None:
+        self._pending[(team_id, challenge_id)] = time.time()
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            await self._r.zadd(ACTIVITY_ZSET_KEY, {_member(*k): ts for k, ts in batch.items()}, gt=True)
+        except REDIS_DOWN_ERRORS:
+            for key, ts in batch.items():  # retried at the next flush; newer touches win
+                self._pending.setdefault(key, ts)
+            return 0
+        self._flushed += len(batch)
+        return len(batch)
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Instance activity flush failed: {e}")
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            with contextlib.suppress(asyncio.CancelledError, asyncio.TimeoutError):
+                await asyncio.wait_for(self._task, timeout=5.0)  # last flush
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "flushed": self._flushed}
+
+
+@dataclass(frozen=True, slots=True)
+class IdleInstance:
+    team_id: int
+    challenge_id: int
+    idle_seconds: int
+    status: str = STATUS_RUNNING
+
+
+class IdleReclaimer:
+    """
+    Frees capacity held by unused instances:
+    - with `hibernate_seconds` set, running HTTP instances idle that long are hibernated
+      through the registered hibernate handler (pod removed, woken by the next proxied
+      request), whatever the usage
+    - the cluster is "near capacity" when instances / CPU / memory usage (the highest) reaches
+      `usage_threshold`, or when spawns wait in the queue
+    - then running or hibernated HTTP instances without a proxied request for `idle_seconds`
+      (counted from their start when they never had one) are taken least recently used first;
+      the slot of a hibernated instance is only freed this way
+    - MODE_TERMINATE reclaims as many as the queue needs (at least one), at most `batch_size`
+      per pass, through the registered handler and tells the team (`instance_reclaimed`);
+      MODE_NOTIFY only asks the team to terminate (`instance_idle`, once per idle period)
+    TCP instances are never considered idle: their traffic does not pass through the proxy.
+    One worker at a time (Redis lock); every pass is summarised in `stats()` (admin metrics).
+    """
+
+    def __init__(
+        self,
+        r: redis.Redis | None = None,
+        *,
+        store: TeamInstanceStore | None = None,
+        limiter: InstanceLimiter | None = None,
+        queue: SpawnQueue | None = None,
+        bus: RedisBus | None = None,
+        mode: str = settings.IDLE_RECLAIM_MODE,
+        idle_seconds: int = settings.IDLE_TIMEOUT_SECONDS,
+        hibernate_seconds: int = settings.HIBERNATE_IDLE_SECONDS,
+        usage_threshold: float = settings.IDLE_RECLAIM_USAGE,
+        batch_size: int = settings.IDLE_RECLAIM_BATCH,
+        interval: float = settings.IDLE_RECLAIM_SECONDS,
+    ) -> None:
+        self._r = r or redis_client
+        self._store = store or TeamInstanceStore(self._r)
+        self._limiter = limiter or InstanceLimiter(self._r)
+        self._queue = queue or spawn_queue
+        self._bus = bus or ctf_redis_bus
+        self.mode = mode
+        self.idle_seconds = idle_seconds
+        self.hibernate_seconds = hibernate_seconds
+        self.usage_threshold = usage_threshold
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = LeaderLock(IDLE_LOCK_KEY, ttl_seconds=max(30, self.interval * 2), r=self._r)
+        self._handler: ReclaimHandler | None = None
+        self._hibernate: ReclaimHandler | None = None
+
+        self._notified: dict[InstanceKey, float] = {}  # -> last activity the team was told about
+        self._reclaimed = 0
+        self._hibernated = 0
+        self._last_pass: dict = {}
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    def register(self, handler: ReclaimHandler, *, hibernate: ReclaimHandler | None = None) -> None:
+        self._handler = handler
+        self._hibernate = hibernate
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != MODE_OFF or self.hibernate_seconds > 0
+
+    async def _usage(self) -> float:
+        u = await self._limiter.utilisation()
+        ratios = [u["instances"] / u["max_instances"] if u["max_instances"] else 0.0]
+        ratios += [u[r]["percent"] / 100 for r in ("cpu", "memory") if u[r]["percent"] is not None]
+        return max(ratios)
+
+    async def idle_instances(
+        self, now: float | None = None, *, idle_seconds: int | None = None
+    ) -> tuple[list[IdleInstance], dict[InstanceKey, float]]:
+        """
+        Running / hibernated HTTP instances idle for `idle_seconds` (default: the reclaim
+        timeout), least recently used first, and the last activity of each.
+        """
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        now = now or time.time()
+        pipe = self._r.pipeline(transaction=True)
+        pipe.zrangebyscore(InstanceLimiter.ZSET_KEY, now, "+inf")
+        pipe.zrange(ACTIVITY_ZSET_KEY, 0, -1, withscores=True)
+        slots, activity = await pipe.execute()
+
+        live = [k for slot in slots if (k := slot_instance(slot))]
+        seen = dict(activity)
+        live_members = {_member(*k) for k in live}
+        if gone := [m for m in seen if m not in live_members]:
+            await self._r.zrem(ACTIVITY_ZSET_KEY, *gone)  # terminated instances
+
+        records = await asyncio.gather(*(self._store.get(t, c) for t, c in live))
+        idle: list[IdleInstance] = []
+        last_seen: dict[InstanceKey, float] = {}
+        for (team_id, challenge_id), rec in zip(live, records, strict=True):
+            status = rec.get("status") if rec else None
+            if status not in (STATUS_RUNNING, STATUS_HIBERNATED) or rec.get("protocol") == "tcp":
+                continue
+            last = seen.get(_member(team_id, challenge_id), 0.0)
+            with contextlib.suppress(KeyError, ValueError):
+                last = max(last, datetime.fromisoformat(rec["started_at"]).timestamp())
+            if now - last >= idle_seconds:
+                idle.append(IdleInstance(team_id, challenge_id, int(now - last), status))
+                last_seen[(team_id, challenge_id)] = last
+        idle.sort(key=lambda i: i.idle_seconds, reverse=True)
+        return idle, last_seen
+
+    async def _publish(self, event: str, inst: IdleInstance) -> None:
+        with contextlib.suppress(*REDIS_DOWN_ERRORS):
+            await self._bus.publish(
+                event, {"challenge_id": inst.challenge_id, "idle_seconds": inst.idle_seconds}, team_id=inst.team_id
+            )
+
+    async def _hibernate_idle(self) -> int:
+        if not (self.hibernate_seconds > 0 and self._hibernate):
+            return 0
+        idle, _ = await self.idle_instances(idle_seconds=self.hibernate_seconds)
+        hibernated = 0
+        for inst in idle:
+            if inst.status == STATUS_RUNNING and await self._hibernate(inst.team_id, inst.challenge_id):
+                hibernated += 1
+        self._hibernated += hibernated
+        metrics.inc("idle.hibernated", hibernated)
+        return hibernated
+
+    async def run_once(self) -> int:
+        """
+        One policy pass. Returns the number of instances reclaimed (or teams notified).
+        """
+        hibernated = await self._hibernate_idle()
+        if self.mode == MODE_OFF:
+            self._last_pass = {"hibernated": hibernated}
+            return 0
+        usage = await self._usage()
+        queued = await self._queue.pending()
+        idle, last_seen = await self.idle_instances()
+        near_capacity = usage >= self.usage_threshold or queued > 0
+        self._notified = {k: v for k, v in self._notified.items() if k in last_seen}
+
+        acted = 0
+        if near_capacity and self.mode == MODE_NOTIFY:
+            for inst in idle[: self.batch_size]:
+                key = (inst.team_id, inst.challenge_id)
+                if self._notified.get(key) != last_seen[key]:  # once per idle period
+                    self._notified[key] = last_seen[key]
+                    await self._publish("instance_idle", inst)
+                    metrics.inc("idle.notified")
+                    acted += 1
+        elif near_capacity and self.mode == MODE_TERMINATE and self._handler:
+            for inst in idle[: min(self.batch_size, max(1, queued))]:
+                if await self._handler(inst.team_id, inst.challenge_id):
+                    self._reclaimed += 1
+                    metrics.inc("idle.reclaimed")
+                    await self._publish("instance_reclaimed", inst)
+                    acted += 1
+
+        self._last_pass = {
+            "usage": round(usage, 3),
+            "queued": queued,
+            "near_capacity": near_capacity,
+            "idle": len(idle),
+            "hibernated": hibernated,
+            "acted": acted,
+            "lru": [asdict(i) for i in idle[:5]],
+        }
+        if acted:
+            logger.info(f"Idle reclaim ({self.mode}): {acted} of {len(idle)} idle instance(s), usage {usage:.0%}")
+        return acted
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                async with self._lock.held() as leader:
+                    if leader:
+                        await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Idle reclaim pass failed: {e}")
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+
+    async def start(self) -> None:
+        if not self.enabled or (self._task and not self._task.done()):
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "idle_seconds": self.idle_seconds,
+            "hibernate_seconds": self.hibernate_seconds,
+            "usage_threshold": self.usage_threshold,
+            "reclaimed": self._reclaimed,
+            "hibernated": self._hibernated,
+            "notified": len(self._notified),
+            "last_pass": self._last_pass,
+        }
+
+
+instance_activity = ActivityTracker()
+idle_reclaimer = IdleReclaimer()
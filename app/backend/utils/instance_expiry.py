@@ -0,0 +1,171 @@
+# app/backend/utils/instance_expiry.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import Awaitable, Callable
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.backend.config.redis import REDIS_DOWN_ERRORS, redis_client
+from app.backend.config.settings import get_settings
+from app.backend.utils.leader_lock import LeaderLock
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+# delayed-job ZSET: member "<kind>:<owner_id>:<challenge_id>", score = expiry epoch.
+# Not the limiter's active_zset: admission prunes expired slots from it before a poller
+# could see them, and it only indexes team instances.
+EXPIRY_ZSET_KEY = "ctf:instances:expiry_zset"
+EXPIRY_LOCK_KEY = "ctf:expiry:lock"
+
+KIND_TEAM = "team"  # K8sTeamChallengeManager instances (team_id, challenge_id)
+KIND_USER = "user"  # legacy per-user instances (user_id, challenge_id)
+
+ExpiryHandler = Callable[[int, int], Awaitable[object]]
+
+
+def expiry_member(kind: str, owner_id: int, challenge_id: int) -> str:
+    return f"{kind}:{owner_id}:{challenge_id}"
+
+
+def _parse_member(member: str) -> tuple[str, int, int] | None:
+    try:
+        kind, owner_id, challenge_id = member.split(":")
+        return kind, int(owner_id), int(challenge_id)
+    except ValueError:
+        return None
+
+
+class ExpiryScheduler:
+    """
+    Durable instance expiry (replaces one `asyncio.sleep(ttl)` task per spawn):
+    - the schedule lives in Redis (`EXPIRY_ZSET_KEY`), so it survives restarts and is the
+      same on every replica; team records write it in the same script as their TTL
+    - one worker at a time (Redis lock) polls every `interval` for due members, up to
+      `batch_size` per round, and runs the handler registered for their kind concurrently
+    - a member is claimed with ZREM before its handler runs (a member is terminated once
+      even without the lock); a failed handler is re-queued `retry_seconds` later
+    Metrics: `expiry.terminated`, `expiry.failed`, `expiry.lag_seconds` (due -> handled).
+    """
+
+    def __init__(
+        self,
+        r: redis.Redis | None = None,
+        *,
+        interval: float = settings.INSTANCE_EXPIRY_POLL_SECONDS,
+        batch_size: int = settings.INSTANCE_EXPIRY_BATCH_SIZE,
+        retry_seconds: int = settings.INSTANCE_EXPIRY_RETRY_SECONDS,
+    ) -> None:
+        self._r = r or redis_client
+        self.interval = interval
+        self._lock = LeaderLock(EXPIRY_LOCK_KEY, ttl_seconds=max(30, self.interval * 6), r=self._r)
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self._handlers: dict[str, ExpiryHandler] = {}
+
+        self._terminated = 0
+        self._failed = 0
+        self._last_pass: dict[str, float | int] = {}
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    def register(self, kind: str, handler: ExpiryHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def schedule(self, kind: str, owner_id: int, challenge_id: int, *, ttl_seconds: int) -> None:
+        exp = int(time.time()) + int(ttl_seconds)
+        await self._r.zadd(EXPIRY_ZSET_KEY, {expiry_member(kind, owner_id, challenge_id): exp})
+
+    async def cancel(self, kind: str, owner_id: int, challenge_id: int) -> None:
+        await self._r.zrem(EXPIRY_ZSET_KEY, expiry_member(kind, owner_id, challenge_id))
+
+    async def _claim_due(self, now: float) -> list[tuple[str, float]]:
+        due = await self._r.zrangebyscore(EXPIRY_ZSET_KEY, "-inf", now, start=0, num=self.batch_size, withscores=True)
+        if not due:
+            return []
+        pipe = self._r.pipeline(transaction=False)
+        for member, _ in due:
+            pipe.zrem(EXPIRY_ZSET_KEY, member)
+        removed = await pipe.execute()
+        return [(m, score) for (m, score), ok in zip(due, removed, strict=True) if ok]
+
+    async def _expire(self, member: str, due_at: float) -> bool:
+        parsed = _parse_member(member)
+        handler = self._handlers.get(parsed[0]) if parsed else None
+        if handler is None:
+            logger.warning(f"Dropping expiry entry without a handler: {member}")
+            return False
+
+        _, owner_id, challenge_id = parsed
+        try:
+            await handler(owner_id, challenge_id)
+        except Exception as e:
+            self._failed += 1
+            metrics.inc("expiry.failed")
+            logger.warning(f"Expiry of {member} failed, retrying in {self.retry_seconds}s: {e}")
+            with contextlib.suppress(*REDIS_DOWN_ERRORS):
+                await self._r.zadd(EXPIRY_ZSET_KEY, {member: int(time.time()) + self.retry_seconds}, nx=True)
+            return False
+
+        self._terminated += 1
+        metrics.inc("expiry.terminated")
+        metrics.observe("expiry.lag_seconds", max(0.0, time.time() - due_at))
+        return True
+
+    async def run_once(self) -> int:
+        """
+        Handles everything due now, batch by batch. Returns the number of instances expired.
+        """
+        started = time.monotonic()
+        expired = 0
+        while True:
+            batch = await self._claim_due(time.time())
+            if batch:
+                results = await asyncio.gather(*(self._expire(m, due_at) for m, due_at in batch))
+                expired += sum(results)
+            if len(batch) < self.batch_size:
+                break
+
+        self._last_pass = {"expired": expired, "seconds": round(time.monotonic() - started, 3)}
+        if expired:
+            logger.info(f"Expired {expired} instance(s)")
+        return expired
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                async with self._lock.held() as leader:
+                    if leader:
+                        await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Instance expiry pass failed: {e}")
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"terminated": self._terminated, "failed": self._failed, "last_pass": self._last_pass}
+
+
+instance_expiry = ExpiryScheduler()
@@ -2,21 +2,45 @@
 import time
 
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 
+from app.backend.config.redis import redis_client
 from app.backend.config.settings import get_settings
+from app.backend.utils.challenge_profiles import memory_bytes, millicores
 
 settings = get_settings()
 
+# slot key -> "<cpu millicores> <memory bytes>" requested by the instance holding the slot;
+# only slots still indexed in ZSET_KEY count, so a leftover entry never consumes capacity
+RESERVATIONS_KEY = "ctf:capacity:reservations"
+# hash cpu / memory (millicores / bytes) written by the node capacity watcher; absent -> settings
+BUDGET_KEY = "ctf:capacity:budget"
+
+
+def configured_budget() -> tuple[int, int]:
+    """
+    (CPU millicores, memory bytes) from CAPACITY_CPU / CAPACITY_MEMORY; 0 = no budget.
+    """
+    cpu = millicores(settings.CAPACITY_CPU) if settings.CAPACITY_CPU else 0
+    memory = memory_bytes(settings.CAPACITY_MEMORY) if settings.CAPACITY_MEMORY else 0
+    return cpu, memory
+
+
+def _percent(used: int, budget: int) -> float | None:
+    return round(100 * used / budget, 1) if budget else None
+
 
 class InstanceLimiter:
     """
     Slot-based limiter with TTL per (team_id, challenge_id) and a global cap.
 
     Atomic via Lua:
-    - cleanup expired ZSET members (and delete slot keys best-effort)
+    - cleanup expired ZSET members (and delete slot keys / reservations best-effort)
     - enforce global limit
     - SET slot_key NX EX ttl
     - ZADD slot_key with score=expires_epoch
+    Team admission (TeamInstanceStore.admit) additionally weighs every slot by its
+    challenge's resource requests (RESERVATIONS_KEY) against the CPU / memory budget.
     """
 
     ZSET_KEY = "ctf:instances:active_zset"
@@ -24,6 +48,7 @@ class InstanceLimiter:
     _LUA_TRY_ACQUIRE = r"""
     -- KEYS[1] = ZSET_KEY
     -- KEYS[2] = SLOT_KEY
+    -- KEYS[3] = RESERVATIONS_KEY
     -- ARGV[1] = now_epoch
     -- ARGV[2] = exp_epoch
     -- ARGV[3] = ttl_seconds
@@ -43,6 +68,7 @@ class InstanceLimiter:
             redis.call("DEL", expired[i]) -- best-effort; key may already be gone
         end
         redis.call("ZREM", zset, unpack(expired))
+        redis.call("HDEL", KEYS[3], unpack(expired))
     end
 
     -- 2) if slot already exists -> refresh index and TTL (idempotent)
@@ -71,8 +97,8 @@ class InstanceLimiter:
     return 1
     """
 
-    def __init__(self) -> None:
-        self._r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(self, r: redis.Redis | None = None) -> None:
+        self._r = r or redis_client
         self._try_acquire_sha: str | None = None
 
     def _slot_key(self, team_id: int, challenge_id: int) -> str:
@@ -94,23 +120,25 @@ class InstanceLimiter:
         try:
             res = await self._r.evalsha(
                 sha,
-                2,
+                3,
                 self.ZSET_KEY,
                 slot_key,
+                RESERVATIONS_KEY,
                 now,
                 exp,
                 int(ttl_seconds),
                 int(limit),
             )
-        except redis.exceptions.NoScriptError:
+        except NoScriptError:
             # Redis lost scripts (restart) -> reload and retry once
             self._try_acquire_sha = None
             sha = await self._ensure_sha()
             res = await self._r.evalsha(
                 sha,
-                2,
+                3,
                 self.ZSET_KEY,
                 slot_key,
+                RESERVATIONS_KEY,
                 now,
                 exp,
                 int(ttl_seconds),
@@ -124,6 +152,7 @@ class InstanceLimiter:
         pipe = self._r.pipeline()
         pipe.delete(slot_key)
         pipe.zrem(self.ZSET_KEY, slot_key)
+        pipe.hdel(RESERVATIONS_KEY, slot_key)
         await pipe.execute()
 
     async def extend(self, *, team_id: int, challenge_id: int, ttl_seconds: int) -> bool:
@@ -140,3 +169,38 @@ class InstanceLimiter:
         pipe.zadd(self.ZSET_KEY, {slot_key: exp})
         await pipe.execute()
         return True
+
+    async def utilisation(self) -> dict:
+        """
+        Live slots, the capacity they reserve and the budget in force (one MULTI read).
+        """
+        now = int(time.time())
+        pipe = self._r.pipeline(transaction=True)
+        pipe.zrangebyscore(self.ZSET_KEY, now, "+inf")
+        pipe.hgetall(RESERVATIONS_KEY)
+        pipe.hmget(BUDGET_KEY, "cpu", "memory")
+        slots, reservations, watched = await pipe.execute()
+
+        used_cpu = used_memory = 0
+        for slot in slots:
+            cpu, _, memory = (reservations.get(slot) or "0 0").partition(" ")
+            used_cpu += int(cpu)
+            used_memory += int(memory or 0)
+
+        from_nodes = watched[0] is not None
+        cpu_budget, memory_budget = (int(watched[0]), int(watched[1] or 0)) if from_nodes else configured_budget()
+        return {
+            "instances": len(slots),
+            "max_instances": settings.MAX_ACTIVE_INSTANCES,
+            "budget_source": "nodes" if from_nodes else "settings",
+            "cpu": {
+                "used_millicores": used_cpu,
+                "budget_millicores": cpu_budget or None,
+                "percent": _percent(used_cpu, cpu_budget),
+            },
+            "memory": {
+                "used_bytes": used_memory,
+                "budget_bytes": memory_budget or None,
+                "percent": _percent(used_memory, memory_budget),
+            },
+        }
@@ -0,0 +1,302 @@
+# app/backend/utils/instance_reconciler.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import re
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+from typing import Any
+
+import redis.asyncio as redis
+from kubernetes import client
+from loguru import logger
+
+from app.backend.config.redis import redis_client
+from app.backend.config.settings import get_settings
+from app.backend.utils.challenge_profiles import MODE_SHARED
+from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.k8s_informer import ResourceInformer
+from app.backend.utils.leader_lock import LeaderLock
+from app.backend.utils.metrics import metrics
+from app.backend.utils.team_instance_store import STATUS_HIBERNATED, TeamInstanceStore, is_wrongtype
+
+settings = get_settings()
+
+RECONCILE_LOCK_KEY = "ctf:reconcile:lock"
+
+InstanceKey = tuple[int, int]  # (team_id, challenge_id)
+
+# Redis key families of one team instance (see TeamInstanceStore, InstanceLimiter, TeamFlagStore)
+_RECORD_RE = re.compile(r"^ctf:instance:team:(\d+):(\d+)$")
+_SLOT_RE = re.compile(r"^ctf:active:team:(\d+):challenge:(\d+)$")
+_FLAG_RE = re.compile(r"^ctf:flag:team:(\d+):(\d+)$")
+
+
+def _key_of(pattern: re.Pattern, key: str) -> InstanceKey | None:
+    m = pattern.match(key)
+    return (int(m[1]), int(m[2])) if m else None
+
+
+def slot_instance(slot: str) -> InstanceKey | None:
+    """
+    (team_id, challenge_id) of a limiter slot key.
+    """
+    return _key_of(_SLOT_RE, slot)
+
+
+def instance_key(labels: dict[str, str] | None) -> InstanceKey | None:
+    """
+    (team_id, challenge_id) of a team instance pod (labels) or service (selector);
+    None for unclaimed warm pool pods and legacy per-user instances.
+    """
+    if not labels or "team" not in labels or "challenge" not in labels:
+        return None
+    return int(labels["team"]), int(labels["challenge"])
+
+
+@dataclass(slots=True)
+class RedisState:
+    records: dict[InstanceKey, dict] = field(default_factory=dict)  # status, started_at, mode
+    slots: set[InstanceKey] = field(default_factory=set)  # limiter slots (index entries)
+    flags: set[InstanceKey] = field(default_factory=set)  # team flags
+
+
+@dataclass(slots=True)
+class Drift:
+    orphan_pods: list[str] = field(default_factory=list)  # no instance record
+    orphan_services: list[str] = field(default_factory=list)
+    dead_instances: list[InstanceKey] = field(default_factory=list)  # pod Succeeded / Failed
+    stale_records: list[InstanceKey] = field(default_factory=list)  # record without a pod (not hibernated / shared)
+    leaked_slots: list[InstanceKey] = field(default_factory=list)  # limiter slot without a record
+    orphan_flags: list[InstanceKey] = field(default_factory=list)  # flag without a record
+
+    def counts(self) -> dict[str, int]:
+        return {f.name: len(getattr(self, f.name)) for f in fields(self)}
+
+
+def _age_seconds(since: datetime | None, now: datetime) -> float:
+    return (now - since).total_seconds() if since else 0.0
+
+
+def find_drift(
+    pods: list[client.V1Pod],
+    services: list[client.V1Service],
+    state: RedisState,
+    *,
+    now: datetime,
+    grace_seconds: float,
+) -> Drift:
+    """
+    Compares the cached K8s objects with the Redis instance state. Objects and records
+    younger than `grace_seconds` are left alone: they may belong to an in-flight spawn,
+    extend or terminate.
+    """
+    drift = Drift()
+    live: set[InstanceKey] = set()
+    dead: set[InstanceKey] = set()
+
+    for pod in pods:
+        key = instance_key(pod.metadata.labels)
+        if key is None or pod.metadata.deletion_timestamp:
+            continue
+        if pod.status and pod.status.phase in ("Succeeded", "Failed"):
+            dead.add(key)  # e.g. activeDeadlineSeconds reached
+        elif key in state.records:
+            live.add(key)
+        elif _age_seconds(pod.metadata.creation_timestamp, now) > grace_seconds:
+            drift.orphan_pods.append(pod.metadata.name)
+    drift.dead_instances = sorted(dead)
+
+    for svc in services:
+        key = instance_key(svc.spec.selector if svc.spec else None)
+        if key is None or key in state.records or svc.metadata.deletion_timestamp:
+            continue
+        if _age_seconds(svc.metadata.creation_timestamp, now) > grace_seconds:
+            drift.orphan_services.append(svc.metadata.name)
+
+    for key, record in state.records.items():
+        if key in live or key in dead:
+            continue
+        if record.get("status") == STATUS_HIBERNATED or record.get("mode") == MODE_SHARED:
+            continue  # no pod of its own on purpose
+        try:
+            started = datetime.fromisoformat(record.get("started_at") or "")
+        except ValueError:
+            started = None
+        if started is None or _age_seconds(started, now) > grace_seconds:
+            drift.stale_records.append(key)
+
+    drift.leaked_slots = sorted(state.slots - state.records.keys())
+    drift.orphan_flags = sorted(state.flags - state.records.keys())
+    return drift
+
+
+class InstanceReconciler:
+    """
+    Controller loop that keeps K8s and the Redis instance state in line:
+    - K8s side from the pod / service informers (no API reads), Redis side from one SCAN per
+      key family plus the limiter index
+    - orphan pods / services (no record) are deleted; dead pods and records without a pod
+      (hibernated and shared-challenge instances excepted) get the full terminate cleanup
+      (objects, record, flag, limiter slot); leaked slots and orphan flags are removed
+    - runs every `interval` and early on pod / service deletions and pod failures, on one
+      worker at a time (Redis lock), only while both informers are synced
+    Every mismatch found is counted in `reconcile.<kind>` metrics.
+    """
+
+    def __init__(
+        self,
+        pods: ResourceInformer,
+        services: ResourceInformer,
+        *,
+        delete_resources: Callable[[int, int], Awaitable[None]],
+        r: redis.Redis | None = None,
+        store: TeamInstanceStore | None = None,
+        limiter: InstanceLimiter | None = None,
+        flags: TeamFlagStore | None = None,
+        interval: float = settings.K8S_RECONCILE_SECONDS,
+        grace_seconds: float = settings.K8S_RECONCILE_GRACE_SECONDS,
+    ) -> None:
+        self.pods = pods
+        self.services = services
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self._delete_resources = delete_resources
+        self._r = r or redis_client
+        self._lock = LeaderLock(RECONCILE_LOCK_KEY, ttl_seconds=max(30, self.interval * 2), r=self._r)
+        self._store = store or TeamInstanceStore(self._r)
+        self._limiter = limiter or InstanceLimiter(self._r)
+        self._flags = flags or TeamFlagStore(self._r)
+
+        self._last: dict[str, int] = {}
+        self._totals: dict[str, int] = {}
+        self._runs = 0
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+        self._wake = asyncio.Event()
+        pods.add_handler(self._on_pod)
+        services.add_handler(self._on_service)
+
+    async def _on_pod(self, event_type: str, pod: client.V1Pod) -> None:
+        failed = pod.status is not None and pod.status.phase in ("Succeeded", "Failed")
+        if event_type == "DELETED" or failed:
+            self._wake.set()
+
+    async def _on_service(self, event_type: str, svc: client.V1Service) -> None:
+        if event_type == "DELETED":
+            self._wake.set()
+
+    async def _load_state(self) -> RedisState:
+        state = RedisState()
+        record_keys = [k async for k in self._r.scan_iter(match="ctf:instance:team:*", count=500)]
+        if record_keys:
+            pipe = self._r.pipeline(transaction=False)
+            for key in record_keys:
+                pipe.hmget(key, "status", "started_at", "mode")
+            for key, res in zip(record_keys, await pipe.execute(raise_on_error=False), strict=True):
+                if isinstance(res, Exception):
+                    if not is_wrongtype(res) or not await self._store.migrate_legacy(key):
+                        raise res
+                    res = await self._r.hmget(key, "status", "started_at", "mode")
+                status, started_at, mode = res
+                if (ik := _key_of(_RECORD_RE, key)) and status is not None:  # gone since the SCAN
+                    state.records[ik] = {"status": status, "started_at": started_at, "mode": mode}
+
+        for slot in await self._r.zrange(InstanceLimiter.ZSET_KEY, 0, -1):
+            if ik := slot_instance(slot):
+                state.slots.add(ik)
+        async for key in self._r.scan_iter(match="ctf:flag:team:*", count=500):
+            if ik := _key_of(_FLAG_RE, key):
+                state.flags.add(ik)
+        return state
+
+    async def _delete(self, kind: str, name: str) -> None:
+        method = "delete_namespaced_pod" if kind == "pods" else "delete_namespaced_service"
+        try:
+            await self.pods.core_v1.call(method, name=name, namespace=self.pods.namespace)
+        except Exception as e:
+            if getattr(e, "status", None) != 404:
+                raise
+
+    async def cleanup_instance(self, team_id: int, challenge_id: int) -> None:
+        # same end state as terminate2 (also used by the expiry handler)
+        await self._delete_resources(team_id, challenge_id)
+        await self._store.delete(team_id, challenge_id)
+        await self._flags.delete_flag(team_id, challenge_id)
+        await self._limiter.release(team_id=team_id, challenge_id=challenge_id)
+
+    async def reconcile_once(self) -> Drift | None:
+        """
+        One pass; None if the informers are not synced yet (an empty cache is not "no pods").
+        """
+        if not (self.pods.synced and self.services.synced):
+            return None
+
+        state = await self._load_state()
+        drift = find_drift(
+            self.pods.items(),
+            self.services.items(),
+            state,
+            now=datetime.now(timezone.utc),
+            grace_seconds=self.grace_seconds,
+        )
+
+        actions: list[Awaitable[Any]] = [
+            *(self._delete("pods", name) for name in drift.orphan_pods),
+            *(self._delete("services", name) for name in drift.orphan_services),
+            *(self.cleanup_instance(*key) for key in (*drift.dead_instances, *drift.stale_records)),
+            *(self._limiter.release(team_id=t, challenge_id=c) for t, c in drift.leaked_slots),
+            *(self._flags.delete_flag(t, c) for t, c in drift.orphan_flags),
+        ]
+        results = await asyncio.gather(*actions, return_exceptions=True)
+        for res in results:
+            if isinstance(res, Exception):
+                logger.warning(f"Reconcile action failed: {res}")
+
+        counts = drift.counts()
+        for name, n in counts.items():
+            if n:
+                metrics.inc(f"reconcile.{name}", n)
+                self._totals[name] = self._totals.get(name, 0) + n
+        self._last = counts
+        self._runs += 1
+        if any(counts.values()):
+            logger.warning(f"Reconciled instance drift: { {k: v for k, v in counts.items() if v} }")
+        return drift
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                async with self._lock.held() as leader:
+                    if leader:
+                        await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Instance reconciliation failed: {e}")
+
+            self._wake.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            await asyncio.sleep(1.0)  # coalesce bursts of deletions into one pass
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self._runs, "last": self._last, "totals": self._totals}
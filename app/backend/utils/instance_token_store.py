@@ -4,14 +4,14 @@ import secrets
 
 import redis.asyncio as redis
 
-from app.backend.config.settings import get_settings
-
-settings = get_settings()
+from app.backend.config.redis import redis_client
+from app.backend.utils.redis_client_cache import RedisClientCache, redis_cache
 
 
 class InstanceTokenStore:
-    def __init__(self) -> None:
-        self._r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(self, r: redis.Redis | None = None, cache: RedisClientCache | None = None) -> None:
+        self._r = r or redis_client
+        self._cache = cache or redis_cache
 
     def _k_http(self, token: str) -> str:
         return f"ctf:token:http:{token}"
@@ -32,16 +32,16 @@ class InstanceTokenStore:
 
     async def set_mapping(self, token: str, *, team_id: int, challenge_id: int, ttl_seconds: int, tcp: bool) -> None:
         payload = json.dumps({"team_id": team_id, "challenge_id": challenge_id})
-        if tcp:
-            await self._r.set(self._k_tcp(token), payload, ex=ttl_seconds)
-        else:
-            await self._r.set(self._k_http(token), payload, ex=ttl_seconds)
+        key = self._k_tcp(token) if tcp else self._k_http(token)
+        await self._r.set(key, payload, ex=ttl_seconds)
+        self._cache.invalidate(key)
 
     async def set_handshake(self, token: str, passphrase: str, ttl_seconds: int) -> None:
         await self._r.set(self._k_hs(token), passphrase, ex=ttl_seconds)
 
     async def get_mapping(self, token: str, tcp: bool) -> dict | None:
-        raw = await self._r.get(self._k_tcp(token) if tcp else self._k_http(token))
+        key = self._k_tcp(token) if tcp else self._k_http(token)
+        raw = await self._cache.get(key, lambda: self._r.get(key))
         if not raw:
             return None
         try:
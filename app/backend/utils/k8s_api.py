@@ -0,0 +1,73 @@
+# app/backend/utils/k8s_api.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from kubernetes import client
+from urllib3.exceptions import TimeoutError as Urllib3Timeout
+
+from app.backend.utils.metrics import metrics
+
+
+class K8sApiTimeout(TimeoutError):
+    """
+    A Kubernetes API call did not complete within the per-call timeout.
+    Its outcome is unknown: the request may already be on its way and still be applied by the
+    API server. Callers of writes re-read the object (`CreateOrAdopt`, `create_or_read`) or
+    roll back; a create landing after its rollback is left to the reconciler.
+    """
+
+
+class AsyncCoreV1:
+    """
+    Awaitable access to the synchronous kubernetes CoreV1Api.
+    - every call runs on a dedicated, bounded thread pool, never on the event loop
+      (excess calls queue there instead of piling up threads)
+    - per-call timeout: sent with the request (`_request_timeout`) and enforced on the await
+    - the urllib3 connection pool is sized to the worker count, so parallel calls
+      do not wait for a free connection
+    Call latency and timeouts are exported as `k8s.api.*` metrics.
+    """
+
+    def __init__(self, api: client.CoreV1Api | None = None, *, max_workers: int = 16, timeout: float = 10.0) -> None:
+        if api is None:
+            cfg = client.Configuration.get_default_copy()
+            cfg.connection_pool_maxsize = max_workers
+            api = client.CoreV1Api(client.ApiClient(cfg))
+        self.api = api
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="k8s-api")
+        self._in_flight = 0
+
+    async def call(self, method: str, /, *args: Any, timeout: float | None = None, **kwargs: Any) -> Any:
+        """
+        await k8s.call("create_namespaced_pod", namespace=ns, body=pod)
+        Raises ApiException as the sync client does, K8sApiTimeout after `timeout` seconds
+        (a call still queued for a worker is dropped; one already sent may still be applied).
+        """
+        timeout = timeout or self.timeout
+        fn = functools.partial(getattr(self.api, method), *args, _request_timeout=timeout, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self._in_flight += 1
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, fn), timeout)
+        except (asyncio.TimeoutError, Urllib3Timeout):  # whichever side gave up first
+            metrics.inc("k8s.api.timeouts")
+            raise K8sApiTimeout(f"Kubernetes API {method} timed out after {timeout}s") from None
+        finally:
+            self._in_flight -= 1
+            metrics.observe(f"k8s.api.{method}", time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {"max_workers": self.max_workers, "in_flight": self._in_flight}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,236 @@
+# app/backend/utils/k8s_create.py
+from __future__ import annotations
+
+import asyncio
+import random
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+from app.backend.utils.k8s_api import AsyncCoreV1, K8sApiTimeout
+from app.backend.utils.k8s_informer import ResourceInformer
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+_CREATE = {"pods": "create_namespaced_pod", "services": "create_namespaced_service"}
+_READ = {"pods": "read_namespaced_pod", "services": "read_namespaced_service"}
+_DELETE = {"pods": "delete_namespaced_pod", "services": "delete_namespaced_service"}
+
+
+class SpawnConflictError(RuntimeError):
+    """
+    The instance's pod / Service names stayed taken by objects that could be neither adopted
+    nor replaced within the attempt budget.
+    """
+
+
+def pod_env(pod: client.V1Pod, name: str) -> str | None:
+    for container in pod.spec.containers or ():
+        for var in container.env or ():
+            if var.name == name:
+                return var.value
+    return None
+
+
+def pod_is_alive(pod: client.V1Pod) -> bool:
+    if pod.metadata.deletion_timestamp:
+        return False
+    return not (pod.status and pod.status.phase in ("Succeeded", "Failed"))
+
+
+def pod_deadline_left(pod: client.V1Pod, now: datetime | None = None) -> float | None:
+    """
+    Seconds before activeDeadlineSeconds ends the pod (counted from its start), None without one.
+    """
+    deadline = pod.spec.active_deadline_seconds
+    if deadline is None:
+        return None
+    started = pod.status.start_time if pod.status else None
+    if started is None:
+        return float(deadline)
+    return deadline - ((now or datetime.now(timezone.utc)) - started).total_seconds()
+
+
+def _conflict(res: Any) -> bool:
+    return isinstance(res, ApiException) and res.status == 409
+
+
+def _read_back(res: Any) -> bool:
+    # 409: the name is taken; timeout: the create may have been applied anyway
+    return _conflict(res) or isinstance(res, K8sApiTimeout)
+
+
+async def create_or_read(core_v1: AsyncCoreV1, kind: str, namespace: str, body: dict) -> Any:
+    """
+    Creates a uniquely named object whose outcome must be known: a create that timed out (it
+    may still be applied) is sent once more, and the 409 of a first attempt that did land
+    reads the object back. Another timeout, or a 409 on the first attempt, propagates.
+    """
+    try:
+        return await core_v1.call(_CREATE[kind], namespace=namespace, body=body)
+    except K8sApiTimeout:
+        metrics.inc("k8s.spawn.timeouts")
+    try:
+        return await core_v1.call(_CREATE[kind], namespace=namespace, body=body)
+    except ApiException as e:
+        if e.status != 409:
+            raise
+    return await core_v1.call(_READ[kind], name=body["metadata"]["name"], namespace=namespace)
+
+
+@dataclass(slots=True)
+class Created:
+    pod: client.V1Pod
+    service: client.V1Service
+    adopted_pod: bool = False  # the pod existed already: it keeps its own env (flag)
+
+
+class CreateOrAdopt:
+    """
+    Idempotent creation of an instance's Pod + Service (fixed names), instead of
+    delete-sleep-recurse on a name conflict:
+    - both are created in parallel; a 409, or a timeout (the create may have been applied
+      anyway), reads the existing object (watch cache first):
+      a live pod with the same labels and image that `adopt_pod` accepts and whose remaining
+      activeDeadlineSeconds still covers the new one (less `deadline_slack`), or a Service
+      with the same selector and type, is taken over as is
+    - anything else under that name (dead pod, object being deleted, another instance's) is
+      deleted in the foreground and its removal awaited through the watch cache (API reads
+      with backoff while the cache is not synced), at most `delete_timeout` seconds
+    - whatever is still missing is created again after a jittered exponential backoff, for
+      at most `max_attempts` rounds, then SpawnConflictError
+    Other API errors propagate; rolling back what was created is up to the caller.
+    Counted in `k8s.spawn.*` metrics: attempts, conflicts, timeouts, adopted, replaced,
+    conflict_failures.
+    """
+
+    def __init__(
+        self,
+        core_v1: AsyncCoreV1,
+        namespace: str,
+        *,
+        pods: ResourceInformer | None = None,
+        services: ResourceInformer | None = None,
+        max_attempts: int = settings.K8S_SPAWN_MAX_ATTEMPTS,
+        backoff: float = settings.K8S_SPAWN_BACKOFF_SECONDS,
+        delete_timeout: float = settings.K8S_DELETE_WAIT_SECONDS,
+        deadline_slack: float = settings.K8S_ADOPT_DEADLINE_SLACK_SECONDS,
+    ) -> None:
+        self.core_v1 = core_v1
+        self.namespace = namespace
+        self.informers = {"pods": pods, "services": services}
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.delete_timeout = delete_timeout
+        self.deadline_slack = deadline_slack
+
+    async def _read(self, kind: str, name: str) -> Any | None:
+        informer = self.informers[kind]
+        if informer is not None and informer.synced and (cached := informer.get(name)) is not None:
+            return cached
+        try:
+            return await self.core_v1.call(_READ[kind], name=name, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None  # deleted meanwhile
+            raise
+
+    def _adoptable(self, kind: str, existing: Any, body: dict, adopt_pod: Callable[[client.V1Pod], bool]) -> bool:
+        if kind == "services":
+            spec = existing.spec
+            return spec.selector == body["spec"]["selector"] and spec.type == body["spec"].get("type", "ClusterIP")
+        labels = existing.metadata.labels or {}
+        containers = existing.spec.containers or []
+        # the adopted pod keeps its own deadline: it must not end well before a new one would
+        wanted = body["spec"].get("activeDeadlineSeconds")
+        left = pod_deadline_left(existing)
+        return (
+            pod_is_alive(existing)
+            and body["metadata"]["labels"].items() <= labels.items()
+            and bool(containers)
+            and containers[0].image == body["spec"]["containers"][0]["image"]
+            and (wanted is None or left is None or left >= wanted - self.deadline_slack)
+            and adopt_pod(existing)
+        )
+
+    async def _wait_gone(self, kind: str, name: str) -> bool:
+        informer = self.informers[kind]
+        if informer is not None and informer.synced:
+            return await informer.wait_deleted(name, self.delete_timeout)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.delete_timeout
+        delay = 0.05
+        while loop.time() < deadline:
+            if await self._read(kind, name) is None:
+                return True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        return False
+
+    async def _replace(self, kind: str, name: str) -> None:
+        metrics.inc("k8s.spawn.replaced")
+        logger.warning(f"Replacing stale {kind[:-1]} {name}")
+        try:
+            await self.core_v1.call(
+                _DELETE[kind],
+                name=name,
+                namespace=self.namespace,
+                body=client.V1DeleteOptions(propagation_policy="Foreground"),
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+        if not await self._wait_gone(kind, name):
+            logger.warning(f"{kind[:-1]} {name} still present after {self.delete_timeout}s")
+
+    async def create(
+        self, pod_body: dict, service_body: dict, *, adopt_pod: Callable[[client.V1Pod], bool] = lambda _: True
+    ) -> Created:
+        bodies = {"pods": pod_body, "services": service_body}
+        got: dict[str, Any] = {}
+        adopted_pod = False
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            missing = [kind for kind in bodies if kind not in got]
+            metrics.inc("k8s.spawn.attempts")
+            results = await asyncio.gather(
+                *(self.core_v1.call(_CREATE[k], namespace=self.namespace, body=bodies[k]) for k in missing),
+                return_exceptions=True,
+            )
+            if errors := [res for res in results if isinstance(res, Exception) and not _read_back(res)]:
+                raise errors[0]
+
+            for kind, res in zip(missing, results, strict=True):
+                if not _read_back(res):
+                    got[kind] = res
+                    continue
+                metrics.inc("k8s.spawn.timeouts" if isinstance(res, K8sApiTimeout) else "k8s.spawn.conflicts")
+                name = bodies[kind]["metadata"]["name"]
+                existing = await self._read(kind, name)
+                if existing is None:
+                    continue  # gone meanwhile: created in the next round
+                if self._adoptable(kind, existing, bodies[kind], adopt_pod):
+                    metrics.inc("k8s.spawn.adopted")
+                    logger.info(f"Adopted existing {kind[:-1]} {name}")
+                    got[kind] = existing
+                    adopted_pod = adopted_pod or kind == "pods"
+                else:
+                    await self._replace(kind, name)
+
+            if len(got) == len(bodies):
+                return Created(got["pods"], got["services"], adopted_pod)
+
+        metrics.inc("k8s.spawn.conflict_failures")
+        raise SpawnConflictError(
+            f"{pod_body['metadata']['name']}: names still taken after {self.max_attempts} attempts"
+        )
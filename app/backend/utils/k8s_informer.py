@@ -0,0 +1,212 @@
+# app/backend/utils/k8s_informer.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ClassVar
+
+from kubernetes import watch
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+CHALLENGE_SELECTOR = "app=ctf-challenge"
+
+Handler = Callable[[str, Any], Awaitable[None]]
+
+_END = object()
+
+
+class ResourceInformer:
+    """
+    Local watch cache of one kind of challenge object ("pods" or "services").
+    - list, then watch from the list's resourceVersion; the blocking stream runs on its
+      own thread and the events are applied on the event loop
+    - `get` / `select` answer from memory once `synced` (no API call per request);
+      `wait_deleted` waits for the watch to report an object gone
+    - handlers receive (event_type, object) after the cache is updated; a re-list replays
+      the listed objects as ADDED and the ones that vanished meanwhile as DELETED
+    - the stream ends every `watch_seconds` (or on an error, e.g. 410 Gone) and the list
+      is read again, so a missed event is repaired at the next re-list
+    """
+
+    _LIST_METHODS: ClassVar[dict[str, str]] = {"pods": "list_namespaced_pod", "services": "list_namespaced_service"}
+
+    def __init__(
+        self,
+        core_v1: AsyncCoreV1,
+        namespace: str,
+        kind: str,
+        *,
+        selector: str = CHALLENGE_SELECTOR,
+        watch_seconds: int = settings.K8S_WATCH_SECONDS,
+    ) -> None:
+        self.core_v1 = core_v1
+        self.namespace = namespace
+        self.kind = kind
+        self.selector = selector
+        self.watch_seconds = watch_seconds
+        self.synced = False
+
+        self._list_method = self._LIST_METHODS[kind]
+        self._objects: dict[str, Any] = {}  # name -> object
+        self._handlers: list[Handler] = []
+        self._deleted: dict[str, asyncio.Event] = {}  # name -> set when its deletion is seen
+        self._watching = False
+        self._relists = 0
+
+        # the stream holds its thread for up to watch_seconds: keep it off the API call pool
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"k8s-watch-{kind}")
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    def add_handler(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+    def get(self, name: str) -> Any | None:
+        return self._objects.get(name)
+
+    def items(self) -> list[Any]:
+        return list(self._objects.values())
+
+    async def wait_deleted(self, name: str, timeout: float) -> bool:
+        """
+        True once the object is gone from the cache (at once if it is not there), False after
+        `timeout`. Only meaningful while `synced`.
+        """
+        if name not in self._objects:
+            return True
+        event = self._deleted.setdefault(name, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _gone(self, name: str) -> None:
+        if event := self._deleted.pop(name, None):
+            event.set()
+
+    def select(self, **labels: str) -> list[Any]:
+        return [
+            o
+            for o in self._objects.values()
+            if all((o.metadata.labels or {}).get(k) == str(v) for k, v in labels.items())
+        ]
+
+    async def _notify(self, event_type: str, obj: Any) -> None:
+        for handler in self._handlers:
+            try:
+                await handler(event_type, obj)
+            except Exception as e:
+                logger.warning(f"{self.kind} informer handler failed on {obj.metadata.name}: {e}")
+
+    async def _apply(self, event_type: str, obj: Any) -> None:
+        if event_type == "DELETED":
+            self._objects.pop(obj.metadata.name, None)
+            self._gone(obj.metadata.name)
+        else:
+            self._objects[obj.metadata.name] = obj
+        await self._notify(event_type, obj)
+
+    def _stream(
+        self, w: watch.Watch, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, resource_version: str
+    ) -> None:
+        # watch thread: blocking HTTP stream, every event is queued on the loop
+        def put(item) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        try:
+            for event in w.stream(
+                getattr(self.core_v1.api, self._list_method),
+                self.namespace,
+                label_selector=self.selector,
+                resource_version=resource_version,
+                timeout_seconds=self.watch_seconds,
+                _request_timeout=(self.core_v1.timeout, self.watch_seconds + 30),
+            ):
+                put(event)
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    async def _relist(self) -> str:
+        listed = await self.core_v1.call(self._list_method, self.namespace, label_selector=self.selector)
+        current = {o.metadata.name: o for o in listed.items}
+        gone = [o for name, o in self._objects.items() if name not in current]
+        self._objects = current
+        self.synced = True
+        self._relists += 1
+
+        for obj in gone:
+            self._gone(obj.metadata.name)
+            await self._notify("DELETED", obj)
+        for obj in current.values():
+            await self._notify("ADDED", obj)
+        return listed.metadata.resource_version
+
+    async def _watch_once(self) -> None:
+        resource_version = await self._relist()
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        w = watch.Watch()
+        stream = loop.run_in_executor(self._executor, self._stream, w, loop, queue, resource_version)
+        self._watching = True
+        try:
+            while (event := await queue.get()) is not _END:
+                if isinstance(event, Exception):
+                    raise event
+                if event["type"] in ("ADDED", "MODIFIED", "DELETED"):  # not BOOKMARK
+                    await self._apply(event["type"], event["object"])
+        finally:
+            self._watching = False
+            w.stop()  # unblocks the thread
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(asyncio.shield(stream), timeout=1.0)
+
+    async def run_forever(self) -> None:
+        backoff = 1.0
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._watch_once()
+                    backoff = 1.0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    metrics.inc(f"k8s.informer.{self.kind}.errors")
+                    logger.warning(f"{self.kind} watch failed, re-listing: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+        finally:
+            logger.info(f"{self.kind} informer stopped")
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self.synced = False
+
+    def stats(self) -> dict:
+        return {
+            "synced": self.synced,
+            "watching": self._watching,
+            "objects": len(self._objects),
+            "relists": self._relists,
+        }
@@ -3,6 +3,7 @@ import asyncio
 import contextlib
 import secrets
 import string
+from datetime import datetime, timezone
 from threading import Lock
 
 from kubernetes import client
@@ -10,8 +11,39 @@ from kubernetes.client.rest import ApiException
 from loguru import logger
 
 from app.backend.config.settings import get_settings
+from app.backend.db.session import AsyncSessionLocal
+from app.backend.repository.challenges import ChallengesCRUDRepository
+from app.backend.utils.challenge_profiles import DEFAULT_PROFILE, MODE_SHARED, ChallengeProfile, challenge_profiles
+from app.backend.utils.cluster_capacity import NodeCapacityWatcher
+from app.backend.utils.ctf_redis import ctf_redis_bus
 from app.backend.utils.flag_store import RedisFlagStore, TeamFlagStore
-from app.backend.utils.redis_bus import RedisBus
+from app.backend.utils.instance_activity import idle_reclaimer, instance_activity
+from app.backend.utils.instance_expiry import KIND_TEAM, KIND_USER, instance_expiry
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.instance_reconciler import InstanceReconciler
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.k8s_create import (
+    CreateOrAdopt,
+    SpawnConflictError,
+    create_or_read,
+    pod_deadline_left,
+    pod_env,
+)
+from app.backend.utils.k8s_informer import ResourceInformer
+from app.backend.utils.metrics import metrics
+from app.backend.utils.pod_readiness import PodReadinessWatcher
+from app.backend.utils.shared_instances import SharedDeployments, is_shared, shared_flag
+from app.backend.utils.spawn_queue import spawn_queue
+from app.backend.utils.team_instance_store import (
+    ADMIT_CLAIMED,
+    STATUS_HIBERNATED,
+    STATUS_RUNNING,
+    STATUS_STARTING,
+    STATUS_TERMINATING,
+    STATUS_WAKING,
+    TeamInstanceStore,
+)
+from app.backend.utils.warm_pool import WarmPool
 
 settings = get_settings()
 
@@ -35,9 +67,10 @@ class K8sChallengeManager:
             return
 
         settings.load_k8s_config()
-        self.core_v1 = client.CoreV1Api()
+        self.core_v1 = AsyncCoreV1(max_workers=settings.K8S_API_MAX_WORKERS, timeout=settings.K8S_API_TIMEOUT_SECONDS)
         self.namespace = settings.K8S_CHALLENGE_NAMESPACE
         self.flag_store = RedisFlagStore()
+        instance_expiry.register(KIND_USER, self.terminate_instance)
         self._initialized = True
         logger.info("K8sChallengeManager initialized")
 
@@ -49,12 +82,19 @@ class K8sChallengeManager:
         return "".join(secrets.choice(alphabet) for _ in range(length))
 
     async def spawn_instance(
-        self, user_id: int, challenge_id: int, image: str, port: int, ttl_seconds: int = 3600
+        self,
+        user_id: int,
+        challenge_id: int,
+        image: str,
+        port: int,
+        ttl_seconds: int = 3600,
+        profile: ChallengeProfile = DEFAULT_PROFILE,
     ) -> str | None:
         """
-        Creates a Pod and a Service for the user.
+        Creates a Pod and a Service for the user from the challenge's compiled manifest template.
         Injects CTF_FLAG (random 8 chars) into the container env and publishes the flag to Redis.
-        Returns the connection info (DNS or IP).
+        A live pod already under the name is adopted with its flag (`CreateOrAdopt`).
+        Returns the connection info (Service DNS), or None if the name stayed taken.
         Pod will have active_deadline_seconds set to ttl_seconds (best-effort).
         """
         name = self.get_pod_name(user_id, challenge_id)
@@ -63,116 +103,84 @@ class K8sChallengeManager:
             user_id, challenge_id, flag_value, ttl_seconds=settings.CHALLENGE_K8S_POD_TTL_SECONDS
         )
 
-        pod_manifest = client.V1Pod(
-            metadata=client.V1ObjectMeta(
-                name=name, labels={"app": "ctf-challenge", "user": str(user_id), "challenge": str(challenge_id)}
-            ),
-            spec=client.V1PodSpec(
-                containers=[
-                    client.V1Container(
-                        name="challenge",
-                        image=image,
-                        ports=[client.V1ContainerPort(container_port=port)],
-                        env=[client.V1EnvVar(name="CTF_FLAG", value=flag_value)],
-                        resources=client.V1ResourceRequirements(limits={"memory": "64Mi", "cpu": "200m"}),
-                    )
-                ],
-                restart_policy="Never",
-                active_deadline_seconds=ttl_seconds,  # kill pod after TTL
-            ),
-        )
-        service_manifest = client.V1Service(
-            metadata=client.V1ObjectMeta(name=name, labels={"app": "ctf-challenge"}),
-            spec=client.V1ServiceSpec(
-                selector={"app": "ctf-challenge", "user": str(user_id), "challenge": str(challenge_id)},
-                ports=[client.V1ServicePort(port=port, target_port=port)],
-                type="ClusterIP",
-            ),
+        template = challenge_profiles.template(challenge_id, image, port, profile)
+        selector = {"app": "ctf-challenge", "user": str(user_id), "challenge": str(challenge_id)}
+        pod_manifest = template.pod(
+            name=name,
+            labels=selector,
+            env={"CTF_FLAG": flag_value},
+            active_deadline_seconds=ttl_seconds,  # kill pod after TTL
         )
+        service_manifest = template.service(name=name, selector=selector)
 
+        # conflicts are answered from the team manager's watch caches once they are synced
+        team_manager = K8sTeamChallengeManager()
+        creator = CreateOrAdopt(self.core_v1, self.namespace, pods=team_manager.pods, services=team_manager.services)
         try:
-            self.core_v1.create_namespaced_pod(namespace=self.namespace, body=pod_manifest)
-            self.core_v1.create_namespaced_service(namespace=self.namespace, body=service_manifest)
+            created = await creator.create(
+                pod_manifest, service_manifest, adopt_pod=lambda pod: bool(pod_env(pod, "CTF_FLAG"))
+            )
+        except SpawnConflictError as e:
+            logger.error(f"Could not spawn {name}: {e}")
+            return None
 
-            logger.info(f"Spawned challenge {name} for user {user_id}")
+        if created.adopted_pod:  # the running pod keeps its flag
+            flag_value = pod_env(created.pod, "CTF_FLAG")
+            await self.flag_store.set_flag(
+                user_id, challenge_id, flag_value, ttl_seconds=settings.CHALLENGE_K8S_POD_TTL_SECONDS
+            )
+        logger.info(f"Spawned challenge {name} for user {user_id}")
 
-            # publish flag to redis bus as a background task
-            async def _publish_flag():
-                try:
-                    bus = RedisBus(settings.REDIS_URL)
-                    await bus.publish(
-                        "challenge_flag",
-                        {
-                            "user_id": user_id,
-                            "challenge_id": challenge_id,
-                            "flag": flag_value,
-                            "service": name,
-                            "port": port,
-                        },
-                    )
-                    await bus.close()
-                except Exception as e:
-                    logger.error(f"Failed to publish flag for {name}: {e}")
+        # publish flag to redis bus as a background task
+        async def _publish_flag():
+            try:
+                await ctf_redis_bus.publish(
+                    "challenge_flag",
+                    {
+                        "user_id": user_id,
+                        "challenge_id": challenge_id,
+                        "flag": flag_value,
+                        "service": name,
+                        "port": template.port,
+                    },
+                )
+            except Exception as e:
+                logger.error(f"Failed to publish flag for {name}: {e}")
 
+        try:
+            loop = asyncio.get_running_loop()
+            loop.create_task(_publish_flag())  # noqa
+        except RuntimeError:
+            # no running loop in this context; best-effort schedule
             try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(_publish_flag())  # noqa
-            except RuntimeError:
-                # no running loop in this context; best-effort schedule
-                try:
-                    asyncio.create_task(_publish_flag())  # noqa
-                except Exception:
-                    # if scheduling fails, log but continue
-                    logger.warning("Could not schedule redis publish task for flag")
+                asyncio.create_task(_publish_flag())  # noqa
+            except Exception:
+                # if scheduling fails, log but continue
+                logger.warning("Could not schedule redis publish task for flag")
 
-            return f"{name}.{self.namespace}.svc.cluster.local:{port}"
+        return f"{name}.{self.namespace}.svc.cluster.local:{template.port}"
 
-        except ApiException as e:
-            if e.status == 409:  # Conflict (Already Exists)
-                print(f"Pod {name} already exists.")
-                existing_pod = self.core_v1.read_namespaced_pod(name, self.namespace)
-
-                if existing_pod.status.phase in ["Succeeded", "Failed"]:
-                    print(f"Deleting dead pod {name}...")
-                    self.core_v1.delete_namespaced_pod(name, self.namespace)
-                    return await self.spawn_instance(user_id, challenge_id, image, port, ttl_seconds)
-                return existing_pod.status.pod_ip
-            else:
-                raise  # Re-raise other errors
-
-    def terminate_instance(self, user_id: int, challenge_id: int):
+    async def terminate_instance(self, user_id: int, challenge_id: int):
         name = self.get_pod_name(user_id, challenge_id)
+        await instance_expiry.cancel(KIND_USER, user_id, challenge_id)
         try:
-            self.core_v1.delete_namespaced_service(name=name, namespace=self.namespace)
-            self.core_v1.delete_namespaced_pod(name=name, namespace=self.namespace)
+            await asyncio.gather(
+                self.core_v1.call("delete_namespaced_service", name=name, namespace=self.namespace),
+                self.core_v1.call("delete_namespaced_pod", name=name, namespace=self.namespace),
+            )
             logger.info(f"Terminated challenge {name}")
         except ApiException as e:
             if getattr(e, "status", None) != 404:
                 logger.error(f"Failed to terminate {name}: {e}")
 
-    def schedule_termination(
+    async def schedule_termination(
         self, user_id: int, challenge_id: int, ttl_seconds: int = settings.CHALLENGE_K8S_POD_TTL_SECONDS
     ) -> None:
         """
         Schedule server-side termination as a fallback after ttl_seconds.
+        Durable: stored in the Redis expiry schedule, not a sleeping task of this worker.
         """
-
-        async def _delayed_terminate():
-            try:
-                await asyncio.sleep(ttl_seconds)
-                try:
-                    self.terminate_instance(user_id, challenge_id)
-                except Exception as exc:
-                    logger.error(f"Scheduled termination failed for {self.get_pod_name(user_id, challenge_id)}: {exc}")
-            except asyncio.CancelledError:
-                logger.debug("Scheduled termination cancelled")
-
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(_delayed_terminate())  # noqa
-        except RuntimeError:
-            # No running loop — schedule via asyncio.create_task anyway (best-effort)
-            asyncio.create_task(_delayed_terminate())  # noqa
+        await instance_expiry.schedule(KIND_USER, user_id, challenge_id, ttl_seconds=ttl_seconds)
 
 
 class K8sTeamChallengeManager:
@@ -180,6 +188,7 @@ class K8sTeamChallengeManager:
     Team-scoped manager (add-on).
     - One pod/service per (team_id, challenge_id)
     - Injects one flag per team instance into env: CTF_FLAG
+      (or, for a claimed warm-pool pod, into the CTF_FLAG_FILE mounted from its annotations)
     - Keeps resources low
     """
 
@@ -199,12 +208,51 @@ class K8sTeamChallengeManager:
             return
 
         settings.load_k8s_config()
-        self.core_v1 = client.CoreV1Api()
+        self.core_v1 = AsyncCoreV1(max_workers=settings.K8S_API_MAX_WORKERS, timeout=settings.K8S_API_TIMEOUT_SECONDS)
         self.namespace = settings.K8S_CHALLENGE_NAMESPACE
         self.flag_store = TeamFlagStore()
+        self.store = TeamInstanceStore()
+        self.warm_pool = WarmPool(self.core_v1, self.namespace)
+        # watch caches of challenge pods / services and the controllers fed by them
+        self.pods = ResourceInformer(self.core_v1, self.namespace, "pods")
+        self.services = ResourceInformer(self.core_v1, self.namespace, "services")
+        self.readiness = PodReadinessWatcher(self.pods)
+        self.reconciler = InstanceReconciler(self.pods, self.services, delete_resources=self._delete_resources)
+        # admission budget from node allocatable (CAPACITY_FROM_NODES), else from settings
+        self.capacity = NodeCapacityWatcher(self.core_v1)
+        # one Deployment per shared challenge (runtime mode "shared") instead of a pod per team
+        self.shared = SharedDeployments(
+            AsyncCoreV1(client.AppsV1Api(), max_workers=4, timeout=settings.K8S_API_TIMEOUT_SECONDS),
+            self.core_v1,
+            self.namespace,
+        )
+        metrics.register_collector("k8s_api", self.core_v1.stats)
+        metrics.register_collector("warm_pool", self.warm_pool.stats)
+        metrics.register_collector("challenge_profiles", challenge_profiles.stats)
+        metrics.register_collector(
+            "k8s_informer", lambda: {"pods": self.pods.stats(), "services": self.services.stats()}
+        )
+        metrics.register_collector("pod_readiness", self.readiness.stats)
+        metrics.register_collector("reconcile", self.reconciler.stats)
+        instance_expiry.register(KIND_TEAM, self.expire_instance)
+        metrics.register_collector("instance_expiry", instance_expiry.stats)
+        metrics.register_collector("capacity", self.capacity_stats)
+        metrics.register_collector("shared_instances", self.shared.stats)
+        spawn_queue.register(self.spawn_queued)
+        metrics.register_collector("spawn_queue", spawn_queue.stats)
+        idle_reclaimer.register(self.reclaim_instance, hibernate=self.hibernate_instance)
+        metrics.register_collector(
+            "idle_reclaim", lambda: {**idle_reclaimer.stats(), "activity": instance_activity.stats()}
+        )
         self._initialized = True
         logger.info("K8sTeamChallengeManager initialized")
 
+    async def capacity_stats(self) -> dict:
+        stats = await InstanceLimiter().utilisation()
+        if settings.CAPACITY_FROM_NODES:
+            stats["nodes"] = self.capacity.stats()
+        return stats
+
     def get_pod_name(self, team_id: int, challenge_id: int) -> str:
         # IMPORTANT: stable naming per team+challenge
         return f"chal-t{team_id}-c{challenge_id}"
@@ -213,14 +261,72 @@ class K8sTeamChallengeManager:
         alphabet = string.ascii_letters + string.digits
         return "".join(secrets.choice(alphabet) for _ in range(length))
 
+    async def _delete_resources(self, team_id: int, challenge_id: int) -> None:
+        """
+        Deletes Service and Pod in parallel; missing objects (404) are fine.
+        Pods are matched by label: a claimed warm-pool pod does not carry the stable name.
+        """
+        results = await asyncio.gather(
+            self.core_v1.call(
+                "delete_namespaced_service", name=self.get_pod_name(team_id, challenge_id), namespace=self.namespace
+            ),
+            self.core_v1.call(
+                "delete_collection_namespaced_pod",
+                self.namespace,
+                label_selector=f"app=ctf-challenge,team={team_id},challenge={challenge_id}",
+            ),
+            return_exceptions=True,
+        )
+        for res in results:
+            if isinstance(res, Exception) and getattr(res, "status", None) != 404:
+                raise res
+
+    def _connection_info(
+        self, name: str, port: int, protocol: str, pod, svc, passphrase: str | None, flag: str
+    ) -> dict:
+        tcp_port = None
+        if protocol == "tcp":
+            tcp_port = svc.spec.ports[0].node_port
+
+        return {
+            "protocol": protocol,
+            "connection_internal": f"{name}.{self.namespace}.svc.cluster.local:{port}",
+            "tcp_host": settings.PUBLIC_TCP_HOST if tcp_port else None,
+            "tcp_port": tcp_port,
+            "passphrase": passphrase,
+            "flag": flag,
+            "pod_uid": pod.metadata.uid,
+        }
+
     async def spawn_instance(
-        self, team_id: int, challenge_id: int, image: str, port: int, ttl_seconds: int = 3600, protocol: str = "http"
+        self,
+        team_id: int,
+        challenge_id: int,
+        image: str,
+        port: int,
+        ttl_seconds: int = 3600,
+        protocol: str = "http",
+        warm_pool: bool = False,
+        profile: ChallengeProfile = DEFAULT_PROFILE,
     ) -> dict | None:
         """
-        Creates a Pod and a Service for the team.
+        Creates a Pod and a Service for the team from the challenge's compiled manifest
+        template (resources, port, probe and env of its profile).
         Injects one CTF_FLAG per team instance and stores it under team scope in Redis.
-        Returns connection string "<svc>.<ns>.svc.cluster.local:<port>"
+        With `warm_pool`, a pre-started pool pod is claimed first (only the Service is created);
+        an empty pool falls back to a cold spawn.
+        Pod and Service are created in parallel; if either fails the other is rolled back.
+        Name conflicts go through `CreateOrAdopt`: a live pod of this instance is adopted (its
+        flag is kept), a dead one replaced, with a bounded number of attempts. An adopted pod
+        keeps its activeDeadlineSeconds: the instance TTL is cut to what is left of it
+        (`ttl_seconds` of the result).
+        Returns connection details and the pod uid (readiness is reported by the pod watch),
+        or None if the instance could not be created.
+        An HTTP challenge with a shared profile gets no pod of its own (`_spawn_shared`).
         """
+        if profile.shared and protocol == "http":
+            return await self._spawn_shared(team_id, challenge_id, image, port, ttl_seconds, profile)
+
         name = self.get_pod_name(team_id, challenge_id)
 
         flag_value = self._gen_flag(8)
@@ -239,136 +345,375 @@ class K8sTeamChallengeManager:
             ttl_seconds=ttl_seconds,
         )
 
-        env = [
-            client.V1EnvVar(name="CTF_FLAG", value=flag_value),
-        ]
-
+        env = {"CTF_FLAG": flag_value}
         if passphrase:
-            env.append(client.V1EnvVar(name="CTF_PASSPHRASE", value=passphrase))
-
-        pod_manifest = client.V1Pod(
-            metadata=client.V1ObjectMeta(
-                name=name,
-                labels={
-                    "app": "ctf-challenge",
-                    "team": str(team_id),
-                    "challenge": str(challenge_id),
-                },
-            ),
-            spec=client.V1PodSpec(
-                containers=[
-                    client.V1Container(
-                        name="challenge",
-                        image=image,
-                        ports=[client.V1ContainerPort(container_port=port)],
-                        env=env,
-                        resources=client.V1ResourceRequirements(
-                            limits={"memory": "512Mi", "cpu": "500m"}, requests={"memory": "256Mi", "cpu": "200m"}
-                        ),
+            env["CTF_PASSPHRASE"] = passphrase
+
+        template = challenge_profiles.template(challenge_id, image, port, profile)
+        selector = {"app": "ctf-challenge", "team": str(team_id), "challenge": str(challenge_id)}
+        pod_manifest = template.pod(name=name, labels=selector, env=env, active_deadline_seconds=ttl_seconds)
+        # SERVICE: TCP = NodePort
+        service_manifest = template.service(
+            name=name, selector=selector, service_type="NodePort" if protocol == "tcp" else "ClusterIP"
+        )
+
+        if warm_pool:
+            claimed = await self.warm_pool.claim(
+                team_id, challenge_id, flag=flag_value, passphrase=passphrase, ttl_seconds=ttl_seconds
+            )
+            if claimed:
+                try:
+                    svc = await self.core_v1.call(
+                        "create_namespaced_service", namespace=self.namespace, body=service_manifest
                     )
-                ],
-                restart_policy="Never",
-                active_deadline_seconds=ttl_seconds,
+                    return self._connection_info(name, template.port, protocol, claimed, svc, passphrase, flag_value)
+                except Exception as e:
+                    # e.g. a leftover Service: clean up (claimed pod included) and go the cold way
+                    logger.warning(f"Service for warm pod {claimed.metadata.name} failed ({e}); cold spawning {name}")
+                    with contextlib.suppress(Exception):
+                        await self._delete_resources(team_id, challenge_id)
+
+        # a live pod left under the name (e.g. a retried spawn) is adopted with its own flag
+        def _adoptable(pod: client.V1Pod) -> bool:
+            return bool(pod_env(pod, "CTF_FLAG")) and (protocol != "tcp" or bool(pod_env(pod, "CTF_PASSPHRASE")))
+
+        creator = CreateOrAdopt(self.core_v1, self.namespace, pods=self.pods, services=self.services)
+        try:
+            created = await creator.create(pod_manifest, service_manifest, adopt_pod=_adoptable)
+        except Exception as e:
+            logger.error(f"K8s API Error: {e}")
+            # roll back whichever half was created (a timed-out create landing after this is an
+            # orphan for the reconciler)
+            with contextlib.suppress(Exception):
+                await self._delete_resources(team_id, challenge_id)
+            return None
+
+        if created.adopted_pod:
+            flag_value = pod_env(created.pod, "CTF_FLAG")
+            passphrase = pod_env(created.pod, "CTF_PASSPHRASE")
+            if (left := pod_deadline_left(created.pod)) is not None:
+                ttl_seconds = min(ttl_seconds, max(1, int(left)))
+            await self.flag_store.set_flag(team_id, challenge_id, flag_value, ttl_seconds=ttl_seconds)
+        return {
+            **self._connection_info(
+                name, template.port, protocol, created.pod, created.service, passphrase, flag_value
             ),
-        )
+            "ttl_seconds": ttl_seconds,
+        }
 
-        # =============================
-        # SERVICE: TCP = NodePort
-        # =============================
-        if protocol == "tcp":
-            service_manifest = client.V1Service(
-                metadata=client.V1ObjectMeta(
-                    name=name,
-                    labels={"app": "ctf-challenge"},
-                ),
-                spec=client.V1ServiceSpec(
-                    selector={
-                        "app": "ctf-challenge",
-                        "team": str(team_id),
-                        "challenge": str(challenge_id),
-                    },
-                    ports=[
-                        client.V1ServicePort(
-                            port=port,
-                            target_port=port,
-                            node_port=None,
-                        )
-                    ],
-                    type="NodePort",
-                ),
+    async def _spawn_shared(
+        self, team_id: int, challenge_id: int, image: str, port: int, ttl_seconds: int, profile: ChallengeProfile
+    ) -> dict:
+        """
+        Shared challenge: makes sure its Deployment serves and hands the team its derived flag,
+        stored like a per-instance flag so submissions validate the same way. The token proxy
+        passes the flag to the deployment on every request of the team.
+        """
+        template = challenge_profiles.template(challenge_id, image, port, profile)
+        name = await self.shared.ensure(challenge_id, template, profile.replicas)
+        flag_value = shared_flag(challenge_id, team_id)
+        await self.flag_store.set_flag(team_id, challenge_id, flag_value, ttl_seconds=ttl_seconds)
+        return {
+            "protocol": "http",
+            "connection_internal": f"{name}.{self.namespace}.svc.cluster.local:{template.port}",
+            "tcp_host": None,
+            "tcp_port": None,
+            "passphrase": None,
+            "flag": flag_value,
+            "pod_uid": None,
+            "mode": MODE_SHARED,
+        }
+
+    async def launch_instance(
+        self,
+        team_id: int,
+        ch,
+        *,
+        ttl_seconds: int,
+        profile: ChallengeProfile,
+        challenge_repo: ChallengesCRUDRepository,
+    ) -> dict:
+        """
+        Starts an admitted instance (placeholder claimed by `store.admit`) and fills in its record,
+        still `starting` until the pod is Ready (a shared instance is running right away: its
+        deployment serves already). Any failure gives the admission back.
+        """
+        try:
+            result = await self.spawn_instance(
+                team_id=team_id,
+                challenge_id=ch.id,
+                image=ch.image_name,
+                port=ch.internal_port,
+                ttl_seconds=ttl_seconds,
+                protocol=ch.protocol.value if getattr(ch, "protocol", None) else "http",
+                warm_pool=ch.warm_pool_size > 0,
+                profile=profile,
             )
-        else:
-            service_manifest = client.V1Service(
-                metadata=client.V1ObjectMeta(
-                    name=name,
-                    labels={"app": "ctf-challenge"},
-                ),
-                spec=client.V1ServiceSpec(
-                    selector={
-                        "app": "ctf-challenge",
-                        "team": str(team_id),
-                        "challenge": str(challenge_id),
-                    },
-                    ports=[client.V1ServicePort(port=port, target_port=port)],
-                    type="ClusterIP",
-                ),
+            if not result:
+                raise RuntimeError("K8s spawn failed")
+            ttl_seconds = result.get("ttl_seconds", ttl_seconds)  # an adopted pod may end sooner
+
+            # durable flag copy: submissions still validate while Redis is unavailable
+            await challenge_repo.save_team_instance_flag(team_id, ch.id, result["flag"], ttl_seconds=ttl_seconds)
+
+            payload = await self.store.set(
+                team_id,
+                ch.id,
+                ttl_seconds=ttl_seconds,
+                connection=result.get("connection_internal"),
+                protocol=result.get("protocol"),
+                tcp_host=result.get("tcp_host"),
+                tcp_port=result.get("tcp_port"),
+                passphrase=result.get("passphrase"),
+                pod_uid=result.get("pod_uid"),
+                to_status=STATUS_RUNNING if result.get("mode") == MODE_SHARED else STATUS_STARTING,
             )
+            if not payload:
+                raise RuntimeError("Redis placeholder missing after claim (unexpected)")
+            # the pod may have turned Ready before its uid was stored
+            return await self.readiness.notify_spawned(team_id, ch.id) or payload
+        except Exception:
+            await self.store.abandon(team_id, ch.id)
+            raise
+
+    async def spawn_queued(self, team_id: int, challenge_id: int) -> str:
+        """
+        Spawn queue handler: admits and launches a queued spawn with the same checks as spawn2.
+        Returns the admission outcome ("gone" when the challenge is no longer deployable).
+        """
+        async with AsyncSessionLocal() as session:
+            challenge_repo = ChallengesCRUDRepository(session)
+            ch = await challenge_repo.read_challenge_by_id(challenge_id)
+            if not ch or ch.is_download:
+                return "gone"
+
+            ttl_seconds = int(settings.CHALLENGE_K8S_POD_TTL_SECONDS)
+            profile = challenge_profiles.for_challenge(ch)
+            cpu_millicores, memory_bytes = profile.weight
+            outcome, _ = await self.store.admit(
+                team_id,
+                challenge_id,
+                ttl_seconds=ttl_seconds,
+                limit=settings.MAX_ACTIVE_INSTANCES,
+                cpu_millicores=cpu_millicores,
+                memory_bytes=memory_bytes,
+                shared=is_shared(ch, profile),
+            )
+            if outcome == ADMIT_CLAIMED:
+                payload = await self.launch_instance(
+                    team_id, ch, ttl_seconds=ttl_seconds, profile=profile, challenge_repo=challenge_repo
+                )
+                return payload.get("status", STATUS_STARTING)
+            return outcome
+
+    async def terminate_instance(self, team_id: int, challenge_id: int):
+        name = self.get_pod_name(team_id, challenge_id)
+        await self._delete_resources(team_id, challenge_id)
+
+        await self.flag_store.delete_flag(team_id, challenge_id)
+        logger.info(f"Terminated challenge {name}")
+
+    async def expire_instance(self, team_id: int, challenge_id: int) -> None:
+        """
+        Expiry handler: same end state as terminate2. The record goes `terminating` first,
+        so an extend racing with the expiry gives up; an instance extended past now is kept.
+        """
+        inst = await self.store.get(team_id, challenge_id)
+        if inst and inst.get("expires_at"):
+            expires_at = datetime.fromisoformat(inst["expires_at"])
+            if expires_at > datetime.now(timezone.utc):
+                return  # extended meanwhile: the extend scheduled the new expiry
+
+        await self.store.transition(team_id, challenge_id, to_status=STATUS_TERMINATING)
+        await self.reconciler.cleanup_instance(team_id, challenge_id)
+        spawn_queue.wake()  # a slot was released
+        logger.info(f"Expired challenge {self.get_pod_name(team_id, challenge_id)}")
+
+    async def reclaim_instance(self, team_id: int, challenge_id: int) -> bool:
+        """
+        Idle reclaim handler: terminates the instance only while it is still running or
+        hibernated (an extend, wake or terminate in between wins).
+        """
+        applied, _ = await self.store.transition(
+            team_id, challenge_id, from_status=(STATUS_RUNNING, STATUS_HIBERNATED), to_status=STATUS_TERMINATING
+        )
+        if not applied:
+            return False
+        await self.reconciler.cleanup_instance(team_id, challenge_id)
+        spawn_queue.wake()
+        logger.info(f"Reclaimed idle challenge {self.get_pod_name(team_id, challenge_id)}")
+        return True
+
+    async def hibernate_instance(self, team_id: int, challenge_id: int) -> bool:
+        """
+        Idle hibernate handler (scale to zero): running -> hibernated, then the instance's pod is
+        deleted and its CPU / memory reservation given back. Service, flag, web tokens, limiter
+        slot and expiry are kept, so the first proxied request can bring it back (`wake_instance`).
+        Only the pod recorded in `pod_uid` is deleted: a wake racing with the hibernation keeps
+        its fresh pod. Returns False when the instance changed meanwhile or its pod is not in the
+        watch cache yet.
+        """
+        applied, record = await self.store.transition(
+            team_id, challenge_id, from_status=(STATUS_RUNNING,), to_status=STATUS_HIBERNATED
+        )
+        if not applied:
+            return False
 
+        pods = [
+            p
+            for p in self.pods.select(team=team_id, challenge=challenge_id)
+            if p.metadata.uid == record.get("pod_uid") and not p.metadata.deletion_timestamp
+        ]
         try:
-            self.core_v1.create_namespaced_pod(
-                namespace=self.namespace,
-                body=pod_manifest,
+            if not pods:
+                raise LookupError("pod not in the watch cache")
+            for pod in pods:
+                await self.core_v1.call("delete_namespaced_pod", name=pod.metadata.name, namespace=self.namespace)
+        except Exception as e:
+            await self.store.transition(
+                team_id, challenge_id, from_status=(STATUS_HIBERNATED,), to_status=STATUS_RUNNING
             )
+            if isinstance(e, LookupError):
+                return False
+            raise
 
-            svc = self.core_v1.create_namespaced_service(
-                namespace=self.namespace,
-                body=service_manifest,
-            )
+        await self.store.release_reservation(team_id, challenge_id)
+        spawn_queue.wake()  # CPU / memory freed
+        logger.info(f"Hibernated idle challenge {self.get_pod_name(team_id, challenge_id)}")
+        return True
 
-            tcp_port = None
-            if protocol == "tcp":
-                tcp_port = svc.spec.ports[0].node_port
+    async def _recreate_pod(self, team_id: int, ch, record: dict) -> bool:
+        """
+        Wake of a `waking` instance: takes its reservation again and creates a fresh pod (unique
+        name: the hibernated one may still be terminating) with the instance's flag, for the
+        remaining TTL. Returns False when the capacity budget has no room.
+        """
+        profile = challenge_profiles.for_challenge(ch)
+        cpu_millicores, memory_bytes = profile.weight
+        reason = await self.store.reserve(team_id, ch.id, cpu_millicores=cpu_millicores, memory_bytes=memory_bytes)
+        if reason:
+            logger.info(f"Wake of t{team_id}-c{ch.id} refused: {reason} budget exhausted")
+            return False
+
+        flag = await self.flag_store.get_flag(team_id, ch.id)
+        remaining = int((datetime.fromisoformat(record["expires_at"]) - datetime.now(timezone.utc)).total_seconds())
+        if not flag or remaining <= 0:
+            raise RuntimeError("flag missing or instance expired")
+
+        template = challenge_profiles.template(ch.id, ch.image_name, ch.internal_port, profile)
+        pod_manifest = template.pod(
+            name=f"{self.get_pod_name(team_id, ch.id)}-w{secrets.token_hex(2)}",
+            labels={"app": "ctf-challenge", "team": str(team_id), "challenge": str(ch.id)},
+            env={"CTF_FLAG": flag},
+            active_deadline_seconds=remaining,
+        )
+        pod = await create_or_read(self.core_v1, "pods", self.namespace, pod_manifest)
+        applied, _ = await self.store.transition(
+            team_id, ch.id, from_status=(STATUS_WAKING,), pod_uid=pod.metadata.uid
+        )
+        if not applied:  # terminated meanwhile
+            with contextlib.suppress(Exception):
+                await self.core_v1.call("delete_namespaced_pod", name=pod.metadata.name, namespace=self.namespace)
+            return True
+        await self.readiness.notify_spawned(team_id, ch.id)
+        return True
+
+    async def wake_instance(
+        self, team_id: int, ch, *, timeout: float = settings.HIBERNATE_WAKE_TIMEOUT_SECONDS
+    ) -> dict | None:
+        """
+        Brings a hibernated instance back on its first proxied request: the caller winning the
+        hibernated -> waking compare-and-set recreates the pod, every caller then waits (up to
+        `timeout`) for the pod watch to mark it running.
+        Returns the running record, or None (no capacity, timed out, or terminated meanwhile).
+        """
+        claimed, record = await self.store.transition(
+            team_id,
+            ch.id,
+            from_status=(STATUS_HIBERNATED,),
+            to_status=STATUS_WAKING,
+            started_at=datetime.now(timezone.utc).isoformat(),  # wake time is measured from here
+        )
+        if claimed:
+            metrics.inc("hibernate.wakes")
+            try:
+                woke = await self._recreate_pod(team_id, ch, record)
+            except Exception:
+                await self.store.release_reservation(team_id, ch.id)
+                await self.store.transition(team_id, ch.id, from_status=(STATUS_WAKING,), to_status=STATUS_HIBERNATED)
+                raise
+            if not woke:
+                metrics.inc("hibernate.wake_refused")
+                await self.store.transition(team_id, ch.id, from_status=(STATUS_WAKING,), to_status=STATUS_HIBERNATED)
+                return None
 
-            return {
-                "protocol": protocol,
-                "connection_internal": f"{name}.{self.namespace}.svc.cluster.local:{port}",
-                "tcp_host": settings.PUBLIC_TCP_HOST if tcp_port else None,
-                "tcp_port": tcp_port,
-                "passphrase": passphrase,
-            }
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            inst = await self.store.get(team_id, ch.id)
+            current = inst.get("status") if inst else None
+            if current == STATUS_RUNNING:
+                return inst
+            if current != STATUS_WAKING or asyncio.get_running_loop().time() >= deadline:
+                return None
+            await asyncio.sleep(0.2)
 
-        except ApiException as e:
-            if e.status == 409:  # Conflict (Already Exists)
-                logger.warning(f"Zombie instance detected for {name}. Cleaning up and retrying...")
-                # Best-effort delete of both Service and Pod
-                try:
-                    self.core_v1.delete_namespaced_service(name=name, namespace=self.namespace)
-                except ApiException:
-                    contextlib.suppress(ApiException)
-                try:
-                    self.core_v1.delete_namespaced_pod(name=name, namespace=self.namespace)
-                except ApiException:
-                    contextlib.suppress(ApiException)
-                # Wait briefly for K8s to register the deletion
-                await asyncio.sleep(3)
-                # Retry the spawn
-                return await self.spawn_instance(team_id, challenge_id, image, port, ttl_seconds, protocol)
 
-            logger.error(f"K8s API Error: {e}")
-            return None
+# ---- warm pool refill loop for main.py ----
+async def start_warm_pool() -> None:
+    await K8sTeamChallengeManager().warm_pool.start()
 
-    async def terminate_instance(self, team_id: int, challenge_id: int):
-        name = self.get_pod_name(team_id, challenge_id)
-        try:
-            self.core_v1.delete_namespaced_service(name=name, namespace=self.namespace)
-        except ApiException as e:
-            if getattr(e, "status", None) != 404:
-                raise
-        try:
-            self.core_v1.delete_namespaced_pod(name=name, namespace=self.namespace)
-        except ApiException as e:
-            if getattr(e, "status", None) != 404:
-                raise
 
-        await self.flag_store.delete_flag(team_id, challenge_id)
-        logger.info(f"Terminated challenge {name}")
+async def stop_warm_pool() -> None:
+    await K8sTeamChallengeManager().warm_pool.stop()
+
+
+# ---- pod / service watch caches + reconciliation loop for main.py ----
+async def start_instance_controller() -> None:
+    mgr = K8sTeamChallengeManager()
+    await mgr.pods.start()
+    await mgr.services.start()
+    await mgr.reconciler.start()
+    if settings.CAPACITY_FROM_NODES:
+        await mgr.capacity.start()
+
+
+async def stop_instance_controller() -> None:
+    mgr = K8sTeamChallengeManager()
+    await mgr.capacity.stop()
+    await mgr.reconciler.stop()
+    await mgr.services.stop()
+    await mgr.pods.stop()
+
+
+# ---- durable instance expiry (one polling leader) for main.py ----
+async def start_instance_expiry() -> None:
+    # both managers register their expiry handler on creation
+    K8sChallengeManager()
+    K8sTeamChallengeManager()
+    await instance_expiry.start()
+
+
+async def stop_instance_expiry() -> None:
+    await instance_expiry.stop()
+
+
+# ---- fair spawn queue dispatcher (one leader) for main.py ----
+async def start_spawn_queue() -> None:
+    K8sTeamChallengeManager()  # registers the spawn handler
+    await spawn_queue.start()
+
+
+async def stop_spawn_queue() -> None:
+    await spawn_queue.stop()
+
+
+# ---- instance activity flush (every worker) + idle reclaim policy (one leader) for main.py ----
+async def start_idle_reclaim() -> None:
+    K8sTeamChallengeManager()  # registers the reclaim handler
+    await instance_activity.start()
+    await idle_reclaimer.start()
+
+
+async def stop_idle_reclaim() -> None:
+    await idle_reclaimer.stop()
+    await instance_activity.stop()
@@ -0,0 +1,105 @@
+# app/backend/utils/leader_lock.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import secrets
+from collections.abc import AsyncIterator
+
+import redis.asyncio as redis
+from loguru import logger
+from redis.commands.core import AsyncScript
+
+from app.backend.config.redis import REDIS_DOWN_ERRORS, redis_client
+from app.backend.utils.metrics import metrics
+
+# only the holder (same token) may free or extend the lock
+_LUA_RELEASE = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+_LUA_RENEW = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class LeaderLock:
+    """
+    Redis lock electing the one worker that runs a periodic pass (warm-pool refill,
+    reconciliation, expiry, spawn queue, idle reclaim):
+    - SET key <random token> NX PX ttl; release and renewal compare the token in a Lua
+      script, so a holder whose pass outlived the TTL never frees or extends the lock of
+      the worker that took over
+    - `held()` renews the lock every ttl/3 while the pass runs; a renewal finding the lock
+      gone logs it and counts `leader_lock.lost` (the pass is not interrupted)
+    - Redis down: not acquired, the pass is skipped
+    """
+
+    def __init__(self, key: str, ttl_seconds: float, *, r: redis.Redis | None = None) -> None:
+        self.key = key
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self._r = r or redis_client
+        self._token: str | None = None
+        self._scripts: dict[str, AsyncScript] = {}
+
+    def _script(self, source: str) -> AsyncScript:
+        # registered on first use (EVALSHA, reloaded on NOSCRIPT)
+        if source not in self._scripts:
+            self._scripts[source] = self._r.register_script(source)
+        return self._scripts[source]
+
+    async def acquire(self) -> bool:
+        token = secrets.token_hex(16)
+        try:
+            if not await self._r.set(self.key, token, nx=True, px=self.ttl_ms):
+                return False
+        except REDIS_DOWN_ERRORS:
+            return False
+        self._token = token
+        return True
+
+    async def renew(self) -> bool:
+        if self._token is None:
+            return False
+        try:
+            return bool(await self._script(_LUA_RENEW)(keys=[self.key], args=[self._token, self.ttl_ms]))
+        except REDIS_DOWN_ERRORS:
+            return True  # unknown: the TTL still protects the lock, try again next round
+
+    async def release(self) -> None:
+        token, self._token = self._token, None
+        if token is None:
+            return
+        with contextlib.suppress(*REDIS_DOWN_ERRORS):
+            await self._script(_LUA_RELEASE)(keys=[self.key], args=[token])
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            if not await self.renew():
+                metrics.inc("leader_lock.lost")
+                logger.warning(f"Leader lock {self.key} lost during a pass")
+                return
+
+    @contextlib.asynccontextmanager
+    async def held(self) -> AsyncIterator[bool]:
+        """
+        `async with lock.held() as leader:` runs the body as leader when `leader` is True.
+        """
+        if not await self.acquire():
+            yield False
+            return
+        keep_alive = asyncio.create_task(self._keep_alive())
+        try:
+            yield True
+        finally:
+            keep_alive.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await keep_alive
+            await self.release()
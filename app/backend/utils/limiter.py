@@ -3,13 +3,20 @@ from __future__ import annotations
 
 import functools
 import inspect
+import time
+from collections import OrderedDict
 from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any, TypeVar, cast, get_type_hints
 
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
+from slowapi.wrappers import Limit
 from starlette.requests import Request
 
+from app.backend.config.redis import redis_registry
 from app.backend.config.settings import get_settings
+from app.backend.utils.metrics import metrics
 
 settings = get_settings()
 F = TypeVar("F", bound=Callable[..., Any])
@@ -20,10 +27,237 @@ def client_ip_key(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
-limiter = Limiter(
+def _check_evaluate_hook(base: type[Limiter] = Limiter) -> None:
+    """
+    slowapi has no public hook for evaluating a request's limits, so BatchedLimiter overrides
+    the private `Limiter.__evaluate_limits` (slowapi is pinned in pyproject.toml). Fails at
+    import when an upgrade renamed or reshaped it, instead of silently falling back to one
+    round trip per limit.
+    """
+    hook = getattr(base, "_Limiter__evaluate_limits", None)
+    if hook is None or list(inspect.signature(hook).parameters) != ["self", "request", "endpoint", "limits"]:
+        raise ImportError(f"{base.__module__}.{base.__name__}.__evaluate_limits changed: update BatchedLimiter")
+
+
+_check_evaluate_hook()
+
+
+@dataclass(slots=True)
+class _Lease:
+    tokens: int
+    expires_at: float
+    remaining: int
+    reset_seconds: int
+
+
+class BatchedLimiter(Limiter):
+    """
+    slowapi Limiter that evaluates every limit applying to a request (stacked route
+    limits, per-key limits, default/application limits) in ONE atomic Lua call instead
+    of one storage round trip per limit.
+
+    - all-or-nothing: a request rejected by one limit consumes none of the others
+    - the tightest remaining budget is exposed on request.state.rate_limit_remaining
+    - limits large enough (>= lease_min_limit per window) are served from a small local
+      token lease taken from Redis in one go, so clearly under-limit clients skip Redis;
+      unused leased tokens make the shared count conservative (never permissive)
+    Fixed-window counters, same semantics as slowapi's default strategy.
+    """
+
+    _LUA_HIT_ALL = r"""
+    -- KEYS[i]      = counter key of limit i
+    -- ARGV[1]      = tokens wanted (request cost + lease)
+    -- ARGV[2]      = request cost (minimum to grant)
+    -- ARGV[1+2i]   = amount of limit i
+    -- ARGV[2+2i]   = window seconds of limit i
+    -- returns {granted, failed_index, tightest_remaining, tightest_reset, min_reset}
+
+    local want = tonumber(ARGV[1])
+    local cost = tonumber(ARGV[2])
+    local n = #KEYS
+
+    -- 1) read all counters; grant as many tokens as the tightest limit allows
+    local grant = want
+    for i = 1, n do
+        local used = tonumber(redis.call("GET", KEYS[i]) or "0")
+        local left = tonumber(ARGV[1 + 2 * i]) - used
+        if left < cost then
+            return {0, i, math.max(left, 0), redis.call("TTL", KEYS[i]), 0}
+        end
+        if left < grant then
+            grant = left
+        end
+    end
+
+    -- 2) consume from every limit
+    local tightest, tightest_reset, min_reset = -1, 0, -1
+    for i = 1, n do
+        local window = tonumber(ARGV[2 + 2 * i])
+        local used = redis.call("INCRBY", KEYS[i], grant)
+        local ttl = redis.call("TTL", KEYS[i])
+        if ttl < 0 then
+            redis.call("EXPIRE", KEYS[i], window)
+            ttl = window
+        end
+
+        local left = tonumber(ARGV[1 + 2 * i]) - used
+        if tightest < 0 or left < tightest then
+            tightest = left
+            tightest_reset = ttl
+        end
+        if min_reset < 0 or ttl < min_reset then
+            min_reset = ttl
+        end
+    end
+
+    return {grant, 0, tightest, tightest_reset, min_reset}
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        lease_min_limit: int = 100,
+        lease_fraction: float = 0.05,
+        max_leases: int = 10_000,
+        hit_script: Callable[..., list[int]] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lease_min_limit = lease_min_limit
+        self.lease_fraction = lease_fraction
+        self.max_leases = max_leases
+        self._hit_script = hit_script
+        self._clock = clock
+        self._leases: OrderedDict[tuple[str, ...], _Lease] = OrderedDict()
+
+    def _script(self) -> Callable[..., list[int]]:
+        if self._hit_script is None:
+            # slowapi evaluates limits synchronously -> sync client; Script reloads itself on NOSCRIPT
+            self._hit_script = redis_registry.sync_client().register_script(self._LUA_HIT_ALL)
+        return self._hit_script
+
+    def _collect(self, request: Request, endpoint: str, limits: list[Limit]) -> list[tuple[Limit, list[str], int]]:
+        """
+        Same filtering and key construction as slowapi's own evaluation loop.
+        """
+        checks = []
+        for lim in limits:
+            limit_scope = lim.scope or endpoint
+            if getattr(lim, "_exempt_when_takes_request", False):
+                if lim.is_exempt(request):
+                    continue
+            elif lim.is_exempt():
+                continue
+
+            if lim.methods is not None and request.method.lower() not in lim.methods:
+                continue
+            if lim.per_method:
+                limit_scope += f":{request.method}"
+
+            if "request" in inspect.signature(lim.key_func).parameters:
+                limit_key = lim.key_func(request)
+            else:
+                limit_key = lim.key_func()
+
+            args = [limit_key, limit_scope]
+            if not all(args):
+                self.logger.error("Skipping limit: %s. Empty value found in parameters.", lim.limit)
+                continue
+            if self._key_prefix:
+                args = [self._key_prefix, *args]
+
+            cost = lim.cost(request) if callable(lim.cost) else lim.cost
+            checks.append((lim, args, int(cost)))
+        return checks
+
+    def _take_lease(self, keys: tuple[str, ...], cost: int) -> _Lease | None:
+        lease = self._leases.get(keys)
+        if lease is None:
+            return None
+        if lease.expires_at <= self._clock() or lease.tokens < cost:
+            del self._leases[keys]
+            return None
+        lease.tokens -= cost
+        self._leases.move_to_end(keys)
+        return lease
+
+    def _store_lease(self, keys: tuple[str, ...], lease: _Lease) -> None:
+        self._leases[keys] = lease
+        self._leases.move_to_end(keys)
+        while len(self._leases) > self.max_leases:
+            self._leases.popitem(last=False)
+
+    def _Limiter__evaluate_limits(self, request: Request, endpoint: str, limits: list[Limit]) -> None:
+        if self._storage_dead:
+            # slowapi's in-memory fallback is active -> keep its per-limit evaluation
+            Limiter._Limiter__evaluate_limits(self, request, endpoint, limits)
+            return
+
+        checks = self._collect(request, endpoint, limits)
+        if not checks:
+            request.state.view_rate_limit = None
+            return
+
+        header_lim, header_args = min(((c[0], c[1]) for c in checks), key=lambda c: c[0].limit)
+        request.state.view_rate_limit = (header_lim.limit, header_args)
+
+        cost = max(c[2] for c in checks)
+        keys = tuple(lim.limit.key_for(*args) for lim, args, _ in checks)
+
+        # 1) local lease (no Redis)
+        lease = self._take_lease(keys, cost)
+        if lease is not None:
+            metrics.inc("rate_limit.local_hit")
+            request.state.rate_limit_remaining = lease.remaining + lease.tokens
+            request.state.rate_limit_reset = lease.reset_seconds
+            return
+
+        # 2) one atomic round trip for all limits (+ a lease for large limits)
+        smallest = min(lim.limit.amount for lim, _, _ in checks)
+        want = cost
+        if smallest >= self.lease_min_limit:
+            want = max(cost, int(smallest * self.lease_fraction))
+
+        argv: list[int] = [want, cost]
+        for lim, _, _ in checks:
+            argv += [lim.limit.amount, lim.limit.get_expiry()]
+
+        metrics.inc("rate_limit.redis_eval")
+        granted, failed_idx, remaining, reset, min_reset = (int(x) for x in self._script()(keys=list(keys), args=argv))
+
+        request.state.rate_limit_remaining = remaining
+        request.state.rate_limit_reset = reset
+
+        if failed_idx:
+            failed_lim, failed_args, _ = checks[failed_idx - 1]
+            request.state.view_rate_limit = (failed_lim.limit, failed_args)
+            metrics.inc("rate_limit.rejected")
+            self.logger.warning(
+                "ratelimit %s (%s) exceeded at endpoint: %s", failed_lim.limit, failed_args[-2], failed_args[-1]
+            )
+            raise RateLimitExceeded(failed_lim)
+
+        if granted > cost:
+            self._store_lease(
+                keys,
+                _Lease(
+                    tokens=granted - cost,
+                    expires_at=self._clock() + max(min_reset, 0),
+                    remaining=remaining,
+                    reset_seconds=reset,
+                ),
+            )
+
+
+limiter = BatchedLimiter(
     key_func=client_ip_key,
     default_limits=[f"{settings.RATE_LIMIT_PER_MINUTE}/minute"],
     storage_uri=settings.REDIS_URL,
+    # degraded mode: Redis down -> slowapi switches to per-worker in-memory counters until it recovers
+    in_memory_fallback_enabled=True,
+    lease_min_limit=settings.RATE_LIMIT_LOCAL_LEASE_MIN_LIMIT,
+    lease_fraction=settings.RATE_LIMIT_LOCAL_LEASE_FRACTION,
 )
 
 
@@ -1,11 +1,14 @@
+import copy
+from collections.abc import Iterable, Mapping
 from email.message import EmailMessage
 from email.utils import make_msgid
+from pathlib import Path
 
 from loguru import logger
 
 from app.backend.config.settings import get_settings
-from app.backend.utils.mail_template import reset_password_email_html, verification_email_html
-from app.backend.utils.mailer import send_email
+from app.backend.utils.mail_template import CompiledTemplate, reset_password_email_html, verification_email_html
+from app.backend.utils.mailer import send_email, send_emails
 
 settings = get_settings()
 
@@ -15,6 +18,113 @@ settings = get_settings()
 LOGO_PATH = settings.LOGO_PATH
 
 
+# -----------------------------
+# INLINE LOGO (cached MIME part)
+# -----------------------------
+class InlineLogo:
+    """
+    Logo read from disk once per process.
+    The base64-encoded MIME part is built once and copied into every message;
+    a CID only has to be unique within one message, so it is fixed per process.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.cid = make_msgid(domain="pwndepot.local")  # "<xxxx@pwndepot.local>"
+        self._part: EmailMessage | None = None
+        self._loaded = False
+
+    @property
+    def cid_ref(self) -> str:
+        # value used in HTML: cid:xxxx@pwndepot.local
+        return self.cid[1:-1]
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.path.exists():
+            logger.warning(f"Logo not found: {self.path}")
+            return
+
+        part = EmailMessage()
+        part.set_content(
+            self.path.read_bytes(),
+            maintype="image",
+            subtype="png",
+            cid=self.cid,
+            disposition="inline",
+            filename="pwndepot.png",  # helps some clients
+        )
+        self._part = part
+
+    def attach(self, msg: EmailMessage) -> None:
+        """
+        Attach the logo to the HTML alternative (payload[1]) as multipart/related.
+        """
+        if not self._loaded:
+            self._load()
+        if self._part is None:
+            return
+
+        html_part = msg.get_payload()[1]
+        html_part.make_related()
+        html_part.attach(copy.copy(self._part))  # shallow copy: encoded payload is shared
+
+    def clear(self) -> None:
+        self._part = None
+        self._loaded = False
+
+
+logo = InlineLogo(LOGO_PATH)
+
+
+def build_html_email(*, to: str, subject: str, text: str, html: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = settings.MAIL_FROM
+    msg["To"] = to
+
+    msg.set_content(text)
+    msg.add_alternative(html, subtype="html")
+    logo.attach(msg)
+    return msg
+
+
+def render_batch(
+    *,
+    subject: str,
+    text: CompiledTemplate,
+    html: CompiledTemplate,
+    recipients: Iterable[Mapping[str, object]],
+) -> list[EmailMessage]:
+    """
+    Render one message per recipient row (must contain "to" plus the template fields).
+    Templates are already compiled and the logo part is cached, so this does no disk I/O.
+    """
+    msgs: list[EmailMessage] = []
+    for row in recipients:
+        values = {**row, "logo_cid": logo.cid_ref}
+        msgs.append(
+            build_html_email(
+                to=str(row["to"]),
+                subject=subject,
+                text=text.render(**values),
+                html=html.render(**values),
+            )
+        )
+    return msgs
+
+
+async def send_bulk_email(
+    *,
+    subject: str,
+    text: CompiledTemplate,
+    html: CompiledTemplate,
+    recipients: Iterable[Mapping[str, object]],
+) -> int:
+    msgs = render_batch(subject=subject, text=text, html=html, recipients=recipients)
+    return await send_emails(msgs)
+
+
 # -----------------------------
 # CONTACT EMAIL
 # -----------------------------
@@ -22,7 +132,7 @@ def _strip_crlf(s: str) -> str:
     return s.replace("\r", "").replace("\n", "")
 
 
-def send_contact_email(*, name: str, email: str, message: str) -> bool:
+async def send_contact_email(*, name: str, email: str, message: str) -> bool:
     name = _strip_crlf(name)
     email = _strip_crlf(email)
     msg = EmailMessage()
@@ -44,94 +154,59 @@ Message:
 """
     )
 
-    return send_email(msg)
+    return await send_email(msg)
 
 
 # -----------------------------
 # VERIFICATION EMAIL (HTML + CID)
 # -----------------------------
-def send_verification_email(email: str, token: str) -> bool:
-    verify_url = f"{settings.FRONTEND_DOMAIN}/verify-email?token={token}"
-
-    msg = EmailMessage()
-    msg["Subject"] = "Verify your email address"
-    msg["From"] = settings.MAIL_FROM
-    msg["To"] = email
-
-    msg.set_content(
-        f"""Please verify your email address by clicking the link below:
+_VERIFICATION_TEXT = CompiledTemplate(
+    """Please verify your email address by clicking the link below:
 
 {verify_url}
 
 This link expires in 24 hours.
 If you didn't create an account, you can safely ignore this email.
-"""
-    )
+""",
+    escape=format,
+)
 
-    # --- generate proper CID ---
-    logo_cid = make_msgid(domain="pwndepot.local")  # returns like "<xxxx@pwndepot.local>"
-    logo_cid_no_brackets = logo_cid[1:-1]  # "xxxx@pwndepot.local"
-
-    # HTML with correct cid reference
-    msg.add_alternative(
-        verification_email_html(verify_url, logo_cid=logo_cid_no_brackets),
-        subtype="html",
-    )
-
-    # Attach inline image to the HTML part (payload[1])
-    if LOGO_PATH.exists():
-        with open(LOGO_PATH, "rb") as img:
-            msg.get_payload()[1].add_related(
-                img.read(),
-                maintype="image",
-                subtype="png",
-                cid=logo_cid,  # IMPORTANT: pass with < >
-                disposition="inline",
-                filename="pwndepot.png",  # helps some clients
-            )
-        logger.info(f"Inline logo attached with CID={logo_cid}")
-    else:
-        logger.warning(f"Logo not found: {LOGO_PATH}")
-
-    return send_email(msg)
 
+async def send_verification_email(email: str, token: str) -> bool:
+    verify_url = f"{settings.FRONTEND_DOMAIN}/verify-email?token={token}"
 
-def send_reset_password_email(email: str, token: str) -> bool:
-    reset_url = f"{settings.FRONTEND_DOMAIN}/reset-password?token={token}"
+    msg = build_html_email(
+        to=email,
+        subject="Verify your email address",
+        text=_VERIFICATION_TEXT.render(verify_url=verify_url),
+        html=verification_email_html(verify_url, logo_cid=logo.cid_ref),
+    )
+    return await send_email(msg)
 
-    msg = EmailMessage()
-    msg["Subject"] = "Reset your password"
-    msg["From"] = settings.MAIL_FROM
-    msg["To"] = email
 
-    msg.set_content(
-        f"""A password reset was requested.
+# -----------------------------
+# RESET PASSWORD EMAIL (HTML + CID)
+# -----------------------------
+_RESET_PASSWORD_TEXT = CompiledTemplate(
+    """A password reset was requested.
 
 Reset your password using this link:
 {reset_url}
 
 This link expires in 1 hour.
 If you did not request this, ignore this email.
-"""
-    )
+""",
+    escape=format,
+)
 
-    logo_cid = make_msgid(domain="pwndepot.local")
-    logo_cid_no_brackets = logo_cid[1:-1]
 
-    msg.add_alternative(
-        reset_password_email_html(reset_url, logo_cid_no_brackets),
-        subtype="html",
-    )
-
-    if LOGO_PATH.exists():
-        with open(LOGO_PATH, "rb") as img:
-            msg.get_payload()[1].add_related(
-                img.read(),
-                maintype="image",
-                subtype="png",
-                cid=logo_cid,
-                disposition="inline",
-                filename="pwndepot.png",
-            )
+async def send_reset_password_email(email: str, token: str) -> bool:
+    reset_url = f"{settings.FRONTEND_DOMAIN}/reset-password?token={token}"
 
-    return send_email(msg)
+    msg = build_html_email(
+        to=email,
+        subject="Reset your password",
+        text=_RESET_PASSWORD_TEXT.render(reset_url=reset_url),
+        html=reset_password_email_html(reset_url, logo.cid_ref),
+    )
+    return await send_email(msg)
@@ -1,4 +1,6 @@
 import html
+from collections.abc import Callable, Iterable, Mapping
+from string import Formatter
 
 from app.backend.config.settings import get_settings
 
@@ -16,12 +18,58 @@ def _e(v) -> str:
 settings = get_settings()
 
 
-def verification_email_html(verify_url: str, logo_cid: str) -> str:
-    # --- HTML escaping (CRITICAL) ---
-    verify_url = _e(verify_url)
-    logo_cid = _e(logo_cid)
+class CompiledTemplate:
+    """
+    Template parsed once into literal fragments and field slots.
+    render() only escapes the field values and joins the precomputed fragments.
+    `static` fields are trusted fragments substituted once at compile time (not escaped).
+    """
 
-    return f"""
+    __slots__ = ("_escape", "_fields", "_literals")
+
+    def __init__(self, source: str, *, escape: Callable[[object], str] = _e, **static: str) -> None:
+        literals: list[str] = []
+        fields: list[str] = []
+        current: list[str] = []
+
+        for text, field, _spec, _conv in Formatter().parse(source):
+            current.append(text)
+            if field is None:
+                continue
+            if field in static:
+                current.append(static[field])
+                continue
+            literals.append("".join(current))
+            fields.append(field)
+            current = []
+
+        literals.append("".join(current))
+        self._literals = tuple(literals)
+        self._fields = tuple(fields)
+        self._escape = escape
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return self._fields
+
+    def render(self, **values) -> str:
+        esc = self._escape
+        lits = self._literals
+        out = [lits[0]]
+        for i, name in enumerate(self._fields, start=1):
+            out.append(esc(values[name]))
+            out.append(lits[i])
+        return "".join(out)
+
+    def render_many(self, rows: Iterable[Mapping[str, object]]) -> list[str]:
+        return [self.render(**row) for row in rows]
+
+
+# -----------------------------
+# VERIFICATION
+# -----------------------------
+_VERIFICATION_HTML = CompiledTemplate(
+    """
 <!DOCTYPE html>
 <html>
 <head>
@@ -126,14 +174,18 @@ def verification_email_html(verify_url: str, logo_cid: str) -> str:
 </body>
 </html>
 """
+)
 
 
-def reset_password_email_html(reset_url: str, logo_cid: str) -> str:
-    # --- HTML escaping (CRITICAL) ---
-    reset_url = _e(reset_url)
-    logo_cid = _e(logo_cid)
+def verification_email_html(verify_url: str, logo_cid: str) -> str:
+    return _VERIFICATION_HTML.render(verify_url=verify_url, logo_cid=logo_cid)
 
-    return f"""
+
+# -----------------------------
+# RESET PASSWORD
+# -----------------------------
+_RESET_PASSWORD_HTML = CompiledTemplate(
+    """
 <!DOCTYPE html>
 <html>
 <body style="background:#ffffff;font-family:Consolas, monospace;">
@@ -200,55 +252,17 @@ Link expires in 1 hour
 </body>
 </html>
 """
+)
 
 
-def backup_code_used_email_html(
-    *,
-    username: str,
-    ip: str,
-    country: str | None,
-    user_agent: str,
-    time: str,
-    logo_cid: str,
-    is_admin: bool = False,
-) -> str:
-    geo = _e(country) if country else "Unknown"
-
-    # escape everything in HTML context
-    username = _e(username)
-    ip = _e(ip)
-    user_agent = _e(user_agent)
-    time = _e(time)
-    logo_cid = _e(logo_cid)
+def reset_password_email_html(reset_url: str, logo_cid: str) -> str:
+    return _RESET_PASSWORD_HTML.render(reset_url=reset_url, logo_cid=logo_cid)
 
-    border = "#fbbf24" if not is_admin else "#dc2626"
-    title = "BACKUP CODE USED" if not is_admin else "ADMIN BACKUP CODE USED"
 
-    if not is_admin:
-        action = f"""
-        <p style="color:#f87171;font-size:12px;margin-top:20px">
-          If this wasn't you,
-          <a href="{settings.FRONTEND_DOMAIN}/reset-password"
-             style="color:#f87171;text-decoration:underline">
-            reset your password immediately</a>
-          and regenerate backup codes.
-        </p>
-        """
-    else:
-        action = """
-        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
-          Immediate security action required:<br/>
-          • Revoke all active sessions<br/>
-          • Rotate credentials<br/>
-          • Regenerate MFA backup codes<br/>
-          • Review audit logs
-        </p>
-        <p style="color:#f87171;font-size:11px">
-          No password reset links are included for admin accounts.
-        </p>
-        """
-
-    return f"""
+# -----------------------------
+# BACKUP CODE USED
+# -----------------------------
+_BACKUP_CODE_USED_SRC = """
 <!DOCTYPE html>
 <html>
 <body style="background:#ffffff;font-family:Consolas, monospace;">
@@ -298,8 +312,40 @@ Time: {time}
 </html>
 """
 
+_BACKUP_CODE_USER_ACTION = f"""
+        <p style="color:#f87171;font-size:12px;margin-top:20px">
+          If this wasn't you,
+          <a href="{settings.FRONTEND_DOMAIN}/reset-password"
+             style="color:#f87171;text-decoration:underline">
+            reset your password immediately</a>
+          and regenerate backup codes.
+        </p>
+        """
+
+_BACKUP_CODE_ADMIN_ACTION = """
+        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
+          Immediate security action required:<br/>
+          • Revoke all active sessions<br/>
+          • Rotate credentials<br/>
+          • Regenerate MFA backup codes<br/>
+          • Review audit logs
+        </p>
+        <p style="color:#f87171;font-size:11px">
+          No password reset links are included for admin accounts.
+        </p>
+        """
 
-def mfa_reset_email_html(
+_BACKUP_CODE_USED_HTML = {
+    False: CompiledTemplate(
+        _BACKUP_CODE_USED_SRC, border="#fbbf24", title="BACKUP CODE USED", action=_BACKUP_CODE_USER_ACTION
+    ),
+    True: CompiledTemplate(
+        _BACKUP_CODE_USED_SRC, border="#dc2626", title="ADMIN BACKUP CODE USED", action=_BACKUP_CODE_ADMIN_ACTION
+    ),
+}
+
+
+def backup_code_used_email_html(
     *,
     username: str,
     ip: str,
@@ -307,16 +353,23 @@ def mfa_reset_email_html(
     user_agent: str,
     time: str,
     logo_cid: str,
+    is_admin: bool = False,
 ) -> str:
-    # escape everything in HTML context
-    username = _e(username)
-    ip = _e(ip)
-    user_agent = _e(user_agent)
-    time = _e(time)
-    geo = _e(country) if country else "Unknown"
-    logo_cid = _e(logo_cid)
-
-    return f"""
+    return _BACKUP_CODE_USED_HTML[is_admin].render(
+        username=username,
+        ip=ip,
+        geo=country or "Unknown",
+        user_agent=user_agent,
+        time=time,
+        logo_cid=logo_cid,
+    )
+
+
+# -----------------------------
+# MFA RESET
+# -----------------------------
+_MFA_RESET_HTML = CompiledTemplate(
+    """
 <!DOCTYPE html>
 <html>
 <body style="background:#ffffff;font-family:Consolas, monospace;">
@@ -366,9 +419,10 @@ If this wasn't you, secure your account immediately.
 </body>
 </html>
 """
+)
 
 
-def new_device_login_email_html(
+def mfa_reset_email_html(
     *,
     username: str,
     ip: str,
@@ -376,45 +430,21 @@ def new_device_login_email_html(
     user_agent: str,
     time: str,
     logo_cid: str,
-    is_admin: bool = False,
 ) -> str:
-    # escape everything in HTML context
-    username = _e(username)
-    ip = _e(ip)
-    user_agent = _e(user_agent)
-    time = _e(time)
-    geo = _e(country) if country else "Unknown"
-    logo_cid = _e(logo_cid)
-    border = "#38bdf8" if not is_admin else "#fb7185"
-    subtitle = (
-        "A new device was used to access your account."
-        if not is_admin
-        else "An ADMIN account was accessed from a new device."
+    return _MFA_RESET_HTML.render(
+        username=username,
+        ip=ip,
+        geo=country or "Unknown",
+        user_agent=user_agent,
+        time=time,
+        logo_cid=logo_cid,
     )
 
-    if not is_admin:
-        action = f"""
-        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
-          If this wasn't you,
-          <a href="{settings.FRONTEND_DOMAIN}/reset-password"
-             style="color:#f87171;text-decoration:underline">
-          reset your password immediately.</a>
-        </p>
-        """
-    else:
-        action = """
-        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
-          If this wasn't you:<br/>
-          • Revoke sessions immediately<br/>
-          • Rotate credentials<br/>
-          • Review audit logs
-        </p>
-        <p style="color:#f87171;font-size:11px">
-          No recovery links are included for admin accounts.
-        </p>
-        """
 
-    return f"""
+# -----------------------------
+# NEW DEVICE LOGIN
+# -----------------------------
+_NEW_DEVICE_LOGIN_SRC = """
 <!DOCTYPE html>
 <html>
 <body style="background:#ffffff;font-family:Consolas, monospace;">
@@ -461,3 +491,59 @@ Time: {time}
 </body>
 </html>
 """
+
+_NEW_DEVICE_USER_ACTION = f"""
+        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
+          If this wasn't you,
+          <a href="{settings.FRONTEND_DOMAIN}/reset-password"
+             style="color:#f87171;text-decoration:underline">
+          reset your password immediately.</a>
+        </p>
+        """
+
+_NEW_DEVICE_ADMIN_ACTION = """
+        <p style="color:#fca5a5;font-size:12px;margin-top:20px">
+          If this wasn't you:<br/>
+          • Revoke sessions immediately<br/>
+          • Rotate credentials<br/>
+          • Review audit logs
+        </p>
+        <p style="color:#f87171;font-size:11px">
+          No recovery links are included for admin accounts.
+        </p>
+        """
+
+_NEW_DEVICE_LOGIN_HTML = {
+    False: CompiledTemplate(
+        _NEW_DEVICE_LOGIN_SRC,
+        border="#38bdf8",
+        subtitle="A new device was used to access your account.",
+        action=_NEW_DEVICE_USER_ACTION,
+    ),
+    True: CompiledTemplate(
+        _NEW_DEVICE_LOGIN_SRC,
+        border="#fb7185",
+        subtitle="An ADMIN account was accessed from a new device.",
+        action=_NEW_DEVICE_ADMIN_ACTION,
+    ),
+}
+
+
+def new_device_login_email_html(
+    *,
+    username: str,
+    ip: str,
+    country: str | None,
+    user_agent: str,
+    time: str,
+    logo_cid: str,
+    is_admin: bool = False,
+) -> str:
+    return _NEW_DEVICE_LOGIN_HTML[is_admin].render(
+        username=username,
+        ip=ip,
+        geo=country or "Unknown",
+        user_agent=user_agent,
+        time=time,
+        logo_cid=logo_cid,
+    )
@@ -1,28 +1,396 @@
+import asyncio
+import contextlib
+import email
+import email.policy
+import os
 import smtplib
+import socket
 import time
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
 from smtplib import SMTPException
 
+import redis.asyncio as redis
+from loguru import logger
+
+from app.backend.config.redis import redis_client
 from app.backend.config.settings import get_settings
+from app.backend.utils.metrics import metrics
 
 settings = get_settings()
 
+OUTBOX_STREAM = "ctf:mail:outbox"
+DEAD_LETTER_STREAM = "ctf:mail:dead"
+CONSUMER_GROUP = "mailer"
+
+
+# -----------------------------
+# SMTP (persistent connection)
+# -----------------------------
+class SMTPSender:
+    """
+    Persistent SMTP connection owned by one dedicated thread.
+    - opened lazily, reused for every message of every batch
+    - re-opened after a disconnect, or proactively after idle_reconnect seconds without traffic
+    smtplib is blocking, so all socket work happens in the executor, never on the event loop.
+    """
+
+    def __init__(
+        self,
+        host: str = settings.SMTP_HOST,
+        port: int = settings.SMTP_PORT,
+        *,
+        use_tls: bool = settings.SMTP_USE_TLS,
+        username: str | None = settings.SMTP_USERNAME,
+        password: str | None = settings.SMTP_PASSWORD,
+        timeout: float = 10,
+        idle_reconnect: float = settings.SMTP_IDLE_RECONNECT_SECONDS,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_reconnect = idle_reconnect
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp-sender")
+        self._conn: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    # ---- sync part (executor thread only) ----
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            with contextlib.suppress(Exception):
+                self._conn.quit()
+            with contextlib.suppress(Exception):
+                self._conn.close()
+        self._conn = None
+
+    def _ensure_conn(self) -> smtplib.SMTP:
+        if self._conn is not None and time.monotonic() - self._last_used > self.idle_reconnect:
+            # servers drop idle sessions; replace instead of failing the next message
+            self._close_sync()
+
+        if self._conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                conn.starttls()
+            if self.username and self.password:
+                conn.login(self.username, self.password)
+            self._conn = conn
+            self.connections_opened += 1
+            metrics.inc("mail.smtp_connections_opened")
+
+        return self._conn
+
+    def _send_one_sync(self, msg: EmailMessage) -> Exception | None:
+        for retry_on_fresh_conn in (True, False):
+            try:
+                self._ensure_conn().send_message(msg)
+                self._last_used = time.monotonic()
+                return None
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                self._close_sync()
+                if not retry_on_fresh_conn:
+                    return e
+            except SMTPException as e:
+                # message-level failure (e.g. recipient refused) - keep the session usable
+                with contextlib.suppress(Exception):
+                    self._conn.rset()
+                return e
+        return None
+
+    def _send_many_sync(self, msgs: list[EmailMessage]) -> list[Exception | None]:
+        return [self._send_one_sync(m) for m in msgs]
+
+    # ---- async API ----
+    async def send_many(self, msgs: list[EmailMessage]) -> list[Exception | None]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._send_many_sync, msgs)
+
+    async def send(self, msg: EmailMessage) -> bool:
+        (err,) = await self.send_many([msg])
+        return err is None
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_sync)
+
+
+# -----------------------------
+# OUTBOX (Redis stream)
+# -----------------------------
+class MailOutbox:
+    """
+    Transactional email outbox on a Redis stream.
+    Handlers only XADD (O(1)); a consumer group guarantees every message is
+    delivered by exactly one worker's dispatcher.
+    """
+
+    def __init__(self, r: redis.Redis | None = None) -> None:
+        self._r = r or redis_client
+
+    async def enqueue(self, msg: EmailMessage) -> str:
+        return await self._r.xadd(
+            OUTBOX_STREAM,
+            {"raw": msg.as_string()},
+            maxlen=settings.MAIL_OUTBOX_MAXLEN,
+            approximate=True,
+        )
+
+    async def enqueue_many(self, msgs: list[EmailMessage]) -> int:
+        pipe = self._r.pipeline(transaction=False)
+        for msg in msgs:
+            pipe.xadd(OUTBOX_STREAM, {"raw": msg.as_string()}, maxlen=settings.MAIL_OUTBOX_MAXLEN, approximate=True)
+        return len(await pipe.execute())
+
+    async def ensure_group(self) -> None:
+        try:
+            await self._r.xgroup_create(OUTBOX_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, consumer: str, *, count: int, block_ms: int) -> list[tuple[str, dict]]:
+        res = await self._r.xreadgroup(CONSUMER_GROUP, consumer, {OUTBOX_STREAM: ">"}, count=count, block=block_ms)
+        if not res:
+            return []
+        return list(res[0][1])
+
+    async def read_own_pending(self, consumer: str, *, count: int) -> list[tuple[str, dict]]:
+        """
+        Messages already delivered to this consumer but never acked (e.g. XACK failed).
+        Entries trimmed from the stream meanwhile come back with empty fields.
+        """
+        res = await self._r.xreadgroup(CONSUMER_GROUP, consumer, {OUTBOX_STREAM: "0"}, count=count)
+        if not res:
+            return []
+        return [(eid, fields or {}) for eid, fields in res[0][1]]
+
+    async def claim_stale(
+        self, consumer: str, *, min_idle_ms: int, count: int, start: str = "0-0"
+    ) -> tuple[str, list[tuple[str, dict]]]:
+        """
+        Take over messages left pending by a crashed/restarted worker, one batch from `start`.
+        Returns the cursor of the next batch ("0-0" once the pending list was scanned) and the
+        claimed entries.
+        """
+        res = await self._r.xautoclaim(OUTBOX_STREAM, CONSUMER_GROUP, consumer, min_idle_ms, start, count=count)
+        if not res:
+            return "0-0", []
+        cursor = res[0].decode() if isinstance(res[0], bytes) else str(res[0])
+        return cursor, [e for e in res[1] if e and e[1]]
+
+    async def ack(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        pipe = self._r.pipeline()
+        pipe.xack(OUTBOX_STREAM, CONSUMER_GROUP, *ids)
+        pipe.xdel(OUTBOX_STREAM, *ids)
+        await pipe.execute()
+
+    async def dead_letter(self, entry_id: str, raw: str, error: str) -> None:
+        await self._r.xadd(
+            DEAD_LETTER_STREAM,
+            {"raw": raw, "error": error[:500], "source_id": entry_id},
+            maxlen=settings.MAIL_OUTBOX_MAXLEN,
+            approximate=True,
+        )
+
+    async def depth(self) -> dict:
+        pipe = self._r.pipeline()
+        pipe.xlen(OUTBOX_STREAM)
+        pipe.xlen(DEAD_LETTER_STREAM)
+        queued, dead = await pipe.execute()
+        try:
+            pending = (await self._r.xpending(OUTBOX_STREAM, CONSUMER_GROUP)).get("pending", 0)
+        except redis.ResponseError:
+            pending = 0  # group not created yet
+        return {"queued": int(queued), "in_flight": int(pending), "dead": int(dead)}
+
+
+class MailDispatcher:
+    """
+    Dedicated async sender: drains the outbox in batches over one persistent SMTP
+    connection, retries failed messages with exponential backoff and moves
+    messages that keep failing to the dead-letter stream.
+    Messages left unacked (an ack that raised, a crashed worker) are picked up again by
+    `recover`, run at start and every MAIL_OUTBOX_CLAIM_IDLE_SECONDS.
+    """
+
+    def __init__(self, outbox: MailOutbox, sender: SMTPSender, *, consumer: str | None = None) -> None:
+        self.outbox = outbox
+        self.sender = sender
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_attempts = settings.SMTP_MAX_RETRIES
+        self.retry_delay = settings.SMTP_RETRY_DELAY_SECONDS
+        self.batch_size = settings.MAIL_OUTBOX_BATCH_SIZE
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    async def deliver(self, entries: list[tuple[str, dict]]) -> None:
+        pending: list[tuple[str, str, EmailMessage]] = []
+        for entry_id, fields in entries:
+            raw = fields.get("raw", "")
+            pending.append((entry_id, raw, email.message_from_string(raw, policy=email.policy.default)))
+
+        errors: dict[str, Exception] = {}
+        for attempt in range(1, self.max_attempts + 1):
+            results = await self.sender.send_many([m for _, _, m in pending])
+
+            done = [eid for (eid, _, _), err in zip(pending, results, strict=True) if err is None]
+            await self.outbox.ack(done)
+            metrics.inc("mail.sent", len(done))
+
+            failed = [(item, err) for item, err in zip(pending, results, strict=True) if err is not None]
+            if not failed:
+                return
+
+            pending = [item for item, _ in failed]
+            errors = {item[0]: err for item, err in failed}
+            metrics.inc("mail.retries", len(pending))
+
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        for entry_id, raw, _ in pending:
+            logger.error(f"Mail {entry_id} dead-lettered after {self.max_attempts} attempts: {errors.get(entry_id)}")
+            await self.outbox.dead_letter(entry_id, raw, str(errors.get(entry_id)))
+        await self.outbox.ack([eid for eid, _, _ in pending])
+        metrics.inc("mail.dead_lettered", len(pending))
+
+    async def recover(self) -> int:
+        """
+        Delivers what is pending without having been acked: first this consumer's own entries
+        (a deliver / ack that raised), then those idle for MAIL_OUTBOX_CLAIM_IDLE_SECONDS on
+        any consumer (a crashed worker), scanning the whole pending list. Returns the count.
+        """
+        recovered = 0
+        while entries := await self.outbox.read_own_pending(self.consumer, count=self.batch_size):
+            if gone := [eid for eid, fields in entries if not fields]:
+                await self.outbox.ack(gone)  # trimmed from the stream: nothing left to send
+            if live := [(eid, fields) for eid, fields in entries if fields]:
+                await self.deliver(live)
+            recovered += len(live)
+
+        cursor = "0-0"
+        while True:
+            cursor, stale = await self.outbox.claim_stale(
+                self.consumer,
+                min_idle_ms=settings.MAIL_OUTBOX_CLAIM_IDLE_SECONDS * 1000,
+                count=self.batch_size,
+                start=cursor,
+            )
+            if stale:
+                await self.deliver(stale)
+                recovered += len(stale)
+            if cursor == "0-0":
+                break
+
+        if recovered:
+            metrics.inc("mail.recovered", recovered)
+        return recovered
 
-def send_email(msg: EmailMessage) -> bool:
-    for attempt in range(1, settings.SMTP_MAX_RETRIES + 1):
+    async def _run_once(self) -> None:
+        await self.outbox.ensure_group()
+
+        next_recover = 0.0
+        while not self._stop_event.is_set():
+            if time.monotonic() >= next_recover:
+                await self.recover()
+                next_recover = time.monotonic() + settings.MAIL_OUTBOX_CLAIM_IDLE_SECONDS
+
+            entries = await self.outbox.read(self.consumer, count=self.batch_size, block_ms=5000)
+            if entries:
+                await self.deliver(entries)
+
+    async def run_forever(self) -> None:
+        backoff = 1.0
         try:
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=10) as server:
-                if settings.SMTP_USE_TLS:
-                    server.starttls()
+            while not self._stop_event.is_set():
+                try:
+                    await self._run_once()
+                    backoff = 1.0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Mail dispatcher error, retrying: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+        finally:
+            with contextlib.suppress(Exception):
+                await self.sender.close()
+            logger.info("Mail dispatcher stopped")
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+
+mail_outbox = MailOutbox()
+smtp_sender = SMTPSender()
+metrics.register_collector("mail_outbox", mail_outbox.depth)
+
+
+async def send_email(msg: EmailMessage) -> bool:
+    """
+    Enqueue a message for the dispatcher (O(1) for the request handler).
+    If Redis is unavailable the message is sent directly so it is not lost.
+    """
+    try:
+        await mail_outbox.enqueue(msg)
+        metrics.inc("mail.enqueued")
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Mail outbox unavailable, sending directly: {e}")
+        metrics.inc("mail.direct_fallback")
+        return await smtp_sender.send(msg)
+
+
+async def send_emails(msgs: list[EmailMessage]) -> int:
+    """
+    Enqueue a batch in one pipelined round trip; returns how many were accepted.
+    """
+    if not msgs:
+        return 0
+    try:
+        n = await mail_outbox.enqueue_many(msgs)
+        metrics.inc("mail.enqueued", n)
+        return n
+    except redis.RedisError as e:
+        logger.warning(f"Mail outbox unavailable, sending batch directly: {e}")
+        metrics.inc("mail.direct_fallback", len(msgs))
+        results = await smtp_sender.send_many(msgs)
+        return sum(1 for err in results if err is None)
+
+
+# ---- singleton dispatcher + functions for main.py ----
+_dispatcher: MailDispatcher | None = None
+
 
-                if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
-                    server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+async def start_mail_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = MailDispatcher(mail_outbox, smtp_sender)
+    await _dispatcher.start()
 
-                server.send_message(msg)
-                return True
 
-        except (SMTPException, OSError):
-            if attempt < settings.SMTP_MAX_RETRIES:
-                time.sleep(settings.SMTP_RETRY_DELAY_SECONDS)
-            else:
-                return False
+async def stop_mail_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is None:
+        return
+    await _dispatcher.stop()
+    _dispatcher = None
@@ -0,0 +1,69 @@
+# app/backend/utils/metrics.py
+from __future__ import annotations
+
+import inspect
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from loguru import logger
+
+Collector = Callable[[], dict[str, Any] | Awaitable[dict[str, Any]]]
+
+
+class Metrics:
+    """
+    Tiny per-worker metrics registry (no external exporter).
+    - counters: monotonically increasing ints
+    - gauges: last written value
+    - timings: count / sum / max per name (seconds)
+    - collectors: callables evaluated on snapshot (for live values like queue depth)
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[str, int] = defaultdict(int)
+        self._gauges: dict[str, float] = {}
+        self._timings: dict[str, dict[str, float]] = {}
+        self._collectors: dict[str, Collector] = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        t = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        t["count"] += 1
+        t["sum"] += seconds
+        t["max"] = max(t["max"], seconds)
+
+    def register_collector(self, name: str, fn: Collector) -> None:
+        self._collectors[name] = fn
+
+    async def snapshot(self) -> dict[str, Any]:
+        collected: dict[str, Any] = {}
+        for name, fn in self._collectors.items():
+            try:
+                res = fn()
+                if inspect.isawaitable(res):
+                    res = await res
+                collected[name] = res
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                collected[name] = {"error": str(e)}
+
+        return {
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+            "timings": {k: dict(v) for k, v in self._timings.items()},
+            "collectors": collected,
+        }
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._gauges.clear()
+        self._timings.clear()
+
+
+metrics = Metrics()
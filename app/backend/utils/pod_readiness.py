@@ -0,0 +1,91 @@
+# app/backend/utils/pod_readiness.py
+from __future__ import annotations
+
+import contextlib
+from datetime import datetime, timezone
+
+from kubernetes import client
+from loguru import logger
+
+from app.backend.config.redis import REDIS_DOWN_ERRORS
+from app.backend.utils.ctf_redis import ctf_redis_bus
+from app.backend.utils.k8s_informer import ResourceInformer
+from app.backend.utils.metrics import metrics
+from app.backend.utils.redis_bus import RedisBus
+from app.backend.utils.team_instance_store import STATUS_RUNNING, STATUS_STARTING, STATUS_WAKING, TeamInstanceStore
+from app.backend.utils.warm_pool import pod_is_ready
+
+
+class PodReadinessWatcher:
+    """
+    Moves team instances from `starting` (or `waking`, a hibernated instance whose pod was
+    recreated) to `running` once their pod reports Ready.
+    - handler on the pod informer (watch cache), so it sees every pod change and every re-list
+    - a Ready pod whose uid is the one stored in the instance record (`pod_uid`) flips it
+      starting -> running with a compare-and-set, so every worker can run a watcher
+    - the worker whose transition applied records `instance.startup_seconds` and publishes
+      `instance_ready` to the owning team's SSE streams
+    A pod can be Ready before the spawn stored its uid: the spawn calls `notify_spawned`
+    afterwards. A claimed warm pod only turns Ready once its flag file holds the claimed flag
+    (see WarmPool), so the instance is never running while the app has no flag yet.
+    """
+
+    def __init__(
+        self,
+        pods: ResourceInformer,
+        *,
+        store: TeamInstanceStore | None = None,
+        bus: RedisBus | None = None,
+    ) -> None:
+        self.pods = pods
+        self._store = store or TeamInstanceStore()
+        self._bus = bus or ctf_redis_bus
+        self._promoted = 0
+        pods.add_handler(self._on_pod)
+
+    async def notify_spawned(self, team_id: int, challenge_id: int) -> dict | None:
+        """
+        Called once the spawn stored the pod uid: promotes right away if that pod is already
+        Ready. Returns the running record, or None (the watch promotes it later).
+        """
+        for pod in self.pods.select(team=team_id, challenge=challenge_id):
+            if pod_is_ready(pod) and (record := await self._promote(team_id, challenge_id, pod.metadata.uid)):
+                return record
+        return None
+
+    async def _promote(self, team_id: int, challenge_id: int, uid: str) -> dict | None:
+        inst = await self._store.get(team_id, challenge_id)
+        if not inst or inst.get("status") not in (STATUS_STARTING, STATUS_WAKING) or inst.get("pod_uid") != uid:
+            return None  # not spawned yet, already running, or an older pod of the same instance
+
+        applied, record = await self._store.transition(
+            team_id, challenge_id, from_status=(STATUS_STARTING, STATUS_WAKING), to_status=STATUS_RUNNING
+        )
+        if not applied:
+            return None  # another worker was faster, or terminated meanwhile
+
+        self._promoted += 1
+        startup = None
+        with contextlib.suppress(KeyError, ValueError):
+            started = datetime.fromisoformat(record["started_at"])
+            startup = round((datetime.now(timezone.utc) - started).total_seconds(), 3)
+            metrics.observe("instance.startup_seconds", startup)
+
+        with contextlib.suppress(*REDIS_DOWN_ERRORS):
+            await self._bus.publish(
+                "instance_ready",
+                {"challenge_id": challenge_id, "status": STATUS_RUNNING, "startup_seconds": startup},
+                team_id=team_id,
+            )
+        logger.info(f"Instance t{team_id}-c{challenge_id} ready after {startup}s")
+        return record
+
+    async def _on_pod(self, event_type: str, pod: client.V1Pod) -> None:
+        labels = pod.metadata.labels or {}
+        if "team" not in labels or "challenge" not in labels:
+            return  # unclaimed warm pool pod / legacy per-user pod
+        if event_type != "DELETED" and pod_is_ready(pod):
+            await self._promote(int(labels["team"]), int(labels["challenge"]), pod.metadata.uid)
+
+    def stats(self) -> dict:
+        return {"promoted": self._promoted}
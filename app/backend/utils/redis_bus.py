@@ -8,23 +8,37 @@ import redis.asyncio as redis
 
 
 class RedisBus:
-    def __init__(self, redis_url: str, channel: str = "ctf:sse") -> None:
+    """
+    Publishes SSE events to a Redis channel.
+    With an injected client (the shared registry client) the bus never closes it;
+    otherwise it owns a client created from redis_url.
+    """
+
+    def __init__(
+        self, redis_url: str | None = None, channel: str = "ctf:sse", *, client: redis.Redis | None = None
+    ) -> None:
         self.redis_url = redis_url
         self.channel = channel
-        self._r: redis.Redis | None = None
+        self._r: redis.Redis | None = client
+        self._owns_client = client is None
 
     async def connect(self) -> None:
         if self._r is None:
             self._r = redis.from_url(self.redis_url, decode_responses=True)
 
     async def close(self) -> None:
-        if self._r is not None:
-            await self._r.close()
+        if self._r is not None and self._owns_client:
+            await self._r.aclose()
             self._r = None
 
-    async def publish(self, event: str, data: Any | None = None) -> None:
+    async def publish(self, event: str, data: Any | None = None, *, team_id: int | None = None) -> None:
+        """
+        With `team_id` the event is delivered to that team's SSE streams only.
+        """
         await self.connect()
         payload = {"event": event, "data": data}
+        if team_id is not None:
+            payload["team_id"] = team_id
         msg = json.dumps(payload, separators=(",", ":"))
         # publish to redis channel
         await self._r.publish(self.channel, msg)
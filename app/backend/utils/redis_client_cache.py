@@ -0,0 +1,232 @@
+# app/backend/utils/redis_client_cache.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import redis.asyncio as aioredis
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+# key families read on (almost) every request and written only on spawn / extend / terminate
+TRACKED_PREFIXES = (
+    "ctf:token:http:",
+    "ctf:instance:team:",
+    "ctf:flag:team:",
+)
+
+_MISSING = object()
+
+
+class RedisClientCache:
+    """
+    Per-worker copy of hot Redis keys, kept coherent by RESP3 server-assisted invalidation.
+    - one dedicated connection runs `CLIENT TRACKING ON BCAST PREFIX ...` for TRACKED_PREFIXES;
+      Redis pushes an `invalidate` message whenever a key under those prefixes is written,
+      deleted or expires (by any worker / any process)
+    - reads go through `get(key, loader)`: served from memory while the tracking connection is
+      up, otherwise passed straight to Redis (no stale reads while invalidations may be missed)
+    - the whole copy is dropped whenever the tracking connection is (re)established
+    - bounded LRU with a TTL as a safety net
+    Opt-in (REDIS_CLIENT_CACHE_ENABLED); when disabled or not started every read goes to Redis.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        prefixes: tuple[str, ...] = TRACKED_PREFIXES,
+        enabled: bool = True,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 60.0,
+        ping_interval: float = 15.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.url = url
+        self.prefixes = prefixes
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.ping_interval = ping_interval
+        self._clock = clock
+
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # bumped on every invalidation: a load that raced with one is not stored
+        self._epoch = 0
+        self._tracking = False
+        self._pushed = False
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self._tracking
+
+    def _tracked(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Cached value of `key`, or `await loader()` (the actual Redis read) on a miss.
+        Missing keys (None / empty hash) are cached too, creation invalidates them.
+        """
+        if not self.active or not self._tracked(key):
+            return await loader()
+
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires_at, value = entry
+            if self._clock() < expires_at:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                metrics.inc("redis_cache.hit")
+                return value
+            del self._entries[key]
+
+        self._misses += 1
+        metrics.inc("redis_cache.miss")
+        epoch = self._epoch
+        value = await loader()
+        if self.active and epoch == self._epoch:
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        """
+        Drops keys written by this worker right away (read-your-writes), the
+        server's invalidation message for the same write arrives later.
+        """
+        self._epoch += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def flush(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+
+    async def _on_invalidate(self, message: list) -> None:
+        # ["invalidate", [key, ...]] or ["invalidate", None] (FLUSHDB / FLUSHALL)
+        self._pushed = True
+        self._invalidations += 1
+        keys = message[1] if len(message) > 1 else None
+        if keys is None:
+            self.flush()
+        else:
+            self.invalidate(*keys)
+        metrics.inc("redis_cache.invalidated", len(keys) if keys else 1)
+
+    async def _track_once(self) -> None:
+        pool = aioredis.ConnectionPool.from_url(
+            self.url,
+            protocol=3,  # invalidations are push messages on the same connection
+            decode_responses=True,
+            max_connections=1,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        )
+        conn = await pool.get_connection()
+        try:
+            conn._parser.set_invalidation_push_handler(self._on_invalidate)
+            prefix_args = [x for p in self.prefixes for x in ("PREFIX", p)]
+            await conn.send_command("CLIENT", "TRACKING", "ON", "BCAST", *prefix_args)
+            if await conn.read_response() != "OK":
+                raise aioredis.ConnectionError("CLIENT TRACKING was not enabled")
+
+            # anything cached before this point may have missed its invalidation
+            self.flush()
+            self._tracking = True
+            logger.info(f"Redis client-side cache tracking {len(self.prefixes)} key prefixes")
+
+            awaiting_pong = False
+            while not self._stop_event.is_set():
+                self._pushed = False
+                resp = await conn.read_response(timeout=self.ping_interval, push_request=True)
+                if resp == "PONG":
+                    awaiting_pong = False
+                elif resp is None and not self._pushed:
+                    # quiet interval: make sure the connection is still alive
+                    if awaiting_pong:
+                        raise aioredis.ConnectionError("tracking connection stopped answering")
+                    await conn.send_command("PING")
+                    awaiting_pong = True
+        finally:
+            self._tracking = False
+            self.flush()
+            with contextlib.suppress(Exception):
+                await pool.disconnect()
+
+    async def run_forever(self) -> None:
+        backoff = 1.0
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._track_once()
+                    backoff = 1.0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Redis client-side cache tracking lost, reads bypass the cache: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 10.0)
+        finally:
+            logger.info("Redis client-side cache stopped")
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "tracking": self._tracking,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self._invalidations,
+        }
+
+
+redis_cache = RedisClientCache(
+    settings.REDIS_URL,
+    enabled=settings.REDIS_CLIENT_CACHE_ENABLED,
+    max_entries=settings.REDIS_CLIENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.REDIS_CLIENT_CACHE_TTL_SECONDS,
+)
+metrics.register_collector("redis_client_cache", redis_cache.stats)
+
+
+async def start_redis_client_cache() -> None:
+    await redis_cache.start()
+
+
+async def stop_redis_client_cache() -> None:
+    await redis_cache.stop()
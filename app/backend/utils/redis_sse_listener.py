@@ -6,9 +6,8 @@ import contextlib
 import json
 import logging
 
-import redis.asyncio as redis
-
-from app.backend.config.settings import get_settings
+from app.backend.config.redis import PUBSUB, redis_registry
+from app.backend.utils.ctf_state_cache import ctf_state_cache
 from app.backend.utils.sse_bus import sse_bus
 
 log = logging.getLogger(__name__)
@@ -21,8 +20,7 @@ class RedisSSEListener:
     """
 
     def __init__(self) -> None:
-        settings = get_settings()
-        self.redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.redis = redis_registry.client(PUBSUB)
 
         self._task: asyncio.Task | None = None
         self._stop_event = asyncio.Event()
@@ -33,6 +31,9 @@ class RedisSSEListener:
 
         log.info("Redis SSE listener connected (channel: ctf:sse)")
 
+        # events may have been missed while disconnected
+        ctf_state_cache.invalidate()
+
         try:
             async for msg in pubsub.listen():
                 if self._stop_event.is_set():
@@ -46,12 +47,16 @@ class RedisSSEListener:
                     payload = json.loads(data_raw)
                     event = payload["event"]
                     data = payload.get("data")
+                    team_id = payload.get("team_id")
                 except Exception:
                     log.warning("Invalid redis message: %s", msg)
                     continue
 
+                if event == "ctf_changed":
+                    ctf_state_cache.invalidate()
+
                 # fan-out to local SSE clients
-                await sse_bus.broadcast(event, data)
+                await sse_bus.broadcast(event, data, team_id=team_id)
 
         finally:
             with contextlib.suppress(Exception):
@@ -74,8 +79,7 @@ class RedisSSEListener:
                     await asyncio.sleep(backoff)
                     backoff = min(backoff * 2, 10.0)
         finally:
-            with contextlib.suppress(Exception):
-                await self.redis.close()
+            # the pooled client is owned by redis_registry (closed at app shutdown)
             log.info("Redis SSE listener stopped")
 
     async def start(self) -> None:
@@ -1,12 +1,11 @@
-from email.message import EmailMessage
-from email.utils import make_msgid
-
 from loguru import logger
 
 from app.backend.config.settings import get_settings
 from app.backend.db.models import RoleEnum
 from app.backend.security.security_events import SecurityEventType
+from app.backend.utils.mail import build_html_email, logo
 from app.backend.utils.mail_template import (
+    CompiledTemplate,
     backup_code_used_email_html,
     mfa_reset_email_html,
     new_device_login_email_html,
@@ -14,14 +13,21 @@ from app.backend.utils.mail_template import (
 from app.backend.utils.mailer import send_email
 
 settings = get_settings()
-LOGO_PATH = settings.LOGO_PATH
 
+_SECURITY_TEXT = CompiledTemplate(
+    """
+Security notification for {username}
+
+Event: {event}
+IP address: {ip}
+User-Agent: {user_agent}
+Time: {time}
+""",
+    escape=format,
+)
 
-async def send_security_email(*, user, event: SecurityEventType, meta: dict) -> bool:
-    msg = EmailMessage()
-    msg["From"] = settings.MAIL_FROM
-    msg["To"] = user.email
 
+async def send_security_email(*, user, event: SecurityEventType, meta: dict) -> bool:
     # -----------------------------
     # SUBJECT + TEMPLATE SELECTION
     # -----------------------------
@@ -49,35 +55,27 @@ async def send_security_email(*, user, event: SecurityEventType, meta: dict) ->
         logger.warning(f"Unhandled security event: {event}")
         return False
 
-    msg["Subject"] = subject
-
     # -----------------------------
     # TEXT FALLBACK (ANTI-SPAM)
     # -----------------------------
-    msg.set_content(
-        f"""
-Security notification for {user.username}
-
-Event: {event}
-IP address: {meta.get("ip")}
-User-Agent: {meta.get("user_agent")}
-Time: {meta.get("time")}
-"""
+    text = _SECURITY_TEXT.render(
+        username=user.username,
+        event=event,
+        ip=meta.get("ip"),
+        user_agent=meta.get("user_agent"),
+        time=meta.get("time"),
     )
 
     # -----------------------------
     # HTML PART
     # -----------------------------
-    logo_cid = make_msgid(domain="pwndepot.local")
-    logo_cid_no_brackets = logo_cid[1:-1]
-
     kwargs = {
         "username": user.username,
         "ip": meta.get("ip"),
         "country": meta.get("country"),
         "user_agent": meta.get("user_agent"),
         "time": str(meta.get("time")),
-        "logo_cid": logo_cid_no_brackets,
+        "logo_cid": logo.cid_ref,
     }
 
     if html_builder in (
@@ -88,22 +86,9 @@ Time: {meta.get("time")}
 
     html = html_builder(**kwargs)
 
-    msg.add_alternative(html, subtype="html")
-
     # -----------------------------
-    # INLINE LOGO (CID)
+    # INLINE LOGO (CID) - cached part
     # -----------------------------
-    if LOGO_PATH.exists():
-        with open(LOGO_PATH, "rb") as img:
-            msg.get_payload()[1].add_related(
-                img.read(),
-                maintype="image",
-                subtype="png",
-                cid=logo_cid,
-                disposition="inline",
-                filename="pwndepot.png",
-            )
-    else:
-        logger.warning(f"Logo not found: {LOGO_PATH}")
+    msg = build_html_email(to=user.email, subject=subject, text=text, html=html)
 
-    return send_email(msg)
+    return await send_email(msg)
@@ -0,0 +1,120 @@
+# app/backend/utils/shared_instances.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import string
+from typing import Any
+
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from app.backend.config.settings import get_settings
+from app.backend.utils.challenge_profiles import ChallengeProfile, ManifestTemplate
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+# set by the token proxy on every request to a shared challenge (client values are dropped)
+FLAG_HEADER = "X-CTF-Flag"
+TEAM_HEADER = "X-CTF-Team"
+INJECTED_HEADERS = frozenset({FLAG_HEADER.lower(), TEAM_HEADER.lower()})
+
+_ALPHABET = string.ascii_letters + string.digits
+
+
+def shared_flag(challenge_id: int, team_id: int, *, length: int = 8, secret: str | None = None) -> str:
+    """
+    Flag of a team on a shared challenge: HMAC-SHA256 of (challenge, team) under
+    SHARED_FLAG_SECRET (the JWT secret when unset), in the alphabet / length of the random
+    per-instance flags. Every replica derives it without a lookup and a respawn keeps it.
+    """
+    key = (secret or settings.SHARED_FLAG_SECRET or settings.JWT_SECRET_KEY).encode()
+    digest = hmac.new(key, f"shared:{challenge_id}:{team_id}".encode(), hashlib.sha256).digest()
+    return "".join(_ALPHABET[b % len(_ALPHABET)] for b in digest[:length])
+
+
+def is_shared(challenge: Any, profile: ChallengeProfile) -> bool:
+    """
+    True when the challenge is served by a shared deployment: shared profile and HTTP (the flag
+    header needs the token proxy; a TCP challenge keeps a pod per team).
+    """
+    protocol = challenge.protocol.value if getattr(challenge, "protocol", None) else "http"
+    return profile.shared and protocol == "http"
+
+
+def shared_name(challenge_id: int) -> str:
+    return f"chal-shared-c{challenge_id}"
+
+
+def shared_labels(challenge_id: int) -> dict[str, str]:
+    # no "team" label: the reconciler and the readiness watcher leave these pods alone
+    return {"app": "ctf-challenge", "shared": "true", "challenge": str(challenge_id)}
+
+
+class SharedDeployments:
+    """
+    One Deployment (`replicas` of the profile) + ClusterIP Service per shared challenge, serving
+    every team; the team's flag travels in `FLAG_HEADER`, injected by the token proxy.
+    - `ensure` is create-or-adopt: an existing Deployment (409) is patched to the current
+      template / replica count, an existing Service is kept; after a failure or timeout
+      nothing is remembered, so the next spawn ensures again (and adopts what did land)
+    - a challenge ensured with the same template and replicas is remembered per worker, so
+      later team spawns make no API call
+    The objects are not removed with team instances: `delete` is for admins / challenge removal.
+    """
+
+    def __init__(self, apps_v1: AsyncCoreV1, core_v1: AsyncCoreV1, namespace: str) -> None:
+        self.apps_v1 = apps_v1
+        self.core_v1 = core_v1
+        self.namespace = namespace
+        self._ensured: dict[int, tuple] = {}  # challenge_id -> (template key, replicas)
+
+    async def ensure(self, challenge_id: int, template: ManifestTemplate, replicas: int) -> str:
+        """
+        Returns the Service name once the challenge's Deployment and Service exist.
+        """
+        name = shared_name(challenge_id)
+        if self._ensured.get(challenge_id) == (template.key, replicas):
+            return name
+
+        labels = shared_labels(challenge_id)
+        deployment = template.deployment(name=name, labels=labels, replicas=replicas)
+        results = await asyncio.gather(
+            self.apps_v1.call("create_namespaced_deployment", namespace=self.namespace, body=deployment),
+            self.core_v1.call(
+                "create_namespaced_service",
+                namespace=self.namespace,
+                body=template.service(name=name, selector=labels),
+            ),
+            return_exceptions=True,
+        )
+        for res in results:
+            if isinstance(res, Exception) and not (isinstance(res, ApiException) and res.status == 409):
+                raise res
+        if isinstance(results[0], ApiException):  # adopted: bring it to the current template
+            await self.apps_v1.call(
+                "patch_namespaced_deployment", name=name, namespace=self.namespace, body=deployment
+            )
+
+        self._ensured[challenge_id] = (template.key, replicas)
+        metrics.inc("shared.ensured")
+        logger.info(f"Shared challenge {name} ready for spawns ({replicas} replica(s))")
+        return name
+
+    async def delete(self, challenge_id: int) -> None:
+        name = shared_name(challenge_id)
+        self._ensured.pop(challenge_id, None)
+        results = await asyncio.gather(
+            self.apps_v1.call("delete_namespaced_deployment", name=name, namespace=self.namespace),
+            self.core_v1.call("delete_namespaced_service", name=name, namespace=self.namespace),
+            return_exceptions=True,
+        )
+        for res in results:
+            if isinstance(res, Exception) and getattr(res, "status", None) != 404:
+                raise res
+
+    def stats(self) -> dict:
+        return {"challenges": sorted(self._ensured)}
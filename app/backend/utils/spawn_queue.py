@@ -0,0 +1,231 @@
+# app/backend/utils/spawn_queue.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import Awaitable, Callable
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.backend.config.redis import REDIS_DOWN_ERRORS, redis_client
+from app.backend.config.settings import get_settings
+from app.backend.utils.ctf_redis import ctf_redis_bus
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.leader_lock import LeaderLock
+from app.backend.utils.metrics import metrics
+from app.backend.utils.redis_bus import RedisBus
+from app.backend.utils.team_instance_store import ADMIT_FULL
+
+settings = get_settings()
+
+# member "<team_id>:<challenge_id>" -> enqueue epoch (one queued spawn per team per challenge)
+QUEUE_ENTRIES_KEY = "ctf:spawnq:entries"
+# team_id -> epoch of its last dispatched spawn (round-robin order)
+QUEUE_SERVED_KEY = "ctf:spawnq:served"
+QUEUE_LOCK_KEY = "ctf:spawnq:lock"
+
+# SSE event sent to the owning team on every queue change of its entries
+QUEUE_EVENT = "spawn_queue"
+
+# (team_id, challenge_id) -> admission outcome (ADMIT_* or "gone" when the challenge disappeared)
+SpawnHandler = Callable[[int, int], Awaitable[str]]
+
+
+def _member(team_id: int, challenge_id: int) -> str:
+    return f"{team_id}:{challenge_id}"
+
+
+def dispatch_order(entries: dict[str, str], served: dict[str, str]) -> list[tuple[int, int]]:
+    """
+    Order in which queued spawns get slots: round-robin across teams, one spawn per team
+    per round. Teams take turns by their last dispatch (never served first, then by oldest
+    entry), and each team's own entries are FIFO.
+    """
+    per_team: dict[int, list[tuple[float, int]]] = {}
+    for member, enqueued_at in entries.items():
+        team_id, _, challenge_id = member.partition(":")
+        per_team.setdefault(int(team_id), []).append((float(enqueued_at), int(challenge_id)))
+    for queued in per_team.values():
+        queued.sort()
+
+    teams = sorted(per_team, key=lambda t: (float(served.get(str(t), 0)), per_team[t][0][0]))
+    order: list[tuple[int, int]] = []
+    for rnd in range(max((len(q) for q in per_team.values()), default=0)):
+        order.extend((t, per_team[t][rnd][1]) for t in teams if rnd < len(per_team[t]))
+    return order
+
+
+class SpawnQueue:
+    """
+    Fair wait line for team spawns refused at capacity (instead of a 429 retry loop):
+    - `enqueue` records one entry per (team, challenge) in a Redis hash; the queue lives in
+      Redis, so every replica sees the same positions and it survives restarts
+    - one dispatcher at a time (Redis lock) hands freed slots out in `dispatch_order`; the
+      head entry is claimed with HDEL, then the registered handler admits and launches it.
+      While the handler answers ADMIT_FULL the entry is put back and the pass stops
+    - the dispatcher polls every `interval` and is woken by enqueues / terminations of this
+      worker; expiries on other workers are picked up by the poll
+    - position and ETA (the expiry of the live slot that frees up for the entry) are exposed
+      by `status` and pushed as `spawn_queue` SSE events to the owning team
+    """
+
+    def __init__(
+        self,
+        r: redis.Redis | None = None,
+        *,
+        bus: RedisBus | None = None,
+        interval: float = settings.SPAWN_QUEUE_POLL_SECONDS,
+        batch_size: int = settings.SPAWN_QUEUE_BATCH_SIZE,
+    ) -> None:
+        self._r = r or redis_client
+        self._bus = bus or ctf_redis_bus
+        self.interval = interval
+        self._lock = LeaderLock(QUEUE_LOCK_KEY, ttl_seconds=max(30, self.interval * 10), r=self._r)
+        self.batch_size = batch_size
+        self._handler: SpawnHandler | None = None
+
+        self._dispatched = 0
+        self._failed = 0
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+        self._wake = asyncio.Event()
+
+    def register(self, handler: SpawnHandler) -> None:
+        self._handler = handler
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def pending(self) -> int:
+        return await self._r.hlen(QUEUE_ENTRIES_KEY)
+
+    async def enqueue(self, team_id: int, challenge_id: int) -> dict:
+        """
+        Queues the spawn (no-op when already queued) and returns its position / ETA.
+        """
+        if await self._r.hsetnx(QUEUE_ENTRIES_KEY, _member(team_id, challenge_id), time.time()):
+            metrics.inc("spawn_queue.enqueued")
+            self.wake()
+        return await self.status(team_id, challenge_id) or {"position": None, "eta_seconds": None}
+
+    async def cancel(self, team_id: int, challenge_id: int) -> bool:
+        removed = bool(await self._r.hdel(QUEUE_ENTRIES_KEY, _member(team_id, challenge_id)))
+        if removed:
+            await self._publish_positions()
+        return removed
+
+    async def _positions(self) -> dict[tuple[int, int], dict]:
+        pipe = self._r.pipeline(transaction=True)
+        pipe.hgetall(QUEUE_ENTRIES_KEY)
+        pipe.hgetall(QUEUE_SERVED_KEY)
+        pipe.zrangebyscore(InstanceLimiter.ZSET_KEY, time.time(), "+inf", withscores=True)
+        entries, served, live = await pipe.execute()
+
+        now = time.time()
+        free = max(0, settings.MAX_ACTIVE_INSTANCES - len(live))
+        out: dict[tuple[int, int], dict] = {}
+        for position, key in enumerate(dispatch_order(entries, served), start=1):
+            # the n-th queued spawn starts when the n-th live slot (by expiry) is released
+            slot = position - 1 - free
+            eta = 0 if slot < 0 else (int(live[slot][1] - now) if slot < len(live) else None)
+            out[key] = {"position": position, "eta_seconds": eta}
+        return out
+
+    async def status(self, team_id: int, challenge_id: int) -> dict | None:
+        return (await self._positions()).get((team_id, challenge_id))
+
+    async def _publish(self, team_id: int, data: dict) -> None:
+        with contextlib.suppress(*REDIS_DOWN_ERRORS):
+            await self._bus.publish(QUEUE_EVENT, data, team_id=team_id)
+
+    async def _publish_positions(self) -> None:
+        for (team_id, challenge_id), pos in (await self._positions()).items():
+            await self._publish(team_id, {"challenge_id": challenge_id, "status": "queued", **pos})
+
+    async def _dispatch(self, team_id: int, challenge_id: int, enqueued_at: str) -> bool:
+        """
+        Returns False when the head has to wait for capacity (nothing dispatched).
+        """
+        member = _member(team_id, challenge_id)
+        if not await self._r.hdel(QUEUE_ENTRIES_KEY, member):
+            return True  # cancelled meanwhile
+
+        try:
+            outcome = await self._handler(team_id, challenge_id)
+        except Exception as e:
+            self._failed += 1
+            metrics.inc("spawn_queue.failed")
+            logger.warning(f"Queued spawn t{team_id}-c{challenge_id} failed: {e}")
+            await self._publish(team_id, {"challenge_id": challenge_id, "status": "failed"})
+            return True
+
+        if outcome == ADMIT_FULL:
+            await self._r.hsetnx(QUEUE_ENTRIES_KEY, member, enqueued_at)  # keeps its place
+            return False
+
+        await self._r.hset(QUEUE_SERVED_KEY, str(team_id), time.time())
+        self._dispatched += 1
+        metrics.inc("spawn_queue.dispatched")
+        metrics.observe("spawn_queue.wait_seconds", max(0.0, time.time() - float(enqueued_at)))
+        await self._publish(team_id, {"challenge_id": challenge_id, "status": outcome})
+        return True
+
+    async def run_once(self) -> int:
+        """
+        Dispatches queued spawns while capacity allows (up to `batch_size`). Returns the count.
+        """
+        if self._handler is None:
+            return 0
+        dispatched = 0
+        while dispatched < self.batch_size:
+            entries = await self._r.hgetall(QUEUE_ENTRIES_KEY)
+            if not entries:
+                break
+            served = await self._r.hgetall(QUEUE_SERVED_KEY)
+            team_id, challenge_id = dispatch_order(entries, served)[0]
+            if not await self._dispatch(team_id, challenge_id, entries[_member(team_id, challenge_id)]):
+                break
+            dispatched += 1
+
+        if dispatched:
+            await self._publish_positions()
+        return dispatched
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            try:
+                async with self._lock.held() as leader:
+                    if leader:
+                        await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Spawn queue pass failed: {e}")
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    async def stats(self) -> dict:
+        return {"queued": await self.pending(), "dispatched": self._dispatched, "failed": self._failed}
+
+
+spawn_queue = SpawnQueue()
@@ -8,26 +8,31 @@ from typing import Any
 
 
 class SSEBus:
+    """
+    In-process fan-out to the SSE streams of this worker.
+    Events broadcast with a `team_id` only reach streams subscribed for that team.
+    """
+
     def __init__(self) -> None:
-        self._subscribers: set[asyncio.Queue[str]] = set()
+        self._subscribers: dict[asyncio.Queue[str], int | None] = {}  # queue -> team_id
         self._lock = asyncio.Lock()
 
-    async def subscribe(self) -> asyncio.Queue[str]:
+    async def subscribe(self, team_id: int | None = None) -> asyncio.Queue[str]:
         q: asyncio.Queue[str] = asyncio.Queue(maxsize=100)
         async with self._lock:
-            self._subscribers.add(q)
+            self._subscribers[q] = team_id
         return q
 
     async def unsubscribe(self, q: asyncio.Queue[str]) -> None:
         async with self._lock:
-            self._subscribers.discard(q)
+            self._subscribers.pop(q, None)
 
-    async def broadcast(self, event: str, data: Any | None = None) -> None:
+    async def broadcast(self, event: str, data: Any | None = None, *, team_id: int | None = None) -> None:
         payload = {"event": event, "data": data}
         msg = json.dumps(payload, separators=(",", ":"))
 
         async with self._lock:
-            subs = list(self._subscribers)
+            subs = [q for q, team in self._subscribers.items() if team_id is None or team == team_id]
 
         for q in subs:
             with contextlib.suppress(asyncio.QueueFull):
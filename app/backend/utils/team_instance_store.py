@@ -1,41 +1,338 @@
 # app/backend/utils/team_instance_store.py
-import json
+import time
 from datetime import datetime, timedelta, timezone
 
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError, ResponseError
 
-from app.backend.config.settings import get_settings
+from app.backend.config.redis import redis_client
+from app.backend.utils.challenge_profiles import MODE_SHARED
+from app.backend.utils.instance_expiry import EXPIRY_ZSET_KEY, KIND_TEAM, expiry_member
+from app.backend.utils.instance_limiter import BUDGET_KEY, RESERVATIONS_KEY, InstanceLimiter, configured_budget
+from app.backend.utils.metrics import metrics
+from app.backend.utils.redis_client_cache import RedisClientCache, redis_cache
 
-settings = get_settings()
+ADMIT_CLAIMED = "claimed"
+ADMIT_EXISTS = "exists"
+ADMIT_FULL = "full"
+
+STATUS_STARTING = "starting"
+STATUS_RUNNING = "running"
+STATUS_RESTARTING = "restarting"  # extend: pod being replaced
+STATUS_TERMINATING = "terminating"
+STATUS_HIBERNATED = "hibernated"  # idle HTTP instance: pod removed, record / flag / token / slot kept
+STATUS_WAKING = "waking"  # hibernated instance whose pod is being recreated by a proxied request
+
+# hash fields stored as ints (everything else is a string)
+_INT_FIELDS = frozenset({"team_id", "challenge_id", "tcp_port"})
+
+
+def _to_hash(payload: dict) -> dict[str, str]:
+    return {k: str(v) for k, v in payload.items() if v is not None}
+
+
+def _from_hash(h: dict[str, str]) -> dict:
+    out: dict = {"connection": None}
+    for k, v in h.items():
+        out[k] = int(v) if k in _INT_FIELDS else v
+    return out
+
+
+def _pairs(flat: list) -> dict[str, str]:
+    return dict(zip(flat[::2], flat[1::2], strict=True))
+
+
+def is_wrongtype(e: Exception) -> bool:
+    return isinstance(e, ResponseError) and str(e).startswith("WRONGTYPE")
+
+
+# records written as a JSON string (before the hash layout): rewritten in place as a hash with
+# the same TTL; nested / null values are dropped, an unreadable record is deleted
+_LUA_MIGRATE_LEGACY = r"""
+-- KEYS[1] = instance record key
+-- returns 1 when a JSON record was rewritten (or dropped), 0 when there was none
+if redis.call("TYPE", KEYS[1]).ok ~= "string" then
+    return 0
+end
+local ok, rec = pcall(cjson.decode, redis.call("GET", KEYS[1]))
+local ttl = redis.call("PTTL", KEYS[1])
+redis.call("DEL", KEYS[1])
+if not ok or type(rec) ~= "table" then
+    return 1
+end
+local flat = {}
+for k, v in pairs(rec) do
+    local t = type(v)
+    if t == "string" or t == "number" or t == "boolean" then
+        flat[#flat + 1] = k
+        flat[#flat + 1] = tostring(v)
+    end
+end
+if #flat > 0 then
+    redis.call("HSET", KEYS[1], unpack(flat))
+    if ttl > 0 then
+        redis.call("PEXPIRE", KEYS[1], ttl)
+    end
+end
+return 1
+"""
+
+
+# shared by the scripts that reserve capacity: nil, or the resource ("cpu" / "memory") the
+# reservations of the live slots plus (cpu, mem) would exceed; the budget hash wins over the
+# configured values (0 = no budget on that resource)
+_LUA_OVER_BUDGET = r"""
+local function over_budget(zset, reservations, budget_key, cpu, mem, cfg_cpu, cfg_mem)
+    local budget = redis.call("HMGET", budget_key, "cpu", "memory")
+    local cpu_budget = tonumber(budget[1] or cfg_cpu) or 0
+    local mem_budget = tonumber(budget[2] or cfg_mem) or 0
+    if cpu_budget <= 0 and mem_budget <= 0 then
+        return nil
+    end
+    local used_cpu, used_mem = 0, 0
+    local slots = redis.call("ZRANGE", zset, 0, -1)
+    if #slots > 0 then
+        local reserved = redis.call("HMGET", reservations, unpack(slots))
+        for i=1,#reserved do
+            if reserved[i] then
+                local c, m = string.match(reserved[i], "(%d+) (%d+)")
+                used_cpu = used_cpu + (tonumber(c) or 0)
+                used_mem = used_mem + (tonumber(m) or 0)
+            end
+        end
+    end
+    if cpu_budget > 0 and used_cpu + cpu > cpu_budget then
+        return "cpu"
+    end
+    if mem_budget > 0 and used_mem + mem > mem_budget then
+        return "memory"
+    end
+    return nil
+end
+"""
 
 
 class TeamInstanceStore:
-    def __init__(self) -> None:
-        self._r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    """
+    Team-scoped instance records, one Redis hash per (team_id, challenge_id):
+    team_id, challenge_id, status, started_at, expires_at, connection, protocol,
+    tcp_host, tcp_port, passphrase, pod_uid (None values are not stored).
+    Status changes go through a compare-and-set script, so concurrent
+    extend / terminate calls cannot overwrite each other.
+    Every write that sets the TTL also (re)schedules the instance's expiry in
+    `EXPIRY_ZSET_KEY` in the same script; delete / abandon unschedule it.
+    Admission reserves the instance's CPU / memory (`RESERVATIONS_KEY`); a hibernated instance
+    gives its reservation back (`release_reservation`) and takes it again on wake (`reserve`).
+    A record still stored as JSON by an older release (rolling deploy) answers WRONGTYPE: it is
+    rewritten as a hash (`migrate_legacy`) and the read / script retried once.
+    `get` is served from the client-side cache when enabled (writes invalidate it).
+    """
+
+    _LUA_ADMIT = (
+        _LUA_OVER_BUDGET
+        + r"""
+    -- KEYS[1] = instance record key (hash)
+    -- KEYS[2] = limiter ZSET_KEY
+    -- KEYS[3] = limiter slot key
+    -- KEYS[4] = expiry ZSET
+    -- KEYS[5] = capacity reservations (hash slot -> "cpu memory")
+    -- KEYS[6] = capacity budget (hash cpu / memory, from the node watcher)
+    -- ARGV[1] = now_epoch
+    -- ARGV[2] = exp_epoch
+    -- ARGV[3] = ttl_seconds
+    -- ARGV[4] = global limit
+    -- ARGV[5] = expiry member
+    -- ARGV[6] = requested cpu (millicores)
+    -- ARGV[7] = requested memory (bytes)
+    -- ARGV[8] = configured cpu budget (0 = none; used when KEYS[6] is absent)
+    -- ARGV[9] = configured memory budget (idem)
+    -- ARGV[10] = "1" for a shared-challenge instance: no pod of its own, so no slot / reservation
+    -- ARGV[11..] = placeholder field/value pairs
+    -- returns {"claimed"} | {"exists", {field, value, ...}} | {"full", "count"|"cpu"|"memory"}
+
+    local record = KEYS[1]
+    local zset = KEYS[2]
+    local slot = KEYS[3]
+    local expiry = KEYS[4]
+    local reservations = KEYS[5]
+    local now = tonumber(ARGV[1])
+    local exp = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    local limit = tonumber(ARGV[4])
+    local cpu = tonumber(ARGV[6])
+    local mem = tonumber(ARGV[7])
+    local shared = ARGV[10] == "1"
+
+    -- 1) team already has an instance -> return it (no capacity consumed)
+    local existing = redis.call("HGETALL", record)
+    if #existing > 0 then
+        return {"exists", existing}
+    end
+
+    -- 2) cleanup expired slots (same as InstanceLimiter.try_acquire)
+    local expired = redis.call("ZRANGEBYSCORE", zset, "-inf", now)
+    if #expired > 0 then
+        for i=1,#expired do
+            redis.call("DEL", expired[i])
+        end
+        redis.call("ZREM", zset, unpack(expired))
+        redis.call("HDEL", reservations, unpack(expired))
+    end
+
+    -- 3) enforce global cap and capacity budget (a leftover slot of this team is
+    --    reused, not counted twice)
+    if not shared and redis.call("EXISTS", slot) == 0 then
+        if redis.call("ZCARD", zset) >= limit then
+            return {"full", "count"}
+        end
+        local reason = over_budget(zset, reservations, KEYS[6], cpu, mem, ARGV[8], ARGV[9])
+        if reason then
+            return {"full", reason}
+        end
+    end
+
+    -- 4) claim: placeholder + slot + index + reservation + expiry schedule
+    redis.call("HSET", record, unpack(ARGV, 11))
+    redis.call("EXPIRE", record, ttl)
+    if not shared then
+        redis.call("SET", slot, "1", "EX", ttl)
+        redis.call("ZADD", zset, exp, slot)
+        redis.call("HSET", reservations, slot, ARGV[6] .. " " .. ARGV[7])
+    end
+    redis.call("ZADD", expiry, exp, ARGV[5])
+    return {"claimed"}
+    """
+    )
+
+    _LUA_RESERVE = (
+        _LUA_OVER_BUDGET
+        + r"""
+    -- KEYS[1] = limiter ZSET_KEY
+    -- KEYS[2] = capacity reservations
+    -- KEYS[3] = capacity budget
+    -- KEYS[4] = limiter slot key
+    -- ARGV[1..4] = requested cpu, requested memory, configured cpu / memory budget
+    -- returns "ok" | "cpu" | "memory"
+
+    redis.call("HDEL", KEYS[2], KEYS[4]) -- a stale reservation of this slot is not counted
+    local reason = over_budget(KEYS[1], KEYS[2], KEYS[3], tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3], ARGV[4])
+    if reason then
+        return reason
+    end
+    redis.call("HSET", KEYS[2], KEYS[4], ARGV[1] .. " " .. ARGV[2])
+    return "ok"
+    """
+    )
+
+    _LUA_TRANSITION = r"""
+    -- KEYS[1] = instance record key (hash)
+    -- KEYS[2] = expiry ZSET
+    -- ARGV[1] = allowed current statuses, space separated ("" = any)
+    -- ARGV[2] = new status ("" = keep)
+    -- ARGV[3] = ttl_seconds (0 = keep)
+    -- ARGV[4] = expiry member
+    -- ARGV[5] = exp_epoch (with ttl_seconds)
+    -- ARGV[6..] = field/value pairs to set
+    -- returns {applied (1/0), {field, value, ...}} ({0, {}} when the record is gone)
+
+    local record = KEYS[1]
+    local cur = redis.call("HGET", record, "status")
+    if not cur then
+        return {0, {}}
+    end
+
+    if ARGV[1] ~= "" and not string.find(" " .. ARGV[1] .. " ", " " .. cur .. " ", 1, true) then
+        return {0, redis.call("HGETALL", record)}
+    end
+
+    if #ARGV >= 6 then
+        redis.call("HSET", record, unpack(ARGV, 6))
+    end
+    if ARGV[2] ~= "" then
+        redis.call("HSET", record, "status", ARGV[2])
+    end
+    local ttl = tonumber(ARGV[3])
+    if ttl > 0 then
+        redis.call("EXPIRE", record, ttl)
+        redis.call("ZADD", KEYS[2], tonumber(ARGV[5]), ARGV[4])
+    end
+    return {1, redis.call("HGETALL", record)}
+    """
+
+    def __init__(self, r: redis.Redis | None = None, cache: RedisClientCache | None = None) -> None:
+        self._r = r or redis_client
+        self._cache = cache or redis_cache
+        self._limiter = InstanceLimiter(self._r)
+        self._shas: dict[str, str] = {}
 
     def _key(self, team_id: int, challenge_id: int) -> str:
         return f"ctf:instance:team:{team_id}:{challenge_id}"
 
-    async def get(self, team_id: int, challenge_id: int) -> dict | None:
-        raw = await self._r.get(self._key(team_id, challenge_id))
-        if not raw:
-            return None
+    async def _eval(self, script: str, keys: tuple[str, ...], args: tuple) -> list:
+        try:
+            return await self._eval_once(script, keys, args)
+        except ResponseError as e:
+            # admit / transition: KEYS[1] is the record
+            if not is_wrongtype(e) or not await self.migrate_legacy(keys[0]):
+                raise
+        return await self._eval_once(script, keys, args)
+
+    async def _eval_once(self, script: str, keys: tuple[str, ...], args: tuple) -> list:
+        sha = self._shas.get(script)
+        if sha is None:
+            sha = self._shas[script] = await self._r.script_load(script)
+        try:
+            return await self._r.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            # Redis lost scripts (restart) -> reload and retry once
+            sha = self._shas[script] = await self._r.script_load(script)
+            return await self._r.evalsha(sha, len(keys), *keys, *args)
+
+    async def migrate_legacy(self, key: str) -> bool:
+        """
+        Rewrites a JSON-string instance record as a hash. Returns False if `key` held none.
+        """
+        migrated = bool(await self._eval_once(_LUA_MIGRATE_LEGACY, (key,), ()))
+        if migrated:
+            metrics.inc("instance_store.legacy_migrated")
+            self._cache.invalidate(key)
+        return migrated
+
+    async def _hgetall(self, key: str) -> dict[str, str]:
         try:
-            return json.loads(raw)
-        except Exception:
+            return await self._r.hgetall(key)
+        except ResponseError as e:
+            if not is_wrongtype(e) or not await self.migrate_legacy(key):
+                raise
+        return await self._r.hgetall(key)
+
+    async def get(self, team_id: int, challenge_id: int) -> dict | None:
+        key = self._key(team_id, challenge_id)
+        h = await self._cache.get(key, lambda: self._hgetall(key))
+        if not h:
             return None
+        return _from_hash(h)
 
-    async def claim_or_get(
+    async def admit(
         self,
         team_id: int,
         challenge_id: int,
         *,
         ttl_seconds: int,
-    ) -> tuple[bool, dict]:
+        limit: int,
+        cpu_millicores: int = 0,
+        memory_bytes: int = 0,
+        shared: bool = False,
+    ) -> tuple[str, dict | None]:
         """
-        Atomowo:
-        - jeśli nie ma instancji -> zakłada placeholder i zwraca (True, payload)
-        - jeśli jest -> zwraca (False, existing)
+        Spawn admission in one round trip (atomic):
+        - (ADMIT_EXISTS, payload)   -> the team already has an instance
+        - (ADMIT_FULL, {"reason"})  -> nothing claimed: the active-instance cap ("count") or the
+                                       CPU / memory budget ("cpu" / "memory") would be exceeded
+        - (ADMIT_CLAIMED, payload)  -> placeholder stored, limiter slot taken and the instance's
+                                       requests (`cpu_millicores`, `memory_bytes`) reserved
+        A `shared` instance (shared challenge: the team only gets its flag) is recorded without
+        taking a slot or capacity, so it is never refused with ADMIT_FULL.
         """
         now = datetime.now(timezone.utc)
         exp = now + timedelta(seconds=ttl_seconds)
@@ -45,28 +342,139 @@ class TeamInstanceStore:
             "connection": None,  # we will fill it later after instance is ready
             "started_at": now.isoformat(),
             "expires_at": exp.isoformat(),
-            "status": "starting",
+            "status": STATUS_STARTING,
         }
+        if shared:
+            payload["mode"] = MODE_SHARED
+
+        keys = (
+            self._key(team_id, challenge_id),
+            InstanceLimiter.ZSET_KEY,
+            self._limiter._slot_key(team_id, challenge_id),
+            EXPIRY_ZSET_KEY,
+            RESERVATIONS_KEY,
+            BUDGET_KEY,
+        )
+        cpu_budget, memory_budget = configured_budget()
+        fields = [x for kv in _to_hash(payload).items() for x in kv]
+        res = await self._eval(
+            self._LUA_ADMIT,
+            keys,
+            (
+                int(now.timestamp()),
+                int(exp.timestamp()),
+                int(ttl_seconds),
+                int(limit),
+                expiry_member(KIND_TEAM, team_id, challenge_id),
+                int(cpu_millicores),
+                int(memory_bytes),
+                cpu_budget,
+                memory_budget,
+                "1" if shared else "0",
+                *fields,
+            ),
+        )
 
+        outcome = res[0]
+        if outcome == ADMIT_CLAIMED:
+            self._cache.invalidate(keys[0])
+        if outcome == ADMIT_EXISTS:
+            return ADMIT_EXISTS, _from_hash(_pairs(res[1]))
+        if outcome == ADMIT_FULL:
+            return ADMIT_FULL, {"reason": res[1] if len(res) > 1 else "count"}
+        return ADMIT_CLAIMED, payload
+
+    async def abandon(self, team_id: int, challenge_id: int) -> None:
+        """
+        Rolls back an admission (spawn failed): record, limiter slot, index, reservation and
+        expiry in one MULTI.
+        """
         key = self._key(team_id, challenge_id)
-        ok = await self._r.set(key, json.dumps(payload), ex=ttl_seconds, nx=True)
-        if ok:
-            return True, payload
+        slot_key = self._limiter._slot_key(team_id, challenge_id)
+        pipe = self._r.pipeline(transaction=True)
+        pipe.delete(key, slot_key)
+        pipe.zrem(InstanceLimiter.ZSET_KEY, slot_key)
+        pipe.hdel(RESERVATIONS_KEY, slot_key)
+        pipe.zrem(EXPIRY_ZSET_KEY, expiry_member(KIND_TEAM, team_id, challenge_id))
+        await pipe.execute()
+        self._cache.invalidate(key)
+
+    async def reserve(self, team_id: int, challenge_id: int, *, cpu_millicores: int, memory_bytes: int) -> str | None:
+        """
+        Reserves the instance's requests again for its (still held) limiter slot, atomically
+        against the capacity budget. Returns None when reserved, else the resource that would
+        be exceeded ("cpu" / "memory").
+        """
+        cpu_budget, memory_budget = configured_budget()
+        res = await self._eval(
+            self._LUA_RESERVE,
+            (
+                InstanceLimiter.ZSET_KEY,
+                RESERVATIONS_KEY,
+                BUDGET_KEY,
+                self._limiter._slot_key(team_id, challenge_id),
+            ),
+            (int(cpu_millicores), int(memory_bytes), cpu_budget, memory_budget),
+        )
+        return None if res == "ok" else res
 
-        existing = await self.get(team_id, challenge_id)
-        return False, existing or payload
+    async def release_reservation(self, team_id: int, challenge_id: int) -> None:
+        """
+        Gives the instance's CPU / memory back to the budget; the limiter slot stays taken.
+        """
+        await self._r.hdel(RESERVATIONS_KEY, self._limiter._slot_key(team_id, challenge_id))
+
+    async def transition(
+        self,
+        team_id: int,
+        challenge_id: int,
+        *,
+        from_status: tuple[str, ...] = (),
+        to_status: str | None = None,
+        ttl_seconds: int | None = None,
+        **fields,
+    ) -> tuple[bool, dict | None]:
+        """
+        Compare-and-set on the record (one round trip):
+        applies `fields` / `to_status` / TTL only while the current status is in
+        `from_status` (any status when empty).
+        Returns (applied, current record) - record is None if it does not exist.
+        """
+        fields = _to_hash(fields)
+        exp_epoch = 0
+        if ttl_seconds is not None:
+            exp = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+            fields["expires_at"] = exp.isoformat()
+            exp_epoch = int(exp.timestamp())
+
+        key = self._key(team_id, challenge_id)
+        applied, flat = await self._eval(
+            self._LUA_TRANSITION,
+            (key, EXPIRY_ZSET_KEY),
+            (
+                " ".join(from_status),
+                to_status or "",
+                int(ttl_seconds or 0),
+                expiry_member(KIND_TEAM, team_id, challenge_id),
+                exp_epoch,
+                *(x for kv in fields.items() for x in kv),
+            ),
+        )
+        if applied:
+            self._cache.invalidate(key)
+        return bool(applied), (_from_hash(_pairs(flat)) if flat else None)
 
     async def update_expires(self, team_id: int, challenge_id: int, *, ttl_seconds: int) -> dict | None:
-        existing = await self.get(team_id, challenge_id)
-        if not existing:
-            return None
-        now = datetime.now(timezone.utc)
-        existing["expires_at"] = (now + timedelta(seconds=ttl_seconds)).isoformat()
-        await self._r.set(self._key(team_id, challenge_id), json.dumps(existing), ex=ttl_seconds)
+        _, existing = await self.transition(team_id, challenge_id, ttl_seconds=ttl_seconds)
         return existing
 
     async def delete(self, team_id: int, challenge_id: int) -> None:
-        await self._r.delete(self._key(team_id, challenge_id))
+        key = self._key(team_id, challenge_id)
+        pipe = self._r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.zrem(EXPIRY_ZSET_KEY, expiry_member(KIND_TEAM, team_id, challenge_id))
+        await pipe.execute()
+        self._cache.invalidate(key)
 
     async def set(
         self,
@@ -79,28 +487,36 @@ class TeamInstanceStore:
         tcp_host: str | None = None,
         tcp_port: int | None = None,
         passphrase: str | None = None,
+        pod_uid: str | None = None,
+        from_status: tuple[str, ...] = (STATUS_STARTING,),
+        to_status: str = STATUS_RUNNING,
     ) -> dict | None:
-        existing = await self.get(team_id, challenge_id)
-        if not existing:
-            return None
-
-        existing["connection"] = connection
-        existing["status"] = "running"
-
-        if protocol is not None:
-            existing["protocol"] = protocol
-        if tcp_host is not None:
-            existing["tcp_host"] = tcp_host
-        if tcp_port is not None:
-            existing["tcp_port"] = tcp_port
-        if passphrase is not None:
-            existing["passphrase"] = passphrase
-
-        now = datetime.now(timezone.utc)
-        existing["expires_at"] = (now + timedelta(seconds=ttl_seconds)).isoformat()
-
-        await self._r.set(self._key(team_id, challenge_id), json.dumps(existing), ex=ttl_seconds)
-        return existing
+        """
+        Stores the connection details and moves the instance to `to_status`
+        (spawns keep it `starting`: the pod readiness watcher marks it running).
+        Returns None if the record is gone or no longer in `from_status`.
+        """
+        applied, existing = await self.transition(
+            team_id,
+            challenge_id,
+            from_status=from_status,
+            to_status=to_status,
+            ttl_seconds=ttl_seconds,
+            connection=connection,
+            protocol=protocol,
+            tcp_host=tcp_host,
+            tcp_port=tcp_port,
+            passphrase=passphrase,
+            pod_uid=pod_uid,
+        )
+        return existing if applied else None
 
     async def force_set(self, team_id: int, challenge_id: int, payload: dict, *, ttl_seconds: int) -> None:
-        await self._r.set(self._key(team_id, challenge_id), json.dumps(payload), ex=ttl_seconds)
+        key = self._key(team_id, challenge_id)
+        pipe = self._r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping=_to_hash(payload))
+        pipe.expire(key, ttl_seconds)
+        pipe.zadd(EXPIRY_ZSET_KEY, {expiry_member(KIND_TEAM, team_id, challenge_id): int(time.time()) + ttl_seconds})
+        await pipe.execute()
+        self._cache.invalidate(key)
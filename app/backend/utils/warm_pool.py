@@ -0,0 +1,294 @@
+# app/backend/utils/warm_pool.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import secrets
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import redis.asyncio as redis
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from app.backend.config.redis import redis_client
+from app.backend.config.settings import get_settings
+from app.backend.db.session import AsyncSessionLocal
+from app.backend.repository.challenges import ChallengesCRUDRepository
+from app.backend.utils.challenge_profiles import DEFAULT_PROFILE, ChallengeProfile, challenge_profiles
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.leader_lock import LeaderLock
+from app.backend.utils.metrics import metrics
+
+settings = get_settings()
+
+POOL_LABEL = "ctf-pool"
+POOL_WARM = "warm"
+POOL_CLAIMED = "claimed"
+
+# secrets reach a pre-started container through a downward API volume of its annotations:
+# the claim writes the annotations, the kubelet refreshes the files on its next pod sync
+# (up to about a minute later), so a pool pod only turns Ready once the flag file is filled
+SECRETS_DIR = "/run/ctf"
+FLAG_ANNOTATION = "ctf.kubos/flag"
+PASSPHRASE_ANNOTATION = "ctf.kubos/passphrase"
+
+REFILL_LOCK_KEY = "ctf:warm_pool:refill"
+
+# pool-only parts of the pod body (the rest comes from the challenge's manifest template)
+_POOL_ENV = {"CTF_FLAG_FILE": f"{SECRETS_DIR}/flag", "CTF_PASSPHRASE_FILE": f"{SECRETS_DIR}/passphrase"}
+_POOL_VOLUME_MOUNTS = [{"name": "ctf-secrets", "mountPath": SECRETS_DIR, "readOnly": True}]
+_POOL_VOLUMES = [
+    {
+        "name": "ctf-secrets",
+        "downwardAPI": {
+            "items": [
+                {"path": file, "fieldRef": {"fieldPath": f"metadata.annotations['{annotation}']"}}
+                for file, annotation in (("flag", FLAG_ANNOTATION), ("passphrase", PASSPHRASE_ANNOTATION))
+            ]
+        },
+    }
+]
+# readiness of a pool pod; the challenge's own probe (or a TCP one) becomes its startup probe
+_FLAG_DELIVERED_PROBE = {"exec": {"command": ["sh", "-c", f"test -s {SECRETS_DIR}/flag"]}, "periodSeconds": 2}
+_STARTUP_FAILURE_THRESHOLD = 150  # the startup probe kills the container after as many failures
+
+
+@dataclass(frozen=True, slots=True)
+class PoolTarget:
+    challenge_id: int
+    image: str
+    port: int
+    size: int
+    profile: ChallengeProfile = DEFAULT_PROFILE
+
+
+async def _load_targets() -> list[PoolTarget]:
+    async with AsyncSessionLocal() as session:
+        rows = await ChallengesCRUDRepository(session).list_warm_pool_challenges()
+        return [
+            PoolTarget(ch.id, ch.image_name, ch.internal_port, ch.warm_pool_size, challenge_profiles.for_challenge(ch))
+            for ch in rows
+        ]
+
+
+def pod_is_ready(pod: client.V1Pod) -> bool:
+    if pod.metadata.deletion_timestamp or pod.status is None or pod.status.phase != "Running":
+        return False
+    return any(c.type == "Ready" and c.status == "True" for c in pod.status.conditions or ())
+
+
+def pod_is_started(pod: client.V1Pod) -> bool:
+    """
+    A pool pod whose containers passed their startup probe: claimable, although not Ready
+    before a claim delivered its flag.
+    """
+    if pod.metadata.deletion_timestamp or pod.status is None or pod.status.phase != "Running":
+        return False
+    statuses = pod.status.container_statuses or ()
+    return bool(statuses) and all(s.started for s in statuses)
+
+
+def _age_seconds(pod: client.V1Pod, now: datetime) -> float:
+    started = (pod.status and pod.status.start_time) or pod.metadata.creation_timestamp or now
+    return (now - started).total_seconds()
+
+
+class WarmPool:
+    """
+    Per-challenge pools of pre-started, unassigned challenge pods (label ctf-pool=warm).
+    - claim(): picks a ready pool pod and relabels it to the team (ctf-pool=claimed, team=<id>)
+      in one optimistic-concurrency patch (resourceVersion), so two workers never get the same pod;
+      the team's Service then selects it exactly like a cold-spawned pod
+    - the flag (and TCP passphrase) are delivered after start through annotations mounted as
+      files under SECRETS_DIR (CTF_FLAG_FILE / CTF_PASSPHRASE_FILE), since the env is fixed at start
+    - pool pods come from the challenge's manifest template (same resources / env as a cold
+      spawn); the profile probe (TCP without one) is their startup probe and a claim needs a
+      started pod, while readiness checks the flag file: the pod (hence the instance) turns
+      Ready once the kubelet wrote the claimed flag, never while the file is still empty
+    - refill loop: one worker at a time (Redis lock) tops every pool up to the challenge's
+      `warm_pool_size`, replaces dead pods and removes pods of challenges no longer pooled
+    Unclaimed pods are recycled after K8S_WARM_POOL_MAX_AGE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        core_v1: AsyncCoreV1,
+        namespace: str,
+        *,
+        targets_loader: Callable[[], Awaitable[list[PoolTarget]]] = _load_targets,
+        r: redis.Redis | None = None,
+        interval: float = settings.K8S_WARM_POOL_REFILL_SECONDS,
+        max_age: int = settings.K8S_WARM_POOL_MAX_AGE_SECONDS,
+    ) -> None:
+        self.core_v1 = core_v1
+        self.namespace = namespace
+        self.interval = interval
+        self.max_age = max_age
+        self._load_targets = targets_loader
+        self._r = r or redis_client
+        self._lock = LeaderLock(REFILL_LOCK_KEY, ttl_seconds=max(30, self.interval * 2), r=self._r)
+
+        self._warm: dict[int, int] = {}  # challenge_id -> ready pool pods (last refill)
+        self._targets: dict[int, int] = {}
+
+        self._task: asyncio.Task | None = None
+        self._stop_event = asyncio.Event()
+        self._wake = asyncio.Event()
+
+    def _selector(self, challenge_id: int | None = None) -> str:
+        sel = f"app=ctf-challenge,{POOL_LABEL}={POOL_WARM}"
+        return sel if challenge_id is None else f"{sel},challenge={challenge_id}"
+
+    def pod_manifest(self, target: PoolTarget) -> dict:
+        template = challenge_profiles.template(target.challenge_id, target.image, target.port, target.profile)
+        body = template.pod(
+            name=f"pool-c{target.challenge_id}-{secrets.token_hex(4)}",
+            labels={"app": "ctf-challenge", "challenge": str(target.challenge_id), POOL_LABEL: POOL_WARM},
+            env=_POOL_ENV,
+            active_deadline_seconds=self.max_age,
+            volume_mounts=_POOL_VOLUME_MOUNTS,
+            volumes=_POOL_VOLUMES,
+            readiness_probe={"tcpSocket": {"port": template.port}, "periodSeconds": 2},
+        )
+        container = body["spec"]["containers"][0]
+        container["startupProbe"] = {**container.pop("readinessProbe"), "failureThreshold": _STARTUP_FAILURE_THRESHOLD}
+        container["readinessProbe"] = _FLAG_DELIVERED_PROBE
+        return body
+
+    async def claim(
+        self,
+        team_id: int,
+        challenge_id: int,
+        *,
+        flag: str,
+        passphrase: str | None,
+        ttl_seconds: int,
+    ) -> client.V1Pod | None:
+        """
+        Assigns a ready pool pod to the team. Returns the claimed pod, or None if the pool is empty.
+        """
+        pods = await self.core_v1.call(
+            "list_namespaced_pod", self.namespace, label_selector=self._selector(challenge_id)
+        )
+        now = datetime.now(timezone.utc)
+        ready = sorted(
+            (p for p in pods.items if pod_is_started(p)),
+            key=lambda p: p.metadata.creation_timestamp or now,
+        )
+
+        for pod in ready:
+            # activeDeadlineSeconds counts from pod start and may only be lowered
+            deadline = int(_age_seconds(pod, now)) + ttl_seconds
+            if deadline > (pod.spec.active_deadline_seconds or self.max_age):
+                continue
+
+            annotations = {FLAG_ANNOTATION: flag}
+            if passphrase:
+                annotations[PASSPHRASE_ANNOTATION] = passphrase
+            patch = {
+                "metadata": {
+                    "resourceVersion": pod.metadata.resource_version,  # fails with 409 if someone was faster
+                    "labels": {POOL_LABEL: POOL_CLAIMED, "team": str(team_id)},
+                    "annotations": annotations,
+                },
+                "spec": {"activeDeadlineSeconds": deadline},
+            }
+            try:
+                claimed = await self.core_v1.call(
+                    "patch_namespaced_pod",
+                    pod.metadata.name,
+                    self.namespace,
+                    patch,
+                    _content_type="application/merge-patch+json",
+                )
+            except ApiException as e:
+                if e.status in (404, 409, 422):
+                    continue  # claimed by another worker, gone, or no longer patchable
+                raise
+
+            metrics.inc("warm_pool.claimed")
+            self._wake.set()  # refill right away
+            logger.info(f"Team {team_id} claimed warm pod {pod.metadata.name} (challenge {challenge_id})")
+            return claimed
+
+        metrics.inc("warm_pool.miss")
+        return None
+
+    async def refill_once(self) -> None:
+        targets = {t.challenge_id: t for t in await self._load_targets()}
+        pods = await self.core_v1.call("list_namespaced_pod", self.namespace, label_selector=self._selector())
+        now = datetime.now(timezone.utc)
+
+        alive: dict[int, list[client.V1Pod]] = {}
+        stale: list[client.V1Pod] = []
+        for pod in pods.items:
+            challenge_id = int(pod.metadata.labels.get("challenge", 0))
+            target = targets.get(challenge_id)
+            too_old = _age_seconds(pod, now) > self.max_age - settings.CHALLENGE_K8S_POD_TTL_SECONDS
+            if pod.metadata.deletion_timestamp:
+                continue
+            if target is None or too_old or (pod.status and pod.status.phase in ("Succeeded", "Failed")):
+                stale.append(pod)
+            else:
+                alive.setdefault(challenge_id, []).append(pod)
+
+        # pool shrunk: drop the youngest surplus pods
+        for challenge_id, items in alive.items():
+            surplus = len(items) - targets[challenge_id].size
+            if surplus > 0:
+                items.sort(key=lambda p: p.metadata.creation_timestamp or now)
+                stale.extend(items[-surplus:])
+                del items[-surplus:]
+
+        creates = [
+            self.core_v1.call("create_namespaced_pod", namespace=self.namespace, body=self.pod_manifest(t))
+            for t in targets.values()
+            for _ in range(t.size - len(alive.get(t.challenge_id, ())))
+        ]
+        deletes = [
+            self.core_v1.call("delete_namespaced_pod", name=p.metadata.name, namespace=self.namespace) for p in stale
+        ]
+        # a timed-out create may still land: the next pass lists it (and trims a surplus)
+        results = await asyncio.gather(*creates, *deletes, return_exceptions=True)
+        for res in results:
+            if isinstance(res, Exception) and getattr(res, "status", None) != 404:
+                logger.warning(f"Warm pool refill call failed: {res}")
+
+        metrics.inc("warm_pool.created", len(creates))
+        self._targets = {cid: t.size for cid, t in targets.items()}
+        self._warm = {cid: sum(pod_is_started(p) for p in alive.get(cid, ())) for cid in targets}
+
+    async def run_forever(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                async with self._lock.held() as leader:
+                    if leader:
+                        await self.refill_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Warm pool refill failed: {e}")
+
+            self._wake.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return  # idempotent
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stop_event.set()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {str(cid): {"target": size, "ready": self._warm.get(cid, 0)} for cid, size in self._targets.items()}
@@ -296,7 +296,44 @@ function AppContent() {
       window.dispatchEvent(new CustomEvent("ctf-refresh", { detail: { force: true } }));
     };
 
+    // team-scoped: only sent to streams of the instance's team
+    const onInstanceReady = (e) => {
+      let detail = null;
+      try {
+        detail = JSON.parse(e.data);
+      } catch {
+        return;
+      }
+      window.dispatchEvent(new CustomEvent("instance-ready", { detail }));
+    };
+
+    // team-scoped: queue position / ETA changes and the start of a queued spawn
+    const onSpawnQueue = (e) => {
+      let detail = null;
+      try {
+        detail = JSON.parse(e.data);
+      } catch {
+        return;
+      }
+      window.dispatchEvent(new CustomEvent("spawn-queue", { detail }));
+    };
+
+    // team-scoped: an idle instance the cluster needs back (asked to terminate / reclaimed)
+    const onIdleInstance = (e) => {
+      let detail = null;
+      try {
+        detail = JSON.parse(e.data);
+      } catch {
+        return;
+      }
+      window.dispatchEvent(new CustomEvent("instance-idle", { detail: { ...detail, reclaimed: e.type === "instance_reclaimed" } }));
+    };
+
     es.addEventListener("ctf_changed", onChange);
+    es.addEventListener("instance_ready", onInstanceReady);
+    es.addEventListener("spawn_queue", onSpawnQueue);
+    es.addEventListener("instance_idle", onIdleInstance);
+    es.addEventListener("instance_reclaimed", onIdleInstance);
 
     es.onerror = () => {
       // nothing - EventSource retries on his own
@@ -304,6 +341,10 @@ function AppContent() {
 
     return () => {
       es.removeEventListener("ctf_changed", onChange);
+      es.removeEventListener("instance_ready", onInstanceReady);
+      es.removeEventListener("spawn_queue", onSpawnQueue);
+      es.removeEventListener("instance_idle", onIdleInstance);
+      es.removeEventListener("instance_reclaimed", onIdleInstance);
       es.close();
     };
   }, [ctfActive, isAdminRoute]);
@@ -25,6 +25,11 @@ function fmtTime(seconds) {
   return `${mm}:${ss}`;
 }
 
+// hibernated (scaled to zero) instances are usable: the first web request wakes them up
+function isUsable(inst) {
+  return !!inst?.running || inst?.status === "hibernated";
+}
+
 function groupByCategory(list) {
   const out = {};
   for (const ch of list) {
@@ -176,7 +181,7 @@ function ChallengeModal({
   }, []);
 
   /**
-   * Poll instance status
+   * Instance status: pushed by SSE (instance-ready), polled only as a slow fallback
    */
   useEffect(() => {
     let stopped = false;
@@ -189,7 +194,7 @@ function ChallengeModal({
         if (stopped) return;
         const nextInst = res.data || null;
         setInst(nextInst);
-        if (nextInst?.running) {
+        if (isUsable(nextInst)) {
           setPending(false);
           if (pendingTimerRef.current) clearTimeout(pendingTimerRef.current);
         }
@@ -203,12 +208,50 @@ function ChallengeModal({
       }
     }
 
+    const onReady = (e) => {
+      if (e.detail?.challenge_id === ch.id) loadStatus();
+    };
+
+    // queued spawn: position / ETA pushed as they change; "starting" once it got a slot
+    const onQueue = (e) => {
+      const d = e.detail;
+      if (d?.challenge_id !== ch.id) return;
+      if (d.status === "queued") {
+        setInst({ running: false, status: "queued", queue_position: d.position, eta_seconds: d.eta_seconds });
+      } else {
+        setPending(d.status === "starting");
+        loadStatus();
+      }
+    };
+
+    // idle instance while the cluster is nearly full: asked to terminate it, or reclaimed
+    const onIdle = (e) => {
+      const d = e.detail;
+      if (d?.challenge_id !== ch.id) return;
+      const minutes = Math.floor((d.idle_seconds || 0) / 60);
+      setMsgKind("warn");
+      if (d.reclaimed) {
+        setMsg(`Instance stopped after ${minutes} min without activity: the cluster needed the slot.`);
+        setInst(null);
+        setWebToken(null);
+        setWebUrl(null);
+      } else {
+        setMsg(`No activity for ${minutes} min and the cluster is nearly full. Please terminate the instance if you are done.`);
+      }
+    };
+
     loadStatus();
-    const interval = setInterval(loadStatus, 10000);
+    const interval = setInterval(loadStatus, 30000);
+    window.addEventListener("instance-ready", onReady);
+    window.addEventListener("spawn-queue", onQueue);
+    window.addEventListener("instance-idle", onIdle);
 
     return () => {
       stopped = true;
       clearInterval(interval);
+      window.removeEventListener("instance-ready", onReady);
+      window.removeEventListener("spawn-queue", onQueue);
+      window.removeEventListener("instance-idle", onIdle);
     };
   }, [ch.id, canUseInstance, canClose]);
 
@@ -229,7 +272,7 @@ function ChallengeModal({
   async function ensureWebToken() {
     if (!canUseInstance) return;
     if (pending) return;
-    if (!inst?.running) return;
+    if (!isUsable(inst)) return;
     if (webToken && webUrl) return;
 
     try {
@@ -247,7 +290,7 @@ function ChallengeModal({
   useEffect(() => {
     ensureWebToken();
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [inst?.running, inst?.expires_at, ch.id, pending]);
+  }, [inst?.running, inst?.status, inst?.expires_at, ch.id, pending]);
 
   /**
    * Spawn (team scoped)
@@ -286,7 +329,7 @@ function ChallengeModal({
       const res = await api.post(`/challenges/${ch.id}/spawn2`, {});
       const payload = res.data?.instance || res.data || null;
       setInst(payload);
-      if (payload?.running) {
+      if (isUsable(payload) || payload?.status === "queued") {
         setPending(false);
         if (pendingTimerRef.current) clearTimeout(pendingTimerRef.current);
       }
@@ -302,7 +345,7 @@ function ChallengeModal({
         const data = e.response.data || {};
         const payload = data.instance || null;
         setInst(payload);
-        if (payload?.running) {
+        if (isUsable(payload)) {
           setPending(false);
           if (pendingTimerRef.current) clearTimeout(pendingTimerRef.current);
         }
@@ -327,14 +370,14 @@ function ChallengeModal({
     setMsgKind("");
 
     try {
-      await api.post(`/challenges/${ch.id}/terminate2`, {});
+      const res = await api.post(`/challenges/${ch.id}/terminate2`, {});
       setInst(null);
       setWebToken(null);
       setWebUrl(null);
       setPending(false);
       if (pendingTimerRef.current) clearTimeout(pendingTimerRef.current);
       setMsgKind("success");
-      setMsg("Instance terminated.");
+      setMsg(res.data?.message || "Instance terminated.");
     } catch (e) {
       const msg2 = safeDetail(e, "Failed to terminate instance.");
       setMsgKind("error");
@@ -537,11 +580,13 @@ function ChallengeModal({
                   </div>
                 ) : (
                   <>
-                    {inst?.running ? (
+                    {isUsable(inst) ? (
                       <div className="ctf-instance">
                         <div className="ctf-row">
                           <span className="label">Status</span>
-                          <span className="val ok">{inst.status || "running"}</span>
+                          <span className="val ok">
+                            {inst.status === "hibernated" ? "hibernated (wakes on first request)" : inst.status || "running"}
+                          </span>
                         </div>
 
                         {inst.protocol === "http" && webUrl && (
@@ -619,6 +664,29 @@ function ChallengeModal({
                           <b>TCP challenges:</b> service may ask for a handshake password. After 3 failed attempts the connection is dropped.
                         </div>
                       </div>
+                    ) : inst?.status === "queued" ? (
+                      <div className="ctf-instance">
+                        <div className="ctf-row">
+                          <span className="label">Status</span>
+                          <span className="val warn">queued #{inst.queue_position ?? "?"}</span>
+                        </div>
+                        {inst.eta_seconds != null && (
+                          <div className="ctf-row">
+                            <span className="label">ETA</span>
+                            <span className="val mono">~{Math.max(1, Math.ceil(inst.eta_seconds / 60))} min</span>
+                          </div>
+                        )}
+
+                        <div className="ctf-note">
+                          No free capacity right now. Your instance starts automatically when a slot frees up.
+                        </div>
+
+                        <div className="ctf-actions">
+                          <button className="auth-submit" onClick={terminate} disabled={busy} type="button">
+                            Leave queue
+                          </button>
+                        </div>
+                      </div>
                     ) : pending ? (
                       <div className="ctf-instance">
                         <div className="ctf-row">
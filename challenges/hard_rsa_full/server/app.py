@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import os, json, pathlib
 
 app = Flask(__name__)
@@ -30,8 +30,11 @@ def get_pub():
 
 @app.get("/cipher")
 def get_cipher():
-    # Backend injects CTF_FLAG. Locally you can use FLAG.
-    flag = os.getenv("CTF_FLAG") or os.getenv("FLAG") or "FLAG{local_test}"
+    # Shared deployment: the platform proxy sends the team's flag with every request.
+    # Per-team pod: backend injects CTF_FLAG. Locally you can use FLAG.
+    flag = request.headers.get("X-CTF-Flag") or os.getenv("CTF_FLAG") or os.getenv("FLAG")
+    if not flag:
+        return jsonify({"error": "no flag for this request"}), 503
 
     m = bytes_to_int(flag.encode("utf-8"))
 
@@ -13,6 +13,26 @@ def get_secret_from_png():
         return None
 
 
+def current_flag():
+    # warm-pool pods get the flag as a file after start (empty until the kubelet wrote it),
+    # others via CTF_FLAG
+    flag_file = os.environ.get("CTF_FLAG_FILE")
+    if flag_file:
+        try:
+            with open(flag_file) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+    return os.environ.get("CTF_FLAG") or None
+
+
+@app.before_request
+def require_flag():
+    # no flag yet (unclaimed warm pod, missing env): unavailable rather than a wrong flag
+    if not current_flag():
+        return "Challenge not ready", 503
+
+
 def sign(username, key):
     return hmac.new(key.encode(), username.encode(), hashlib.sha256).hexdigest()
 
@@ -94,8 +114,7 @@ def flag():
 
     expected = sign(username, key)
     if hmac.compare_digest(expected, provided) and username == "admin":
-        # default flag if CTF_FLAG not provided
-        return os.environ.get("CTF_FLAG", "ISEP{You_f0und_th3_s3cr3t!}")
+        return current_flag()
     return "Access denied", 403
 
 
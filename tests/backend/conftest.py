@@ -10,6 +10,7 @@ from pathlib import Path
 import httpx
 import pytest
 import pytest_asyncio
+import redis.asyncio as aioredis
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
@@ -105,6 +106,7 @@ TEST_DB_URL = os.environ["SQLALCHEMY_DATABASE_URL"]
 from app.backend.api.v1 import deps
 from app.backend.db.base import Base
 from app.backend.main import app
+from app.backend.utils.ctf_state_cache import ctf_state_cache
 
 with suppress(Exception):
     app.state.limiter.enabled = False
@@ -132,6 +134,7 @@ async def reset_db(async_engine):
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    ctf_state_cache.invalidate()
     yield
 
 
@@ -142,6 +145,39 @@ async def db_session(async_engine) -> AsyncGenerator:
         yield session
 
 
+# -----------------------------
+# REAL REDIS (Lua scripts)
+# -----------------------------
+# TEST_REDIS_URL (CI service, flushed around each test) or a throwaway testcontainers Redis;
+# without either the tests using `real_redis` are skipped
+@pytest.fixture(scope="session")
+def real_redis_url():
+    if url := os.environ.get("TEST_REDIS_URL"):
+        yield url
+        return
+    try:
+        from testcontainers.redis import RedisContainer
+    except ImportError:
+        pytest.skip("needs TEST_REDIS_URL or testcontainers")
+    try:
+        container = RedisContainer("redis:7-alpine").start()
+    except Exception as e:
+        pytest.skip(f"no Redis container: {e}")
+    try:
+        yield f"redis://{container.get_container_host_ip()}:{container.get_exposed_port(6379)}/0"
+    finally:
+        container.stop()
+
+
+@pytest_asyncio.fixture
+async def real_redis(real_redis_url) -> AsyncGenerator[aioredis.Redis, None]:
+    r = aioredis.Redis.from_url(real_redis_url, decode_responses=True)
+    await r.flushdb()
+    yield r
+    await r.flushdb()
+    await r.aclose()
+
+
 @pytest_asyncio.fixture
 async def client(db_session) -> AsyncGenerator[AsyncClient, None]:
     async def override_get_db():
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from kubernetes import client
+
+from app.backend.utils.challenge_profiles import ChallengeProfile
+from app.backend.utils.cluster_capacity import NodeCapacityWatcher
+from app.backend.utils.instance_limiter import BUDGET_KEY, RESERVATIONS_KEY, InstanceLimiter
+from app.backend.utils.team_instance_store import ADMIT_CLAIMED, ADMIT_FULL, TeamInstanceStore
+
+
+class _HashRedis:
+    """
+    Hash / sorted-set subset of Redis used by the capacity reads and the node watcher.
+    """
+
+    def __init__(self) -> None:
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.ttls: dict[str, int] = {}
+
+    async def zrangebyscore(self, key, min, max):
+        return [m for m, s in self.zsets.get(key, {}).items() if s >= float(min)]
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hmget(self, key, *fields):
+        h = self.hashes.get(key, {})
+        return [h.get(f) for f in fields]
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, r: _HashRedis) -> None:
+        self._r = r
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *a, **kw: self._calls.append(getattr(self._r, name)(*a, **kw))
+
+    async def execute(self):
+        return [await c for c in self._calls]
+
+
+def _node(cpu: str, memory: str, *, unschedulable=False) -> client.V1Node:
+    return client.V1Node(
+        spec=client.V1NodeSpec(unschedulable=unschedulable),
+        status=client.V1NodeStatus(allocatable={"cpu": cpu, "memory": memory}),
+    )
+
+
+class _NodesApi:
+    def __init__(self, nodes) -> None:
+        self.nodes = nodes
+        self.calls = []
+
+    async def call(self, method, **kwargs):
+        self.calls.append((method, kwargs))
+        return SimpleNamespace(items=self.nodes)
+
+
+def test_profile_weight_is_its_requests():
+    assert ChallengeProfile(cpu_request="250m", memory_request="128Mi").weight == (250, 128 * 2**20)
+    assert ChallengeProfile(cpu_request="1.5", memory_request="1G").weight == (1500, 10**9)
+
+
+@pytest.mark.asyncio
+async def test_utilisation_counts_only_live_slots_against_the_node_budget():
+    r = _HashRedis()
+    now = time.time()
+    r.zsets[InstanceLimiter.ZSET_KEY] = {"slot:a": now + 60, "slot:b": now + 60, "slot:gone": now - 60}
+    r.hashes[RESERVATIONS_KEY] = {"slot:a": "250 134217728", "slot:b": "1000 536870912", "slot:gone": "4000 1"}
+
+    # nothing watched yet: the configured budget (none in tests) applies
+    stats = await InstanceLimiter(r).utilisation()
+    assert stats["instances"] == 2
+    assert stats["budget_source"] == "settings"
+    assert stats["cpu"] == {"used_millicores": 1250, "budget_millicores": None, "percent": None}
+
+    api = _NodesApi([_node("4", "8Gi"), _node("2", "4Gi"), _node("64", "1Ti", unschedulable=True)])
+    watcher = NodeCapacityWatcher(api, r, selector="pool=challenges", fraction=0.5, interval=20)
+    assert await watcher.refresh() == {"cpu": 3000, "memory": 6 * 2**30}
+    assert api.calls == [("list_node", {"label_selector": "pool=challenges"})]
+    assert r.ttls[BUDGET_KEY] == 60  # stale after three missed refreshes
+
+    stats = await InstanceLimiter(r).utilisation()
+    assert stats["budget_source"] == "nodes"
+    assert stats["cpu"]["percent"] == round(100 * 1250 / 3000, 1)
+    assert stats["memory"] == {"used_bytes": 640 * 2**20, "budget_bytes": 6 * 2**30, "percent": 10.4}
+    assert watcher.stats()["nodes"] == 2
+
+
+# -----------------------------
+# budget script against a real Redis
+# -----------------------------
+@pytest.mark.asyncio
+async def test_concurrent_admissions_stop_at_the_node_budget(real_redis):
+    store = TeamInstanceStore(real_redis)
+    await real_redis.hset(BUDGET_KEY, mapping={"cpu": 1000, "memory": 2**30})
+
+    results = await asyncio.gather(
+        *(
+            store.admit(team, 1, ttl_seconds=60, limit=100, cpu_millicores=300, memory_bytes=2**20)
+            for team in range(10)
+        )
+    )
+    assert [outcome for outcome, _ in results].count(ADMIT_CLAIMED) == 3
+    assert [info for outcome, info in results if outcome == ADMIT_FULL] == [{"reason": "cpu"}] * 7
+
+    # memory is checked the same way
+    outcome, info = await store.admit(50, 1, ttl_seconds=60, limit=100, cpu_millicores=0, memory_bytes=2**30)
+    assert (outcome, info) == (ADMIT_FULL, {"reason": "memory"})
+    assert (await store.admit(51, 1, ttl_seconds=60, limit=100, cpu_millicores=100))[0] == ADMIT_CLAIMED
+
+
+@pytest.mark.asyncio
+async def test_budget_counts_only_live_reserved_slots(real_redis):
+    store = TeamInstanceStore(real_redis)
+    await real_redis.hset(BUDGET_KEY, mapping={"cpu": 1000, "memory": 0})
+    await real_redis.zadd(InstanceLimiter.ZSET_KEY, {"slot:gone": 1, "slot:hibernated": time.time() + 60})
+    await real_redis.hset(RESERVATIONS_KEY, mapping={"slot:gone": "900 0"})  # slot:hibernated gave its back
+
+    assert (await store.admit(1, 1, ttl_seconds=60, limit=100, cpu_millicores=1000))[0] == ADMIT_CLAIMED
+    assert await real_redis.hexists(RESERVATIONS_KEY, "slot:gone") == 0
+    assert await store.reserve(2, 1, cpu_millicores=1, memory_bytes=0) == "cpu"
+
+
+@pytest.mark.asyncio
+async def test_node_budget_overrides_the_configured_one(real_redis, monkeypatch):
+    monkeypatch.setattr("app.backend.utils.instance_limiter.settings.CAPACITY_CPU", "500m")
+    monkeypatch.setattr("app.backend.utils.instance_limiter.settings.CAPACITY_MEMORY", "")
+    store = TeamInstanceStore(real_redis)
+
+    assert await store.admit(1, 1, ttl_seconds=60, limit=100, cpu_millicores=600) == (ADMIT_FULL, {"reason": "cpu"})
+
+    # watched nodes: 0 = no budget on that resource, whatever is configured
+    await real_redis.hset(BUDGET_KEY, mapping={"cpu": 0, "memory": 0})
+    assert (await store.admit(1, 1, ttl_seconds=60, limit=100, cpu_millicores=600))[0] == ADMIT_CLAIMED
@@ -0,0 +1,149 @@
+import pytest
+import pytest_asyncio
+from kubernetes import client
+
+from app.backend.config.redis import RedisRegistry
+from app.backend.utils.challenge_profiles import (
+    DEFAULT_PROFILE,
+    ChallengeProfiles,
+    ManifestTemplate,
+    ProbeProfile,
+    parse_profile,
+)
+from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.k8s_manager import K8sTeamChallengeManager
+from app.backend.utils.shared_instances import SharedDeployments, shared_flag
+from tests.backend.utils import LocalK8sApiServer, LocalRedisServer
+
+BOT_YML = """
+name: xss-bot
+points: 300
+runtime:
+  port: 8000
+  resources:
+    requests: {cpu: 250m, memory: 512Mi}
+    limits: {cpu: "1", memory: 1Gi}
+  probe: {type: http, path: /health, period_seconds: 2}
+  env: {BOT_TIMEOUT: 10}
+"""
+
+
+def test_profiles_are_read_once_per_challenge_directory(tmp_path):
+    (tmp_path / "xss-bot").mkdir()
+    (tmp_path / "xss-bot" / "challenge.yml").write_text(BOT_YML)
+    (tmp_path / "crypto" / "xor").mkdir(parents=True)
+    (tmp_path / "crypto" / "xor" / "challenge.yml").write_text(
+        "name: xor\nruntime:\n  resources:\n    limits: {cpu: 100m}\n"
+    )
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "challenge.yml").write_text('name: "x",\npoints: 1,\n')
+    (tmp_path / "greedy").mkdir()
+    (tmp_path / "greedy" / "challenge.yml").write_text("runtime:\n  env: {CTF_FLAG: fake}\n")
+
+    profiles = ChallengeProfiles(tmp_path)
+    bot = profiles.get("xss-bot")
+    assert (bot.cpu_request, bot.memory_limit, bot.port) == ("250m", "1Gi", 8000)
+    assert bot.probe == ProbeProfile(type="http", path="/health", period_seconds=2)
+    assert bot.env == (("BOT_TIMEOUT", "10"),)
+
+    xor = profiles.get(None, "crypto/xor")  # no path: the name is the directory, as for flags on disk
+    assert xor.cpu_limit == "100m"
+    assert xor.memory_limit == DEFAULT_PROFILE.memory_limit
+    assert profiles.get("broken") is DEFAULT_PROFILE
+    assert profiles.get("greedy") is DEFAULT_PROFILE  # may not replace the injected flag
+    assert profiles.get("missing") is DEFAULT_PROFILE
+    assert profiles.stats()["invalid"] == ["broken", "greedy"]
+
+    with pytest.raises(ValueError):
+        parse_profile({"resources": {"limits": {"memory": "lots"}}})
+
+
+def test_template_is_compiled_once_and_only_fills_in_the_instance_fields(tmp_path):
+    profiles = ChallengeProfiles(tmp_path)
+    bot = parse_profile({"port": 8000, "probe": {"type": "tcp"}, "env": {"BOT_TIMEOUT": "10"}})
+
+    tpl = profiles.template(4, "bot:1", 80, bot)
+    assert profiles.template(4, "bot:1", 80, bot) is tpl
+    a = tpl.pod(name="chal-t1-c4", labels={"team": "1"}, env={"CTF_FLAG": "a"}, active_deadline_seconds=60)
+    b = tpl.pod(name="chal-t2-c4", labels={"team": "2"}, env={"CTF_FLAG": "b"}, active_deadline_seconds=60)
+
+    (container,) = a["spec"]["containers"]
+    assert container["env"] == [{"name": "BOT_TIMEOUT", "value": "10"}, {"name": "CTF_FLAG", "value": "a"}]
+    assert b["spec"]["containers"][0]["env"][-1] == {"name": "CTF_FLAG", "value": "b"}
+    assert container["readinessProbe"]["tcpSocket"] == {"port": 8000}
+    assert container["ports"] == [{"containerPort": 8000}]
+    assert tpl.service(name="chal-t1-c4", selector={}, service_type="NodePort")["spec"]["ports"][0]["port"] == 8000
+
+    # a new image (admin edit) recompiles
+    assert profiles.template(4, "bot:2", 80, bot) is not tpl
+
+
+@pytest_asyncio.fixture
+async def k8s(monkeypatch):
+    redis_server = await LocalRedisServer().start()
+    reg = RedisRegistry(redis_server.url, max_connections=4, pool_timeout=1, socket_timeout=1, health_check_interval=0)
+    api = await LocalK8sApiServer().start()
+    mgr = K8sTeamChallengeManager()
+    cfg = client.Configuration(host=api.host)
+    monkeypatch.setattr(mgr, "core_v1", AsyncCoreV1(client.CoreV1Api(client.ApiClient(cfg)), max_workers=4, timeout=5))
+    monkeypatch.setattr(mgr, "flag_store", TeamFlagStore(reg.client()))
+    yield mgr, api
+
+    mgr.core_v1.close()
+    await api.stop()
+    await reg.shutdown()
+    await redis_server.stop()
+
+
+@pytest.mark.asyncio
+async def test_spawn_uses_the_challenge_profile(k8s):
+    mgr, api = k8s
+    bot = parse_profile({"port": 8000, "resources": {"limits": {"cpu": "1", "memory": "1Gi"}}})
+
+    result = await mgr.spawn_instance(1, 5, "bot:1", 80, profile=bot)
+    assert result["connection_internal"].endswith(":8000")
+
+    (pod,) = api.pods(team="1")
+    assert pod["spec"]["containers"][0]["resources"]["limits"] == {"cpu": "1", "memory": "1Gi"}
+    assert pod["spec"]["containers"][0]["env"][0]["name"] == "CTF_FLAG"
+
+    # challenges without a profile keep the platform defaults
+    await mgr.spawn_instance(2, 6, "img", 8080)
+    (pod,) = api.pods(team="2")
+    assert pod["spec"]["containers"][0]["resources"]["limits"] == {"cpu": "500m", "memory": "512Mi"}
+
+
+@pytest.mark.asyncio
+async def test_shared_challenge_serves_every_team_from_one_deployment(k8s, monkeypatch):
+    mgr, api = k8s
+    apps_v1 = AsyncCoreV1(client.AppsV1Api(mgr.core_v1.api.api_client), max_workers=2, timeout=5)
+    monkeypatch.setattr(mgr, "shared", SharedDeployments(apps_v1, mgr.core_v1, mgr.namespace))
+    oracle = parse_profile({"mode": "shared", "replicas": 2})
+    assert oracle.shared
+
+    first = await mgr.spawn_instance(1, 7, "rsa:1", 5000, profile=oracle)
+    second = await mgr.spawn_instance(2, 7, "rsa:1", 5000, profile=oracle)
+
+    # one Deployment + Service for the challenge, no pod per team
+    assert api.objects[("deployments", "chal-shared-c7")]["spec"]["replicas"] == 2
+    assert ("services", "chal-shared-c7") in api.objects
+    assert api.pods(team="1") == [] and api.pods(team="2") == []
+    assert first["connection_internal"] == second["connection_internal"]
+    container = api.objects[("deployments", "chal-shared-c7")]["spec"]["template"]["spec"]["containers"][0]
+    assert all(e["name"] != "CTF_FLAG" for e in container["env"])
+
+    # team flags: derived, distinct, stable, and stored for submissions
+    assert first["flag"] == shared_flag(7, 1) != second["flag"]
+    assert await mgr.flag_store.get_flag(2, 7) == shared_flag(7, 2)
+    assert sum(1 for _, path in api.requests if "deployments" in path) == 1  # second spawn: no API call
+
+    # another worker adopts the existing deployment (patched to its replica count)
+    other = SharedDeployments(apps_v1, mgr.core_v1, mgr.namespace)
+    await other.ensure(7, ManifestTemplate("rsa:1", 5000, oracle), 3)
+    assert api.objects[("deployments", "chal-shared-c7")]["spec"]["replicas"] == 3
+    apps_v1.close()
+
+    # TCP challenges keep a pod per team
+    tcp = await mgr.spawn_instance(3, 8, "nc:1", 4000, protocol="tcp", profile=oracle)
+    assert tcp["pod_uid"] and api.pods(team="3")
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.backend.utils.ctf_state_cache import CTFStateCache, CTFStateSnapshot
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_ctf_state_cache_serves_from_memory_until_ttl_or_invalidation():
+    calls = 0
+    state = CTFStateSnapshot(active=True, ends_at=None, paused_remaining_seconds=None)
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return state
+
+    clock = _Clock()
+    cache = CTFStateCache(ttl=5, loader=loader, clock=clock)
+
+    # concurrent cold reads share one load
+    results = await asyncio.gather(*(cache.get() for _ in range(20)))
+    assert all(r.is_open() for r in results)
+    assert calls == 1
+
+    clock.now += 4
+    await cache.get()
+    assert calls == 1
+
+    clock.now += 2
+    await cache.get()
+    assert calls == 2
+
+    # ctf_changed from another worker
+    state = CTFStateSnapshot(active=False, ends_at=None, paused_remaining_seconds=30)
+    cache.invalidate()
+    assert (await cache.get()).is_open() is False
+    assert calls == 3
+
+
+def test_snapshot_is_closed_after_ends_at_without_reload():
+    now = datetime.now(timezone.utc)
+    snap = CTFStateSnapshot(active=True, ends_at=now + timedelta(seconds=10), paused_remaining_seconds=None)
+
+    assert snap.is_open(now) is True
+    assert snap.is_open(now + timedelta(seconds=11)) is False
+
+
+@pytest.mark.asyncio
+async def test_reload_overlapping_a_write_through_is_not_stored():
+    before = CTFStateSnapshot(active=True, ends_at=None, paused_remaining_seconds=None)
+    stopped = CTFStateSnapshot(active=False, ends_at=None, paused_remaining_seconds=None)
+    loading = asyncio.Event()
+    release = asyncio.Event()
+
+    async def loader():
+        loading.set()
+        await release.wait()
+        return before  # read before the admin's write committed
+
+    cache = CTFStateCache(ttl=60, loader=loader, clock=_Clock())
+    reload = asyncio.create_task(cache.get())
+    await loading.wait()
+    cache.set(stopped)  # admin stops the CTF on this worker meanwhile
+    release.set()
+
+    assert (await reload).is_open() is False
+    assert (await cache.get()).is_open() is False
+
+    # same for an invalidation (ctf_changed from another worker) during the load
+    loading.clear()
+    release.clear()
+    cache.invalidate()
+    reload = asyncio.create_task(cache.get())
+    await loading.wait()
+    cache.invalidate()
+    release.set()
+    await reload
+    assert cache._snapshot is None
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.backend.utils.email_validation import MXLookupCache
+from tests.backend.utils import StaticMXResolver
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_mx_positive_and_negative_results_are_cached():
+    resolver = StaticMXResolver({"gmail.com": 300})
+    clock = _Clock()
+    cache = MXLookupCache(resolver=resolver, timeout=0.5, min_ttl=60, max_ttl=3600, negative_ttl=120, clock=clock)
+
+    assert await cache.has_mx("gmail.com") is True
+    assert await cache.has_mx("GMAIL.com.") is True
+    assert await cache.has_mx("nope.invalid") is False
+    assert await cache.has_mx("nope.invalid") is False
+    assert resolver.calls == ["gmail.com", "nope.invalid"]
+
+    # negative entry expires first, positive one follows the record TTL
+    clock.now += 121
+    assert await cache.has_mx("nope.invalid") is False
+    assert await cache.has_mx("gmail.com") is True
+    assert resolver.calls == ["gmail.com", "nope.invalid", "nope.invalid"]
+
+    clock.now += 300
+    assert await cache.has_mx("gmail.com") is True
+    assert resolver.calls[-1] == "gmail.com"
+
+
+@pytest.mark.asyncio
+async def test_mx_timeout_is_not_cached_and_lookups_are_coalesced():
+    resolver = StaticMXResolver({"gmail.com": 300}, hang={"slow.example"})
+    cache = MXLookupCache(resolver=resolver, timeout=0.05)
+
+    assert await cache.has_mx("slow.example") is False
+    assert await cache.has_mx("slow.example") is False
+    assert resolver.calls.count("slow.example") == 2
+
+    results = await asyncio.gather(*(cache.has_mx("gmail.com") for _ in range(20)))
+    assert all(results)
+    assert resolver.calls.count("gmail.com") == 1
+
+
+@pytest.mark.asyncio
+async def test_mx_warm_prefills_cache():
+    resolver = StaticMXResolver({"gmail.com": 300, "outlook.com": 300})
+    cache = MXLookupCache(resolver=resolver, timeout=0.5)
+
+    assert await cache.warm(["gmail.com", "outlook.com", "gone.invalid"]) == 2
+    resolver.calls.clear()
+    assert await cache.has_mx("outlook.com") is True
+    assert resolver.calls == []
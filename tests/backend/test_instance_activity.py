@@ -0,0 +1,219 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.backend.utils.instance_activity import (
+    ACTIVITY_ZSET_KEY,
+    MODE_NOTIFY,
+    MODE_OFF,
+    MODE_TERMINATE,
+    ActivityTracker,
+    IdleReclaimer,
+)
+from app.backend.utils.instance_limiter import InstanceLimiter
+
+
+class _ZSetRedis:
+    def __init__(self) -> None:
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.zadds = 0
+
+    async def zadd(self, key, mapping, gt=False):
+        self.zadds += 1
+        z = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not gt or score > z.get(member, float("-inf")):
+                z[member] = score
+
+    async def zrangebyscore(self, key, min, max):
+        return [m for m, s in self.zsets.get(key, {}).items() if s >= float(min)]
+
+    async def zrange(self, key, start, end, withscores=False):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda kv: kv[1])
+        return items if withscores else [m for m, _ in items]
+
+    async def zrem(self, key, *members):
+        for m in members:
+            self.zsets.get(key, {}).pop(m, None)
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, r: _ZSetRedis) -> None:
+        self._r = r
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *a, **kw: self._calls.append(getattr(self._r, name)(*a, **kw))
+
+    async def execute(self):
+        return [await c for c in self._calls]
+
+
+class _Store:
+    def __init__(self, records) -> None:
+        self.records = records
+
+    async def get(self, team_id, challenge_id):
+        return self.records.get((team_id, challenge_id))
+
+
+class _Limiter:
+    def __init__(self, instances, max_instances=10) -> None:
+        self.instances = instances
+        self.max_instances = max_instances
+
+    async def utilisation(self):
+        return {
+            "instances": self.instances,
+            "max_instances": self.max_instances,
+            "cpu": {"percent": None},
+            "memory": {"percent": 40.0},
+        }
+
+
+class _Queue:
+    def __init__(self, pending=0) -> None:
+        self.queued = pending
+
+    async def pending(self):
+        return self.queued
+
+
+class _Bus:
+    def __init__(self) -> None:
+        self.events = []
+
+    async def publish(self, event, data=None, *, team_id=None):
+        self.events.append((event, team_id, data["challenge_id"]))
+
+
+@pytest.mark.asyncio
+async def test_touches_are_buffered_and_flushed_in_one_write():
+    r = _ZSetRedis()
+    tracker = ActivityTracker(r)
+    for _ in range(100):
+        tracker.touch(1, 5)
+    tracker.touch(2, 5)
+    assert r.zadds == 0  # nothing on the request path
+
+    assert await tracker.flush() == 2
+    assert r.zadds == 1
+    last = r.zsets[ACTIVITY_ZSET_KEY]["1:5"]
+
+    # an older timestamp flushed late by another worker does not win
+    await r.zadd(ACTIVITY_ZSET_KEY, {"1:5": last - 100}, gt=True)
+    assert r.zsets[ACTIVITY_ZSET_KEY]["1:5"] == last
+    assert await tracker.flush() == 0
+
+
+def _running(started_minutes_ago: int, protocol: str = "http") -> dict:
+    started = datetime.now(timezone.utc) - timedelta(minutes=started_minutes_ago)
+    return {"status": "running", "protocol": protocol, "started_at": started.isoformat()}
+
+
+@pytest.mark.asyncio
+async def test_idle_instances_are_reclaimed_lru_first_only_near_capacity():
+    r = _ZSetRedis()
+    now = time.time()
+    r.zsets[InstanceLimiter.ZSET_KEY] = {f"ctf:active:team:{t}:challenge:1": now + 600 for t in (1, 2, 3, 4, 5, 6)}
+    r.zsets[ACTIVITY_ZSET_KEY] = {
+        "1:1": now - 30 * 60,  # idle 30 min
+        "2:1": now - 60,  # active
+        "3:1": now - 20 * 60,  # idle 20 min
+        "9:1": now - 90 * 60,  # instance gone
+    }
+    store = _Store(
+        {
+            (1, 1): _running(50),
+            (2, 1): _running(50),
+            (3, 1): _running(50),
+            (4, 1): _running(40),  # never proxied: idle since its start
+            (5, 1): _running(50, protocol="tcp"),  # traffic not seen by the proxy
+            (6, 1): {**_running(50), "status": "starting"},
+        }
+    )
+    limiter, queue, bus = _Limiter(instances=6), _Queue(), _Bus()
+    reclaimer = IdleReclaimer(
+        r, store=store, limiter=limiter, queue=queue, bus=bus, mode=MODE_TERMINATE, idle_seconds=15 * 60
+    )
+    reclaimed: list[tuple[int, int]] = []
+
+    async def _reclaim(team_id, challenge_id):
+        reclaimed.append((team_id, challenge_id))
+        return True
+
+    reclaimer.register(_reclaim)
+
+    idle, _ = await reclaimer.idle_instances()
+    assert [(i.team_id, i.idle_seconds // 60) for i in idle] == [(4, 40), (1, 30), (3, 20)]
+    assert "9:1" not in r.zsets[ACTIVITY_ZSET_KEY]
+
+    # 60% used, nobody waiting: idle instances are left alone
+    assert await reclaimer.run_once() == 0
+    assert reclaimer.stats()["last_pass"]["idle"] == 3
+
+    # two teams wait: the two least recently used go
+    queue.queued = 2
+    assert await reclaimer.run_once() == 2
+    assert reclaimed == [(4, 1), (1, 1)]
+    assert bus.events == [("instance_reclaimed", 4, 1), ("instance_reclaimed", 1, 1)]
+
+    # notify mode asks once per idle period
+    limiter.instances, queue.queued = 9, 0
+    notifier = IdleReclaimer(r, store=store, limiter=limiter, queue=queue, bus=bus, mode=MODE_NOTIFY)
+    bus.events.clear()
+    assert await notifier.run_once() == 3
+    assert await notifier.run_once() == 0
+    assert [e[0] for e in bus.events] == ["instance_idle"] * 3
+
+
+@pytest.mark.asyncio
+async def test_idle_instances_hibernate_whatever_the_usage_and_stay_reclaimable():
+    r = _ZSetRedis()
+    now = time.time()
+    r.zsets[InstanceLimiter.ZSET_KEY] = {f"ctf:active:team:{t}:challenge:1": now + 600 for t in (1, 2, 3)}
+    r.zsets[ACTIVITY_ZSET_KEY] = {"1:1": now - 10 * 60, "2:1": now - 60, "3:1": now - 30 * 60}
+    store = _Store({(1, 1): _running(50), (2, 1): _running(50), (3, 1): _running(50, protocol="tcp")})
+    queue = _Queue()
+    reclaimer = IdleReclaimer(
+        r,
+        store=store,
+        limiter=_Limiter(instances=3),
+        queue=queue,
+        bus=_Bus(),
+        mode=MODE_OFF,
+        idle_seconds=15 * 60,
+        hibernate_seconds=5 * 60,
+    )
+    hibernated: list[tuple[int, int]] = []
+    reclaimed: list[tuple[int, int]] = []
+
+    async def _hibernate(team_id, challenge_id):
+        hibernated.append((team_id, challenge_id))
+        store.records[(team_id, challenge_id)]["status"] = "hibernated"
+        return True
+
+    async def _reclaim(team_id, challenge_id):
+        reclaimed.append((team_id, challenge_id))
+        return True
+
+    reclaimer.register(_reclaim, hibernate=_hibernate)
+    assert reclaimer.enabled  # hibernation runs even with reclaim off
+
+    # 30% used: only the scale-to-zero applies, TCP and active instances keep their pod
+    await reclaimer.run_once()
+    assert hibernated == [(1, 1)]
+    assert reclaimed == []
+    await reclaimer.run_once()
+    assert hibernated == [(1, 1)]  # already hibernated
+
+    # a hibernated instance still holds its slot: reclaimed once idle long enough and needed
+    r.zsets[ACTIVITY_ZSET_KEY]["1:1"] = now - 20 * 60
+    reclaimer.mode, queue.queued = MODE_TERMINATE, 1
+    assert await reclaimer.run_once() == 1
+    assert reclaimed == [(1, 1)]
+    assert reclaimer.stats()["hibernated"] == 1
@@ -0,0 +1,284 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import NoScriptError, ResponseError
+from starlette.requests import Request
+
+from app.backend.api.v1.endpoints import challenges
+from app.backend.utils.instance_expiry import EXPIRY_ZSET_KEY
+from app.backend.utils.instance_limiter import BUDGET_KEY, RESERVATIONS_KEY, InstanceLimiter
+from app.backend.utils.k8s_api import K8sApiTimeout
+from app.backend.utils.team_instance_store import (
+    ADMIT_CLAIMED,
+    ADMIT_EXISTS,
+    ADMIT_FULL,
+    STATUS_RESTARTING,
+    STATUS_RUNNING,
+    STATUS_STARTING,
+    STATUS_TERMINATING,
+    TeamInstanceStore,
+)
+
+
+class _ScriptedRedis:
+    """
+    Records admission calls and answers with canned script replies; the first EVALSHA
+    raises NOSCRIPT like a freshly restarted Redis.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.loads = 0
+        self.calls = []
+
+    async def script_load(self, script):
+        self.loads += 1
+        return f"sha{self.loads}"
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        if sha == "sha1":
+            raise NoScriptError("NOSCRIPT")
+        self.calls.append(keys_and_args)
+        return self.replies.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_admit_is_one_script_call_per_outcome():
+    existing = ["status", "running", "connection", "http://x", "tcp_port", "31337"]
+    r = _ScriptedRedis([["claimed"], ["exists", existing], ["full", "cpu"]])
+    store = TeamInstanceStore(r)
+
+    outcome, payload = await store.admit(7, 3, ttl_seconds=60, limit=10, cpu_millicores=250, memory_bytes=2**27)
+    assert outcome == ADMIT_CLAIMED
+    assert payload["status"] == "starting"
+    assert r.loads == 2  # reloaded once after NOSCRIPT
+
+    keys = r.calls[0][:6]
+    assert keys == (
+        "ctf:instance:team:7:3",
+        "ctf:instances:active_zset",
+        "ctf:active:team:7:challenge:3",
+        "ctf:instances:expiry_zset",
+        "ctf:capacity:reservations",
+        "ctf:capacity:budget",
+    )
+    # ttl, cap, expiry schedule member, requested cpu / memory (budget args and shared flag follow)
+    assert r.calls[0][8:13] == (60, 10, "team:7:3", 250, 2**27)
+    assert r.calls[0][15] == "0"
+    fields = dict(zip(r.calls[0][16::2], r.calls[0][17::2], strict=True))
+    assert fields["status"] == "starting"
+    assert "connection" not in fields  # None values are not stored
+
+    outcome, payload = await store.admit(7, 3, ttl_seconds=60, limit=10)
+    assert outcome == ADMIT_EXISTS
+    assert payload == {"status": "running", "connection": "http://x", "tcp_port": 31337}
+    assert await store.admit(7, 3, ttl_seconds=60, limit=10) == (ADMIT_FULL, {"reason": "cpu"})
+    assert len(r.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_record_is_migrated_and_the_script_retried():
+    r = _ScriptedRedis(
+        [ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value"), 1, ["claimed"]]
+    )
+
+    async def evalsha(sha, numkeys, *keys_and_args):
+        r.calls.append(keys_and_args)
+        reply = r.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    r.evalsha = evalsha
+    outcome, _ = await TeamInstanceStore(r).admit(7, 3, ttl_seconds=60, limit=10)
+    assert outcome == ADMIT_CLAIMED
+    # admit -> WRONGTYPE, migrate the record, admit again
+    assert [c[0] for c in r.calls] == ["ctf:instance:team:7:3"] * 3
+    assert r.calls[1] == ("ctf:instance:team:7:3",)
+
+
+@pytest.mark.asyncio
+async def test_transition_sends_allowed_statuses_and_fields_in_one_call():
+    record = ["status", "running", "team_id", "7", "connection", "http://y"]
+    r = _ScriptedRedis([[1, record], [0, ["status", "terminating"]], [0, []]])
+    store = TeamInstanceStore(r)
+
+    updated = await store.set(7, 3, connection="http://y", ttl_seconds=60, from_status=(STATUS_RESTARTING,))
+    assert updated == {"status": "running", "team_id": 7, "connection": "http://y"}
+
+    key, expiry_key, allowed, to_status, ttl, member, exp, *fields = r.calls[0]
+    assert (key, expiry_key) == ("ctf:instance:team:7:3", "ctf:instances:expiry_zset")
+    assert (allowed, to_status, ttl, member) == ("restarting", "running", 60, "team:7:3")
+    assert exp > 0  # the TTL write reschedules the expiry
+    fields = dict(zip(fields[::2], fields[1::2], strict=True))
+    assert fields["connection"] == "http://y"
+    assert "expires_at" in fields
+    assert "protocol" not in fields
+
+    # lost the race against terminate -> not applied, current record returned
+    applied, current = await store.transition(7, 3, from_status=(STATUS_RUNNING,), to_status=STATUS_RESTARTING)
+    assert not applied
+    assert current["status"] == "terminating"
+
+    assert await store.set(7, 3, connection="http://y", ttl_seconds=60) is None
+
+
+class _ExtendStore:
+    def __init__(self) -> None:
+        expires = datetime.now(timezone.utc) + timedelta(minutes=5)
+        self.record = {"status": STATUS_RUNNING, "expires_at": expires.isoformat()}
+        self.calls: list[str] = []
+
+    async def get(self, team_id, challenge_id):
+        return self.record
+
+    async def transition(self, team_id, challenge_id, **kwargs):
+        self.calls.append(f"transition:{kwargs.get('to_status')}")
+        return True, self.record
+
+    async def abandon(self, team_id, challenge_id):
+        self.calls.append("abandon")
+
+    async def delete(self, team_id, challenge_id):
+        self.calls.append("delete")
+
+
+class _FailingSpawner:
+    def __init__(self, failure) -> None:
+        self.failure = failure
+
+    async def terminate_instance(self, team_id, challenge_id):
+        return None
+
+    async def spawn_instance(self, **kwargs):
+        if isinstance(self.failure, Exception):
+            raise self.failure
+        return self.failure
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("failure", [None, K8sApiTimeout("create_namespaced_pod timed out")])
+async def test_failed_extend_gives_the_admission_back(monkeypatch, failure):
+    store = _ExtendStore()
+    monkeypatch.setattr(challenges, "TeamInstanceStore", lambda: store)
+    monkeypatch.setattr(challenges, "K8sTeamChallengeManager", lambda: _FailingSpawner(failure))
+    ch = SimpleNamespace(is_download=False, protocol=None, image_name="img", internal_port=80, warm_pool_size=0)
+
+    async def _team(user_id):
+        return SimpleNamespace(id=7)
+
+    async def _challenge(challenge_id):
+        return ch
+
+    request = Request({"type": "http", "method": "POST", "path": "/api/v1/challenges/3/extend", "headers": []})
+    with pytest.raises(HTTPException) as exc:
+        await challenges.extend_instance_team_scoped(
+            request,
+            3,
+            SimpleNamespace(id=1),
+            SimpleNamespace(get_team_for_user=_team),
+            SimpleNamespace(read_challenge_by_id=_challenge),
+        )
+    assert exc.value.status_code == 500
+    # record, limiter slot, reservation and expiry go in one MULTI, not only the record
+    assert store.calls == [f"transition:{STATUS_RESTARTING}", "abandon"]
+
+
+# -----------------------------
+# scripts against a real Redis
+# -----------------------------
+@pytest.mark.asyncio
+async def test_concurrent_admissions_stop_exactly_at_the_limit(real_redis):
+    store = TeamInstanceStore(real_redis)
+
+    results = await asyncio.gather(*(store.admit(team, 1, ttl_seconds=60, limit=3) for team in range(20)))
+    outcomes = [outcome for outcome, _ in results]
+    assert outcomes.count(ADMIT_CLAIMED) == 3
+    assert [info for outcome, info in results if outcome == ADMIT_FULL] == [{"reason": "count"}] * 17
+    assert await real_redis.zcard(InstanceLimiter.ZSET_KEY) == 3
+    assert await real_redis.zcard(EXPIRY_ZSET_KEY) == 3
+
+    # a claimed team gets its record back; a shared instance needs no slot
+    team = next(t for t, (outcome, _) in enumerate(results) if outcome == ADMIT_CLAIMED)
+    outcome, record = await store.admit(team, 1, ttl_seconds=60, limit=3)
+    assert (outcome, record["status"], record["team_id"]) == (ADMIT_EXISTS, STATUS_STARTING, team)
+    assert (await store.admit(99, 1, ttl_seconds=60, limit=3, shared=True))[0] == ADMIT_CLAIMED
+
+    # an abandoned admission frees its slot for the next team
+    await store.abandon(team, 1)
+    assert (await store.admit(100, 1, ttl_seconds=60, limit=3))[0] == ADMIT_CLAIMED
+    assert (await store.admit(101, 1, ttl_seconds=60, limit=3))[0] == ADMIT_FULL
+
+
+@pytest.mark.asyncio
+async def test_expired_slots_are_reclaimed_by_the_admission(real_redis):
+    store = TeamInstanceStore(real_redis)
+    assert (await store.admit(1, 1, ttl_seconds=60, limit=1))[0] == ADMIT_CLAIMED
+
+    slot = InstanceLimiter(real_redis)._slot_key(1, 1)
+    await real_redis.zadd(InstanceLimiter.ZSET_KEY, {slot: 1})  # long expired
+    assert (await store.admit(2, 1, ttl_seconds=60, limit=1))[0] == ADMIT_CLAIMED
+    assert await real_redis.exists(slot) == 0
+    assert await real_redis.hexists(RESERVATIONS_KEY, slot) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_transitions_apply_once(real_redis):
+    store = TeamInstanceStore(real_redis)
+    await store.admit(1, 1, ttl_seconds=60, limit=10)
+
+    results = await asyncio.gather(
+        store.transition(1, 1, from_status=(STATUS_STARTING,), to_status=STATUS_TERMINATING),
+        *(store.set(1, 1, connection=f"c{i}", ttl_seconds=120) for i in range(5)),
+    )
+    applied = [r for r in results if (r[0] if isinstance(r, tuple) else r is not None)]
+    assert len(applied) == 1
+
+    record = await store.get(1, 1)
+    assert record["status"] in (STATUS_TERMINATING, STATUS_RUNNING)
+    if record["status"] == STATUS_RUNNING:
+        assert 60 < await real_redis.ttl("ctf:instance:team:1:1") <= 120
+        assert await real_redis.zscore(EXPIRY_ZSET_KEY, "team:1:1") > 0
+
+    applied, record = await store.transition(2, 1, to_status=STATUS_RUNNING)
+    assert (applied, record) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_records_are_rewritten_as_hashes(real_redis):
+    legacy = {"status": "running", "team_id": 1, "connection": "http://x", "tcp_port": None}
+    await real_redis.set("ctf:instance:team:1:1", json.dumps(legacy), ex=300)
+    await real_redis.set("ctf:instance:team:1:2", json.dumps(legacy | {"status": "starting"}), ex=300)
+    store = TeamInstanceStore(real_redis)
+
+    record = await store.get(1, 1)
+    assert record["status"] == "running"
+    assert record["connection"] == "http://x"
+    assert await real_redis.type("ctf:instance:team:1:1") == "hash"
+    assert 0 < await real_redis.ttl("ctf:instance:team:1:1") <= 300
+
+    applied, record = await store.transition(1, 2, from_status=(STATUS_STARTING,), to_status=STATUS_TERMINATING)
+    assert applied
+    assert record["status"] == STATUS_TERMINATING
+
+    outcome, _ = await store.admit(1, 1, ttl_seconds=60, limit=10)
+    assert outcome == ADMIT_EXISTS
+
+
+@pytest.mark.asyncio
+async def test_reserve_takes_the_released_reservation_back(real_redis):
+    store = TeamInstanceStore(real_redis)
+    await real_redis.hset(BUDGET_KEY, mapping={"cpu": 1000, "memory": 0})
+    await store.admit(1, 1, ttl_seconds=60, limit=10, cpu_millicores=600)
+    slot = InstanceLimiter(real_redis)._slot_key(1, 1)
+
+    await store.release_reservation(1, 1)
+    assert await real_redis.hexists(RESERVATIONS_KEY, slot) == 0
+    assert await store.reserve(1, 1, cpu_millicores=600, memory_bytes=0) is None
+    # its own (stale) reservation is not counted twice
+    assert await store.reserve(1, 1, cpu_millicores=600, memory_bytes=0) is None
+    assert await real_redis.hget(RESERVATIONS_KEY, slot) == "600 0"
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from app.backend.utils.instance_expiry import EXPIRY_ZSET_KEY, KIND_TEAM, KIND_USER, ExpiryScheduler
+
+
+class _ZSetRedis:
+    """
+    Sorted-set subset of Redis shared by several schedulers (= workers / restarts).
+    """
+
+    def __init__(self) -> None:
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    async def zadd(self, key, mapping, nx=False):
+        z = self.zsets.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if nx and member in z:
+                continue
+            added += member not in z
+            z[member] = float(score)
+        return added
+
+    async def zrem(self, key, *members):
+        z = self.zsets.get(key, {})
+        return sum(z.pop(m, None) is not None for m in members)
+
+    async def zrangebyscore(self, key, min, max, start=0, num=None, withscores=False):
+        due = sorted((s, m) for m, s in self.zsets.get(key, {}).items() if s <= max)
+        due = due[start : start + num if num is not None else None]
+        return [(m, s) for s, m in due] if withscores else [m for _, m in due]
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, r: _ZSetRedis) -> None:
+        self._r = r
+        self._calls = []
+
+    def zrem(self, key, *members):
+        self._calls.append(self._r.zrem(key, *members))
+
+    async def execute(self):
+        return [await c for c in self._calls]
+
+
+@pytest.mark.asyncio
+async def test_schedule_survives_a_restart_and_is_drained_in_batches():
+    r = _ZSetRedis()
+    before_restart = ExpiryScheduler(r, batch_size=2)
+    for team_id in range(1, 6):
+        await before_restart.schedule(KIND_TEAM, team_id, 3, ttl_seconds=0)
+    await before_restart.schedule(KIND_TEAM, 9, 3, ttl_seconds=3600)
+    await before_restart.schedule(KIND_USER, 4, 3, ttl_seconds=0)
+    await before_restart.cancel(KIND_USER, 4, 3)  # terminated by hand
+
+    # a fresh worker (nothing in memory) picks the schedule up from Redis
+    scheduler = ExpiryScheduler(r, batch_size=2)
+    expired: list[tuple[int, int]] = []
+
+    async def _expire(team_id, challenge_id):
+        expired.append((team_id, challenge_id))
+
+    scheduler.register(KIND_TEAM, _expire)
+    assert await scheduler.run_once() == 5
+    assert sorted(expired) == [(t, 3) for t in range(1, 6)]
+    assert list(r.zsets[EXPIRY_ZSET_KEY]) == ["team:9:3"]  # not due yet
+    assert scheduler.stats()["terminated"] == 5
+
+
+@pytest.mark.asyncio
+async def test_each_due_instance_is_expired_once_and_failures_are_retried():
+    r = _ZSetRedis()
+    workers = [ExpiryScheduler(r, batch_size=10, retry_seconds=60) for _ in range(3)]
+    calls: list[tuple[int, int]] = []
+
+    async def _expire(team_id, challenge_id):
+        await asyncio.sleep(0)
+        calls.append((team_id, challenge_id))
+        if team_id == 2:
+            raise RuntimeError("k8s API down")
+
+    for w in workers:
+        w.register(KIND_TEAM, _expire)
+    await workers[0].schedule(KIND_TEAM, 1, 3, ttl_seconds=0)
+    await workers[0].schedule(KIND_TEAM, 2, 3, ttl_seconds=0)
+
+    # no lock here: the ZREM claim alone keeps concurrent pollers from doubling up
+    await asyncio.gather(*(w.run_once() for w in workers))
+    assert sorted(calls) == [(1, 3), (2, 3)]
+
+    retry_at = r.zsets[EXPIRY_ZSET_KEY]["team:2:3"]
+    assert retry_at >= time.time() + 55
+    assert sum(w.stats()["failed"] for w in workers) == 1
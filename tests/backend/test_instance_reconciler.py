@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from kubernetes import client
+
+from app.backend.utils.instance_reconciler import InstanceReconciler, RedisState, find_drift
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.k8s_informer import ResourceInformer
+from tests.backend.utils import LocalK8sApiServer
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+OLD = NOW - timedelta(minutes=10)
+NEW = NOW - timedelta(seconds=5)
+
+
+def _pod(name: str, labels: dict, *, created=OLD, phase="Running") -> client.V1Pod:
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name=name, labels={"app": "ctf-challenge", **labels}, creation_timestamp=created),
+        status=client.V1PodStatus(phase=phase),
+    )
+
+
+def _svc(name: str, team: int, challenge: int, *, created=OLD) -> client.V1Service:
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(name=name, labels={"app": "ctf-challenge"}, creation_timestamp=created),
+        spec=client.V1ServiceSpec(selector={"app": "ctf-challenge", "team": str(team), "challenge": str(challenge)}),
+    )
+
+
+def _record(started=OLD, status="running") -> dict:
+    return {"status": status, "started_at": started.isoformat()}
+
+
+def test_find_drift_classifies_both_directions():
+    pods = [
+        _pod("chal-t1-c1", {"team": "1", "challenge": "1"}),  # healthy
+        _pod("chal-t2-c1", {"team": "2", "challenge": "1"}),  # no record -> orphan
+        _pod("chal-t3-c1", {"team": "3", "challenge": "1"}, created=NEW),  # no record yet: in-flight spawn
+        _pod("chal-t4-c1", {"team": "4", "challenge": "1"}, phase="Failed"),  # deadline reached
+        _pod("pool-c1-abcd", {"challenge": "1", "ctf-pool": "warm"}),  # warm pool: not an instance
+        _pod("chal-u9-c1", {"user": "9", "challenge": "1"}),  # legacy per-user instance
+    ]
+    services = [
+        _svc("chal-t1-c1", 1, 1),
+        _svc("chal-t2-c1", 2, 1),  # orphan
+        _svc("chal-t6-c1", 6, 1, created=NEW),
+    ]
+    state = RedisState(
+        records={
+            (1, 1): _record(),
+            (4, 1): _record(),
+            (5, 1): _record(),  # pod gone -> stale
+            (7, 1): _record(started=NEW, status="starting"),  # pod not created yet
+            (10, 1): _record(status="hibernated"),  # scaled to zero: no pod on purpose
+            (11, 1): {**_record(), "mode": "shared"},  # served by the challenge's deployment
+        },
+        slots={(1, 1), (4, 1), (5, 1), (7, 1), (8, 1), (10, 1)},
+        flags={(1, 1), (8, 1), (9, 1)},
+    )
+
+    drift = find_drift(pods, services, state, now=NOW, grace_seconds=120)
+
+    assert drift.orphan_pods == ["chal-t2-c1"]
+    assert drift.orphan_services == ["chal-t2-c1"]
+    assert drift.dead_instances == [(4, 1)]
+    assert drift.stale_records == [(5, 1)]
+    assert drift.leaked_slots == [(8, 1)]
+    assert drift.orphan_flags == [(8, 1), (9, 1)]
+    assert sum(drift.counts().values()) == 7
+
+
+async def _wait_for(cond, timeout: float = 3.0) -> None:
+    async def _poll():
+        while not cond():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_informer_cache_follows_the_api_and_replays_deletions_on_relist():
+    api = await LocalK8sApiServer().start()
+    cfg = client.Configuration(host=api.host)
+    core_v1 = AsyncCoreV1(client.CoreV1Api(client.ApiClient(cfg)), max_workers=4, timeout=2.0)
+    pods = ResourceInformer(core_v1, "ctf-challenges", "pods", watch_seconds=1)
+    services = ResourceInformer(core_v1, "ctf-challenges", "services", watch_seconds=1)
+
+    async def _noop(team_id, challenge_id):
+        return None
+
+    reconciler = InstanceReconciler(pods, services, delete_resources=_noop)
+    seen: list[tuple[str, str]] = []
+
+    async def _record_event(event_type, pod):
+        seen.append((event_type, pod.metadata.name))
+
+    pods.add_handler(_record_event)
+    try:
+        # nothing is reconciled against an empty, not yet listed cache
+        assert await reconciler.reconcile_once() is None
+
+        body = client.V1Pod(
+            metadata=client.V1ObjectMeta(
+                name="chal-t1-c1", labels={"app": "ctf-challenge", "team": "1", "challenge": "1"}
+            ),
+            spec=client.V1PodSpec(containers=[client.V1Container(name="challenge", image="img")]),
+        )
+        await core_v1.call("create_namespaced_pod", namespace="ctf-challenges", body=body)
+        await pods.start()
+        await _wait_for(lambda: pods.stats()["watching"])
+        assert [p.metadata.name for p in pods.select(team=1, challenge=1)] == ["chal-t1-c1"]
+        requests_before = len(api.requests)
+
+        # served from memory
+        assert pods.get("chal-t1-c1").status.phase == "Running"
+        assert len(api.requests) == requests_before
+
+        # deleted while no stream is open: the next re-list reports it
+        await pods.stop()
+        await core_v1.call("delete_namespaced_pod", name="chal-t1-c1", namespace="ctf-challenges")
+        await pods.start()
+        await _wait_for(lambda: ("DELETED", "chal-t1-c1") in seen)
+        assert pods.get("chal-t1-c1") is None
+        assert reconciler._wake.is_set()
+    finally:
+        await pods.stop()
+        await services.stop()
+        core_v1.close()
+        await api.stop()
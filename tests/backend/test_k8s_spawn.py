@@ -0,0 +1,199 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from kubernetes import client
+
+from app.backend.config.redis import RedisRegistry
+from app.backend.config.settings import get_settings
+from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.k8s_api import AsyncCoreV1, K8sApiTimeout
+from app.backend.utils.k8s_create import create_or_read
+from app.backend.utils.k8s_manager import K8sTeamChallengeManager
+from app.backend.utils.metrics import metrics
+from tests.backend.utils import LocalK8sApiServer, LocalRedisServer
+
+settings = get_settings()
+
+
+def _core_v1(api: LocalK8sApiServer, *, timeout: float = 5.0) -> AsyncCoreV1:
+    cfg = client.Configuration(host=api.host)
+    cfg.connection_pool_maxsize = 16
+    return AsyncCoreV1(client.CoreV1Api(client.ApiClient(cfg)), max_workers=16, timeout=timeout)
+
+
+@pytest_asyncio.fixture
+async def k8s(monkeypatch):
+    redis_server = await LocalRedisServer().start()
+    reg = RedisRegistry(
+        redis_server.url, max_connections=16, pool_timeout=1, socket_timeout=1, health_check_interval=0
+    )
+    api = await LocalK8sApiServer().start()
+
+    mgr = K8sTeamChallengeManager()
+    monkeypatch.setattr(mgr, "core_v1", _core_v1(api))
+    monkeypatch.setattr(mgr, "flag_store", TeamFlagStore(reg.client()))
+    yield mgr, api
+
+    mgr.core_v1.close()
+    await api.stop()
+    await reg.shutdown()
+    await redis_server.stop()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_spawns_do_not_block_the_event_loop(k8s):
+    mgr, api = k8s
+    api.latency = 0.2
+
+    lag = 0.0
+
+    async def _ticker():
+        nonlocal lag
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - t - 0.01)
+
+    ticker = asyncio.create_task(_ticker())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(mgr.spawn_instance(team, 1, "img", 8080, protocol="tcp") for team in range(8)))
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+
+    assert all(r is not None for r in results)
+    assert sorted(r["tcp_port"] for r in results) == list(range(30000, 30008))
+    # 16 API calls of 0.2s each: sequential and blocking would take 3.2s
+    assert api.max_concurrent == 16
+    assert elapsed < 1.0
+    assert lag < 0.1
+
+    await asyncio.gather(*(mgr.terminate_instance(team, 1) for team in range(8)))
+    assert api.objects == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_service_creation_rolls_back_the_pod(k8s):
+    mgr, api = k8s
+    api.fail["services"] = 500
+
+    assert await mgr.spawn_instance(1, 1, "img", 8080) is None
+    assert api.objects == {}
+    assert any(m == "DELETE" and p.startswith(f"/api/v1/namespaces/{mgr.namespace}/pods") for m, p in api.requests)
+
+
+@pytest.mark.asyncio
+async def test_slow_api_server_hits_the_per_call_timeout(k8s, monkeypatch):
+    mgr, api = k8s
+    monkeypatch.setattr(mgr, "core_v1", _core_v1(api, timeout=0.2))
+    api.latency = 1.0
+    before = (await metrics.snapshot())["counters"].get("k8s.api.timeouts", 0)
+
+    started = time.perf_counter()
+    assert await mgr.spawn_instance(1, 1, "img", 8080) is None
+    assert time.perf_counter() - started < 1.0
+    assert (await metrics.snapshot())["counters"]["k8s.api.timeouts"] >= before + 2
+
+
+@pytest.mark.asyncio
+async def test_timed_out_creates_are_read_back_not_orphaned(k8s, monkeypatch):
+    mgr, api = k8s
+    monkeypatch.setattr(mgr, "core_v1", _core_v1(api, timeout=0.3))
+    api.method_latency["POST"] = 0.5  # applied by the server after the client gave up
+    before = (await metrics.snapshot())["counters"].get("k8s.spawn.timeouts", 0)
+
+    result = await mgr.spawn_instance(1, 1, "img", 8080)
+    await asyncio.sleep(0.6)  # every create sent has landed or been refused
+
+    assert result is not None
+    assert sorted(api.objects) == [("pods", "chal-t1-c1"), ("services", "chal-t1-c1")]
+    pod = api.objects[("pods", "chal-t1-c1")]
+    assert result["pod_uid"] == pod["metadata"]["uid"]
+    assert {"name": "CTF_FLAG", "value": result["flag"]} in pod["spec"]["containers"][0]["env"]
+    assert await mgr.flag_store.get_flag(1, 1) == result["flag"]
+    assert (await metrics.snapshot())["counters"]["k8s.spawn.timeouts"] >= before + 2
+
+
+@pytest.mark.asyncio
+async def test_uniquely_named_create_is_sent_again_after_a_timeout(k8s):
+    mgr, api = k8s
+    core_v1 = _core_v1(api, timeout=0.3)
+    body = {"metadata": {"name": "chal-t1-c1-wabcd"}, "spec": {"containers": [{"name": "c", "image": "img"}]}}
+
+    api.method_latency["POST"] = 0.5
+    create = asyncio.create_task(create_or_read(core_v1, "pods", mgr.namespace, body))
+    await asyncio.sleep(0.2)
+    api.method_latency["POST"] = 0.0  # the retry lands first; the timed-out attempt gets 409
+    pod = await create
+    await asyncio.sleep(0.4)
+    assert pod.metadata.uid == api.objects[("pods", "chal-t1-c1-wabcd")]["metadata"]["uid"]
+    assert len(api.objects) == 1
+
+    api.method_latency["POST"] = 1.0  # still unknown after the retry: the caller rolls back
+    with pytest.raises(K8sApiTimeout):
+        await create_or_read(core_v1, "pods", mgr.namespace, {**body, "metadata": {"name": "other"}})
+    core_v1.close()
+
+
+@pytest.mark.asyncio
+async def test_spawn_conflicts_adopt_a_live_pod_and_replace_a_dead_one(k8s):
+    mgr, api = k8s
+    first = await mgr.spawn_instance(1, 1, "img", 8080)
+    pod_uid = api.objects[("pods", "chal-t1-c1")]["metadata"]["uid"]
+    before = (await metrics.snapshot())["counters"]
+
+    # a retried spawn finds its live pod: adopted, the flag in its env stays valid
+    again = await mgr.spawn_instance(1, 1, "img", 8080)
+    assert again["pod_uid"] == pod_uid
+    assert again["flag"] == first["flag"]
+    assert await mgr.flag_store.get_flag(1, 1) == first["flag"]
+
+    # a dead pod is deleted in the foreground and created again
+    api.set_pod_status("chal-t1-c1", {"phase": "Failed"})
+    replaced = await mgr.spawn_instance(1, 1, "img", 8080)
+    assert replaced["pod_uid"] != pod_uid
+    assert replaced["flag"] != first["flag"]
+
+    counters = (await metrics.snapshot())["counters"]
+    assert counters["k8s.spawn.adopted"] - before.get("k8s.spawn.adopted", 0) == 3  # 2 Services + 1 pod
+    assert counters["k8s.spawn.replaced"] - before.get("k8s.spawn.replaced", 0) == 1
+
+
+def _started_ago(seconds: float) -> dict:
+    started = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    return {"startTime": started.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+
+@pytest.mark.asyncio
+async def test_adopted_pod_keeps_its_deadline_and_cuts_the_instance_ttl(k8s):
+    mgr, api = k8s
+    await mgr.spawn_instance(1, 1, "img", 8080, ttl_seconds=3600)
+    pod_uid = api.objects[("pods", "chal-t1-c1")]["metadata"]["uid"]
+
+    # started 30s ago: adopted, the instance ends with the pod
+    api.set_pod_status("chal-t1-c1", _started_ago(30))
+    adopted = await mgr.spawn_instance(1, 1, "img", 8080, ttl_seconds=3600)
+    assert adopted["pod_uid"] == pod_uid
+    assert 3560 <= adopted["ttl_seconds"] <= 3570
+
+    # most of its activeDeadlineSeconds spent: replaced by a pod with the full deadline
+    api.set_pod_status("chal-t1-c1", _started_ago(3000))
+    replaced = await mgr.spawn_instance(1, 1, "img", 8080, ttl_seconds=3600)
+    assert replaced["pod_uid"] != pod_uid
+    assert replaced["ttl_seconds"] == 3600
+    assert api.objects[("pods", "chal-t1-c1")]["spec"]["activeDeadlineSeconds"] == 3600
+
+
+@pytest.mark.asyncio
+async def test_persistent_spawn_conflict_gives_up_after_bounded_attempts(k8s):
+    mgr, api = k8s
+    api.fail["pods"] = 409  # name taken, yet nothing to read or delete
+    before = (await metrics.snapshot())["counters"].get("k8s.spawn.conflict_failures", 0)
+
+    assert await mgr.spawn_instance(1, 1, "img", 8080) is None
+    pod_creates = [p for m, p in api.requests if m == "POST" and p.endswith("/pods")]
+    assert len(pod_creates) == settings.K8S_SPAWN_MAX_ATTEMPTS
+    assert (await metrics.snapshot())["counters"]["k8s.spawn.conflict_failures"] == before + 1
+    assert api.objects == {}
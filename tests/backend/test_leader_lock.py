@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+import redis.asyncio as aioredis
+
+from app.backend.utils.leader_lock import LeaderLock
+
+
+@pytest.mark.asyncio
+async def test_only_the_holder_releases_or_renews_the_lock(real_redis):
+    first = LeaderLock("test:leader", ttl_seconds=0.2, r=real_redis)
+    second = LeaderLock("test:leader", ttl_seconds=5, r=real_redis)
+
+    assert await first.acquire()
+    assert not await second.acquire()
+
+    # the first pass outlives its TTL: the second worker takes over
+    await asyncio.sleep(0.3)
+    assert await second.acquire()
+    assert not await first.renew()
+    await first.release()
+    assert await real_redis.get("test:leader") == second._token
+
+    await second.release()
+    assert await real_redis.exists("test:leader") == 0
+
+
+@pytest.mark.asyncio
+async def test_held_lock_is_renewed_during_a_long_pass(real_redis):
+    lock = LeaderLock("test:leader", ttl_seconds=0.3, r=real_redis)
+    other = LeaderLock("test:leader", ttl_seconds=5, r=real_redis)
+
+    async with lock.held() as leader:
+        assert leader
+        await asyncio.sleep(0.8)  # well past the TTL
+        assert not await other.acquire()
+    assert await real_redis.exists("test:leader") == 0
+
+    async with other.held() as leader:
+        assert leader
+
+
+@pytest.mark.asyncio
+async def test_no_leader_while_redis_is_down():
+    r = aioredis.Redis.from_url("redis://127.0.0.1:1/0", socket_connect_timeout=0.2)
+    lock = LeaderLock("test:leader", ttl_seconds=5, r=r)
+    async with lock.held() as leader:
+        assert not leader
+    await r.aclose()
@@ -0,0 +1,168 @@
+import pytest
+import redis
+from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
+from starlette.requests import Request
+
+from app.backend.utils.limiter import BatchedLimiter, _check_evaluate_hook, client_ip_key
+
+
+class _CountingHitScript:
+    """
+    In-process stand-in for the Lua hit-all script (fixed windows that never roll over).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.counters: dict[str, int] = {}
+
+    def __call__(self, keys, args):
+        self.calls += 1
+        want, cost = args[0], args[1]
+        limits = [(args[2 + 2 * i], args[3 + 2 * i]) for i in range(len(keys))]
+
+        grant = want
+        for i, (key, (amount, window)) in enumerate(zip(keys, limits, strict=True), start=1):
+            left = amount - self.counters.get(key, 0)
+            if left < cost:
+                return [0, i, max(left, 0), window, 0]
+            grant = min(grant, left)
+
+        remaining = min(
+            amount - (self.counters.get(k, 0) + grant) for k, (amount, _) in zip(keys, limits, strict=True)
+        )
+        for key in keys:
+            self.counters[key] = self.counters.get(key, 0) + grant
+        return [grant, 0, remaining, 60, 60]
+
+
+def _request(ip="10.0.0.1", path="/api/v1/thing"):
+    return Request({"type": "http", "method": "GET", "path": path, "headers": [], "client": (ip, 1234)})
+
+
+def _limiter(script):
+    return BatchedLimiter(key_func=client_ip_key, hit_script=script)
+
+
+def test_stacked_limits_are_checked_in_one_call_and_rejections_consume_nothing():
+    script = _CountingHitScript()
+    limiter = _limiter(script)
+
+    @limiter.limit("2/minute")
+    @limiter.limit("10/hour")
+    async def endpoint(request: Request):
+        return None
+
+    for _ in range(2):
+        limiter._check_request_limit(_request(), endpoint, False)
+    assert script.calls == 2
+
+    req = _request()
+    with pytest.raises(RateLimitExceeded):
+        limiter._check_request_limit(req, endpoint, False)
+    assert "2 per 1 minute" in str(req.state.view_rate_limit[0])
+
+    hour_key = next(k for k in script.counters if "/10/1/hour" in k)
+    assert script.counters[hour_key] == 2
+
+    # other clients keep their own budget
+    limiter._check_request_limit(_request(ip="10.0.0.2"), endpoint, False)
+
+
+def test_large_limits_are_served_from_a_local_lease():
+    script = _CountingHitScript()
+    limiter = _limiter(script)
+    limiter.lease_min_limit = 100
+    limiter.lease_fraction = 0.05
+
+    @limiter.limit("200/minute")
+    async def endpoint(request: Request):
+        return None
+
+    for _ in range(25):
+        limiter._check_request_limit(_request(), endpoint, False)
+
+    # leases of 10 tokens: 25 requests -> 3 round trips
+    assert script.calls == 3
+    assert sum(script.counters.values()) == 30
+
+
+def test_the_overridden_slowapi_hook_is_checked():
+    _check_evaluate_hook(Limiter)
+
+    class _Renamed(Limiter):
+        _Limiter__evaluate_limits = None
+
+    with pytest.raises(ImportError):
+        _check_evaluate_hook(_Renamed)
+
+
+# -----------------------------
+# hit-all script against a real Redis
+# -----------------------------
+class _RedisHitScript:
+    def __init__(self, r: redis.Redis):
+        self.calls = 0
+        self._script = r.register_script(BatchedLimiter._LUA_HIT_ALL)
+
+    def __call__(self, keys, args):
+        self.calls += 1
+        return self._script(keys=keys, args=args)
+
+
+@pytest.fixture
+def sync_redis(real_redis_url):
+    r = redis.Redis.from_url(real_redis_url, decode_responses=True)
+    r.flushdb()
+    yield r
+    r.flushdb()
+    r.close()
+
+
+def test_hit_all_script_is_all_or_nothing(sync_redis):
+    limiter = _limiter(_RedisHitScript(sync_redis))
+
+    @limiter.limit("2/minute")
+    @limiter.limit("10/hour")
+    async def endpoint(request: Request):
+        return None
+
+    req = _request()
+    limiter._check_request_limit(req, endpoint, False)
+    assert req.state.rate_limit_remaining == 1
+    assert 0 < req.state.rate_limit_reset <= 60
+    limiter._check_request_limit(_request(), endpoint, False)
+
+    with pytest.raises(RateLimitExceeded):
+        limiter._check_request_limit(_request(), endpoint, False)
+    [minute_key] = sync_redis.keys("*/2/1/minute")
+    [hour_key] = sync_redis.keys("*/10/1/hour")
+    assert sync_redis.get(minute_key) == "2"
+    assert sync_redis.get(hour_key) == "2"  # the rejected request consumed nothing
+    assert 0 < sync_redis.ttl(hour_key) <= 3600
+
+
+def test_hit_all_script_leases_tokens_and_stops_at_the_limit(sync_redis):
+    script = _RedisHitScript(sync_redis)
+    limiter = _limiter(script)
+    limiter.lease_min_limit = 100
+    limiter.lease_fraction = 0.05
+
+    @limiter.limit("200/minute")
+    async def endpoint(request: Request):
+        return None
+
+    for _ in range(25):
+        limiter._check_request_limit(_request(), endpoint, False)
+    [key] = sync_redis.keys("*/200/1/minute")
+    assert script.calls == 3
+    assert sync_redis.get(key) == "30"
+
+    # the last lease is cut to what the window has left, then requests are refused
+    sync_redis.set(key, 195, keepttl=True)
+    limiter._leases.clear()
+    for _ in range(5):
+        limiter._check_request_limit(_request(), endpoint, False)
+    assert sync_redis.get(key) == "200"
+    with pytest.raises(RateLimitExceeded):
+        limiter._check_request_limit(_request(), endpoint, False)
@@ -0,0 +1,49 @@
+from app.backend.utils import mail
+from app.backend.utils.mail import InlineLogo, render_batch
+from app.backend.utils.mail_template import CompiledTemplate
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def test_compiled_template_escapes_fields_but_not_static_fragments():
+    tpl = CompiledTemplate('<p style="{style}">Hi {name}</p><a href="{url}">x</a>', style="color:red")
+
+    assert tpl.fields == ("name", "url")
+    assert tpl.render(name="<b>", url='http://x/?a=1&b="2"') == (
+        '<p style="color:red">Hi &lt;b&gt;</p><a href="http://x/?a=1&amp;b=&quot;2&quot;">x</a>'
+    )
+    assert tpl.render_many([{"name": "a", "url": ""}, {"name": "b", "url": ""}]) == [
+        '<p style="color:red">Hi a</p><a href="">x</a>',
+        '<p style="color:red">Hi b</p><a href="">x</a>',
+    ]
+
+
+def test_batch_render_reads_logo_once(tmp_path, monkeypatch):
+    logo_path = tmp_path / "logo.png"
+    logo_path.write_bytes(PNG)
+    logo = InlineLogo(logo_path)
+    monkeypatch.setattr(mail, "logo", logo)
+
+    text = CompiledTemplate("Hello {username}", escape=format)
+    html = CompiledTemplate('<img src="cid:{logo_cid}"/><p>Hello {username}</p>')
+
+    first = render_batch(subject="News", text=text, html=html, recipients=[{"to": "a@x.io", "username": "<a>"}])
+    logo_path.unlink()  # cached part must be reused, no further disk reads
+    rest = render_batch(
+        subject="News",
+        text=text,
+        html=html,
+        recipients=[{"to": f"u{i}@x.io", "username": f"u{i}"} for i in range(3)],
+    )
+
+    msgs = first + rest
+    assert [m["To"] for m in msgs] == ["a@x.io", "u0@x.io", "u1@x.io", "u2@x.io"]
+    for m in msgs:
+        images = [p for p in m.walk() if p.get_content_type() == "image/png"]
+        assert len(images) == 1
+        assert images[0]["Content-ID"] == logo.cid
+        assert images[0].get_content() == PNG
+        assert f"cid:{logo.cid_ref}" in m.get_body(("html",)).get_content()
+
+    assert "Hello &lt;a&gt;" in first[0].get_body(("html",)).get_content()
+    assert first[0].get_body(("plain",)).get_content().strip() == "Hello <a>"
@@ -0,0 +1,123 @@
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from app.backend.utils.mailer import MailDispatcher, SMTPSender
+from tests.backend.utils import LocalSMTPServer
+
+
+def _msg(i: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = f"hello {i}"
+    msg["From"] = "noreply@example.com"
+    msg["To"] = f"user{i}@example.com"
+    msg.set_content(f"body {i}\n.leading dot\n")
+    return msg
+
+
+class _RecordingOutbox:
+    def __init__(self):
+        self.acked: list[str] = []
+        self.dead: list[str] = []
+
+    async def ack(self, ids):
+        self.acked.extend(ids)
+
+    async def dead_letter(self, entry_id, raw, error):
+        self.dead.append(entry_id)
+
+
+@pytest.mark.asyncio
+async def test_smtp_sender_reuses_one_connection_for_a_batch():
+    server = await LocalSMTPServer().start()
+    sender = SMTPSender("127.0.0.1", server.port, use_tls=False, username=None, password=None)
+    try:
+        results = await sender.send_many([_msg(i) for i in range(5)])
+        assert results == [None] * 5
+        assert await sender.send(_msg(5)) is True
+    finally:
+        await sender.close()
+        await server.stop()
+
+    assert len(server.messages) == 6
+    assert server.connections == 1
+    assert b"..leading dot" not in server.messages[0]
+
+
+@pytest.mark.asyncio
+async def test_smtp_sender_reconnects_after_server_drops_session():
+    server = await LocalSMTPServer(drop_after=2).start()
+    sender = SMTPSender("127.0.0.1", server.port, use_tls=False, username=None, password=None)
+    try:
+        results = await sender.send_many([_msg(i) for i in range(5)])
+    finally:
+        await sender.close()
+        await server.stop()
+
+    assert results == [None] * 5
+    assert len(server.messages) == 5
+    assert server.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_dead_letters_after_max_attempts():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+
+    outbox = _RecordingOutbox()
+    sender = SMTPSender("127.0.0.1", closed_port, use_tls=False, username=None, password=None, timeout=1)
+    dispatcher = MailDispatcher(outbox, sender, consumer="test")
+    dispatcher.retry_delay = 0
+
+    await dispatcher.deliver([("1-0", {"raw": _msg(1).as_string()}), ("2-0", {"raw": _msg(2).as_string()})])
+    await sender.close()
+
+    assert outbox.dead == ["1-0", "2-0"]
+    assert outbox.acked == ["1-0", "2-0"]
+
+
+class _PendingOutbox(_RecordingOutbox):
+    """
+    Own pending entries (XREADGROUP 0) and other consumers' stale ones (XAUTOCLAIM pages).
+    """
+
+    def __init__(self, own, stale_pages):
+        super().__init__()
+        self.own = own
+        self.stale_pages = stale_pages  # cursor -> (next cursor, entries)
+        self.claim_starts: list[str] = []
+
+    async def read_own_pending(self, consumer, *, count):
+        return [e for e in self.own if e[0] not in self.acked][:count]
+
+    async def claim_stale(self, consumer, *, min_idle_ms, count, start="0-0"):
+        self.claim_starts.append(start)
+        return self.stale_pages[start]
+
+
+class _OkSender:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_many(self, msgs):
+        self.sent += len(msgs)
+        return [None] * len(msgs)
+
+
+@pytest.mark.asyncio
+async def test_recover_redelivers_own_unacked_entries_and_every_stale_page():
+    raw = {"raw": _msg(1).as_string()}
+    outbox = _PendingOutbox(
+        own=[("1-0", raw), ("2-0", {}), ("3-0", raw)],  # 2-0 trimmed from the stream
+        stale_pages={"0-0": ("7-0", [("5-0", raw)]), "7-0": ("0-0", [("8-0", raw)])},
+    )
+    sender = _OkSender()
+    dispatcher = MailDispatcher(outbox, sender, consumer="test")
+    dispatcher.batch_size = 2
+
+    assert await dispatcher.recover() == 4
+    assert sender.sent == 4
+    assert sorted(outbox.acked) == ["1-0", "2-0", "3-0", "5-0", "8-0"]
+    assert outbox.claim_starts == ["0-0", "7-0"]
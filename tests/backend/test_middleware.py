@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.backend.main import app
+from app.backend.middleware.ctf_gate import CTFGateMiddleware, PathAllowlist
+from app.backend.middleware.origin_check import OriginCheckMiddleware
+from app.backend.middleware.rate_limit import RateLimitMiddleware
+from app.backend.utils.ctf_state_cache import CTFStateSnapshot, ctf_state_cache
+from app.backend.utils.limiter import BatchedLimiter, client_ip_key
+
+ORIGIN = "http://localhost:5173"
+
+
+async def _ok(request):
+    return JSONResponse({"ok": True})
+
+
+async def _stream(request):
+    async def gen():
+        for i in range(3):
+            yield f"event: tick\ndata: {i}\n\n".encode()
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+def _app():
+    inner = Starlette(
+        routes=[
+            Route("/api/v1/thing", _ok, methods=["GET", "POST"]),
+            Route("/api/v1/ctf-events", _stream),
+            Route("/team/{name}", _ok),
+        ]
+    )
+    gate = CTFGateMiddleware(inner, allowlist_exact={"/api/v1/ctf-events"}, allowlist_prefixes=("/team/",))
+    return OriginCheckMiddleware(gate, allowed_origins=[ORIGIN])
+
+
+@pytest.mark.asyncio
+async def test_origin_check_and_gate_when_ctf_open():
+    ctf_state_cache.set(CTFStateSnapshot(active=True, ends_at=None, paused_remaining_seconds=None))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://t") as ac:
+        assert (await ac.get("/api/v1/thing")).status_code == 200
+        assert (await ac.post("/api/v1/thing", headers={"origin": ORIGIN})).status_code == 200
+        assert (await ac.post("/api/v1/thing", headers={"referer": f"{ORIGIN}/login"})).status_code == 200
+
+        blocked = await ac.post("/api/v1/thing", headers={"origin": "http://evil.example"})
+        assert blocked.status_code == 403
+        assert blocked.json()["code"] == "CSRF_BLOCKED"
+        assert (await ac.post("/api/v1/thing")).status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_gate_blocks_when_closed_but_streams_allowlisted_routes():
+    ended = datetime.now(timezone.utc) - timedelta(seconds=1)
+    ctf_state_cache.set(CTFStateSnapshot(active=True, ends_at=ended, paused_remaining_seconds=None))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://t") as ac:
+        res = await ac.get("/api/v1/thing")
+        assert res.status_code == 403
+        assert res.json()["code"] == "CTF_ENDED"
+        assert res.json()["ends_at"] == ended.isoformat()
+
+        assert (await ac.get("/team/alpha")).status_code == 200
+
+        res = await ac.get("/api/v1/ctf-events")
+        assert res.status_code == 200
+        assert res.text.count("event: tick") == 3
+
+
+def test_path_allowlist_matches_exact_and_prefix_entries():
+    allow = PathAllowlist(
+        exact={"/", "/api/v1/teams"},
+        prefixes=("/team/", "/api/v1/teams/by-name/", "/api/v1/teams/by-name/x", "/as.ets", "/t"),
+    )
+
+    assert allow.matches("/")
+    assert allow.matches("/api/v1/teams")
+    assert allow.matches("/api/v1/teams/by-name/alpha")
+    assert allow.matches("/as.ets/logo.png")
+    assert allow.matches("/tomato")
+    assert not allow.matches("/api/v1/teams/1")
+    assert not allow.matches("/asXets/logo.png")
+    assert not allow.matches("/api/v1/team")
+    assert not allow.matches("")
+
+    assert not PathAllowlist().matches("/")
+
+
+def test_path_allowlist_from_settings_with_extra_entries():
+    s = SimpleNamespace(
+        CTF_GATE_ALLOWLIST_EXACT=("/",),
+        CTF_GATE_ALLOWLIST_PREFIXES=("/assets",),
+        CTF_GATE_ALLOWLIST_EXTRA_LIST=["/status", "/docs/*"],
+    )
+    allow = PathAllowlist.from_settings(s)
+
+    assert allow.matches("/status")
+    assert not allow.matches("/status/x")
+    assert allow.matches("/docs/index.html")
+    assert allow.matches("/api/v1/users/admin/login")
+
+
+def test_application_middleware_stack_is_pure_asgi():
+    wrapped = [m.cls.__name__ for m in app.user_middleware if issubclass(m.cls, BaseHTTPMiddleware)]
+    assert wrapped == []  # a BaseHTTPMiddleware buffers SSE and the instance proxy
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_middleware_streams_and_applies_the_default_limits():
+    hits = []
+
+    def hit_script(keys, args):  # in-process stand-in for the hit-all script: 2 per window
+        hits.append(keys)
+        left = 2 - len(hits)
+        return [1, 0, left, 60, 60] if left >= 0 else [0, 1, 0, 60, 0]
+
+    limiter = BatchedLimiter(
+        key_func=client_ip_key, default_limits=["2/minute"], headers_enabled=True, hit_script=hit_script
+    )
+    inner = Starlette(
+        routes=[Route("/api/v1/ctf-events", _stream)],
+        middleware=[Middleware(RateLimitMiddleware)],
+        exception_handlers={RateLimitExceeded: _rate_limit_exceeded_handler},
+    )
+    inner.state.limiter = limiter
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=inner), base_url="http://t") as ac:
+        res = await ac.get("/api/v1/ctf-events")
+        assert res.status_code == 200
+        assert res.text.count("event: tick") == 3  # every chunk, one response start
+        assert res.headers["x-ratelimit-limit"] == "2"
+
+        assert (await ac.get("/api/v1/ctf-events")).status_code == 200
+        assert (await ac.get("/api/v1/ctf-events")).status_code == 429
@@ -0,0 +1,147 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from kubernetes import client
+
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.k8s_informer import ResourceInformer
+from app.backend.utils.metrics import metrics
+from app.backend.utils.pod_readiness import PodReadinessWatcher
+from app.backend.utils.sse_bus import SSEBus
+from app.backend.utils.team_instance_store import STATUS_RUNNING, STATUS_STARTING
+from tests.backend.utils import LocalK8sApiServer
+
+NAMESPACE = "ctf-challenges"
+READY = {"phase": "Running", "conditions": [{"type": "Ready", "status": "True"}]}
+
+
+class _Store:
+    """
+    TeamInstanceStore stand-in: get / compare-and-set transition on plain dicts.
+    """
+
+    def __init__(self) -> None:
+        self.records: dict[tuple[int, int], dict] = {}
+
+    async def get(self, team_id: int, challenge_id: int) -> dict | None:
+        rec = self.records.get((team_id, challenge_id))
+        return dict(rec) if rec else None
+
+    async def transition(self, team_id, challenge_id, *, from_status=(), to_status=None, **_):
+        rec = self.records.get((team_id, challenge_id))
+        if rec is None or (from_status and rec["status"] not in from_status):
+            return False, rec
+        rec["status"] = to_status or rec["status"]
+        return True, dict(rec)
+
+
+class _Bus:
+    def __init__(self) -> None:
+        self.published: list[tuple[str, dict, int | None]] = []
+
+    async def publish(self, event: str, data=None, *, team_id: int | None = None) -> None:
+        self.published.append((event, data, team_id))
+
+
+async def _wait_for(cond, timeout: float = 3.0) -> None:
+    async def _poll():
+        while not cond():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_poll(), timeout)
+
+
+@pytest_asyncio.fixture
+async def k8s():
+    api = await LocalK8sApiServer().start()
+    api.pod_status = {"phase": "Pending", "conditions": []}
+    cfg = client.Configuration(host=api.host)
+    core_v1 = AsyncCoreV1(client.CoreV1Api(client.ApiClient(cfg)), max_workers=4, timeout=2.0)
+    store, bus = _Store(), _Bus()
+    pods = ResourceInformer(core_v1, NAMESPACE, "pods", watch_seconds=1)
+    watcher = PodReadinessWatcher(pods, store=store, bus=bus)
+    yield api, core_v1, watcher, store, bus
+
+    await pods.stop()
+    core_v1.close()
+    await api.stop()
+
+
+async def _create_pod(core_v1: AsyncCoreV1, name: str, team_id: int, challenge_id: int) -> str:
+    pod = client.V1Pod(
+        metadata=client.V1ObjectMeta(
+            name=name, labels={"app": "ctf-challenge", "team": str(team_id), "challenge": str(challenge_id)}
+        ),
+        spec=client.V1PodSpec(containers=[client.V1Container(name="challenge", image="img")]),
+    )
+    created = await core_v1.call("create_namespaced_pod", namespace=NAMESPACE, body=pod)
+    return created.metadata.uid
+
+
+def _starting(uid: str) -> dict:
+    return {"status": STATUS_STARTING, "started_at": datetime.now(timezone.utc).isoformat(), "pod_uid": uid}
+
+
+@pytest.mark.asyncio
+async def test_instance_goes_running_only_when_its_pod_is_ready(k8s):
+    api, core_v1, watcher, store, bus = k8s
+    before = (await metrics.snapshot())["timings"].get("instance.startup_seconds", {}).get("count", 0)
+
+    uid = await _create_pod(core_v1, "chal-t1-c2", 1, 2)
+    store.records[(1, 2)] = _starting(uid)
+    # an instance whose record points at a newer pod (extend) ignores its old one
+    await _create_pod(core_v1, "chal-t3-c2", 3, 2)
+    store.records[(3, 2)] = _starting("uid-of-the-fresh-pod")
+
+    await watcher.pods.start()
+    await _wait_for(lambda: watcher.pods.stats()["watching"])
+    await asyncio.sleep(0.1)
+    assert store.records[(1, 2)]["status"] == STATUS_STARTING
+
+    api.set_pod_status("chal-t3-c2", READY)
+    api.set_pod_status("chal-t1-c2", READY)
+    await _wait_for(lambda: store.records[(1, 2)]["status"] == STATUS_RUNNING)
+
+    assert store.records[(3, 2)]["status"] == STATUS_STARTING
+    assert [(e, d["challenge_id"], t) for e, d, t in bus.published] == [("instance_ready", 2, 1)]
+    timing = (await metrics.snapshot())["timings"]["instance.startup_seconds"]
+    assert timing["count"] == before + 1
+
+    # streams end after watch_seconds: the re-list keeps running and does not promote twice
+    await asyncio.sleep(1.5)
+    assert sum(1 for m, p in api.requests if m == "GET" and "watch=true" not in p) >= 2
+    assert len(bus.published) == 1
+
+
+@pytest.mark.asyncio
+async def test_pod_ready_before_the_spawn_stored_its_uid_is_promoted_by_notify_spawned(k8s):
+    api, core_v1, watcher, store, bus = k8s
+    api.pod_status = READY  # Ready before the spawn got its reply
+
+    await watcher.pods.start()
+    await _wait_for(lambda: watcher.pods.stats()["watching"])
+    uid = await _create_pod(core_v1, "pool-c2-abcd", 1, 2)
+    await _wait_for(lambda: watcher.pods.get("pool-c2-abcd") is not None)
+
+    store.records[(1, 2)] = _starting(uid)
+    record = await watcher.notify_spawned(1, 2)
+    assert record["status"] == STATUS_RUNNING
+    assert await watcher.notify_spawned(1, 2) is None  # already running
+    assert len(bus.published) == 1
+
+
+@pytest.mark.asyncio
+async def test_team_events_reach_only_that_teams_streams():
+    bus = SSEBus()
+    team_1, team_2, anonymous = await bus.subscribe(1), await bus.subscribe(2), await bus.subscribe()
+
+    await bus.broadcast("instance_ready", {"challenge_id": 2}, team_id=1)
+    await bus.broadcast("ctf_changed", {"action": "start"})
+
+    assert [json.loads(team_1.get_nowait())["event"] for _ in range(2)] == ["instance_ready", "ctf_changed"]
+    assert json.loads(team_2.get_nowait())["event"] == "ctf_changed"
+    assert json.loads(anonymous.get_nowait())["event"] == "ctf_changed"
+    assert team_2.empty() and anonymous.empty()
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.backend.config.redis import RedisRegistry
+from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.redis_client_cache import RedisClientCache
+from app.backend.utils.team_instance_store import TeamInstanceStore
+from tests.backend.utils import LocalRedisServer
+
+
+async def _wait_for(cond, timeout: float = 2.0) -> None:
+    async def _poll():
+        while not cond():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_locally_until_redis_invalidates_them():
+    server = await LocalRedisServer().start()
+    reg = RedisRegistry(server.url, max_connections=4, pool_timeout=0.5, socket_timeout=0.5, health_check_interval=0)
+    other_worker = RedisRegistry(
+        server.url, max_connections=1, pool_timeout=0.5, socket_timeout=0.5, health_check_interval=0
+    )
+    cache = RedisClientCache(server.url, ping_interval=0.2)
+    flags = TeamFlagStore(reg.client(), cache=cache)
+    await cache.start()
+    try:
+        await _wait_for(lambda: cache.active)
+        await other_worker.client().set("ctf:flag:team:1:2", "flag{a}")
+        await _wait_for(lambda: cache.stats()["invalidations"] == 1)
+
+        for _ in range(3):
+            assert await flags.get_flag(1, 2) == "flag{a}"
+        assert server.commands.count(b"GET") == 1
+        assert cache.stats()["hit_ratio"] == pytest.approx(2 / 3, abs=1e-3)
+
+        # written elsewhere -> pushed invalidation -> next read goes to Redis again
+        await other_worker.client().set("ctf:flag:team:1:2", "flag{b}")
+        await _wait_for(lambda: cache.stats()["entries"] == 0)
+        assert await flags.get_flag(1, 2) == "flag{b}"
+
+        # own writes are visible immediately
+        await flags.set_flag(1, 2, "flag{c}", ttl_seconds=60)
+        assert await flags.get_flag(1, 2) == "flag{c}"
+
+        # instance records (hashes) are cached the same way
+        instances = TeamInstanceStore(reg.client(), cache=cache)
+        await other_worker.client().hset("ctf:instance:team:1:2", mapping={"team_id": "1", "status": "running"})
+        await _wait_for(lambda: cache.stats()["invalidations"] == 4)
+        assert (await instances.get(1, 2))["status"] == "running"
+        assert (await instances.get(1, 2))["status"] == "running"
+        assert server.commands.count(b"HGETALL") == 1
+    finally:
+        await cache.stop()
+        await reg.shutdown()
+        await other_worker.shutdown()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bypassed_and_dropped_while_tracking_is_down():
+    server = await LocalRedisServer().start()
+    reg = RedisRegistry(server.url, max_connections=4, pool_timeout=0.5, socket_timeout=0.5, health_check_interval=0)
+    cache = RedisClientCache(server.url, ping_interval=0.2)
+    flags = TeamFlagStore(reg.client(), cache=cache)
+    await cache.start()
+    try:
+        await _wait_for(lambda: cache.active)
+        await flags.set_flag(1, 2, "flag{a}", ttl_seconds=60)
+        await _wait_for(lambda: cache.stats()["invalidations"] == 1)
+        await flags.get_flag(1, 2)
+        assert cache.stats()["entries"] == 1
+
+        await server.stop()
+        await _wait_for(lambda: not cache.active)
+        assert cache.stats()["entries"] == 0
+        with pytest.raises(RedisConnectionError):
+            await flags.get_flag(1, 2)  # not served from the (possibly stale) local copy
+
+        # invalidations may be missed while disconnected: everything starts cold again
+        await server.start()
+        await _wait_for(lambda: cache.active, timeout=5.0)
+        server.data[b"ctf:flag:team:1:2"] = b"flag{b}"  # changed behind our back
+        assert await flags.get_flag(1, 2) == "flag{b}"
+    finally:
+        await cache.stop()
+        await reg.shutdown()
+        await server.stop()
@@ -0,0 +1,154 @@
+import fastapi
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from slowapi.errors import RateLimitExceeded
+from starlette.requests import Request
+
+from app.backend.api.v1.endpoints import ctf_events
+from app.backend.config.redis import RedisRegistry, RedisUnavailable
+from app.backend.repository.challenges import ChallengesCRUDRepository
+from app.backend.utils import flag_store
+from app.backend.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.backend.utils.limiter import BatchedLimiter, client_ip_key
+from tests.backend.utils import LocalRedisServer, create_challenge
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _registry(server: LocalRedisServer, clock: _Clock) -> RedisRegistry:
+    return RedisRegistry(
+        server.url,
+        max_connections=4,
+        pool_timeout=0.5,
+        socket_timeout=0.5,
+        health_check_interval=0,
+        breaker=CircuitBreaker("redis-test", failure_threshold=2, reset_timeout=5.0, clock=clock),
+    )
+
+
+def test_breaker_opens_fails_fast_and_probes_once():
+    clock = _Clock()
+    breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=5.0, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 5
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+
+    breaker.record_failure()  # failed probe -> open again
+    assert not breaker.allow()
+
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_redis_goes_away_and_comes_back():
+    server = await LocalRedisServer().start()
+    clock = _Clock()
+    reg = _registry(server, clock)
+    r = reg.client()
+    try:
+        await r.set("k", "v")
+        assert await r.get("k") == "v"
+
+        await server.stop()
+        for _ in range(2):
+            with pytest.raises(RedisConnectionError):
+                await r.get("k")
+        assert not reg.available
+
+        # open circuit: rejected without touching the network
+        with pytest.raises(RedisUnavailable):
+            await r.get("k")
+        with pytest.raises(RedisUnavailable):
+            await r.pipeline().get("k").execute()
+
+        await server.start()
+        with pytest.raises(RedisUnavailable):
+            await r.get("k")  # still inside reset_timeout
+
+        clock.now += 5
+        assert await r.get("k") == "v"  # probe succeeds -> closed
+        assert reg.available
+        assert reg.stats()["breaker"]["state"] == CLOSED
+    finally:
+        await reg.shutdown()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_sse_connection_cap_is_skipped_while_redis_is_down(monkeypatch):
+    server = await LocalRedisServer().start()
+    reg = _registry(server, _Clock())
+    monkeypatch.setattr(ctf_events, "redis_client", reg.client())
+    monkeypatch.setattr(ctf_events, "MAX_SSE_CONNECTIONS_PER_IP", 1)
+    try:
+        assert await ctf_events._acquire_sse_slot("sse:ctf:ip:1.2.3.4") is True
+        with pytest.raises(fastapi.HTTPException):
+            await ctf_events._acquire_sse_slot("sse:ctf:ip:1.2.3.4")
+
+        await server.stop()
+        assert await ctf_events._acquire_sse_slot("sse:ctf:ip:1.2.3.4") is False
+        assert await ctf_events._acquire_sse_slot("sse:ctf:ip:1.2.3.4") is False
+    finally:
+        await reg.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_team_flag_is_validated_from_db_while_redis_is_down(db_session, monkeypatch):
+    server = await LocalRedisServer().start()
+    reg = _registry(server, _Clock())
+    monkeypatch.setattr(flag_store, "redis_client", reg.client())
+
+    challenge = await create_challenge(db_session, flag=None)
+    repo = ChallengesCRUDRepository(db_session)
+    try:
+        await flag_store.TeamFlagStore().set_flag(1, challenge.id, "dyn-flag", ttl_seconds=60)
+        await repo.save_team_instance_flag(1, challenge.id, "dyn-flag", ttl_seconds=60)
+        assert await repo.validate_flag_team(challenge, "dyn-flag", team_id=1)
+
+        await server.stop()
+        assert await repo.validate_flag_team(challenge, "dyn-flag", team_id=1)
+        assert not await repo.validate_flag_team(challenge, "wrong", team_id=1)
+
+        await repo.delete_team_instance_flag(1, challenge.id)
+        assert not await repo.validate_flag_team(challenge, "dyn-flag", team_id=1)
+    finally:
+        await reg.shutdown()
+
+
+def test_limiter_falls_back_to_local_counters_when_redis_is_down():
+    def _down(keys, args):
+        raise RedisUnavailable("Redis circuit open")
+
+    limiter = BatchedLimiter(key_func=client_ip_key, hit_script=_down, in_memory_fallback_enabled=True)
+
+    @limiter.limit("2/minute")
+    async def endpoint(request: Request):
+        return None
+
+    def _request():
+        return Request({"type": "http", "method": "GET", "path": "/x", "headers": [], "client": ("10.0.0.1", 1)})
+
+    for _ in range(2):
+        limiter._check_request_limit(_request(), endpoint, False)
+    assert limiter._storage_dead
+
+    with pytest.raises(RateLimitExceeded):
+        limiter._check_request_limit(_request(), endpoint, False)
@@ -0,0 +1,55 @@
+import pytest
+
+from app.backend.config.redis import PUBSUB, RedisRegistry, redis_client
+from app.backend.utils.flag_store import RedisFlagStore, TeamFlagStore
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.instance_token_store import InstanceTokenStore
+from app.backend.utils.metrics import metrics
+from app.backend.utils.team_instance_store import TeamInstanceStore
+
+
+def _registry() -> RedisRegistry:
+    return RedisRegistry(
+        "redis://127.0.0.1:1/0",
+        max_connections=4,
+        pool_timeout=0.1,
+        socket_timeout=0.1,
+        health_check_interval=30,
+    )
+
+
+def test_stores_share_the_registry_client():
+    stores = [TeamInstanceStore(), InstanceTokenStore(), TeamFlagStore(), RedisFlagStore(), InstanceLimiter()]
+    assert all(s._r is redis_client for s in stores)
+
+
+@pytest.mark.asyncio
+async def test_registry_clients_pool_settings_and_stats():
+    reg = _registry()
+    default = reg.client()
+    assert reg.client() is default
+    assert reg.client(PUBSUB) is not default
+
+    kwargs = default.connection_pool.connection_kwargs
+    assert default.connection_pool.max_connections == 4
+    assert kwargs["health_check_interval"] == 30
+    assert kwargs["socket_timeout"] == 0.1
+    assert reg.client(PUBSUB).connection_pool.connection_kwargs["socket_timeout"] is None
+
+    assert reg.stats() == {
+        "breaker": {"state": "closed", "consecutive_failures": 0},
+        "default": {"max": 4, "in_use": 0, "idle": 0},
+        PUBSUB: {"max": 4, "in_use": 0, "idle": 0},
+    }
+
+    # unreachable server: startup logs and continues, shutdown drops every client
+    assert await reg.ping() is False
+    await reg.startup()
+    await reg.shutdown()
+    assert set(reg.stats()) == {"breaker"}
+
+
+@pytest.mark.asyncio
+async def test_registry_pools_are_exported_as_metrics():
+    snap = await metrics.snapshot()
+    assert "default" in snap["collectors"]["redis_pools"]
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+from app.backend.db.models import SecurityDevice
+from app.backend.security.security_events import _device_upsert_stmt, is_new_device, known_devices
+from tests.backend.utils import create_admin_user
+
+
+@pytest.mark.asyncio
+async def test_is_new_device_learns_device_once(db_session):
+    known_devices.clear()
+    user = await create_admin_user(db_session)
+
+    assert await is_new_device(db_session, user.id, "fp-1") is True
+    # served from the in-memory filter
+    assert await is_new_device(db_session, user.id, "fp-1") is False
+
+    # cold cache (other worker / restart) -> DB says known
+    known_devices.clear()
+    assert await is_new_device(db_session, user.id, "fp-1") is False
+    assert await is_new_device(db_session, user.id, "fp-2") is True
+
+    count = await db_session.execute(select(func.count()).select_from(SecurityDevice))
+    assert count.scalar_one() == 2
+
+
+def test_device_upsert_is_single_statement():
+    now = datetime.now(timezone.utc)
+    stmt = _device_upsert_stmt(1, "fp", now, timedelta(minutes=15))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert "ON CONFLICT (user_id, fingerprint) DO UPDATE" in sql
+    assert "WHERE security_devices.last_seen <" in sql
+    assert "RETURNING (xmax = 0)" in sql
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from app.backend.utils.instance_limiter import InstanceLimiter
+from app.backend.utils.spawn_queue import QUEUE_ENTRIES_KEY, SpawnQueue, dispatch_order
+from app.backend.utils.team_instance_store import ADMIT_FULL, STATUS_STARTING
+
+
+class _QueueRedis:
+    """
+    Hash / sorted-set subset of Redis used by the spawn queue (shared by several workers).
+    """
+
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    async def hsetnx(self, key, field, value):
+        h = self.hashes.setdefault(key, {})
+        if field in h:
+            return 0
+        h[field] = str(value)
+        return 1
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    async def hdel(self, key, *fields):
+        h = self.hashes.get(key, {})
+        return sum(h.pop(f, None) is not None for f in fields)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    async def zrangebyscore(self, key, min, max, withscores=False):
+        live = sorted((s, m) for m, s in self.zsets.get(key, {}).items() if s >= float(min))
+        return [(m, s) for s, m in live] if withscores else [m for _, m in live]
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, r: _QueueRedis) -> None:
+        self._r = r
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *a, **kw: self._calls.append(getattr(self._r, name)(*a, **kw))
+
+    async def execute(self):
+        return [await c for c in self._calls]
+
+
+class _Bus:
+    def __init__(self) -> None:
+        self.events = []
+
+    async def publish(self, event, data=None, *, team_id=None):
+        self.events.append((event, team_id, data))
+
+
+def test_dispatch_order_is_round_robin_across_teams():
+    entries = {"1:10": "1", "1:11": "2", "1:12": "3", "2:10": "4", "3:10": "5", "3:11": "6"}
+    assert dispatch_order(entries, {}) == [(1, 10), (2, 10), (3, 10), (1, 11), (3, 11), (1, 12)]
+    # team 1 was served last: it waits for the others
+    assert dispatch_order(entries, {"1": "100", "2": "50"})[:3] == [(3, 10), (2, 10), (1, 10)]
+
+
+@pytest.mark.asyncio
+async def test_queue_hands_out_freed_slots_fairly_and_reports_position(monkeypatch):
+    monkeypatch.setattr("app.backend.utils.spawn_queue.settings.MAX_ACTIVE_INSTANCES", 2)
+    r, bus = _QueueRedis(), _Bus()
+    now = time.time()
+    r.zsets[InstanceLimiter.ZSET_KEY] = {"slot:a": now + 600, "slot:b": now + 60}  # cluster full
+
+    queue = SpawnQueue(r, bus=bus)
+    free_slots = 0
+    started: list[tuple[int, int]] = []
+
+    async def _spawn(team_id, challenge_id):
+        nonlocal free_slots
+        if not free_slots:
+            return ADMIT_FULL
+        free_slots -= 1
+        started.append((team_id, challenge_id))
+        return STATUS_STARTING
+
+    queue.register(_spawn)
+    await queue.enqueue(1, 10)
+    await queue.enqueue(1, 11)
+    head = await queue.enqueue(1, 10)  # not queued twice
+    assert head["position"] == 1
+    assert 55 <= head["eta_seconds"] <= 60  # first live slot to expire
+    second = await queue.enqueue(2, 10)
+    assert second["position"] == 2
+    assert second["eta_seconds"] > 590
+    assert await queue.status(1, 11) == {"position": 3, "eta_seconds": None}
+
+    # still full: nothing leaves the queue, the head keeps its place
+    assert await queue.run_once() == 0
+    assert await queue.pending() == 3
+    assert (await queue.status(1, 10))["position"] == 1
+
+    # two slots free up: team 1 and then team 2, before team 1's second spawn
+    free_slots = 2
+    assert await queue.run_once() == 2
+    assert started == [(1, 10), (2, 10)]
+    assert list(r.hashes[QUEUE_ENTRIES_KEY]) == ["1:11"]
+    assert ("spawn_queue", 2, {"challenge_id": 10, "status": "starting"}) in bus.events
+    assert bus.events[-1][:2] == ("spawn_queue", 1)
+    assert bus.events[-1][2]["position"] == 1
+
+    # leaving the queue
+    assert await queue.cancel(1, 11)
+    assert await queue.status(1, 11) is None
+    assert (await queue.stats())["dispatched"] == 2
@@ -0,0 +1,129 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from kubernetes import client
+
+from app.backend.config.redis import RedisRegistry
+from app.backend.utils.flag_store import TeamFlagStore
+from app.backend.utils.k8s_api import AsyncCoreV1
+from app.backend.utils.k8s_manager import K8sTeamChallengeManager
+from app.backend.utils.warm_pool import FLAG_ANNOTATION, PoolTarget, WarmPool
+from tests.backend.utils import LocalK8sApiServer, LocalRedisServer, container_status, role_grants
+
+
+@pytest_asyncio.fixture
+async def k8s(monkeypatch):
+    redis_server = await LocalRedisServer().start()
+    reg = RedisRegistry(redis_server.url, max_connections=8, pool_timeout=1, socket_timeout=1, health_check_interval=0)
+    api = await LocalK8sApiServer().start()
+    # pool pods: started, not Ready before their flag file is filled
+    api.pod_status = {
+        "phase": "Running",
+        "conditions": [{"type": "Ready", "status": "False"}],
+        "containerStatuses": [container_status(started=True, ready=False)],
+    }
+    targets = [PoolTarget(challenge_id=7, image="img", port=8080, size=2)]
+
+    async def _targets():
+        return targets
+
+    cfg = client.Configuration(host=api.host)
+    core_v1 = AsyncCoreV1(client.CoreV1Api(client.ApiClient(cfg)), max_workers=8, timeout=5)
+    mgr = K8sTeamChallengeManager()
+    pool = WarmPool(core_v1, mgr.namespace, targets_loader=_targets, r=reg.client())
+    monkeypatch.setattr(mgr, "core_v1", core_v1)
+    monkeypatch.setattr(mgr, "warm_pool", pool)
+    monkeypatch.setattr(mgr, "flag_store", TeamFlagStore(reg.client()))
+    yield mgr, api, targets
+
+    core_v1.close()
+    await api.stop()
+    await reg.shutdown()
+    await redis_server.stop()
+
+
+@pytest.mark.asyncio
+async def test_refill_keeps_each_pool_at_its_size(k8s):
+    mgr, api, targets = k8s
+
+    await mgr.warm_pool.refill_once()
+    pods = api.pods(challenge="7")
+    assert len(pods) == 2
+    assert all(p["metadata"]["labels"]["ctf-pool"] == "warm" for p in pods)
+    assert mgr.warm_pool.stats() == {"7": {"target": 2, "ready": 0}}
+
+    await mgr.warm_pool.refill_once()
+    assert len(api.pods(challenge="7")) == 2
+    assert mgr.warm_pool.stats() == {"7": {"target": 2, "ready": 2}}
+
+    targets[0] = PoolTarget(challenge_id=7, image="img", port=8080, size=1)
+    await mgr.warm_pool.refill_once()
+    assert len(api.pods(challenge="7")) == 1
+
+    targets.clear()
+    await mgr.warm_pool.refill_once()
+    assert api.pods() == []
+
+
+@pytest.mark.asyncio
+async def test_spawn_claims_a_warm_pod_and_delivers_the_flag_after_start(k8s):
+    mgr, api, _ = k8s
+    await mgr.warm_pool.refill_once()
+
+    result = await mgr.spawn_instance(1, 7, "img", 8080, ttl_seconds=600, warm_pool=True)
+    assert result["connection_internal"].startswith("chal-t1-c7.")
+
+    (claimed,) = api.pods(team="1")
+    assert claimed["metadata"]["name"].startswith("pool-c7-")
+    assert claimed["metadata"]["labels"]["ctf-pool"] == "claimed"
+    assert claimed["metadata"]["annotations"][FLAG_ANNOTATION] == result["flag"]
+    assert claimed["spec"]["activeDeadlineSeconds"] <= 601
+    # Ready (hence running) only once the kubelet wrote the flag file
+    (container,) = claimed["spec"]["containers"]
+    assert container["readinessProbe"]["exec"]["command"][-1] == "test -s /run/ctf/flag"
+    assert container["startupProbe"]["tcpSocket"] == {"port": 8080}
+    assert ("services", "chal-t1-c7") in api.objects
+    assert len(api.pods(challenge="7")) == 2  # no cold pod created
+
+    await mgr.warm_pool.refill_once()
+    assert len(api.pods(challenge="7", **{"ctf-pool": "warm"})) == 2
+
+    await mgr.terminate_instance(1, 7)
+    assert api.pods(team="1") == []
+    assert ("services", "chal-t1-c7") not in api.objects
+
+
+@pytest.mark.asyncio
+async def test_one_warm_pod_is_claimed_once_and_an_empty_pool_spawns_cold(k8s):
+    mgr, api, targets = k8s
+    targets[0] = PoolTarget(challenge_id=7, image="img", port=8080, size=1)
+    await mgr.warm_pool.refill_once()
+
+    a, b = await asyncio.gather(
+        mgr.spawn_instance(1, 7, "img", 8080, warm_pool=True),
+        mgr.spawn_instance(2, 7, "img", 8080, warm_pool=True),
+    )
+    assert a and b
+    names = sorted(p["metadata"]["name"] for p in api.pods(challenge="7") if "team" in p["metadata"]["labels"])
+    assert len(names) == 2
+    assert sum(n.startswith("pool-c7-") for n in names) == 1
+    assert sum(n.startswith("chal-t") for n in names) == 1
+
+
+@pytest.mark.asyncio
+async def test_challenge_roles_grant_every_call_of_the_instance_lifecycle(k8s):
+    mgr, api, _ = k8s
+    await mgr.warm_pool.refill_once()
+    assert await mgr.spawn_instance(1, 7, "img", 8080, warm_pool=True)  # claim (patch)
+    assert await mgr.spawn_instance(2, 8, "img", 8080)  # cold
+    assert await mgr.spawn_instance(2, 8, "img", 8080)  # conflict: read and adopt
+    await mgr.terminate_instance(1, 7)  # pods by label (deletecollection)
+    await mgr.warm_pool.refill_once()
+
+    used = api.verbs()
+    assert {("", "pods", "patch"), ("", "pods", "deletecollection"), ("", "pods", "get")} <= used
+    for manifest in ("k8s/challenges-rbac.yaml", "k8s/local/backend-rbac-local.yaml"):
+        (granted,) = role_grants(Path(__file__).parents[2] / manifest, mgr.namespace).values()
+        assert used <= granted, f"{manifest} misses {sorted(used - granted)}"
@@ -1,5 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import copy
+import json
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import dns.resolver
+import yaml
+
 from app.backend.db.models import ChallengeTable, DifficultyEnum, RoleEnum, UserTable
 from app.backend.security.password import PasswordManager
 from app.backend.security.tokens import create_jwt_access_token
@@ -7,6 +19,24 @@ from app.backend.security.tokens import create_jwt_access_token
 pwd_manager = PasswordManager()
 
 
+def role_grants(manifest: Path, namespace: str) -> dict[str, set[tuple[str, str, str]]]:
+    """
+    (apiGroup, resource, verb) granted by each Role of `namespace` in a k8s manifest file.
+    """
+    grants: dict[str, set[tuple[str, str, str]]] = {}
+    for doc in yaml.safe_load_all(manifest.read_text()):
+        if not doc or doc.get("kind") != "Role" or doc["metadata"].get("namespace") != namespace:
+            continue
+        grants[doc["metadata"]["name"]] = {
+            (group, resource, verb)
+            for rule in doc.get("rules", ())
+            for group in rule["apiGroups"]
+            for resource in rule["resources"]
+            for verb in rule["verbs"]
+        }
+    return grants
+
+
 async def create_admin_user(
     session, *, username="admin", email="admin@example.com", password="AdminPass123!"
 ) -> UserTable:
@@ -35,9 +65,11 @@ async def create_challenge(
     difficulty=DifficultyEnum.EASY,
     points=100,
     flag="FLAG{TEST}",
+    image_name="ctf/test-challenge:latest",
 ) -> ChallengeTable:
     challenge = ChallengeTable(
         name=name,
+        image_name=image_name,
         path=path,
         description=description,
         hint=hint,
@@ -75,3 +107,411 @@ def authenticate_client(client, user_id: int):
     token = create_jwt_access_token({"sub": str(user_id)})
     client.cookies.set("access_token", token, path="/")
     return token
+
+
+class StaticMXResolver:
+    """
+    Local stand-in for dns.asyncresolver.Resolver.
+    `records` maps domain -> MX TTL; unknown domains raise NXDOMAIN, domains in `hang` never answer.
+    """
+
+    def __init__(self, records: dict[str, int] | None = None, *, hang: set[str] | None = None):
+        self.records = records or {}
+        self.hang = hang or set()
+        self.calls: list[str] = []
+
+    async def resolve(self, qname, rdtype="MX", lifetime=None, **_):
+        self.calls.append(qname)
+        if qname in self.hang:
+            await asyncio.sleep(3600)
+        if qname not in self.records:
+            raise dns.resolver.NXDOMAIN()
+        return SimpleNamespace(rrset=SimpleNamespace(ttl=self.records[qname]))
+
+
+class LocalSMTPServer:
+    """
+    Minimal in-process SMTP server (HELO/EHLO/MAIL/RCPT/DATA/RSET/NOOP/QUIT).
+    Records every message and connection; `drop_after` closes the session after that many messages.
+    """
+
+    def __init__(self, *, drop_after: int | None = None):
+        self.drop_after = drop_after
+        self.messages: list[bytes] = []
+        self.connections = 0
+        self.port: int | None = None
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> LocalSMTPServer:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        received = 0
+        writer.write(b"220 localhost ESMTP\r\n")
+
+        data: list[bytes] | None = None
+        while line := await reader.readline():
+            if data is not None:
+                if line.rstrip(b"\r\n") == b".":
+                    self.messages.append(b"".join(data))
+                    data = None
+                    received += 1
+                    writer.write(b"250 OK queued\r\n")
+                    if self.drop_after is not None and received >= self.drop_after:
+                        break
+                else:
+                    data.append(line[1:] if line.startswith(b"..") else line)
+                continue
+
+            cmd = line[:4].upper()
+            if cmd in (b"HELO", b"EHLO"):
+                writer.write(b"250 localhost\r\n")
+            elif cmd in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                writer.write(b"250 OK\r\n")
+            elif cmd == b"DATA":
+                data = []
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif cmd == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                break
+            else:
+                writer.write(b"502 Command not implemented\r\n")
+            await writer.drain()
+
+        await writer.drain()
+        writer.close()
+
+
+class LocalRedisServer:
+    """
+    Minimal in-process Redis server for fault-injection tests: HELLO (RESP2/RESP3),
+    PING/GET/SET [EX n] [NX]/DEL/EXISTS/INCRBY/DECRBY/EXPIRE/HSET/HGETALL, TTLs are not enforced.
+    `CLIENT TRACKING ON BCAST PREFIX ...` (RESP3) gets `invalidate` pushes for written keys.
+    `stop()` drops the listener and every open connection (Redis going away);
+    `start()` again comes back on the same port with the same data.
+    """
+
+    def __init__(self):
+        self.data: dict[bytes, bytes | dict[bytes, bytes]] = {}
+        self.commands: list[bytes] = []
+        self.port: int | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._tracking: dict[asyncio.StreamWriter, tuple[bytes, ...]] = {}
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    async def start(self) -> LocalRedisServer:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", self.port or 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        for w in list(self._writers):
+            w.close()
+        await self._server.wait_closed()
+        self._writers.clear()
+        self._tracking.clear()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes] | None:
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _bulk(self, v: bytes | None) -> bytes:
+        return b"$-1\r\n" if v is None else b"$%d\r\n%s\r\n" % (len(v), v)
+
+    def _int(self, n: int) -> bytes:
+        return b":%d\r\n" % n
+
+    def _map(self, items: dict[bytes, bytes], proto: int) -> bytes:
+        head = b"%%%d\r\n" % len(items) if proto == 3 else b"*%d\r\n" % (2 * len(items))
+        return head + b"".join(self._bulk(k) + self._bulk(v) for k, v in items.items())
+
+    def _invalidate(self, keys: list[bytes]) -> None:
+        for w, prefixes in list(self._tracking.items()):
+            hit = [k for k in keys if k.startswith(prefixes)]
+            if hit:
+                w.write(b">2\r\n" + self._bulk(b"invalidate") + b"*%d\r\n" % len(hit) + b"".join(map(self._bulk, hit)))
+
+    def _execute(self, cmd: bytes, args: list[bytes], proto: int) -> bytes:
+        if cmd == b"PING":
+            return b"+PONG\r\n"
+        if cmd == b"CLIENT":
+            return b"+OK\r\n"
+        if cmd == b"GET":
+            return self._bulk(self.data.get(args[0]))
+        if cmd == b"SET":
+            opts = [a.upper() for a in args[2:]]
+            if b"NX" in opts and args[0] in self.data:
+                return self._bulk(None)
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if cmd == b"DEL":
+            return self._int(sum(self.data.pop(k, None) is not None for k in args))
+        if cmd == b"EXISTS":
+            return self._int(sum(k in self.data for k in args))
+        if cmd in (b"INCRBY", b"DECRBY"):
+            step = int(args[1]) if cmd == b"INCRBY" else -int(args[1])
+            n = int(self.data.get(args[0], b"0")) + step
+            self.data[args[0]] = b"%d" % n
+            return self._int(n)
+        if cmd == b"EXPIRE":
+            return self._int(int(args[0] in self.data))
+        if cmd == b"HSET":
+            h = self.data.setdefault(args[0], {})
+            added = sum(k not in h for k in args[1::2])
+            h.update(zip(args[1::2], args[2::2], strict=True))
+            return self._int(added)
+        if cmd == b"HGETALL":
+            return self._map(self.data.get(args[0], {}), proto)
+        return b"-ERR unknown command '%s'\r\n" % cmd
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        proto = 2
+        try:
+            while (command := await self._read_command(reader)) is not None:
+                cmd = command[0].upper()
+                self.commands.append(cmd)
+                if cmd == b"HELLO":
+                    proto = int(command[1]) if len(command) > 1 else proto
+                    reply = self._map({b"server": b"redis", b"version": b"7.2.0", b"proto": b"%d" % proto}, proto)
+                else:
+                    reply = self._execute(cmd, command[1:], proto)
+                if cmd == b"CLIENT" and command[1].upper() == b"TRACKING" and proto == 3:
+                    self._tracking[writer] = tuple(
+                        command[i + 1] for i, a in enumerate(command[:-1]) if a.upper() == b"PREFIX"
+                    )
+                writer.write(reply)
+                if cmd in (b"SET", b"HSET", b"INCRBY", b"DECRBY"):
+                    self._invalidate(command[1:2])
+                elif cmd == b"DEL":
+                    self._invalidate(command[1:])
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._tracking.pop(writer, None)
+            writer.close()
+
+
+def container_status(*, started: bool, ready: bool) -> dict:
+    return {"name": "challenge", "image": "img", "imageID": "", "restartCount": 0, "started": started, "ready": ready}
+
+
+class LocalK8sApiServer:
+    """
+    Minimal in-process Kubernetes API server for the core/v1 pod and service (and apps/v1
+    deployment) calls the instance manager makes: create / read / list / merge-patch / delete (also by labelSelector)
+    and watch (`?watch=true`, chunked JSON events after `resourceVersion`).
+    Every request waits `latency` seconds (a slow API server), plus `method_latency[method]`
+    (e.g. creates applied after the client gave up); `fail` maps "pods" / "services"
+    to an HTTP status returned on create. New pods are Running and Ready unless `pod_status` says
+    otherwise; `set_pod_status` changes it later. A patch carrying a stale metadata.resourceVersion
+    gets 409, like the real thing. `max_concurrent` records how many requests were in flight at
+    the same time.
+    """
+
+    def __init__(self, *, latency: float = 0.0):
+        self.latency = latency
+        self.method_latency: dict[str, float] = {}
+        self.fail: dict[str, int] = {}
+        self.pod_status: dict = {
+            "phase": "Running",
+            "conditions": [{"type": "Ready", "status": "True"}],
+            "containerStatuses": [container_status(started=True, ready=True)],
+        }
+        self.objects: dict[tuple[str, str], dict] = {}  # (kind, name) -> object
+        self.requests: list[tuple[str, str]] = []
+        self.max_concurrent = 0
+        self.port: int | None = None
+        self._in_flight = 0
+        self._next_node_port = 30000
+        self._version = 0
+        self._events: list[tuple[int, str, str, dict]] = []  # (version, kind, type, object)
+        self._closing = False
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> LocalK8sApiServer:
+        self._closing = False
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._closing = True  # ends open watch streams
+        self._server.close()
+        await self._server.wait_closed()
+
+    def verbs(self) -> set[tuple[str, str, str]]:
+        """
+        RBAC (apiGroup, resource, verb) of every namespaced request received so far.
+        """
+        used = set()
+        for method, path in self.requests:
+            parts, params, _ = self._parse(path)
+            group = path.strip("/").split("/")[1] if path.startswith("/apis/") else ""
+            named = len(parts) > 5
+            if method == "GET":
+                verb = "watch" if params.get("watch", [""])[0].lower() == "true" else ("get" if named else "list")
+            else:
+                verb = {"POST": "create", "PATCH": "patch", "PUT": "update"}.get(method)
+                verb = verb or ("delete" if named else "deletecollection")
+            used.add((group, parts[4], verb))
+        return used
+
+    def pods(self, **labels: str) -> list[dict]:
+        return [o for (kind, _), o in self.objects.items() if kind == "pods" and self._matches(o, labels)]
+
+    def set_pod_status(self, name: str, status: dict) -> None:
+        pod = self.objects[("pods", name)]
+        pod["status"] = {**pod["status"], **status}
+        self._bump(pod, "pods", "MODIFIED")
+
+    def _bump(self, obj: dict, kind: str, event: str) -> None:
+        self._version += 1
+        obj["metadata"]["resourceVersion"] = str(self._version)
+        self._events.append((self._version, kind, event, copy.deepcopy(obj)))
+
+    @staticmethod
+    def _matches(obj: dict, selector: dict[str, str]) -> bool:
+        labels = obj["metadata"].get("labels") or {}
+        return all(labels.get(k) == v for k, v in selector.items())
+
+    @staticmethod
+    def _parse(path: str) -> tuple[list[str], dict[str, list[str]], dict[str, str]]:
+        # /api/v1/namespaces/{ns}/{kind}[/{name}][?labelSelector=a=b,c=d]
+        # (/apis/{group}/{version}/... has one more segment in front)
+        path, _, query = path.partition("?")
+        params = urllib.parse.parse_qs(query)
+        selector = dict(kv.split("=", 1) for kv in ",".join(params.get("labelSelector", [])).split(",") if kv)
+        parts = path.strip("/").split("/")
+        return parts[1:] if parts[0] == "apis" else parts, params, selector
+
+    def _route(self, method: str, path: str, body: dict | None) -> tuple[int, dict]:
+        parts, _, selector = self._parse(path)
+        kind = parts[4]
+
+        if len(parts) == 5 and method in ("GET", "DELETE"):
+            items = [o for (k, _), o in self.objects.items() if k == kind and self._matches(o, selector)]
+            if method == "DELETE":
+                for o in items:
+                    del self.objects[(kind, o["metadata"]["name"])]
+                    self._bump(o, kind, "DELETED")
+            meta = {"resourceVersion": str(self._version)}
+            return 200, {"kind": "List", "apiVersion": "v1", "metadata": meta, "items": items}
+
+        if method == "POST":
+            if kind in self.fail:
+                return self.fail[kind], {"kind": "Status", "code": self.fail[kind]}
+            name = body["metadata"]["name"]
+            if (kind, name) in self.objects:
+                return 409, {"kind": "Status", "reason": "AlreadyExists", "code": 409}
+            if kind == "services" and body["spec"].get("type") == "NodePort":
+                body["spec"]["ports"][0]["nodePort"] = self._next_node_port
+                self._next_node_port += 1
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            body["metadata"]["creationTimestamp"] = now
+            body["metadata"]["uid"] = str(uuid.uuid4())
+            if kind == "pods":
+                body["status"] = {**copy.deepcopy(self.pod_status), "startTime": now}
+            self._bump(body, kind, "ADDED")
+            self.objects[(kind, name)] = body
+            return 201, body
+
+        obj = self.objects.get((kind, parts[5]))
+        if obj is None:
+            return 404, {"kind": "Status", "reason": "NotFound", "code": 404}
+        if method == "DELETE":
+            del self.objects[(kind, parts[5])]
+            self._bump(obj, kind, "DELETED")
+        if method == "PATCH":
+            expected = body.get("metadata", {}).pop("resourceVersion", None)
+            if expected is not None and expected != obj["metadata"]["resourceVersion"]:
+                return 409, {"kind": "Status", "reason": "Conflict", "code": 409}
+            for section, values in body.items():
+                if not isinstance(values, dict):  # apiVersion / kind
+                    obj[section] = values
+                    continue
+                target = obj.setdefault(section, {})
+                for k, v in values.items():
+                    if isinstance(v, dict):
+                        target.setdefault(k, {}).update(v)
+                    else:
+                        target[k] = v
+            self._bump(obj, kind, "MODIFIED")
+        return 200, obj
+
+    async def _watch(self, writer: asyncio.StreamWriter, path: str) -> None:
+        parts, params, selector = self._parse(path)
+        seen = int(params.get("resourceVersion", ["0"])[0] or 0)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + int(params.get("timeoutSeconds", ["60"])[0])
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n")
+        while not self._closing and loop.time() < deadline:
+            for version, kind, event, obj in self._events:
+                if version > seen and kind == parts[4] and self._matches(obj, selector):
+                    line = json.dumps({"type": event, "object": obj}).encode() + b"\n"
+                    writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            seen = self._version
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while request_line := await reader.readline():
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                body = json.loads(await reader.readexactly(length)) if length else None
+
+                self.requests.append((method, path))
+                if method == "GET" and "watch=true" in path:
+                    await self._watch(writer, path)
+                    continue
+
+                self._in_flight += 1
+                self.max_concurrent = max(self.max_concurrent, self._in_flight)
+                try:
+                    await asyncio.sleep(self.latency + self.method_latency.get(method, 0.0))
+                    code, payload = self._route(method, path, body)
+                finally:
+                    self._in_flight -= 1
+
+                raw = json.dumps(payload).encode()
+                writer.write(
+                    b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                    % (code, len(raw), raw)
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()